@@ -0,0 +1,231 @@
+"""
+Answer Cache for GPT Fallbacks
+GiNi chat, the summary/notes generators and the quiz/test generators call GPT-4o
+whenever the CMS has nothing. Many of those requests repeat: a whole class asks
+"explain photosynthesis" in slightly different words. GPT output is stored in
+`ai_answer_cache`, scoped by tenant, generator kind and the request scope (class,
+subject, answer source and generator options), and reused:
+
+- exact: the question is normalized (case, punctuation, stopwords, light stemming) and
+  hashed, so "Explain photosynthesis!" and "explain the photosynthesis" share an entry
+- near-duplicate: entries in the same scope sharing a term with the question are
+  compared by cosine similarity of hashed word/character n-gram features; numbers,
+  question words and negations must match exactly so "solve 2x+3=7" never reuses the
+  answer for "2x+3=9", nor "who invented the telephone" the one for "when was it invented"
+
+Entries expire after ANSWER_CACHE_TTL_HOURS (TTL index on `expires_at`). Answers GPT
+refused under the academic-only rule are cached too, but only ever served on an exact
+match, and a near-duplicate lookup never returns them or matches across that line.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from cms_search import STOPWORDS, stem
+from semantic_search import features
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_TTL_HOURS = float(os.environ.get("ANSWER_CACHE_TTL_HOURS", "168"))
+ANSWER_CACHE_NEAR_THRESHOLD = float(os.environ.get("ANSWER_CACHE_NEAR_THRESHOLD", "0.85"))
+ANSWER_CACHE_CANDIDATES = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_POSSESSIVE_RE = re.compile(r"['’]s\b")
+_NEGATION_RE = re.compile(r"n['’]t\b")
+
+# Words that change what is being asked: dropped by CMS search, kept (and required to match) here
+QUESTION_WORDS = frozenset("how what when where which who whom whose why".split())
+NEGATIONS = frozenset("not no never nor none without cannot".split())
+_STOPWORDS = STOPWORDS - QUESTION_WORDS
+
+
+def normalize(question: str) -> List[str]:
+    """
+    CMS search tokens, keeping question words, negations and single characters, so
+    "why/when did WW2 start" and "2x + 3 = 7" / "2x + 4 = 7" get different keys
+    """
+    text = _NEGATION_RE.sub(" not", _POSSESSIVE_RE.sub("", (question or "").lower()))
+    return [stem(token) for token in _TOKEN_RE.findall(text) if token not in _STOPWORDS]
+
+
+def _guard_terms(terms: List[str]) -> set:
+    """Terms a near-duplicate must share exactly: numbers, question words and negations"""
+    return {t for t in terms if t in QUESTION_WORDS or t in NEGATIONS or any(ch.isdigit() for ch in t)}
+
+
+def _scope_key(scope: Dict[str, Any]) -> str:
+    canonical = {}
+    for name, value in (scope or {}).items():
+        if isinstance(value, str):
+            value = value.strip().lower()
+        if value is None or value == "":
+            continue
+        canonical[name] = value
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def _similarity(a: str, b: str) -> float:
+    a_indices, a_values = features([(a, 1.0)])
+    b_indices, b_values = features([(b, 1.0)])
+    if not len(a_indices) or not len(b_indices):
+        return 0.0
+    _, ia, ib = np.intersect1d(a_indices, b_indices, assume_unique=True, return_indices=True)
+    dot = float(a_values[ia] @ b_values[ib])
+    return dot / float(np.linalg.norm(a_values) * np.linalg.norm(b_values))
+
+
+class AnswerCache:
+    def __init__(self, db, ttl_hours: float = ANSWER_CACHE_TTL_HOURS,
+                 near_threshold: float = ANSWER_CACHE_NEAR_THRESHOLD):
+        self.collection = db.ai_answer_cache
+        self.ttl = timedelta(hours=ttl_hours)
+        self.near_threshold = near_threshold
+        self.counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stored": 0,
+                         "restricted_hits": 0, "tokens_saved": 0, "errors": 0}
+
+    def _key(self, tenant_id: str, kind: str, scope_key: str, normalized: str) -> str:
+        return hashlib.sha256(f"{tenant_id}|{kind}|{scope_key}|{normalized}".encode()).hexdigest()
+
+    async def lookup(self, tenant_id: str, kind: str, scope: Dict[str, Any], question: str,
+                     near: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Cached answer for the question as {answer, is_restricted, match, similarity}, or None.
+        Pass near=False for keys that are not free text (generator chapter/topic), where a
+        near-duplicate is a different request.
+        """
+        terms = normalize(question)
+        if not terms:
+            return None
+        normalized = " ".join(terms)
+        scope_key = _scope_key(scope)
+        now = datetime.utcnow()
+        try:
+            entry = await self.collection.find_one(
+                {"_id": self._key(tenant_id, kind, scope_key, normalized), "expires_at": {"$gt": now}}
+            )
+            match, similarity = "exact", 1.0
+            if entry is None and near:
+                entry, similarity = await self._nearest(tenant_id, kind, scope_key, normalized, terms, now)
+                match = "near"
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+
+            self.counters[f"{match}_hits"] += 1
+            if entry.get("is_restricted"):
+                self.counters["restricted_hits"] += 1
+            self.counters["tokens_saved"] += entry.get("tokens_used", 0)
+            await self.collection.update_one(
+                {"_id": entry["_id"]},
+                {"$inc": {"hits": 1, "tokens_saved": entry.get("tokens_used", 0)}, "$set": {"last_hit_at": now}}
+            )
+            return {"answer": entry["answer"], "is_restricted": bool(entry.get("is_restricted")),
+                    "match": match, "similarity": round(similarity, 4)}
+        except Exception as e:
+            # A cache failure should cost a GPT call, never the request
+            self.counters["errors"] += 1
+            logger.error(f"[ANSWER CACHE] Lookup failed for {kind}: {str(e)}")
+            return None
+
+    async def _nearest(self, tenant_id: str, kind: str, scope_key: str, normalized: str,
+                       terms: List[str], now: datetime):
+        guard = _guard_terms(terms)
+        candidates = self.collection.find(
+            {"tenant_id": tenant_id, "kind": kind, "scope": scope_key, "terms": {"$in": list(set(terms))},
+             "is_restricted": False, "expires_at": {"$gt": now}},
+            {"normalized": 1, "terms": 1, "answer": 1, "tokens_used": 1, "is_restricted": 1}
+        ).sort("hits", -1).limit(ANSWER_CACHE_CANDIDATES)
+
+        best, best_score = None, 0.0
+        async for candidate in candidates:
+            if _guard_terms(candidate.get("terms", [])) != guard:
+                continue
+            score = _similarity(normalized, candidate.get("normalized", ""))
+            if score >= self.near_threshold and score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    async def store(self, tenant_id: str, kind: str, scope: Dict[str, Any], question: str, answer: str,
+                    tokens_used: int = 0, is_restricted: bool = False):
+        terms = normalize(question)
+        if not terms or not answer:
+            return
+        normalized = " ".join(terms)
+        scope_key = _scope_key(scope)
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": self._key(tenant_id, kind, scope_key, normalized)},
+                {"$set": {
+                    "tenant_id": tenant_id,
+                    "kind": kind,
+                    "scope": scope_key,
+                    "class_standard": (scope or {}).get("class_standard"),
+                    "subject": (scope or {}).get("subject"),
+                    "question": question,
+                    "normalized": normalized,
+                    "terms": sorted(set(terms)),
+                    "answer": answer,
+                    "tokens_used": tokens_used or 0,
+                    "is_restricted": is_restricted,
+                    "created_at": now,
+                    "expires_at": now + self.ttl,
+                 },
+                 "$setOnInsert": {"hits": 0, "tokens_saved": 0}},
+                upsert=True
+            )
+            self.counters["stored"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"[ANSWER CACHE] Store failed for {kind}: {str(e)}")
+
+    async def invalidate(self, tenant_id: str, kind: Optional[str] = None, subject: Optional[str] = None,
+                         class_standard: Optional[str] = None) -> int:
+        query: Dict[str, Any] = {"tenant_id": tenant_id}
+        if kind:
+            query["kind"] = kind
+        if subject:
+            query["subject"] = subject
+        if class_standard:
+            query["class_standard"] = class_standard
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+    async def tenant_stats(self, tenant_id: str) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$match": {"tenant_id": tenant_id, "expires_at": {"$gt": datetime.utcnow()}}},
+            {"$group": {"_id": "$kind", "entries": {"$sum": 1}, "hits": {"$sum": "$hits"},
+                        "tokens_saved": {"$sum": "$tokens_saved"}}},
+            {"$sort": {"_id": 1}},
+        ]
+        return [
+            {"kind": row["_id"], "entries": row["entries"], "hits": row["hits"], "tokens_saved": row["tokens_saved"]}
+            async for row in self.collection.aggregate(pipeline)
+        ]
+
+    def metrics(self) -> Dict[str, Any]:
+        hits = self.counters["exact_hits"] + self.counters["near_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+            "near_threshold": self.near_threshold,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **self.counters,
+        }
+
+
+answer_cache = None
+
+def get_answer_cache(db) -> AnswerCache:
+    global answer_cache
+    if answer_cache is None:
+        answer_cache = AnswerCache(db)
+    return answer_cache
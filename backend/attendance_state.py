@@ -0,0 +1,289 @@
+"""
+Attendance State Machine for Biometric (ZKTeco) punches
+Per-tenant, per-day table of each person's first punch and last punch type, so the
+status of a new punch (on_time / late / very_late / checked_in / checked_out) is an
+O(1) state lookup instead of a scan of today's attendance_punches rows.
+State is warmed from PostgreSQL at startup and updated on every insert; a punch belongs
+to its UTC calendar day (`punch_day`), both when recorded and when warmed.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, date, time as dt_time, timedelta, timezone
+from typing import Optional, Dict, Any, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional - the in-process store is the default
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# How many days of state to keep (today plus late catch-up uploads from yesterday)
+STATE_RETENTION_DAYS = 2
+
+# One row per person; punches are split into days in Python with punch_day()
+WARM_STATE_SQL = """
+    SELECT tenant_id, person_id,
+           ARRAY_AGG(punch_time ORDER BY punch_time) AS punch_times,
+           ARRAY_AGG(punch_type ORDER BY punch_time) AS punch_types
+    FROM attendance_punches
+    WHERE punch_time >= $1 AND ($2::text IS NULL OR tenant_id = $2)
+    GROUP BY tenant_id, person_id
+"""
+
+# KEYS[1] = day hash; ARGV = person_id, first_punch (UTC ISO, fixed width), punch_type, ttl.
+# Returns the person's previous state, or nil if this is their first punch of the day.
+RECORD_PUNCH_LUA = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+local state = {first_punch = ARGV[2], last_punch_type = ARGV[3], punch_count = 1}
+if raw then
+    local previous = cjson.decode(raw)
+    if previous.first_punch and previous.first_punch < ARGV[2] then
+        state.first_punch = previous.first_punch
+    end
+    state.punch_count = (previous.punch_count or 0) + 1
+end
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(state))
+if not raw then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return raw
+"""
+
+
+def as_utc(value: datetime) -> datetime:
+    """Naive punch times are UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def punch_day(punch_time: datetime) -> date:
+    """The day a punch's state is kept under"""
+    return as_utc(punch_time).date()
+
+
+def _iso(value: datetime) -> str:
+    # Fixed width so the Lua script can compare punch times as strings
+    return as_utc(value).isoformat(timespec="microseconds")
+
+
+def _parse_clock(value: str) -> dt_time:
+    hours, minutes = str(value).split(":")[:2]
+    return dt_time(int(hours), int(minutes))
+
+
+class ShiftThresholds:
+    """
+    First punch strictly before on_time_until is on time, before late_until is late,
+    anything after is very late. Defaults reproduce the previous hard-coded rule
+    (hour <= 9 on time, hour <= 10 late).
+    """
+
+    def __init__(self, on_time_until: str = "10:00", late_until: str = "11:00"):
+        self.on_time_until = _parse_clock(on_time_until)
+        self.late_until = _parse_clock(late_until)
+        if self.late_until < self.on_time_until:
+            raise ValueError("late_until must not be earlier than on_time_until")
+
+    @classmethod
+    def from_env(cls) -> "ShiftThresholds":
+        return cls(
+            os.environ.get("ATTENDANCE_ON_TIME_UNTIL", "10:00"),
+            os.environ.get("ATTENDANCE_LATE_UNTIL", "11:00"),
+        )
+
+    def classify(self, punch_time: datetime) -> str:
+        clock = punch_time.time().replace(tzinfo=None)
+        if clock < self.on_time_until:
+            return "on_time"
+        if clock < self.late_until:
+            return "late"
+        return "very_late"
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "on_time_until": self.on_time_until.strftime("%H:%M"),
+            "late_until": self.late_until.strftime("%H:%M"),
+        }
+
+
+class InMemoryAttendanceStateStore:
+    """Default store: a dict per (tenant, day). Exact for a single worker process."""
+
+    def __init__(self):
+        self._days: Dict[Tuple[str, date], Dict[str, Dict[str, Any]]] = {}
+
+    async def record(self, tenant_id: str, day: date, person_id: str,
+                     punch_time: datetime, punch_type: str) -> Optional[Dict[str, Any]]:
+        """Apply a punch and return the person's state from *before* it (None if first)"""
+        people = self._days.setdefault((tenant_id, day), {})
+        previous = people.get(person_id)
+        if previous is None:
+            people[person_id] = {"first_punch": punch_time, "last_punch_type": punch_type, "punch_count": 1}
+            return None
+        state = dict(previous)
+        if punch_time < previous["first_punch"]:
+            previous["first_punch"] = punch_time
+        previous["last_punch_type"] = punch_type
+        previous["punch_count"] += 1
+        return state
+
+    async def load(self, tenant_id: str, day: date, person_id: str, state: Dict[str, Any]):
+        self._days.setdefault((tenant_id, day), {})[person_id] = state
+
+    async def reset(self, tenant_id: Optional[str] = None):
+        if tenant_id is None:
+            self._days.clear()
+            return
+        for key in [key for key in self._days if key[0] == tenant_id]:
+            del self._days[key]
+
+    async def prune(self, before: date):
+        for key in [key for key in self._days if key[1] < before]:
+            del self._days[key]
+
+    async def size(self) -> int:
+        return sum(len(people) for people in self._days.values())
+
+
+class RedisAttendanceStateStore:
+    """
+    Shared store for multi-worker deployments. One hash per (tenant, day); each punch is
+    applied by a Lua script, so concurrent workers agree on who punched first and no
+    update is lost between reading and writing a person's state.
+    """
+
+    def __init__(self, url: str, prefix: str = "attendance_state"):
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.ttl_seconds = STATE_RETENTION_DAYS * 86400
+        self._record_punch = self.redis.register_script(RECORD_PUNCH_LUA)
+
+    def _key(self, tenant_id: str, day: date) -> str:
+        return f"{self.prefix}:{tenant_id}:{day.isoformat()}"
+
+    async def record(self, tenant_id: str, day: date, person_id: str,
+                     punch_time: datetime, punch_type: str) -> Optional[Dict[str, Any]]:
+        raw = await self._record_punch(
+            keys=[self._key(tenant_id, day)],
+            args=[person_id, _iso(punch_time), punch_type, self.ttl_seconds],
+        )
+        if raw is None:
+            return None
+        previous = json.loads(raw)
+        return {
+            "first_punch": datetime.fromisoformat(previous["first_punch"]) if previous.get("first_punch") else None,
+            "last_punch_type": previous.get("last_punch_type"),
+            "punch_count": previous.get("punch_count", 0),
+        }
+
+    async def load(self, tenant_id: str, day: date, person_id: str, state: Dict[str, Any]):
+        key = self._key(tenant_id, day)
+        await self.redis.hset(key, person_id, json.dumps({**state, "first_punch": _iso(state["first_punch"])}))
+        await self.redis.expire(key, self.ttl_seconds)
+
+    async def reset(self, tenant_id: Optional[str] = None):
+        pattern = f"{self.prefix}:{tenant_id or '*'}:*"
+        async for key in self.redis.scan_iter(match=pattern):
+            await self.redis.delete(key)
+
+    async def prune(self, before: date):
+        # Keys expire on their own
+        return None
+
+    async def size(self) -> int:
+        total = 0
+        async for key in self.redis.scan_iter(match=f"{self.prefix}:*"):
+            total += await self.redis.hlen(key)
+        return total
+
+
+class AttendanceStateTracker:
+    def __init__(self, store=None, default_thresholds: Optional[ShiftThresholds] = None):
+        self.store = store or InMemoryAttendanceStateStore()
+        self.default_thresholds = default_thresholds or ShiftThresholds.from_env()
+        self.tenant_thresholds: Dict[str, ShiftThresholds] = {}
+        self.warmed_at: Optional[datetime] = None
+        self._today: Optional[date] = None
+
+    def thresholds_for(self, tenant_id: str) -> ShiftThresholds:
+        return self.tenant_thresholds.get(tenant_id, self.default_thresholds)
+
+    def set_thresholds(self, tenant_id: str, thresholds: Optional[ShiftThresholds]):
+        if thresholds is None:
+            self.tenant_thresholds.pop(tenant_id, None)
+        else:
+            self.tenant_thresholds[tenant_id] = thresholds
+
+    async def observe(self, tenant_id: str, person_id: str, punch_time: datetime, punch_type: str) -> Dict[str, str]:
+        """Record a punch that has just been inserted and return its attendance status"""
+        if punch_time.tzinfo is None:
+            punch_time = punch_time.replace(tzinfo=timezone.utc)
+        await self._roll_over()
+        previous = await self.store.record(tenant_id, punch_day(punch_time), str(person_id),
+                                           as_utc(punch_time), punch_type)
+        if previous is None:
+            return {"status": "present", "type": self.thresholds_for(tenant_id).classify(punch_time)}
+        if punch_type == "OUT":
+            return {"status": "checked_out", "type": "normal"}
+        return {"status": "checked_in", "type": "return"}
+
+    async def _roll_over(self):
+        """Drop days that fell out of retention once the UTC day changes"""
+        today = punch_day(datetime.now(timezone.utc))
+        if today != self._today:
+            self._today = today
+            await self.store.prune(today - timedelta(days=STATE_RETENTION_DAYS - 1))
+
+    async def warm(self, conn, tenant_id: Optional[str] = None) -> int:
+        """Rebuild state for the retained days from attendance_punches"""
+        since_day = punch_day(datetime.now(timezone.utc)) - timedelta(days=STATE_RETENTION_DAYS - 1)
+        since = datetime.combine(since_day, dt_time.min, tzinfo=timezone.utc)
+        await self.store.reset(tenant_id)
+        rows = await conn.fetch(WARM_STATE_SQL, since, tenant_id)
+        person_days = 0
+        for row in rows:
+            days: Dict[date, Dict[str, Any]] = {}
+            for punch_time, punch_type in zip(row["punch_times"], row["punch_types"]):
+                punch_time = as_utc(punch_time)
+                state = days.setdefault(punch_day(punch_time), {"first_punch": punch_time, "punch_count": 0})
+                state["last_punch_type"] = punch_type
+                state["punch_count"] += 1
+            for day, state in days.items():
+                await self.store.load(row["tenant_id"], day, str(row["person_id"]), state)
+            person_days += len(days)
+        self._today = None
+        await self._roll_over()
+        self.warmed_at = datetime.utcnow()
+        logger.info(f"Attendance state warmed with {person_days} person-days")
+        return person_days
+
+    async def reset(self, tenant_id: Optional[str] = None):
+        await self.store.reset(tenant_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "store": type(self.store).__name__,
+            "people_tracked": await self.store.size(),
+            "warmed_at": self.warmed_at,
+            "default_thresholds": self.default_thresholds.to_dict(),
+            "tenant_overrides": len(self.tenant_thresholds),
+        }
+
+
+attendance_state_tracker = None
+
+def get_attendance_state_tracker():
+    global attendance_state_tracker
+    if attendance_state_tracker is None:
+        redis_url = os.environ.get("ATTENDANCE_STATE_REDIS_URL")
+        store = None
+        if redis_url and aioredis is not None:
+            store = RedisAttendanceStateStore(redis_url)
+        elif redis_url:
+            logger.warning("ATTENDANCE_STATE_REDIS_URL set but redis is not installed; using in-memory state")
+        attendance_state_tracker = AttendanceStateTracker(store)
+    return attendance_state_tracker
@@ -0,0 +1,254 @@
+"""
+Pooled PostgreSQL access for Biometric (ZKTeco) endpoints
+One application-lifetime asyncpg pool shared by every /biometric/* route, with
+acquire-latency / waiter metrics and reusable prepared statements for the hot
+punch-ingestion queries
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+try:
+    import asyncpg
+except ImportError:  # Biometric module is optional - Mongo-only deployments don't ship asyncpg
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+
+# Hot-path statements. Kept as module constants so every call sends identical text
+# and hits the per-connection prepared statement cache.
+INSERT_PUNCH_SQL = """
+    INSERT INTO attendance_punches (
+        person_id, person_type, tenant_id, school_id, device_id, device_name,
+        punch_time, punch_method, punch_type, verification_score, status, source_payload
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+    ON CONFLICT (tenant_id, device_id, person_id, punch_time) DO NOTHING
+    RETURNING punch_id, processed_at
+"""
+
+# Multi-row variant: one statement per batch, columns passed as parallel arrays.
+# Punches already stored (connector retries, catch-up re-reads) are skipped, so only
+# newly inserted rows come back.
+BULK_INSERT_PUNCHES_SQL = """
+    INSERT INTO attendance_punches (
+        person_id, person_type, tenant_id, school_id, device_id, device_name,
+        punch_time, punch_method, punch_type, verification_score, status, source_payload
+    )
+    SELECT * FROM unnest(
+        $1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[],
+        $7::timestamptz[], $8::text[], $9::text[], $10::float8[], $11::text[], $12::jsonb[]
+    )
+    ON CONFLICT (tenant_id, device_id, person_id, punch_time) DO NOTHING
+    RETURNING punch_id, processed_at, person_id, device_id, punch_time
+"""
+
+# Fallbacks used until the dedupe index below exists: ON CONFLICT needs a matching
+# unique index, so these skip already-stored punches with a NOT EXISTS guard instead.
+INSERT_PUNCH_GUARDED_SQL = """
+    INSERT INTO attendance_punches (
+        person_id, person_type, tenant_id, school_id, device_id, device_name,
+        punch_time, punch_method, punch_type, verification_score, status, source_payload
+    )
+    SELECT $1::text, $2::text, $3::text, $4::text, $5::text, $6::text,
+           $7::timestamptz, $8::text, $9::text, $10::float8, $11::text, $12::jsonb
+    WHERE NOT EXISTS (
+        SELECT 1 FROM attendance_punches
+        WHERE tenant_id = $3 AND device_id = $5 AND person_id = $1 AND punch_time = $7
+    )
+    RETURNING punch_id, processed_at
+"""
+
+BULK_INSERT_PUNCHES_GUARDED_SQL = """
+    INSERT INTO attendance_punches (
+        person_id, person_type, tenant_id, school_id, device_id, device_name,
+        punch_time, punch_method, punch_type, verification_score, status, source_payload
+    )
+    SELECT DISTINCT ON (p.tenant_id, p.device_id, p.person_id, p.punch_time) p.* FROM unnest(
+        $1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[],
+        $7::timestamptz[], $8::text[], $9::text[], $10::float8[], $11::text[], $12::jsonb[]
+    ) AS p(person_id, person_type, tenant_id, school_id, device_id, device_name,
+           punch_time, punch_method, punch_type, verification_score, status, source_payload)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM attendance_punches a
+        WHERE a.tenant_id = p.tenant_id AND a.device_id = p.device_id
+          AND a.person_id = p.person_id AND a.punch_time = p.punch_time
+    )
+    RETURNING punch_id, processed_at, person_id, device_id, punch_time
+"""
+
+LATEST_DEVICE_PUNCH_SQL = """
+    SELECT MAX(punch_time) AS last_punch_time FROM attendance_punches
+    WHERE tenant_id = $1 AND device_id = $2
+"""
+
+# The ON CONFLICT target above needs this index. It is built by the explicit
+# migrate_punch_dedupe_index() step, which first removes exact duplicates recorded
+# before it existed (otherwise the index can't be built).
+PUNCH_DEDUPE_INDEX = "attendance_punches_device_person_time"
+DELETE_DUPLICATE_PUNCHES_SQL = """
+    DELETE FROM attendance_punches a USING attendance_punches b
+    WHERE a.tenant_id = b.tenant_id AND a.device_id = b.device_id
+      AND a.person_id = b.person_id AND a.punch_time = b.punch_time
+      AND a.ctid > b.ctid
+"""
+CREATE_PUNCH_DEDUPE_INDEX_SQL = f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {PUNCH_DEDUPE_INDEX}
+    ON attendance_punches (tenant_id, device_id, person_id, punch_time)
+"""
+
+UPDATE_DEVICE_SEEN_SQL = """
+    UPDATE device_registry SET
+        last_seen = NOW(), connection_status = 'online',
+        daily_punches = daily_punches + $3
+    WHERE device_id = $1 AND tenant_id = $2
+"""
+
+
+class BiometricPool:
+    def __init__(self, dsn: Optional[str] = None, min_size: int = None, max_size: int = None):
+        self.dsn = dsn or os.environ.get('DATABASE_URL')
+        self.min_size = min_size or int(os.environ.get('BIOMETRIC_POOL_MIN_SIZE', '2'))
+        self.max_size = max_size or int(os.environ.get('BIOMETRIC_POOL_MAX_SIZE', '10'))
+        self.command_timeout = float(os.environ.get('BIOMETRIC_POOL_COMMAND_TIMEOUT', '30'))
+        self.pool = None
+        # None until checked at startup; False keeps ingestion on the guarded statements
+        self.has_punch_dedupe_index: Optional[bool] = None
+        self._start_lock = asyncio.Lock()
+        self.waiters = 0
+        self.acquired = 0
+        self.acquire_count = 0
+        self.acquire_time_total = 0.0
+        self.acquire_time_max = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return asyncpg is not None and bool(self.dsn)
+
+    async def start(self):
+        """Create the pool. Called from app startup; a no-op when Postgres isn't configured."""
+        if self.pool is not None or not self.configured:
+            return
+        async with self._start_lock:
+            if self.pool is not None:
+                return
+            self.pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                command_timeout=self.command_timeout,
+            )
+            await self.check_schema()
+        logger.info(f"Biometric Postgres pool started (min={self.min_size}, max={self.max_size})")
+
+    async def check_schema(self):
+        """Record whether the punch dedupe index exists; ingestion falls back to guarded inserts without it"""
+        try:
+            async with self.pool.acquire() as conn:
+                self.has_punch_dedupe_index = await conn.fetchval("SELECT to_regclass($1)", PUNCH_DEDUPE_INDEX) is not None
+        except Exception as e:
+            self.has_punch_dedupe_index = False
+            logger.error(f"Could not check for {PUNCH_DEDUPE_INDEX}: {e}")
+            return
+        if not self.has_punch_dedupe_index:
+            logger.warning(
+                f"{PUNCH_DEDUPE_INDEX} is missing; punches are inserted with a NOT EXISTS guard "
+                f"until the punch dedupe migration is run"
+            )
+
+    async def migrate_punch_dedupe_index(self) -> Dict[str, Any]:
+        """
+        Remove duplicate punches and build the unique index behind ON CONFLICT. Run
+        explicitly (POST /biometric/migrations/punch-dedupe-index), never on startup:
+        it deletes rows and locks attendance_punches while the index builds.
+        """
+        async with self.acquire() as conn:
+            if await conn.fetchval("SELECT to_regclass($1)", PUNCH_DEDUPE_INDEX) is not None:
+                self.has_punch_dedupe_index = True
+                return {"index": PUNCH_DEDUPE_INDEX, "created": False, "duplicates_removed": 0}
+            logger.info(f"Migrating attendance_punches: removing duplicates and building {PUNCH_DEDUPE_INDEX}")
+            async with conn.transaction():
+                status = await conn.execute(DELETE_DUPLICATE_PUNCHES_SQL)
+                await conn.execute(CREATE_PUNCH_DEDUPE_INDEX_SQL)
+        removed = int(status.split()[-1])
+        self.has_punch_dedupe_index = True
+        logger.info(f"Created {PUNCH_DEDUPE_INDEX} ({removed} duplicate punches removed)")
+        return {"index": PUNCH_DEDUPE_INDEX, "created": True, "duplicates_removed": removed}
+
+    @property
+    def insert_punch_sql(self) -> str:
+        return INSERT_PUNCH_SQL if self.has_punch_dedupe_index else INSERT_PUNCH_GUARDED_SQL
+
+    @property
+    def bulk_insert_punches_sql(self) -> str:
+        return BULK_INSERT_PUNCHES_SQL if self.has_punch_dedupe_index else BULK_INSERT_PUNCHES_GUARDED_SQL
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Biometric Postgres pool closed")
+
+    async def checkout(self):
+        """Take a pooled connection, creating the pool lazily if startup skipped it; pair with release()"""
+        if self.pool is None:
+            if not self.configured:
+                raise RuntimeError("Biometric database not configured")
+            await self.start()
+
+        started = time.perf_counter()
+        self.waiters += 1
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            self.waiters -= 1
+        elapsed = time.perf_counter() - started
+        self.acquire_count += 1
+        self.acquire_time_total += elapsed
+        self.acquire_time_max = max(self.acquire_time_max, elapsed)
+        self.acquired += 1
+        return conn
+
+    async def release(self, conn):
+        self.acquired -= 1
+        await self.pool.release(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a pooled connection for the duration of the block"""
+        conn = await self.checkout()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        pool_size = self.pool.get_size() if self.pool is not None else 0
+        idle = self.pool.get_idle_size() if self.pool is not None else 0
+        return {
+            "configured": self.configured,
+            "started": self.pool is not None,
+            "punch_dedupe_index": self.has_punch_dedupe_index,
+            "size": pool_size,
+            "idle": idle,
+            "in_use": self.acquired,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "waiters": self.waiters,
+            "acquire_count": self.acquire_count,
+            "acquire_avg_ms": round(self.acquire_time_total / self.acquire_count * 1000, 3) if self.acquire_count else 0.0,
+            "acquire_max_ms": round(self.acquire_time_max * 1000, 3),
+        }
+
+
+biometric_pool = None
+
+def get_biometric_pool():
+    global biometric_pool
+    if biometric_pool is None:
+        biometric_pool = BiometricPool()
+    return biometric_pool
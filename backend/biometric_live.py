@@ -0,0 +1,300 @@
+"""
+Live Biometric Attendance Feed for School ERP
+Punches accepted by the ingestion endpoints are pushed to subscribed dashboards (gate
+screens, principal's dashboard) of the same tenant over Server-Sent Events. Names come
+from a per-tenant staff/student directory cached in memory, and each tenant keeps a
+ring buffer of its latest punches so a new subscriber is backfilled without a query.
+Set BIOMETRIC_LIVE_BROKER=change_stream to fan out across uvicorn workers.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Set, Deque
+
+from notification_stream import LocalBroker, ChangeStreamBroker, format_sse, STREAM_HEARTBEAT_SECONDS, STREAM_RETRY_MS
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_TTL_SECONDS = float(os.environ.get("BIOMETRIC_DIRECTORY_TTL", "300"))
+LIVE_BACKFILL_MAX = int(os.environ.get("BIOMETRIC_LIVE_BACKFILL_MAX", "200"))
+LIVE_QUEUE_SIZE = 500
+
+RECENT_PUNCHES_SQL = """
+    SELECT punch_id, person_id, person_type, device_id, device_name,
+           punch_time, punch_method, punch_type, verification_score, status
+    FROM attendance_punches
+    WHERE tenant_id = $1 AND DATE(punch_time) = $2
+    ORDER BY punch_time DESC
+    LIMIT $3
+"""
+
+
+class PersonDirectory:
+    """Per-tenant person_id -> display details, refreshed every DIRECTORY_TTL_SECONDS"""
+
+    def __init__(self, db, ttl: float = DIRECTORY_TTL_SECONDS):
+        self.db = db
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+
+    async def _load(self, tenant_id: str):
+        staff: Dict[str, Dict[str, Any]] = {}
+        async for member in self.db.staff.find(
+            {"tenant_id": tenant_id, "is_active": True},
+            {"_id": 0, "employee_id": 1, "name": 1, "designation": 1, "department": 1}
+        ):
+            if member.get("employee_id"):
+                staff[member["employee_id"]] = {
+                    "name": member.get("name", "Unknown Staff"),
+                    "designation": member.get("designation", "Staff"),
+                    "department": member.get("department", "Unknown")
+                }
+
+        students: Dict[str, Dict[str, Any]] = {}
+        async for student in self.db.students.find(
+            {"tenant_id": tenant_id, "is_active": True},
+            {"_id": 0, "id": 1, "admission_no": 1, "name": 1, "class_id": 1, "section_id": 1}
+        ):
+            entry = {"name": student.get("name"), "class_id": student.get("class_id"), "section_id": student.get("section_id")}
+            # Devices are enrolled with either the admission number or the record id
+            for key in (student.get("id"), student.get("admission_no")):
+                if key:
+                    students[str(key)] = entry
+
+        self._entries[tenant_id] = {"staff": staff, "student": students}
+        self._loaded_at[tenant_id] = time.monotonic()
+        self.loads += 1
+
+    async def _ensure(self, tenant_id: str):
+        if time.monotonic() - self._loaded_at.get(tenant_id, float("-inf")) < self.ttl:
+            return
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            if time.monotonic() - self._loaded_at.get(tenant_id, float("-inf")) >= self.ttl:
+                await self._load(tenant_id)
+
+    async def lookup(self, tenant_id: str, person_type: str, person_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            await self._ensure(tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not load biometric directory for tenant {tenant_id}: {e}")
+            return None
+        kind = "staff" if person_type == "staff" else "student"
+        return self._entries.get(tenant_id, {}).get(kind, {}).get(str(person_id))
+
+    def invalidate(self, tenant_id: Optional[str] = None):
+        if tenant_id is None:
+            self._loaded_at.clear()
+        else:
+            self._loaded_at.pop(tenant_id, None)
+
+
+def _display_name(person_type: str, person_id: str, entry: Optional[Dict[str, Any]]) -> str:
+    if entry and entry.get("name"):
+        return entry["name"]
+    if person_type == "student":
+        return f"Student {person_id}"
+    return person_id
+
+
+def format_live_punch(punch: Dict[str, Any], entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape shared by GET /biometric/live-attendance and the live stream"""
+    punch_time = punch["punch_time"]
+    if not isinstance(punch_time, datetime):
+        punch_time = datetime.fromisoformat(str(punch_time).replace("Z", "+00:00"))
+    person_id = str(punch["person_id"])
+    person_name = _display_name(punch.get("person_type"), person_id, entry)
+    record = {
+        "punch_id": punch.get("punch_id"),
+        "person_name": person_name,
+        "staff_name": person_name,
+        "time": punch_time.strftime("%H:%M:%S"),
+        "punch_time": punch_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "punch_type": punch.get("punch_type"),
+        "device_name": punch.get("device_name") or f"Device {punch.get('device_id')}",
+        "verification_score": punch.get("verification_score") or 0,
+        "status": punch.get("punch_type"),
+        "method": punch.get("punch_method"),
+        "person_type": punch.get("person_type"),
+        "person_id": person_id
+    }
+    if punch.get("attendance_status"):
+        record["attendance_status"] = punch["attendance_status"]
+    return record
+
+
+class LiveSubscriber:
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.dropped = 0
+
+
+class LiveAttendanceHub:
+    def __init__(self, db, broker=None):
+        self.db = db
+        self.directory = PersonDirectory(db)
+        self.broker = broker or LocalBroker()
+        self.subscribers: Dict[str, Set[LiveSubscriber]] = {}
+        self.recent: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._recent_day: Dict[str, date] = {}
+        # Punches published while a tenant's buffer is being warmed from Postgres
+        self._warming: Dict[str, List[Dict[str, Any]]] = {}
+        self._warm_locks: Dict[str, asyncio.Lock] = {}
+        self.counters = {"connections_total": 0, "published": 0, "delivered": 0, "dropped": 0, "backfill_queries": 0}
+
+    @classmethod
+    def from_env(cls, db) -> "LiveAttendanceHub":
+        if os.environ.get("BIOMETRIC_LIVE_BROKER", "local").lower() == "change_stream":
+            return cls(db, ChangeStreamBroker(db, "biometric_live_events"))
+        return cls(db)
+
+    def start(self):
+        self.broker.start(self._dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    async def format_punches(self, tenant_id: str, punches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        records = []
+        for punch in punches:
+            entry = await self.directory.lookup(tenant_id, punch.get("person_type"), punch["person_id"])
+            records.append(format_live_punch(punch, entry))
+        return records
+
+    async def publish(self, tenant_id: str, punches: List[Dict[str, Any]]):
+        """Broadcast punches that were just committed; never fails the ingestion request"""
+        try:
+            records = await self.format_punches(tenant_id, punches)
+            await self.broker.publish([{"tenant_id": tenant_id, "records": records}])
+            self.counters["published"] += len(records)
+        except Exception as e:
+            logger.error(f"[LIVE] Failed to publish {len(punches)} punches: {e}")
+
+    def _buffer(self, tenant_id: str) -> Optional[Deque[Dict[str, Any]]]:
+        # Buffers only ever hold today's punches
+        if self._recent_day.get(tenant_id) != date.today():
+            self.recent.pop(tenant_id, None)
+            self._recent_day.pop(tenant_id, None)
+        return self.recent.get(tenant_id)
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        tenant_id = event.get("tenant_id")
+        # The feed is today's: late catch-up uploads of earlier days are stored, not shown
+        today = date.today().strftime("%Y-%m-%d")
+        records = [r for r in event.get("records") or [] if str(r.get("punch_time", "")).startswith(today)]
+        if not records:
+            return
+        buffer = self._buffer(tenant_id)
+        if buffer is not None:
+            buffer.extend(records)
+        elif tenant_id in self._warming:
+            self._warming[tenant_id].extend(records)
+        for subscriber in list(self.subscribers.get(tenant_id, ())):
+            for record in records:
+                try:
+                    subscriber.queue.put_nowait(record)
+                    self.counters["delivered"] += 1
+                except asyncio.QueueFull:
+                    subscriber.dropped += 1
+                    self.counters["dropped"] += 1
+
+    async def backfill(self, pool, tenant_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Latest `limit` punches of today, oldest first; Postgres is read once per tenant per day"""
+        limit = max(0, min(limit, LIVE_BACKFILL_MAX))
+        buffer = self._buffer(tenant_id)
+        if buffer is None:
+            async with self._warm_locks.setdefault(tenant_id, asyncio.Lock()):
+                buffer = self._buffer(tenant_id)
+                if buffer is None:
+                    buffer = await self._warm(pool, tenant_id)
+        return list(buffer)[-limit:] if limit else []
+
+    async def _warm(self, pool, tenant_id: str) -> Deque[Dict[str, Any]]:
+        today = date.today()
+        self._warming[tenant_id] = []
+        try:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(RECENT_PUNCHES_SQL, tenant_id, today, LIVE_BACKFILL_MAX)
+            self.counters["backfill_queries"] += 1
+            records = await self.format_punches(tenant_id, [dict(row) for row in reversed(rows)])
+        finally:
+            published_meanwhile = self._warming.pop(tenant_id, [])
+        seen = {r.get("punch_id") for r in published_meanwhile}
+        buffer = deque([r for r in records if r.get("punch_id") not in seen] + published_meanwhile, maxlen=LIVE_BACKFILL_MAX)
+        self.recent[tenant_id] = buffer
+        self._recent_day[tenant_id] = today
+        return buffer
+
+    def reset(self, tenant_id: str):
+        """Forget a tenant's buffered punches and cached directory (after bulk rewrites)"""
+        self.recent.pop(tenant_id, None)
+        self._recent_day.pop(tenant_id, None)
+        self.directory.invalidate(tenant_id)
+
+    def subscribe(self, tenant_id: str) -> LiveSubscriber:
+        subscriber = LiveSubscriber(tenant_id)
+        self.subscribers.setdefault(tenant_id, set()).add(subscriber)
+        self.counters["connections_total"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: LiveSubscriber):
+        tenant_subscribers = self.subscribers.get(subscriber.tenant_id)
+        if tenant_subscribers is not None:
+            tenant_subscribers.discard(subscriber)
+            if not tenant_subscribers:
+                self.subscribers.pop(subscriber.tenant_id, None)
+
+    async def events(self, request, pool, tenant_id: str, backfill: int = 0):
+        """SSE body: `backfill` with the latest punches, then one `punch` event per accepted punch"""
+        subscriber = self.subscribe(tenant_id)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            backfilled: Set[Any] = set()
+            if backfill:
+                try:
+                    records = await self.backfill(pool, tenant_id, backfill)
+                except Exception as e:
+                    logger.warning(f"[LIVE] Backfill failed for tenant {tenant_id}: {e}")
+                    records = []
+                backfilled = {r.get("punch_id") for r in records if r.get("punch_id") is not None}
+                yield format_sse("backfill", {"punches": records, "date": date.today().strftime("%Y-%m-%d")})
+
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    record = await asyncio.wait_for(subscriber.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if record.get("punch_id") in backfilled:
+                    continue
+                yield format_sse("punch", record, str(record.get("punch_id") or ""))
+        finally:
+            self.unsubscribe(subscriber)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker.name,
+            "connected": sum(len(s) for s in self.subscribers.values()),
+            "buffered_tenants": len(self.recent),
+            "directory_loads": self.directory.loads,
+            **self.counters,
+        }
+
+
+live_attendance_hub = None
+
+def get_live_attendance_hub(db):
+    global live_attendance_hub
+    if live_attendance_hub is None:
+        live_attendance_hub = LiveAttendanceHub.from_env(db)
+    return live_attendance_hub
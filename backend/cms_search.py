@@ -0,0 +1,474 @@
+"""
+BM25 Search Index for the Academic CMS
+Every tenant gets an in-process inverted index over its active CMS documents (book
+chapters, Q&A knowledge base and generated Q&A pairs, academic content, previous-year
+papers and their questions, academic/reference books). Text is tokenized and lightly
+stemmed; title-like fields count more than body text. Queries are ranked with BM25 and
+filtered on subject / class_standard / book_type / school_id / difficulty_level, so
+GiNi and the generators no longer scan collections with unanchored $regex.
+
+CMS endpoints call `refresh()` after a write, which re-reads the document and updates
+the index incrementally. Each write also bumps `data_versions` ("tenant|cms_search"), so
+another worker (or a restart) notices its copy is behind and rebuilds it from MongoDB.
+Indexes are saved as JSON to CMS_SEARCH_DIR (kept private to the server's user) and reused
+when their version is still current.
+"""
+
+import os
+import re
+import math
+import json
+import heapq
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable, Awaitable
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CMS_SEARCH_DIR = os.environ.get("CMS_SEARCH_DIR") or os.path.join(tempfile.gettempdir(), "erp_cms_search")
+# Coalesce bursts of CMS edits into one write of the tenant's index file
+CMS_SEARCH_SAVE_DELAY = float(os.environ.get("CMS_SEARCH_SAVE_DELAY", "5"))
+INDEX_FORMAT = 2
+
+# listener(tenant_id, kind, {ref: current doc}, refs) - refs missing from the dict were deleted
+ChangeListener = Callable[[str, str, Dict[str, Dict[str, Any]], Tuple[str, ...]], Awaitable[None]]
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Share of query terms a document needs before its text is served as an answer
+ANSWER_MIN_MATCH = float(os.environ.get("CMS_SEARCH_ANSWER_MIN_MATCH", "0.75"))
+
+# kind -> (collection, {field: weight})
+SOURCES: Dict[str, Tuple[str, Dict[str, int]]] = {
+    "qa": ("qa_knowledge_base", {
+        "question": 3, "keywords": 2, "tags": 2, "chapter_topic": 2, "answer": 1, "explanation": 1,
+    }),
+    "qa_pair": ("qa_pairs", {
+        "question": 3, "topic": 2, "chapter": 2, "keywords": 2, "answer": 1,
+    }),
+    "chapter": ("book_chapters", {
+        "chapter_title": 3, "chapter_name": 3, "keywords": 2, "key_concepts": 2,
+        "description": 1, "learning_objectives": 1, "content": 1,
+    }),
+    "content": ("academic_content", {
+        "topic_title": 3, "keywords": 2, "content_text": 1,
+    }),
+    "paper": ("previous_year_papers", {
+        "title": 3, "chapter": 2, "paper_type": 1, "exam_year": 1, "description": 1,
+    }),
+    "paper_question": ("paper_questions", {
+        "question_text": 3, "tags": 2, "solution": 1, "solution_steps": 1,
+    }),
+    "academic_book": ("academic_books", {
+        "title": 3, "book_name": 3, "author": 1, "description": 1,
+    }),
+    "reference_book": ("reference_books", {
+        "title": 3, "book_name": 3, "chapter": 2, "author": 1, "description": 1,
+    }),
+}
+
+FILTER_FIELDS = ("school_id", "subject", "class_standard", "book_type", "difficulty_level")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does explain for from how in into is it its of on or
+please so that the their then there these this to was what when where which who why will
+with you your define describe tell me about give
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Longest suffix first; (suffix, replacement, minimum stem length left behind)
+_SUFFIXES = (
+    ("ational", "ate", 2), ("ization", "ize", 2), ("fulness", "ful", 2), ("iveness", "ive", 2),
+    ("ousness", "ous", 2), ("tional", "tion", 2), ("ations", "ate", 2), ("ation", "ate", 2),
+    ("ments", "", 3), ("ment", "", 3), ("ness", "", 3), ("ingly", "", 3), ("edly", "", 3),
+    ("sses", "ss", 1), ("ies", "y", 2), ("ing", "", 3), ("ed", "", 3), ("ly", "", 3),
+    ("es", "", 3), ("s", "", 3),
+)
+
+
+def stem(word: str) -> str:
+    """Light suffix stripping: enough to fold plurals and verb forms, cheap enough to run per token"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, replacement, min_stem in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            if suffix == "s" and word[-2] in "su":  # class, focus
+                return word
+            if suffix == "es" and not word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+                continue  # notes -> note, not "not"
+            word = word[:-len(suffix)] + replacement
+            # running -> runn -> run
+            if suffix in ("ing", "ed") and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in _TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def _field_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value if v is not None)
+    return "" if value is None else str(value)
+
+
+def document_ref(doc: Dict[str, Any]) -> str:
+    return doc.get("id") or str(doc["_id"])
+
+
+class TenantIndex:
+    """Inverted index for one tenant: term -> {docno: weighted tf}"""
+
+    def __init__(self, tenant_id: str, version: int = 0):
+        self.tenant_id = tenant_id
+        self.version = version
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_terms: Dict[int, Dict[str, int]] = {}
+        self.doc_length: Dict[int, int] = {}
+        self.doc_meta: Dict[int, Tuple[str, str, Dict[str, Any]]] = {}  # docno -> (kind, ref, filters)
+        self.refs: Dict[Tuple[str, str], int] = {}
+        self.total_length = 0
+        self.next_docno = 0
+
+    def __len__(self):
+        return len(self.doc_meta)
+
+    def add(self, kind: str, doc: Dict[str, Any]):
+        ref = document_ref(doc)
+        self.remove(kind, ref)
+        terms: Counter = Counter()
+        for field, weight in SOURCES[kind][1].items():
+            for token in tokenize(_field_text(doc.get(field))):
+                terms[token] += weight
+        if not terms:
+            return
+
+        docno = self.next_docno
+        self.next_docno += 1
+        self.refs[(kind, ref)] = docno
+        self.doc_meta[docno] = (kind, ref, {f: doc.get(f) for f in FILTER_FIELDS if doc.get(f) is not None})
+        self.doc_terms[docno] = dict(terms)
+        length = sum(terms.values())
+        self.doc_length[docno] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[docno] = tf
+
+    def remove(self, kind: str, ref: str):
+        docno = self.refs.pop((kind, ref), None)
+        if docno is None:
+            return
+        for term in self.doc_terms.pop(docno):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(docno, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_length.pop(docno)
+        del self.doc_meta[docno]
+
+    def search(self, query: str, k: int, kinds: Optional[Iterable[str]] = None,
+               filters: Optional[Dict[str, Any]] = None, min_match: float = 0.0) -> List[Tuple[str, str, float]]:
+        """Top-k (kind, ref, score) for the query among documents matching kinds and filters.
+        min_match is the fraction of distinct query terms a document must contain."""
+        terms = set(tokenize(query))
+        if not terms or not self.doc_meta:
+            return []
+        kinds = set(kinds) if kinds else None
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        total_docs = len(self.doc_meta)
+        avg_length = self.total_length / total_docs
+
+        allowed: Dict[int, bool] = {}
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for docno, tf in posting.items():
+                ok = allowed.get(docno)
+                if ok is None:
+                    kind, _, meta = self.doc_meta[docno]
+                    ok = (kinds is None or kind in kinds) and all(meta.get(f) == v for f, v in filters.items())
+                    allowed[docno] = ok
+                if not ok:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_length[docno] / avg_length)
+                scores[docno] = scores.get(docno, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[docno] += 1
+
+        if min_match > 0:
+            required = math.ceil(min_match * len(terms))
+            scores = {docno: score for docno, score in scores.items() if matched[docno] >= required}
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_meta[docno][0], self.doc_meta[docno][1], round(score, 4)) for docno, score in best]
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-ready snapshot; the per-document dicts are replaced, never mutated, by add/remove"""
+        return {"format": INDEX_FORMAT, "tenant_id": self.tenant_id, "version": self.version,
+                "next_docno": self.next_docno,
+                "docs": [[docno, *self.doc_meta[docno], terms] for docno, terms in self.doc_terms.items()]}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "TenantIndex":
+        index = cls(state["tenant_id"], state["version"])
+        index.next_docno = state["next_docno"]
+        for docno, kind, ref, meta, terms in state["docs"]:
+            index.doc_terms[docno] = terms
+            index.doc_meta[docno] = (kind, ref, meta)
+            index.refs[(kind, ref)] = docno
+            length = sum(terms.values())
+            index.doc_length[docno] = length
+            index.total_length += length
+            for term, tf in terms.items():
+                index.postings.setdefault(term, {})[docno] = tf
+        return index
+
+
+class CMSSearchIndex:
+    def __init__(self, db, directory: str = CMS_SEARCH_DIR):
+        self.db = db
+        self.directory = directory
+        self._indexes: Dict[str, TenantIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._save_tasks: Dict[str, asyncio.Task] = {}
+        self._listeners: List[ChangeListener] = []
+        self.counters = {"queries": 0, "builds": 0, "loads": 0, "updates": 0, "stale": 0}
+        self.persist = self._prepare_directory()
+
+    def _prepare_directory(self) -> bool:
+        """Only keep index files in a directory no other user can write to"""
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            if os.stat(self.directory).st_uid != os.getuid():
+                raise PermissionError(f"{self.directory} is owned by another user")
+            os.chmod(self.directory, 0o700)
+            return True
+        except OSError as e:
+            logger.warning(f"[CMS SEARCH] Not persisting indexes: {str(e)}")
+            return False
+
+    # ---------- versions ----------
+
+    def _version_id(self, tenant_id: str) -> str:
+        return f"{tenant_id}|cms_search"
+
+    async def _current_version(self, tenant_id: str) -> int:
+        doc = await self.db.data_versions.find_one({"_id": self._version_id(tenant_id)}, {"version": 1})
+        return doc.get("version", 0) if doc else 0
+
+    async def _bump_version(self, tenant_id: str) -> int:
+        doc = await self.db.data_versions.find_one_and_update(
+            {"_id": self._version_id(tenant_id)},
+            {"$inc": {"version": 1},
+             "$set": {"tenant_id": tenant_id, "collection": "cms_search", "changed_at": datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+    # ---------- building ----------
+
+    def _path(self, tenant_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id)
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def _read(self, tenant_id: str) -> Optional[TenantIndex]:
+        if not self.persist:
+            return None
+        try:
+            with open(self._path(tenant_id)) as f:
+                state = json.load(f)
+            if state.get("format") != INDEX_FORMAT or state.get("tenant_id") != tenant_id:
+                return None
+            return TenantIndex.from_state(state)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[CMS SEARCH] Discarding unreadable index for tenant {tenant_id}: {str(e)}")
+            return None
+
+    def _write(self, state: Dict[str, Any]):
+        if not self.persist:
+            return
+        path = self._path(state["tenant_id"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=str)
+        os.replace(tmp_path, path)
+
+    async def _build(self, tenant_id: str, version: int) -> TenantIndex:
+        documents = []
+        for kind, (collection, fields) in SOURCES.items():
+            projection = {field: 1 for field in (*fields, *FILTER_FIELDS, "id")}
+            cursor = self.db[collection].find({"tenant_id": tenant_id, "is_active": True}, projection)
+            async for doc in cursor.batch_size(1000):
+                documents.append((kind, doc))
+
+        def build() -> TenantIndex:
+            index = TenantIndex(tenant_id, version)
+            for kind, doc in documents:
+                index.add(kind, doc)
+            return index
+
+        index = await asyncio.to_thread(build)
+        self.counters["builds"] += 1
+        logger.info(f"[CMS SEARCH] Built index for tenant {tenant_id}: {len(index)} documents, "
+                    f"{len(index.postings)} terms")
+        return index
+
+    async def index_for(self, tenant_id: str) -> TenantIndex:
+        version = await self._current_version(tenant_id)
+        index = self._indexes.get(tenant_id)
+        if index is not None and index.version == version:
+            return index
+
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(tenant_id)
+            if index is not None and index.version >= version:
+                return index
+            index = await asyncio.to_thread(self._read, tenant_id)
+            if index is not None and index.version == version:
+                self.counters["loads"] += 1
+            else:
+                if index is not None:
+                    self.counters["stale"] += 1
+                index = await self._build(tenant_id, version)
+                await asyncio.to_thread(self._write, index.to_state())
+            self._indexes[tenant_id] = index
+            return index
+
+    # ---------- incremental updates ----------
+
+    def add_listener(self, listener: ChangeListener):
+        """Also hand every refreshed batch to listener (other indexes over the same CMS documents)"""
+        self._listeners.append(listener)
+
+    async def refresh(self, tenant_id: Optional[str], kind: str, *refs: str):
+        """Re-index documents after a CMS write; inactive or missing ones drop out of the index"""
+        if not tenant_id or not refs:
+            return
+        try:
+            collection = SOURCES[kind][0]
+            docs = {
+                doc["id"]: doc
+                async for doc in self.db[collection].find({"tenant_id": tenant_id, "id": {"$in": list(refs)}})
+            }
+            for listener in self._listeners:
+                try:
+                    await listener(tenant_id, kind, docs, refs)
+                except Exception as e:
+                    logger.error(f"[CMS SEARCH] Change listener failed for {kind}: {str(e)}")
+            version = await self._bump_version(tenant_id)
+            index = self._indexes.get(tenant_id)
+            if index is None:
+                return
+            if index.version != version - 1:
+                # Missed someone else's write; the next query rebuilds from MongoDB
+                self.counters["stale"] += 1
+                return
+            for ref in refs:
+                doc = docs.get(ref)
+                if doc is not None and doc.get("is_active", True):
+                    index.add(kind, doc)
+                else:
+                    index.remove(kind, ref)
+            index.version = version
+            self.counters["updates"] += len(refs)
+            self._schedule_save(tenant_id)
+        except Exception as e:
+            logger.error(f"[CMS SEARCH] Failed to re-index {kind} {list(refs)[:5]}: {str(e)}")
+
+    async def invalidate(self, tenant_id: str):
+        """Force a rebuild on the next query, e.g. after a bulk import outside the API"""
+        await self._bump_version(tenant_id)
+
+    def _schedule_save(self, tenant_id: str):
+        task = self._save_tasks.get(tenant_id)
+        if task is None or task.done():
+            self._save_tasks[tenant_id] = asyncio.create_task(self._save_later(tenant_id))
+
+    async def _save_later(self, tenant_id: str):
+        await asyncio.sleep(CMS_SEARCH_SAVE_DELAY)
+        await self._save(tenant_id)
+
+    async def _save(self, tenant_id: str):
+        index = self._indexes.get(tenant_id)
+        if index is None:
+            return
+        try:
+            # Snapshot on the loop; refresh keeps changing the live index while the thread writes
+            await asyncio.to_thread(self._write, index.to_state())
+        except Exception as e:
+            logger.error(f"[CMS SEARCH] Failed to persist index for tenant {tenant_id}: {str(e)}")
+
+    async def flush(self):
+        """Write pending index changes now (shutdown)"""
+        pending = [tenant_id for tenant_id, task in self._save_tasks.items() if not task.done()]
+        for tenant_id in pending:
+            self._save_tasks.pop(tenant_id).cancel()
+            await self._save(tenant_id)
+
+    # ---------- querying ----------
+
+    async def search(self, tenant_id: str, query: str, k: int = 10, kinds: Optional[Iterable[str]] = None,
+                     filters: Optional[Dict[str, Any]] = None, min_match: float = 0.0) -> List[Tuple[str, str, float]]:
+        if not query or not query.strip():
+            return []
+        index = await self.index_for(tenant_id)
+        self.counters["queries"] += 1
+        return index.search(query, k, kinds, filters, min_match)
+
+    async def documents(self, tenant_id: str, kind: str, query: str, k: int = 10,
+                        filters: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None,
+                        with_score: bool = False, min_match: float = 0.0) -> List[Dict[str, Any]]:
+        """Ranked hits of one kind, loaded from MongoDB in rank order"""
+        hits = await self.search(tenant_id, query, k, [kind], filters, min_match)
+        if not hits:
+            return []
+        refs = [ref for _, ref, _ in hits]
+        object_ids = [ObjectId(ref) for ref in refs if ObjectId.is_valid(ref)]
+        query_filter: Dict[str, Any] = {"tenant_id": tenant_id, "is_active": True,
+                                        "$or": [{"id": {"$in": refs}}, {"_id": {"$in": object_ids}}]}
+        found = {}
+        async for doc in self.db[SOURCES[kind][0]].find(query_filter, projection):
+            found[document_ref(doc)] = doc
+        ranked = []
+        for _, ref, score in hits:
+            doc = found.get(ref)
+            if doc is None:
+                continue
+            if with_score:
+                doc["search_score"] = score
+            ranked.append(doc)
+        return ranked
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "tenants_loaded": len(self._indexes),
+            "documents": sum(len(index) for index in self._indexes.values()),
+            "terms": sum(len(index.postings) for index in self._indexes.values()),
+            **self.counters,
+        }
+
+
+cms_search = None
+
+def get_cms_search_index(db) -> CMSSearchIndex:
+    global cms_search
+    if cms_search is None:
+        cms_search = CMSSearchIndex(db)
+    return cms_search
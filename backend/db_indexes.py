@@ -0,0 +1,312 @@
+"""
+MongoDB Index Registry for School ERP
+Declarative per-collection compound indexes, built idempotently at startup
+"""
+
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+# Every index is named explicitly so reruns are no-ops and the report can
+# match declared indexes against what the server actually has.
+# Format: collection -> [(name, keys, options)]
+INDEX_REGISTRY: Dict[str, List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "users": [
+        ("users_id_tenant", [("id", ASCENDING), ("tenant_id", ASCENDING)], {}),
+        ("users_username_tenant", [("username", ASCENDING), ("tenant_id", ASCENDING)], {}),
+        ("users_tenant_role", [("tenant_id", ASCENDING), ("role", ASCENDING)], {}),
+        ("users_linked_students", [("tenant_id", ASCENDING), ("linked_student_ids", ASCENDING)], {}),
+    ],
+    "tenants": [
+        ("tenants_id", [("id", ASCENDING)], {}),
+    ],
+    "schools": [
+        ("schools_tenant_active", [("tenant_id", ASCENDING), ("is_active", ASCENDING)], {}),
+        ("schools_id", [("id", ASCENDING)], {}),
+    ],
+    "students": [
+        ("students_tenant_active_class_section", [
+            ("tenant_id", ASCENDING), ("is_active", ASCENDING),
+            ("class_id", ASCENDING), ("section_id", ASCENDING)
+        ], {}),
+        ("students_tenant_id", [("tenant_id", ASCENDING), ("id", ASCENDING)], {}),
+        ("students_tenant_active_id", [("tenant_id", ASCENDING), ("is_active", ASCENDING), ("id", ASCENDING)], {}),
+        ("students_tenant_admission_no", [("tenant_id", ASCENDING), ("admission_no", ASCENDING)], {}),
+        ("students_user_id", [("user_id", ASCENDING)], {}),
+    ],
+    "staff": [
+        ("staff_tenant_active_department", [
+            ("tenant_id", ASCENDING), ("is_active", ASCENDING), ("department", ASCENDING)
+        ], {}),
+        ("staff_tenant_id", [("tenant_id", ASCENDING), ("id", ASCENDING)], {}),
+        ("staff_tenant_active_id", [("tenant_id", ASCENDING), ("is_active", ASCENDING), ("id", ASCENDING)], {}),
+        ("staff_tenant_employee_id", [("tenant_id", ASCENDING), ("employee_id", ASCENDING)], {}),
+    ],
+    "classes": [
+        ("classes_tenant_active", [("tenant_id", ASCENDING), ("is_active", ASCENDING)], {}),
+    ],
+    "sections": [
+        ("sections_tenant_class", [("tenant_id", ASCENDING), ("class_id", ASCENDING)], {}),
+    ],
+    "attendance": [
+        ("attendance_tenant_type_date", [
+            ("tenant_id", ASCENDING), ("type", ASCENDING), ("date", ASCENDING)
+        ], {}),
+        ("attendance_tenant_person_date", [
+            ("tenant_id", ASCENDING), ("person_id", ASCENDING), ("date", ASCENDING)
+        ], {}),
+    ],
+    "student_fees": [
+        ("student_fees_tenant_student_config", [
+            ("tenant_id", ASCENDING), ("student_id", ASCENDING), ("fee_config_id", ASCENDING)
+        ], {}),
+        ("student_fees_tenant_config_active", [
+            ("tenant_id", ASCENDING), ("fee_config_id", ASCENDING), ("is_active", ASCENDING)
+        ], {}),
+        ("student_fees_tenant_status_due", [
+            ("tenant_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING)
+        ], {}),
+    ],
+    "fee_configurations": [
+        ("fee_configurations_tenant_active", [("tenant_id", ASCENDING), ("is_active", ASCENDING)], {}),
+    ],
+    "payments": [
+        ("payments_tenant_created", [("tenant_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        ("payments_tenant_student_date", [
+            ("tenant_id", ASCENDING), ("student_id", ASCENDING), ("payment_date", DESCENDING)
+        ], {}),
+    ],
+    "payment_idempotency": [
+        ("payment_idempotency_tenant_key", [("tenant_id", ASCENDING), ("key", ASCENDING)], {"unique": True}),
+        ("payment_idempotency_expires", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "fee_totals": [
+        ("fee_totals_tenant", [("tenant_id", ASCENDING)], {"unique": True}),
+    ],
+    "fee_billing_cycles": [
+        # One active cycle per period; generate_billing_cycle's claim relies on it
+        ("fee_billing_cycles_tenant_period_unique", [("tenant_id", ASCENDING), ("billing_period", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"is_active": True}}),
+    ],
+    "fee_invoices": [
+        ("fee_invoices_tenant_period_status", [
+            ("tenant_id", ASCENDING), ("billing_period", ASCENDING), ("status", ASCENDING)
+        ], {}),
+        ("fee_invoices_tenant_student", [("tenant_id", ASCENDING), ("student_id", ASCENDING)], {}),
+    ],
+    "transactions": [
+        ("transactions_tenant_active_date", [
+            ("tenant_id", ASCENDING), ("is_active", ASCENDING), ("transaction_date", DESCENDING), ("id", DESCENDING)
+        ], {}),
+    ],
+    "notifications": [
+        ("notifications_tenant_active_created", [
+            ("tenant_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING)
+        ], {}),
+        ("notifications_tenant_id", [("tenant_id", ASCENDING), ("id", ASCENDING)], {}),
+        # Keyset pages sort on (created_at, id)
+        ("notifications_tenant_active_created_id", [
+            ("tenant_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)
+        ], {}),
+    ],
+    "notification_events": [
+        # Only needed while workers tail the change stream
+        ("notification_events_ttl", [("created_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+    ],
+    "biometric_live_events": [
+        ("biometric_live_events_ttl", [("created_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+    ],
+    "notification_receipts": [
+        ("notification_receipts_user_notification", [
+            ("tenant_id", ASCENDING), ("user_id", ASCENDING), ("notification_id", ASCENDING)
+        ], {"unique": True}),
+        ("notification_receipts_user_created", [
+            ("tenant_id", ASCENDING), ("user_id", ASCENDING), ("notification_created_at", ASCENDING)
+        ], {}),
+    ],
+    "notification_outbox": [
+        ("notification_outbox_status_due", [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        ("notification_outbox_id", [("id", ASCENDING)], {}),
+        ("notification_outbox_claim", [("claim_token", ASCENDING)], {"sparse": True}),
+        # Delivered entries are kept for a week for auditing, then purged
+        ("notification_outbox_delivered_ttl", [("delivered_at", ASCENDING)], {"expireAfterSeconds": 7 * 86400}),
+    ],
+    "student_results": [
+        ("student_results_tenant_exam_class", [
+            ("tenant_id", ASCENDING), ("exam_term_id", ASCENDING), ("class_id", ASCENDING)
+        ], {}),
+        ("student_results_tenant_student", [("tenant_id", ASCENDING), ("student_id", ASCENDING)], {}),
+    ],
+    "ai_logs": [
+        ("ai_logs_tenant_created", [("tenant_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "ai_answer_cache": [
+        ("ai_answer_cache_scope_terms", [
+            ("tenant_id", ASCENDING), ("kind", ASCENDING), ("scope", ASCENDING), ("terms", ASCENDING)
+        ], {}),
+        ("ai_answer_cache_expires", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "qa_knowledge_base": [
+        ("qa_knowledge_base_tenant_class_subject", [
+            ("tenant_id", ASCENDING), ("class_standard", ASCENDING), ("subject", ASCENDING)
+        ], {}),
+    ],
+    "academic_books": [
+        ("academic_books_tenant_class_subject", [
+            ("tenant_id", ASCENDING), ("class_standard", ASCENDING), ("subject", ASCENDING)
+        ], {}),
+    ],
+    "book_chapters": [
+        ("book_chapters_tenant_book", [("tenant_id", ASCENDING), ("book_id", ASCENDING)], {}),
+    ],
+    "biometric_settings": [
+        ("biometric_settings_tenant", [("tenant_id", ASCENDING)], {"unique": True}),
+    ],
+    "reminder_logs": [
+        ("reminder_logs_tenant_sent", [("tenant_id", ASCENDING), ("sent_at", DESCENDING)], {}),
+    ],
+    "background_jobs": [
+        ("background_jobs_id_tenant", [("id", ASCENDING), ("tenant_id", ASCENDING)], {}),
+    ],
+    "audit_logs": [
+        ("audit_logs_tenant_created", [("tenant_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+}
+
+
+class IndexManager:
+    def __init__(self, db, registry: Dict[str, List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]]] = None):
+        self.db = db
+        self.registry = registry if registry is not None else INDEX_REGISTRY
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._confirmed: set = set()
+
+    def register(self, collection: str, name: str, keys: List[Tuple[str, int]], **options):
+        """Declare an additional index (used by modules that own their own collections)"""
+        specs = self.registry.setdefault(collection, [])
+        if not any(spec[0] == name for spec in specs):
+            specs.append((name, keys, options))
+
+    async def ensure_indexes(self) -> Dict[str, Any]:
+        """
+        Create every declared index. Safe to call repeatedly - createIndexes is a
+        no-op for indexes that already exist with the same name and options.
+        """
+        started_at = datetime.utcnow()
+        created: Dict[str, List[str]] = {}
+        failed: Dict[str, str] = {}
+
+        for collection, specs in self.registry.items():
+            models = [IndexModel(keys, name=name, **options) for name, keys, options in specs]
+            try:
+                names = await self.db[collection].create_indexes(models)
+                created[collection] = names
+            except OperationFailure as e:
+                # Typically an equivalent index already exists under another name;
+                # build the rest one by one so a single conflict doesn't block the collection
+                logger.warning(f"[INDEXES] Bulk build failed on {collection}: {e}; retrying individually")
+                created[collection] = []
+                for model in models:
+                    try:
+                        created[collection].extend(await self.db[collection].create_indexes([model]))
+                    except OperationFailure as inner:
+                        failed[f"{collection}.{model.document['name']}"] = str(inner)
+            except Exception as e:
+                failed[collection] = str(e)
+                logger.error(f"[INDEXES] Failed to build indexes on {collection}: {e}")
+
+        self.last_run = {
+            "started_at": started_at,
+            "finished_at": datetime.utcnow(),
+            "created": created,
+            "failed": failed,
+        }
+        logger.info(
+            f"[INDEXES] Ensured {sum(len(v) for v in created.values())} indexes "
+            f"across {len(created)} collections ({len(failed)} failures)"
+        )
+        return self.last_run
+
+    async def has_index(self, collection: str, name: str) -> bool:
+        """
+        True when the named index exists on the server. Positive answers are cached;
+        callers that depend on a unique index for correctness check this first.
+        """
+        if (collection, name) in self._confirmed:
+            return True
+        try:
+            info = await self.db[collection].index_information()
+        except Exception as e:
+            logger.warning(f"[INDEXES] Could not read indexes for {collection}: {e}")
+            return False
+        if name not in info:
+            return False
+        self._confirmed.add((collection, name))
+        return True
+
+    async def report(self) -> Dict[str, Any]:
+        """
+        Compare declared indexes with the server. Reports declared indexes that are
+        missing and existing secondary indexes with zero recorded accesses.
+        """
+        missing: Dict[str, List[str]] = {}
+        unused: Dict[str, List[Dict[str, Any]]] = {}
+        undeclared: Dict[str, List[str]] = {}
+
+        existing_collections = set(await self.db.list_collection_names())
+
+        for collection in sorted(set(self.registry.keys()) | existing_collections):
+            declared = {spec[0] for spec in self.registry.get(collection, [])}
+            if collection not in existing_collections:
+                if declared:
+                    missing[collection] = sorted(declared)
+                continue
+
+            try:
+                info = await self.db[collection].index_information()
+            except Exception as e:
+                logger.warning(f"[INDEXES] Could not read indexes for {collection}: {e}")
+                continue
+
+            absent = sorted(declared - set(info.keys()))
+            if absent:
+                missing[collection] = absent
+
+            extra = sorted(name for name in info.keys() if name != "_id_" and name not in declared)
+            if extra:
+                undeclared[collection] = extra
+
+            try:
+                stats = await self.db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+            except Exception:
+                # $indexStats needs clusterMonitor privileges on some hosted clusters
+                continue
+            idle = [
+                {"name": s["name"], "since": s.get("accesses", {}).get("since")}
+                for s in stats
+                if s["name"] != "_id_" and s.get("accesses", {}).get("ops", 0) == 0
+            ]
+            if idle:
+                unused[collection] = idle
+
+        return {
+            "missing": missing,
+            "unused": unused,
+            "undeclared": undeclared,
+            "last_run": self.last_run,
+        }
+
+
+index_manager = None
+
+def get_index_manager(db):
+    global index_manager
+    if index_manager is None:
+        index_manager = IndexManager(db)
+    return index_manager
@@ -0,0 +1,151 @@
+"""
+Streaming CSV / XLSX Exporters for School ERP
+Exports iterate the Motor cursor instead of a capped to_list(). CSV rows are encoded
+and flushed to the client in small chunks as the cursor advances, so the first bytes
+leave immediately. XLSX uses openpyxl's write_only workbook (rows are serialised to
+disk-backed sheet parts as they are appended) saved into a SpooledTemporaryFile, which
+is then sent in chunks. Memory stays bounded by the driver batch and chunk sizes.
+"""
+
+import io
+import os
+import csv
+import asyncio
+import logging
+import tempfile
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union, BinaryIO
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+# XLSX files up to this size stay in memory; larger ones roll over to a temp file
+EXPORT_SPOOL_BYTES = int(os.environ.get("EXPORT_SPOOL_MB", "8")) * 1024 * 1024
+
+CSV_MEDIA_TYPE = "text/csv"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+async def cursor_rows(cursor, transform: Callable[[Dict[str, Any]], List[Any]]) -> AsyncIterator[List[Any]]:
+    """Rows from a Motor cursor, skipping (and logging) documents the transform can't handle"""
+    async for doc in cursor.batch_size(EXPORT_BATCH_SIZE):
+        try:
+            row = transform(doc)
+        except Exception as e:
+            logger.warning(f"Skipping invalid record {doc.get('id')} in export: {e}")
+            continue
+        if row is not None:
+            yield row
+
+
+def _attachment(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f"attachment; filename={filename}"}
+
+
+def csv_response(rows: AsyncIterator[List[Any]], headers: List[str], filename: str) -> StreamingResponse:
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(headers)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+        async for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    return StreamingResponse(generate(), media_type=CSV_MEDIA_TYPE, headers=_attachment(filename))
+
+
+def _new_sheet(headers: List[str], sheet_title: str, widths: Optional[List[float]], header_fill: Optional[str]):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    # write_only sheets take column widths only before the first row is appended
+    for index, header in enumerate(headers, 1):
+        width = widths[index - 1] if widths else min(max(len(header) + 4, 12), 50)
+        sheet.column_dimensions[get_column_letter(index)].width = width
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        if header_fill:
+            cell.fill = PatternFill(start_color=header_fill, end_color=header_fill, fill_type="solid")
+            cell.font = Font(bold=True, color="FFFFFF", size=11)
+        else:
+            cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        header_cells.append(cell)
+    sheet.append(header_cells)
+    return workbook, sheet
+
+
+def _append_rows(sheet, rows: Iterable[List[Any]]):
+    for row in rows:
+        sheet.append(row)
+
+
+def _summary_rows(sheet, summary: List[List[Any]]) -> List[List[Any]]:
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    title = WriteOnlyCell(sheet, value="SUMMARY")
+    title.font = Font(bold=True)
+    return [[], [title], *summary]
+
+
+async def write_xlsx(target: Union[str, BinaryIO], rows: AsyncIterator[List[Any]], headers: List[str],
+                     sheet_title: str, widths: Optional[List[float]] = None, header_fill: Optional[str] = "10B981",
+                     summary: Optional[List[List[Any]]] = None):
+    """Write rows to a write_only workbook in batches; openpyxl work runs off the event loop"""
+    workbook, sheet = _new_sheet(headers, sheet_title, widths, header_fill)
+    batch: List[List[Any]] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(_append_rows, sheet, batch)
+            batch = []
+    if summary:
+        batch.extend(_summary_rows(sheet, summary))
+    if batch:
+        await asyncio.to_thread(_append_rows, sheet, batch)
+    await asyncio.to_thread(workbook.save, target)
+
+
+async def xlsx_response(rows: AsyncIterator[List[Any]], headers: List[str], filename: str, sheet_title: str,
+                        **options) -> StreamingResponse:
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        await write_xlsx(spool, rows, headers, sheet_title, **options)
+        size = spool.seek(0, io.SEEK_END)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+
+    async def generate():
+        try:
+            while True:
+                chunk = await asyncio.to_thread(spool.read, EXPORT_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
+
+    return StreamingResponse(
+        generate(), media_type=XLSX_MEDIA_TYPE,
+        headers={**_attachment(filename), "Content-Length": str(size)}
+    )
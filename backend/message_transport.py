@@ -0,0 +1,331 @@
+"""
+Outbound Message Transports for School ERP (email / SMS)
+Async front for blocking provider SDKs: every provider owns a small thread pool and
+reuses its connections (pooled SMTP sessions, a keep-alive HTTP session, one Twilio
+client), so a slow gateway only ties up its own workers - never the event loop or
+another provider. Per-provider latency and error metrics are kept in memory.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import Optional, Dict, Any, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    pass
+
+
+class TransportMetrics:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+
+    def record(self, elapsed: float, error: Optional[Exception] = None):
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+        if error is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+            self.last_error = str(error)
+            self.last_error_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        attempts = self.sent + self.failed
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "error_rate": round(self.failed / attempts, 4) if attempts else 0.0,
+            "latency_avg_ms": round(self.latency_total / attempts * 1000, 2) if attempts else 0.0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+class BaseTransport:
+    """Runs a provider's blocking `_deliver` on the provider's own thread pool"""
+
+    channel = "email"
+    name = "base"
+
+    def __init__(self, max_workers: int = 4, timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"transport-{self.name}")
+        self.metrics = TransportMetrics()
+
+    def _deliver(self, **message) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def send(self, **message) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self.metrics.in_flight += 1
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, lambda: self._deliver(**message)),
+                timeout=self.timeout
+            )
+        except Exception as e:
+            self.metrics.record(time.perf_counter() - started, e)
+            raise TransportError(f"{self.name}: {e}") from e
+        finally:
+            self.metrics.in_flight -= 1
+        self.metrics.record(time.perf_counter() - started)
+        return result
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class SMTPEmailTransport(BaseTransport):
+    """SMTP with a pool of logged-in sessions reused across messages"""
+
+    channel = "email"
+    name = "smtp"
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, sender: Optional[str] = None,
+                 use_tls: bool = True, use_ssl: bool = False, max_workers: int = 4, timeout: float = 30.0):
+        super().__init__(max_workers=max_workers, timeout=timeout)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                conn.starttls()
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def _borrow(self) -> smtplib.SMTP:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _deliver(self, to: List[str], subject: str, text: str, html: Optional[str] = None, **_) -> Dict[str, Any]:
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(to)
+        msg["Subject"] = subject
+        msg.set_content(text or "")
+        if html:
+            msg.add_alternative(html, subtype="html")
+
+        conn = self._borrow()
+        try:
+            refused = conn.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Pooled session timed out on the server side; reconnect once
+            conn = self._connect()
+            refused = conn.send_message(msg)
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+        self._idle.put(conn)
+        return {"provider": self.name, "refused": list(refused.keys())}
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.quit()
+            except Exception:
+                pass
+        super().close()
+
+
+class _HTTPTransport(BaseTransport):
+    """Shared keep-alive requests.Session sized to the worker pool"""
+
+    def __init__(self, max_workers: int = 8, timeout: float = 15.0):
+        super().__init__(max_workers=max_workers, timeout=timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+        super().close()
+
+
+class ReplitMailTransport(_HTTPTransport):
+    channel = "email"
+    name = "replit_mail"
+    url = "https://connectors.replit.com/api/v2/mailer/send"
+
+    def __init__(self, auth_token: str, **kwargs):
+        super().__init__(**kwargs)
+        self.auth_token = auth_token
+
+    def _deliver(self, to: List[str], subject: str, text: str, html: Optional[str] = None, **_) -> Dict[str, Any]:
+        response = self.session.post(
+            self.url,
+            headers={"Content-Type": "application/json", "X_REPLIT_TOKEN": self.auth_token},
+            json={"to": to if len(to) > 1 else to[0], "subject": subject, "html": html or text, "text": text},
+            timeout=self.timeout
+        )
+        if not response.ok:
+            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
+            raise TransportError(f"Email API error: {error_data}")
+        return response.json()
+
+
+class HTTPSMSTransport(_HTTPTransport):
+    """Generic JSON-over-HTTP SMS gateway: POST {to, from, message} with a bearer key"""
+
+    channel = "sms"
+    name = "http_sms"
+
+    def __init__(self, url: str, api_key: Optional[str] = None, sender: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.api_key = api_key
+        self.sender = sender
+
+    def _deliver(self, to: str, body: str, **_) -> Dict[str, Any]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        response = self.session.post(
+            self.url, headers=headers,
+            json={"to": to, "from": self.sender, "message": body},
+            timeout=self.timeout
+        )
+        if not response.ok:
+            raise TransportError(f"SMS gateway error {response.status_code}: {response.text[:200]}")
+        return {"provider": self.name, "status_code": response.status_code}
+
+
+class TwilioSMSTransport(BaseTransport):
+    channel = "sms"
+    name = "twilio"
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, **kwargs):
+        super().__init__(**kwargs)
+        from twilio.rest import Client  # Optional dependency, only needed when Twilio is configured
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def _deliver(self, to: str, body: str, **_) -> Dict[str, Any]:
+        message = self.client.messages.create(body=body, from_=self.from_number, to=to)
+        return {"provider": self.name, "sid": message.sid}
+
+
+class MessageTransports:
+    """Active email / SMS transports, picked from the environment"""
+
+    def __init__(self, email: Optional[BaseTransport] = None, sms: Optional[BaseTransport] = None):
+        self.email = email
+        self.sms = sms
+
+    @classmethod
+    def from_env(cls) -> "MessageTransports":
+        return cls(email=_email_transport_from_env(), sms=_sms_transport_from_env())
+
+    async def send_email(self, to: List[str], subject: str, text: str, html: Optional[str] = None) -> Dict[str, Any]:
+        if self.email is None:
+            raise TransportError("Email transport not configured")
+        return await self.email.send(to=list(to), subject=subject, text=text, html=html)
+
+    async def send_sms(self, to: str, body: str) -> Dict[str, Any]:
+        if self.sms is None:
+            raise TransportError("SMS transport not configured")
+        return await self.sms.send(to=to, body=body)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            transport.channel: {"provider": transport.name, **transport.metrics.to_dict()}
+            for transport in (self.email, self.sms) if transport is not None
+        }
+
+    def close(self):
+        for transport in (self.email, self.sms):
+            if transport is not None:
+                transport.close()
+
+
+def _email_transport_from_env() -> Optional[BaseTransport]:
+    provider = os.environ.get("EMAIL_TRANSPORT", "").lower()
+    workers = int(os.environ.get("EMAIL_TRANSPORT_WORKERS", "4"))
+    if provider == "smtp" or (not provider and os.environ.get("SMTP_HOST")):
+        return SMTPEmailTransport(
+            host=os.environ.get("SMTP_HOST", "localhost"),
+            port=int(os.environ.get("SMTP_PORT", "587")),
+            username=os.environ.get("SMTP_USERNAME"),
+            password=os.environ.get("SMTP_PASSWORD"),
+            sender=os.environ.get("SMTP_FROM"),
+            use_tls=os.environ.get("SMTP_USE_TLS", "true").lower() == "true",
+            use_ssl=os.environ.get("SMTP_USE_SSL", "false").lower() == "true",
+            max_workers=workers,
+        )
+    if provider in ("", "replit"):
+        if os.environ.get("REPL_IDENTITY"):
+            return ReplitMailTransport("repl " + os.environ["REPL_IDENTITY"], max_workers=workers)
+        if os.environ.get("WEB_REPL_RENEWAL"):
+            return ReplitMailTransport("depl " + os.environ["WEB_REPL_RENEWAL"], max_workers=workers)
+    return None
+
+
+def _sms_transport_from_env() -> Optional[BaseTransport]:
+    provider = os.environ.get("SMS_TRANSPORT", "").lower()
+    workers = int(os.environ.get("SMS_TRANSPORT_WORKERS", "4"))
+    twilio_creds = [os.environ.get(k) for k in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER")]
+    if provider == "http" or (not provider and os.environ.get("SMS_HTTP_URL")):
+        return HTTPSMSTransport(
+            url=os.environ["SMS_HTTP_URL"],
+            api_key=os.environ.get("SMS_HTTP_API_KEY"),
+            sender=os.environ.get("SMS_SENDER_ID"),
+            max_workers=workers,
+        )
+    if provider in ("", "twilio") and all(twilio_creds):
+        try:
+            return TwilioSMSTransport(*twilio_creds, max_workers=workers)
+        except ImportError:
+            logger.warning("Twilio credentials set but the twilio package is not installed")
+    return None
+
+
+message_transports = None
+
+def get_message_transports() -> MessageTransports:
+    global message_transports
+    if message_transports is None:
+        message_transports = MessageTransports.from_env()
+    return message_transports
@@ -0,0 +1,326 @@
+"""
+Transactional Notification Outbox for School ERP
+Request handlers write one `notification_outbox` document next to their business
+write instead of spawning a fire-and-forget task. A background worker claims due
+entries in batches, coalesces notification-settings lookups per tenant, bulk-inserts
+the in-app notifications, sends each batch's emails concurrently through the message
+transports, and retries failures (including emails the transport rejected) with
+exponential backoff until they are dead-lettered. Batches are delivered concurrently
+while fewer than OUTBOX_MAX_IN_FLIGHT claimed entries are unsettled, and a batch's
+lease is renewed for as long as it is being delivered. Enqueue refuses new entries
+once OUTBOX_MAX_PENDING are waiting.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.environ.get("NOTIFICATION_OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("NOTIFICATION_OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE_SECONDS = 5
+OUTBOX_LEASE_SECONDS = 120
+# Bound on entries one worker has claimed but not yet settled, across concurrent batches
+OUTBOX_MAX_IN_FLIGHT = int(os.environ.get("NOTIFICATION_OUTBOX_MAX_IN_FLIGHT", "500"))
+# Undelivered backlog at which enqueue starts refusing entries (0 disables the bound)
+OUTBOX_MAX_PENDING = int(os.environ.get("NOTIFICATION_OUTBOX_MAX_PENDING", "100000"))
+OUTBOX_BACKLOG_CHECK_SECONDS = 10
+
+
+class OutboxFull(Exception):
+    """Raised by enqueue while the undelivered backlog is at OUTBOX_MAX_PENDING"""
+
+
+class NotificationOutbox:
+    def __init__(self, db, service):
+        self.db = db
+        self.service = service
+        self.worker_id = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._running = False
+        self.in_flight = 0
+        self.backlog = 0
+        self._backlog_checked_at = 0.0
+        self.counters = {
+            "enqueued": 0,
+            "shed": 0,
+            "delivered": 0,
+            "retried": 0,
+            "dead_lettered": 0,
+            "emails_sent": 0,
+            "batches": 0,
+            "settings_lookups": 0,
+        }
+        self.last_batch_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    # ---------- producer side ----------
+
+    async def enqueue(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """
+        Persist notification requests (create_notification kwargs) for the worker.
+        Raises OutboxFull instead of growing the backlog past OUTBOX_MAX_PENDING.
+        """
+        if not entries:
+            return []
+        await self._refresh_backlog()
+        if OUTBOX_MAX_PENDING and self.backlog + len(entries) > OUTBOX_MAX_PENDING:
+            self.counters["shed"] += len(entries)
+            logger.error(f"[OUTBOX] Backlog of {self.backlog} is at the limit; refused {len(entries)} notifications")
+            raise OutboxFull(f"Notification backlog is full ({self.backlog} undelivered)")
+        now = datetime.utcnow()
+        docs = [{
+            "id": str(uuid.uuid4()),
+            "tenant_id": entry["tenant_id"],
+            "payload": entry,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        } for entry in entries]
+        await self.db.notification_outbox.insert_many(docs, ordered=False)
+        self.counters["enqueued"] += len(docs)
+        self.backlog += len(docs)
+        self._wake.set()
+        return [doc["id"] for doc in docs]
+
+    async def _refresh_backlog(self):
+        """Recount undelivered entries, at most every OUTBOX_BACKLOG_CHECK_SECONDS"""
+        if time.monotonic() - self._backlog_checked_at < OUTBOX_BACKLOG_CHECK_SECONDS:
+            return
+        self._backlog_checked_at = time.monotonic()
+        self.backlog = await self.db.notification_outbox.count_documents(
+            {"status": {"$in": ["pending", "processing"]}}
+        )
+
+    # ---------- worker side ----------
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+
+    async def _run(self):
+        logger.info("[OUTBOX] Notification delivery worker started")
+        deliveries: Set[asyncio.Task] = set()
+        while self._running:
+            # Cleared before claiming so an enqueue or settle during the claim is not missed
+            self._wake.clear()
+            try:
+                batch = await self._claim_batch()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"[OUTBOX] Claiming a batch failed: {str(e)}")
+                batch = []
+            if batch:
+                task = asyncio.create_task(self._deliver_batch(batch))
+                deliveries.add(task)
+                task.add_done_callback(deliveries.discard)
+                continue
+            # Nothing due, or at the in-flight bound: wait for new entries or a settled batch
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        if deliveries:
+            await asyncio.gather(*deliveries, return_exceptions=True)
+        logger.info("[OUTBOX] Notification delivery worker stopped")
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        limit = min(OUTBOX_BATCH_SIZE, OUTBOX_MAX_IN_FLIGHT - self.in_flight)
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        due = {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                # Lease expired: the worker that claimed it died mid-batch
+                {"status": "processing", "locked_until": {"$lte": now}},
+            ]
+        }
+        candidates = await self.db.notification_outbox.find(due, {"_id": 0, "id": 1}) \
+            .sort("next_attempt_at", 1).limit(limit).to_list(limit)
+        if not candidates:
+            return []
+
+        claim_token = str(uuid.uuid4())
+        await self.db.notification_outbox.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, **due},
+            {"$set": {
+                "status": "processing",
+                "claim_token": claim_token,
+                "claimed_by": self.worker_id,
+                "locked_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+            }}
+        )
+        batch = await self.db.notification_outbox.find({"claim_token": claim_token}, {"_id": 0}).to_list(limit)
+        self.in_flight += len(batch)
+        return batch
+
+    async def drain_once(self) -> int:
+        """Claim and deliver one batch; returns the number of entries handled"""
+        batch = await self._claim_batch()
+        if batch:
+            await self._deliver_batch(batch)
+        return len(batch)
+
+    async def _renew_lease(self, claim_token: str):
+        """Extend a batch's lease until cancelled, so a slow batch is not claimed twice"""
+        while True:
+            await asyncio.sleep(OUTBOX_LEASE_SECONDS / 3)
+            try:
+                await self.db.notification_outbox.update_many(
+                    {"claim_token": claim_token, "status": "processing"},
+                    {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=OUTBOX_LEASE_SECONDS)}}
+                )
+            except Exception as e:
+                logger.warning(f"[OUTBOX] Renewing lease {claim_token} failed: {str(e)}")
+
+    async def _deliver_batch(self, batch: List[Dict[str, Any]]):
+        """Settle a claimed batch: deliver it, or schedule retries for what failed"""
+        started = time.perf_counter()
+        renewal = asyncio.create_task(self._renew_lease(batch[0]["claim_token"]))
+        try:
+            # One settings read per tenant in the batch instead of one per notification
+            settings_by_tenant: Dict[str, Dict[str, Any]] = {}
+            for tenant_id in {entry["tenant_id"] for entry in batch}:
+                settings_by_tenant[tenant_id] = await self.service.get_notification_settings(tenant_id)
+                self.counters["settings_lookups"] += 1
+
+            # Outbox id doubles as the notification id, so redelivery after a crash is idempotent
+            existing = {
+                doc["id"] for doc in await self.db.notifications.find(
+                    {"id": {"$in": [entry["id"] for entry in batch]}}, {"_id": 0, "id": 1}
+                ).to_list(len(batch))
+            }
+
+            notifications = []
+            built: List[tuple] = []
+            failed: Dict[str, str] = {}
+            for entry in batch:
+                try:
+                    notification = self.service.build_notification(notification_id=entry["id"], **entry["payload"])
+                except Exception as e:
+                    failed[entry["id"]] = f"build failed: {e}"
+                    continue
+                built.append((entry, notification))
+                if entry["id"] not in existing:
+                    notifications.append(notification)
+
+            if notifications:
+                await self.db.notifications.insert_many(notifications, ordered=False)
+                await self.service.notifications_created(notifications)
+
+            # Sent together; the transport's executor bounds how many go out at once
+            email_entries, emails = [], []
+            for entry, notification in built:
+                payload = entry["payload"]
+                event_settings = settings_by_tenant[entry["tenant_id"]].get("event_settings", {}).get(payload["event_type"], {})
+                if payload.get("send_email", True) and payload.get("email_recipients") and event_settings.get("email", True):
+                    email_entries.append(entry)
+                    emails.append(self.service.send_email_notification(
+                        to=payload["email_recipients"],
+                        subject=notification["title"],
+                        body=notification["body"],
+                        tenant_id=entry["tenant_id"]
+                    ))
+            # A failed email is retried with the entry; the in-app notification already exists by then
+            for entry, result in zip(email_entries, await asyncio.gather(*emails)):
+                if result.get("success"):
+                    self.counters["emails_sent"] += 1
+                else:
+                    failed[entry["id"]] = f"email failed: {result.get('error')}"
+
+            delivered_ids = [entry["id"] for entry, _ in built if entry["id"] not in failed]
+            if delivered_ids:
+                await self.db.notification_outbox.update_many(
+                    {"id": {"$in": delivered_ids}},
+                    {"$set": {"status": "delivered", "delivered_at": datetime.utcnow()},
+                     "$unset": {"claim_token": "", "locked_until": ""}}
+                )
+                self.counters["delivered"] += len(delivered_ids)
+            for entry in batch:
+                if entry["id"] in failed:
+                    await self._retry_or_dead_letter(entry, failed[entry["id"]])
+
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"[OUTBOX] Batch of {len(batch)} failed, scheduling retries: {str(e)}")
+            try:
+                for entry in batch:
+                    await self._retry_or_dead_letter(entry, str(e))
+            except Exception as retry_error:
+                # Their leases expire and the entries are claimed again
+                logger.error(f"[OUTBOX] Failed to schedule retries: {str(retry_error)}")
+        finally:
+            renewal.cancel()
+            self.in_flight -= len(batch)
+            self.counters["batches"] += 1
+            self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._wake.set()
+
+    async def _retry_or_dead_letter(self, entry: Dict[str, Any], error: str):
+        attempts = entry.get("attempts", 0) + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            update = {"status": "dead", "dead_at": datetime.utcnow()}
+            self.counters["dead_lettered"] += 1
+            logger.error(f"[OUTBOX] Dead-lettered notification {entry['id']} after {attempts} attempts: {error}")
+        else:
+            delay = OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            update = {"status": "pending", "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)}
+            self.counters["retried"] += 1
+        await self.db.notification_outbox.update_one(
+            {"id": entry["id"]},
+            {"$set": {**update, "attempts": attempts, "last_error": error},
+             "$unset": {"claim_token": "", "locked_until": ""}}
+        )
+
+    async def requeue_dead_letters(self, tenant_id: Optional[str] = None) -> int:
+        query: Dict[str, Any] = {"status": "dead"}
+        if tenant_id:
+            query["tenant_id"] = tenant_id
+        result = await self.db.notification_outbox.update_many(
+            query,
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            self._wake.set()
+        return result.modified_count
+
+    async def metrics(self, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        match: Dict[str, Any] = {"status": {"$in": ["pending", "processing", "dead"]}}
+        if tenant_id:
+            match["tenant_id"] = tenant_id
+        depth = {"pending": 0, "processing": 0, "dead": 0}
+        async for row in self.db.notification_outbox.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]):
+            depth[row["_id"]] = row["count"]
+        return {
+            "worker_running": self._task is not None and not self._task.done(),
+            "in_flight": self.in_flight,
+            "max_in_flight": OUTBOX_MAX_IN_FLIGHT,
+            "backlog": depth["pending"] + depth["processing"],
+            "max_pending": OUTBOX_MAX_PENDING,
+            "depth": depth,
+            "last_batch_ms": self.last_batch_ms,
+            "last_error": self.last_error,
+            **self.counters,
+        }
@@ -0,0 +1,251 @@
+"""
+Notification Read Receipts & Unread Counters for School ERP
+Read state lives in `notification_receipts` (one row per user and notification) plus a
+per-user read watermark set by mark-all-read, instead of the ever-growing `is_read_by`
+array. Unread counts come from `notification_counters`: a creation sequence per audience
+(tenant-wide, target role, targeted user) and one reader document per user recording the
+sequences it has already accounted for, so /notifications/unread-count is one indexed
+read. Deleting or retargeting a notification bumps the epoch of its audiences, which
+makes the affected readers recount exactly once.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Roles that only see notifications addressed to them; every other role sees the whole tenant
+SCOPED_ROLES = ("student", "teacher", "parent")
+TENANT_AUDIENCE = "*"
+
+
+def audience_filter(user_id: str, role: str) -> Optional[Dict[str, Any]]:
+    """Visibility condition shared by the notification list and the unread recount"""
+    if role not in SCOPED_ROLES:
+        return None
+    return {"$or": [
+        {"target_role": "all"},
+        {"target_role": role},
+        {"target_user_ids": user_id}
+    ]}
+
+
+def reader_audiences(user_id: str, role: str) -> List[str]:
+    if role not in SCOPED_ROLES:
+        return [TENANT_AUDIENCE]
+    return ["role:all", f"role:{role}", f"user:{user_id}"]
+
+
+class ReadView:
+    """One user's read state, loaded once per request"""
+
+    def __init__(self, user_id: str, watermark: Optional[datetime], read_ids: Set[str]):
+        self.user_id = user_id
+        self.watermark = watermark
+        self.read_ids = read_ids
+
+    def is_read(self, notification: Dict[str, Any]) -> bool:
+        # is_read_by is no longer written but still honoured for older notifications
+        if self.user_id in notification.get("is_read_by", []):
+            return True
+        if notification.get("id") in self.read_ids:
+            return True
+        created_at = notification.get("created_at")
+        return bool(self.watermark and created_at and created_at <= self.watermark)
+
+    def unread_query(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"is_read_by": {"$ne": self.user_id}}
+        if self.watermark:
+            query["created_at"] = {"$gt": self.watermark}
+        if self.read_ids:
+            query["id"] = {"$nin": list(self.read_ids)}
+        return query
+
+
+class NotificationReadState:
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _key(tenant_id: str, name: str) -> str:
+        return f"{tenant_id}|{name}"
+
+    def _reader_key(self, tenant_id: str, user_id: str) -> str:
+        return self._key(tenant_id, f"reader:{user_id}")
+
+    async def _audiences_of(self, notifications: List[Dict[str, Any]]) -> List[List[str]]:
+        """Audience names each notification counts towards, resolving targeted users in one query"""
+        targeted = {
+            uid for n in notifications if (n.get("target_role") or "all") != "all"
+            for uid in (n.get("target_user_ids") or [])
+        }
+        roles: Dict[str, str] = {}
+        if targeted:
+            async for user in self.db.users.find({"id": {"$in": list(targeted)}}, {"_id": 0, "id": 1, "role": 1}):
+                roles[user["id"]] = user.get("role")
+
+        result = []
+        for notification in notifications:
+            target_role = notification.get("target_role") or "all"
+            audiences = [TENANT_AUDIENCE, f"role:{target_role}"]
+            if target_role != "all":
+                # A targeted user only needs their own counter when their role doesn't already cover it
+                for uid in notification.get("target_user_ids") or []:
+                    if roles.get(uid) in SCOPED_ROLES and roles.get(uid) != target_role:
+                        audiences.append(f"user:{uid}")
+            result.append(audiences)
+        return result
+
+    async def _bump(self, notifications: List[Dict[str, Any]], field: str):
+        increments: Dict[str, int] = {}
+        for notification, audiences in zip(notifications, await self._audiences_of(notifications)):
+            for audience in audiences:
+                key = self._key(notification["tenant_id"], audience)
+                increments[key] = increments.get(key, 0) + 1
+        if increments:
+            await self.db.notification_counters.bulk_write([
+                UpdateOne({"_id": key}, {"$inc": {field: count}}, upsert=True)
+                for key, count in increments.items()
+            ], ordered=False)
+
+    async def record_created(self, notifications: List[Dict[str, Any]]):
+        """Call after inserting notifications; one counter write per audience touched"""
+        try:
+            await self._bump(notifications, "seq")
+        except Exception as e:
+            logger.error(f"Failed to update notification counters: {str(e)}")
+
+    async def record_changed(self, notifications: List[Dict[str, Any]]):
+        """Call after deactivating or retargeting notifications (pass old and new versions)"""
+        try:
+            await self._bump(notifications, "epoch")
+        except Exception as e:
+            logger.error(f"Failed to invalidate notification counters: {str(e)}")
+
+    async def _audience_state(self, tenant_id: str, names: List[str], extra_keys: List[str] = ()) -> Dict[str, Any]:
+        keys = [self._key(tenant_id, name) for name in names] + list(extra_keys)
+        docs = {doc["_id"]: doc async for doc in self.db.notification_counters.find({"_id": {"$in": keys}})}
+        return {
+            "seqs": {name: docs.get(self._key(tenant_id, name), {}).get("seq", 0) for name in names},
+            "epochs": {name: docs.get(self._key(tenant_id, name), {}).get("epoch", 0) for name in names},
+            "docs": docs,
+        }
+
+    async def _read_ids_since(self, tenant_id: str, user_id: str, watermark: Optional[datetime]) -> Set[str]:
+        query: Dict[str, Any] = {"tenant_id": tenant_id, "user_id": user_id}
+        if watermark:
+            query["notification_created_at"] = {"$gt": watermark}
+        return {
+            receipt["notification_id"]
+            async for receipt in self.db.notification_receipts.find(query, {"_id": 0, "notification_id": 1})
+        }
+
+    async def read_view(self, tenant_id: str, user_id: str) -> ReadView:
+        reader = await self.db.notification_counters.find_one(
+            {"_id": self._reader_key(tenant_id, user_id)}, {"read_watermark": 1}
+        )
+        watermark = reader.get("read_watermark") if reader else None
+        return ReadView(user_id, watermark, await self._read_ids_since(tenant_id, user_id, watermark))
+
+    async def unread_count(self, tenant_id: str, user_id: str, role: str) -> int:
+        names = reader_audiences(user_id, role)
+        reader_key = self._reader_key(tenant_id, user_id)
+        state = await self._audience_state(tenant_id, names, [reader_key])
+        reader = state["docs"].get(reader_key)
+
+        if reader is None or reader.get("role") != role or reader.get("epochs") != state["epochs"]:
+            return await self.recount(tenant_id, user_id, role, reader, state)
+
+        unread = reader.get("unread", 0) + sum(
+            state["seqs"][name] - reader.get("seqs", {}).get(name, 0) for name in names
+        )
+        return max(unread, 0)
+
+    async def recount(self, tenant_id: str, user_id: str, role: str,
+                      reader: Optional[Dict[str, Any]] = None, state: Optional[Dict[str, Any]] = None) -> int:
+        """Exact count from the notifications collection; re-bases the reader's counter"""
+        if state is None:
+            state = await self._audience_state(tenant_id, reader_audiences(user_id, role))
+        watermark = reader.get("read_watermark") if reader else None
+        view = ReadView(user_id, watermark, await self._read_ids_since(tenant_id, user_id, watermark))
+
+        query = {"tenant_id": tenant_id, "is_active": True, **view.unread_query()}
+        visibility = audience_filter(user_id, role)
+        if visibility:
+            query.update(visibility)
+        unread = await self.db.notifications.count_documents(query)
+
+        await self.db.notification_counters.update_one(
+            {"_id": self._reader_key(tenant_id, user_id)},
+            {"$set": {
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "role": role,
+                "unread": unread,
+                "seqs": state["seqs"],
+                "epochs": state["epochs"],
+                "counted_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        return unread
+
+    async def mark_read(self, tenant_id: str, user_id: str, role: str, notification_id: str) -> Optional[bool]:
+        """
+        Record a receipt; returns False if the notification was already read and None if
+        it does not exist or is not addressed to this user
+        """
+        query: Dict[str, Any] = {"id": notification_id, "tenant_id": tenant_id, "is_active": True}
+        visibility = audience_filter(user_id, role)
+        if visibility:
+            query.update(visibility)
+        notification = await self.db.notifications.find_one(query, {"_id": 0, "id": 1, "created_at": 1, "is_read_by": 1})
+        if not notification:
+            return None
+
+        reader_key = self._reader_key(tenant_id, user_id)
+        reader = await self.db.notification_counters.find_one({"_id": reader_key}, {"read_watermark": 1})
+        view = ReadView(user_id, reader.get("read_watermark") if reader else None, set())
+        if view.is_read(notification):
+            return False
+        try:
+            await self.db.notification_receipts.insert_one({
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "notification_id": notification["id"],
+                "notification_created_at": notification.get("created_at"),
+                "read_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            return False
+        if reader is not None:
+            await self.db.notification_counters.update_one({"_id": reader_key}, {"$inc": {"unread": -1}})
+        return True
+
+    async def mark_all_read(self, tenant_id: str, user_id: str, role: str):
+        """Move the watermark to now; receipts older than it become redundant"""
+        now = datetime.utcnow()
+        state = await self._audience_state(tenant_id, reader_audiences(user_id, role))
+        await self.db.notification_counters.update_one(
+            {"_id": self._reader_key(tenant_id, user_id)},
+            {"$set": {
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "role": role,
+                "read_watermark": now,
+                "unread": 0,
+                "seqs": state["seqs"],
+                "epochs": state["epochs"],
+                "counted_at": now
+            }},
+            upsert=True
+        )
+        await self.db.notification_receipts.delete_many({
+            "tenant_id": tenant_id,
+            "user_id": user_id,
+            "notification_created_at": {"$lte": now}
+        })
@@ -10,6 +10,11 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any, Callable
 import uuid
 
+from message_transport import get_message_transports, MessageTransports
+from notification_outbox import NotificationOutbox
+from notification_receipts import NotificationReadState
+from notification_stream import NotificationStream
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -20,7 +25,9 @@ class NotificationEventType:
     ADMISSION_REJECTED = "admission_rejected"
     ATTENDANCE_ABSENT = "attendance_absent"
     ATTENDANCE_LATE = "attendance_late"
+    ATTENDANCE_ABSENT_DIGEST = "attendance_absent_digest"
     STAFF_ATTENDANCE_LATE = "staff_attendance_late"
+    STAFF_ATTENDANCE_ABSENT = "staff_attendance_absent"
     FEE_DUE_REMINDER = "fee_due_reminder"
     FEE_OVERDUE = "fee_overdue"
     FEE_PAYMENT_RECEIVED = "fee_payment_received"
@@ -63,12 +70,24 @@ NOTIFICATION_TEMPLATES = {
         "priority": "normal",
         "target_role": "parent"
     },
+    NotificationEventType.ATTENDANCE_ABSENT_DIGEST: {
+        "title": "Absence Summary - {group_name}",
+        "body": "{absent_count} absent in {group_name} on {date}: {names}.",
+        "priority": "normal",
+        "target_role": "admin"
+    },
     NotificationEventType.STAFF_ATTENDANCE_LATE: {
         "title": "Staff Late Arrival",
         "body": "Staff member {staff_name} arrived late on {date} at {time}.",
         "priority": "normal",
         "target_role": "admin"
     },
+    NotificationEventType.STAFF_ATTENDANCE_ABSENT: {
+        "title": "Staff Absence Alert",
+        "body": "Staff member {staff_name} was marked absent on {date}.",
+        "priority": "normal",
+        "target_role": "admin"
+    },
     NotificationEventType.FEE_DUE_REMINDER: {
         "title": "Fee Due Reminder",
         "body": "Reminder: Fee payment of {amount} for {student_name} is due on {due_date}. Please make the payment to avoid late fees.",
@@ -127,8 +146,12 @@ NOTIFICATION_TEMPLATES = {
 
 
 class NotificationService:
-    def __init__(self, db):
+    def __init__(self, db, transports: Optional[MessageTransports] = None):
         self.db = db
+        self.transports = transports or get_message_transports()
+        self.outbox = NotificationOutbox(db, self)
+        self.read_state = NotificationReadState(db)
+        self.stream = NotificationStream.from_env(db)
     
     async def get_notification_settings(self, tenant_id: str) -> Dict[str, Any]:
         """Get notification settings for a tenant"""
@@ -145,6 +168,47 @@ class NotificationService:
             }
         return settings
     
+    def build_notification(
+        self,
+        tenant_id: str,
+        event_type: str,
+        data: Dict[str, Any],
+        target_user_ids: List[str] = None,
+        target_role: str = None,
+        target_class: str = None,
+        target_section: str = None,
+        school_id: str = None,
+        notification_id: str = None,
+        **_
+    ) -> Dict[str, Any]:
+        """Render the notification document for an event from its template"""
+        template = NOTIFICATION_TEMPLATES.get(event_type, NOTIFICATION_TEMPLATES[NotificationEventType.GENERAL_ANNOUNCEMENT])
+        
+        title = template["title"].format(**data) if "{" in template["title"] else template["title"]
+        body = template["body"].format(**data) if "{" in template["body"] else template["body"]
+        priority = data.get("priority", template["priority"])
+        role = target_role or template["target_role"]
+        
+        return {
+            "id": notification_id or str(uuid.uuid4()),
+            "tenant_id": tenant_id,
+            "school_id": school_id,
+            "title": title,
+            "body": body,
+            "notification_type": event_type,
+            "target_role": role,
+            "target_class": target_class,
+            "target_section": target_section,
+            "target_user_ids": target_user_ids or [],
+            "priority": priority,
+            "is_read_by": [],
+            "is_active": True,
+            "created_by": "system",
+            "created_by_name": "System",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+    
     async def create_notification(
         self,
         tenant_id: str,
@@ -159,38 +223,23 @@ class NotificationService:
         email_recipients: List[str] = None
     ) -> Dict[str, Any]:
         """
-        Create a notification based on event type and data
+        Create a notification immediately (bypasses the outbox)
         """
         try:
-            template = NOTIFICATION_TEMPLATES.get(event_type, NOTIFICATION_TEMPLATES[NotificationEventType.GENERAL_ANNOUNCEMENT])
-            
-            title = template["title"].format(**data) if "{" in template["title"] else template["title"]
-            body = template["body"].format(**data) if "{" in template["body"] else template["body"]
-            priority = data.get("priority", template["priority"])
-            role = target_role or template["target_role"]
-            
-            notification_id = str(uuid.uuid4())
-            notification = {
-                "id": notification_id,
-                "tenant_id": tenant_id,
-                "school_id": school_id,
-                "title": title,
-                "body": body,
-                "notification_type": event_type,
-                "target_role": role,
-                "target_class": target_class,
-                "target_section": target_section,
-                "target_user_ids": target_user_ids or [],
-                "priority": priority,
-                "is_read_by": [],
-                "is_active": True,
-                "created_by": "system",
-                "created_by_name": "System",
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
+            notification = self.build_notification(
+                tenant_id=tenant_id,
+                event_type=event_type,
+                data=data,
+                target_user_ids=target_user_ids,
+                target_role=target_role,
+                target_class=target_class,
+                target_section=target_section,
+                school_id=school_id
+            )
+            title = notification["title"]
             
             await self.db.notifications.insert_one(notification)
+            await self.notifications_created([notification])
             logger.info(f"Created notification: {title} for tenant {tenant_id}")
             
             settings = await self.get_notification_settings(tenant_id)
@@ -201,18 +250,39 @@ class NotificationService:
                     await self.send_email_notification(
                         to=email_recipients,
                         subject=title,
-                        body=body,
+                        body=notification["body"],
                         tenant_id=tenant_id
                     )
                 except Exception as e:
                     logger.error(f"Failed to send email: {str(e)}")
             
-            return {"success": True, "notification_id": notification_id}
+            return {"success": True, "notification_id": notification["id"]}
             
         except Exception as e:
             logger.error(f"Error creating notification: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def notifications_created(self, notifications: List[Dict[str, Any]]):
+        """Bookkeeping after notifications are inserted: unread counters, then live push"""
+        await self.read_state.record_created(notifications)
+        await self.stream.publish_notifications(notifications)
+    
+    async def enqueue_notification(self, **kwargs) -> Dict[str, Any]:
+        """
+        Record a notification in the outbox; the delivery worker creates it shortly after.
+        Takes the same arguments as create_notification.
+        """
+        try:
+            outbox_ids = await self.outbox.enqueue([kwargs])
+            return {"success": True, "notification_id": outbox_ids[0]}
+        except Exception as e:
+            logger.error(f"Error enqueueing notification: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def enqueue_notifications(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """Batch form of enqueue_notification - one outbox insert for many notifications"""
+        return await self.outbox.enqueue(entries)
+    
     async def send_email_notification(
         self,
         to: List[str],
@@ -222,16 +292,14 @@ class NotificationService:
         html: str = None
     ) -> Dict[str, Any]:
         """
-        Send email notification - logs for now, can be extended with email provider
-        For production, integrate with Resend, SendGrid, or SMTP
+        Send email notification through the configured email transport (SMTP / Replit Mail).
+        Every attempt is recorded in email_logs; without a transport the email is only logged.
         """
         try:
             if not to:
                 return {"success": False, "error": "No recipients"}
             
-            logger.info(f"[EMAIL] Would send to {to}: {subject}")
-            
-            await self.db.email_logs.insert_one({
+            log = {
                 "id": str(uuid.uuid4()),
                 "tenant_id": tenant_id,
                 "to": to,
@@ -239,9 +307,24 @@ class NotificationService:
                 "body": body,
                 "status": "queued",
                 "created_at": datetime.utcnow()
-            })
+            }
+            result = {"success": True, "message": "Email logged for delivery"}
+            
+            if self.transports.email is not None:
+                try:
+                    await self.transports.send_email(to, subject, body, html)
+                    log["status"] = "sent"
+                    log["provider"] = self.transports.email.name
+                    result = {"success": True, "message": "Email sent"}
+                except Exception as e:
+                    log["status"] = "failed"
+                    log["error"] = str(e)
+                    result = {"success": False, "error": str(e)}
+            else:
+                logger.info(f"[EMAIL] No email transport configured; logged email to {to}: {subject}")
             
-            return {"success": True, "message": "Email logged for delivery"}
+            await self.db.email_logs.insert_one(log)
+            return result
             
         except Exception as e:
             logger.error(f"Error logging email: {str(e)}")
@@ -256,7 +339,7 @@ class NotificationService:
         parent_email: str = None
     ):
         """Notify admins about new admission application"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.ADMISSION_NEW,
             data={
@@ -277,7 +360,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about admission approval"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.ADMISSION_APPROVED,
             data={
@@ -299,7 +382,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about admission rejection"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.ADMISSION_REJECTED,
             data={"student_name": student_name},
@@ -320,7 +403,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about student absence"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.ATTENDANCE_ABSENT,
             data={
@@ -333,6 +416,89 @@ class NotificationService:
             email_recipients=[parent_email] if parent_email else None
         )
     
+    async def notify_students_absent(
+        self,
+        tenant_id: str,
+        school_id: str,
+        date: str,
+        absentees: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        Batch form of notify_student_absent - one outbox write for a whole attendance sheet.
+        Each absentee carries name and optional parent_email / parent_user_id.
+        """
+        return await self.enqueue_notifications([
+            {
+                "tenant_id": tenant_id,
+                "event_type": NotificationEventType.ATTENDANCE_ABSENT,
+                "data": {"student_name": absentee["name"], "date": date},
+                "target_user_ids": [absentee["parent_user_id"]] if absentee.get("parent_user_id") else None,
+                "target_role": "parent",
+                "school_id": school_id,
+                "email_recipients": [absentee["parent_email"]] if absentee.get("parent_email") else None
+            }
+            for absentee in absentees
+        ])
+    
+    async def notify_attendance_digest(
+        self,
+        tenant_id: str,
+        school_id: str,
+        date: str,
+        group_name: str,
+        absentees: List[Dict[str, Any]],
+        target_class: str = None,
+        target_section: str = None,
+        notify_parents: bool = True
+    ) -> List[str]:
+        """
+        Digest mode for one class/section sheet: a single summary for admins (and the
+        class teachers when target_class is set) plus one notification per parent
+        covering all of that parent's absent children
+        """
+        if not absentees:
+            return []
+        names = ", ".join(absentee["name"] for absentee in absentees if absentee.get("name"))
+        summary = {"group_name": group_name, "absent_count": len(absentees), "date": date, "names": names}
+        entries = [{
+            "tenant_id": tenant_id,
+            "event_type": NotificationEventType.ATTENDANCE_ABSENT_DIGEST,
+            "data": summary,
+            "target_role": "admin",
+            "school_id": school_id
+        }]
+        if target_class:
+            entries.append({
+                "tenant_id": tenant_id,
+                "event_type": NotificationEventType.ATTENDANCE_ABSENT_DIGEST,
+                "data": summary,
+                "target_role": "teacher",
+                "target_class": target_class,
+                "target_section": target_section,
+                "school_id": school_id
+            })
+        
+        if notify_parents:
+            # Siblings absent together share a parent, so they share a notification
+            by_parent: Dict[Any, List[Dict[str, Any]]] = {}
+            for idx, absentee in enumerate(absentees):
+                key = absentee.get("parent_user_id") or absentee.get("parent_email") or ("student", idx)
+                by_parent.setdefault(key, []).append(absentee)
+            for children in by_parent.values():
+                parent_user_id = children[0].get("parent_user_id")
+                parent_email = children[0].get("parent_email")
+                entries.append({
+                    "tenant_id": tenant_id,
+                    "event_type": NotificationEventType.ATTENDANCE_ABSENT,
+                    "data": {"student_name": " and ".join(child["name"] for child in children), "date": date},
+                    "target_user_ids": [parent_user_id] if parent_user_id else None,
+                    "target_role": "parent",
+                    "school_id": school_id,
+                    "email_recipients": [parent_email] if parent_email else None
+                })
+        
+        return await self.enqueue_notifications(entries)
+    
     async def notify_student_late(
         self,
         tenant_id: str,
@@ -344,7 +510,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about student late arrival"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.ATTENDANCE_LATE,
             data={
@@ -367,7 +533,7 @@ class NotificationService:
         time: str
     ):
         """Notify admin about staff late arrival"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.STAFF_ATTENDANCE_LATE,
             data={
@@ -379,6 +545,25 @@ class NotificationService:
             school_id=school_id
         )
     
+    async def notify_staff_absent_batch(
+        self,
+        tenant_id: str,
+        school_id: str,
+        staff_names: List[str],
+        date: str
+    ) -> List[str]:
+        """Notify admins about staff marked absent on a bulk sheet - one outbox write for all of them"""
+        return await self.enqueue_notifications([
+            {
+                "tenant_id": tenant_id,
+                "event_type": NotificationEventType.STAFF_ATTENDANCE_ABSENT,
+                "data": {"staff_name": staff_name, "date": date},
+                "target_role": "admin",
+                "school_id": school_id
+            }
+            for staff_name in staff_names
+        ])
+    
     async def notify_fee_due(
         self,
         tenant_id: str,
@@ -390,7 +575,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about upcoming fee due"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.FEE_DUE_REMINDER,
             data={
@@ -414,7 +599,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about overdue fee"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.FEE_OVERDUE,
             data={
@@ -438,7 +623,7 @@ class NotificationService:
         parent_user_id: str = None
     ):
         """Notify parent about payment received"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.FEE_PAYMENT_RECEIVED,
             data={
@@ -462,7 +647,7 @@ class NotificationService:
         target_class: str = None
     ):
         """Notify about exam schedule"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.EXAM_SCHEDULED,
             data={
@@ -483,7 +668,7 @@ class NotificationService:
         target_class: str = None
     ):
         """Notify about result publication"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.RESULT_PUBLISHED,
             data={"exam_name": exam_name},
@@ -502,7 +687,7 @@ class NotificationService:
         description: str = ""
     ):
         """Notify about new calendar event"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.CALENDAR_EVENT,
             data={
@@ -523,7 +708,7 @@ class NotificationService:
         section: str
     ):
         """Notify about timetable update"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.TIMETABLE_UPDATE,
             data={
@@ -545,7 +730,7 @@ class NotificationService:
         affected_student_ids: List[str] = None
     ):
         """Notify about transport route changes"""
-        return await self.create_notification(
+        return await self.enqueue_notification(
             tenant_id=tenant_id,
             event_type=NotificationEventType.TRANSPORT_ROUTE_CHANGE,
             data={
@@ -0,0 +1,290 @@
+"""
+Server-Sent Events push channel for Notifications
+Connected users hold one long-lived /api/notifications/stream response. New
+notifications and unread-counter changes are published to an in-process pub/sub and
+fanned out to the matching subscribers, so clients no longer poll. With several
+uvicorn workers, set NOTIFICATION_STREAM_BROKER=change_stream: events are written to
+`notification_events` and every worker tails that collection with a MongoDB change
+stream (requires a replica set).
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Callable, Awaitable
+
+from notification_receipts import SCOPED_ROLES, audience_filter
+from pagination import json_default
+
+logger = logging.getLogger(__name__)
+
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+STREAM_QUEUE_SIZE = int(os.environ.get("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+STREAM_REPLAY_LIMIT = 100
+STREAM_RETRY_MS = 5000
+
+Dispatch = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=json_default)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _public(notification: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in notification.items() if k not in ("_id", "is_read_by")}
+
+
+class Subscriber:
+    def __init__(self, tenant_id: str, user_id: str, role: str):
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.role = role
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        if event.get("user_id"):
+            return event["user_id"] == self.user_id
+        notification = event.get("notification") or {}
+        if self.role not in SCOPED_ROLES:
+            return True
+        return (notification.get("target_role") in ("all", self.role)
+                or self.user_id in (notification.get("target_user_ids") or []))
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # Slow client: drop and tell it to refetch once it catches up
+            self.overflowed = True
+            return False
+
+
+class LocalBroker:
+    """Single worker: events go straight to this process's subscribers"""
+
+    name = "local"
+
+    def __init__(self):
+        self._dispatch: Optional[Dispatch] = None
+
+    def start(self, dispatch: Dispatch):
+        self._dispatch = dispatch
+
+    async def publish(self, events: List[Dict[str, Any]]):
+        if self._dispatch is None:
+            return
+        for event in events:
+            await self._dispatch(event)
+
+    async def stop(self):
+        self._dispatch = None
+
+
+class ChangeStreamBroker:
+    """Multi-worker: events are inserted into an events collection and each worker watches it"""
+
+    name = "change_stream"
+
+    def __init__(self, db, collection: str = "notification_events"):
+        self.db = db
+        self.collection = db[collection]
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, dispatch: Dispatch):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch(dispatch))
+
+    async def publish(self, events: List[Dict[str, Any]]):
+        if events:
+            now = datetime.utcnow()
+            await self.collection.insert_many(
+                [{**event, "created_at": now} for event in events], ordered=False
+            )
+
+    async def _watch(self, dispatch: Dispatch):
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as changes:
+                    async for change in changes:
+                        resume_token = changes.resume_token
+                        event = change["fullDocument"]
+                        event.pop("_id", None)
+                        event.pop("created_at", None)
+                        await dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[STREAM] Change stream interrupted, retrying: {str(e)}")
+                await asyncio.sleep(5)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+
+class NotificationStream:
+    def __init__(self, db, broker=None):
+        self.db = db
+        self.broker = broker or LocalBroker()
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.counters = {"connections_total": 0, "published": 0, "delivered": 0, "dropped": 0}
+
+    @classmethod
+    def from_env(cls, db) -> "NotificationStream":
+        if os.environ.get("NOTIFICATION_STREAM_BROKER", "local").lower() == "change_stream":
+            return cls(db, ChangeStreamBroker(db))
+        return cls(db)
+
+    def start(self):
+        self.broker.start(self._dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    # ---------- publishing ----------
+
+    async def publish_notifications(self, notifications: List[Dict[str, Any]]):
+        events = [
+            {"type": "notification", "tenant_id": n["tenant_id"], "notification": _public(n)}
+            for n in notifications
+        ]
+        await self._publish(events)
+
+    async def publish_unread(self, tenant_id: str, user_id: str, delta: Optional[int] = None, count: Optional[int] = None):
+        """Counter change for one user's sessions: a relative delta or an absolute count"""
+        event: Dict[str, Any] = {"type": "unread", "tenant_id": tenant_id, "user_id": user_id}
+        if count is not None:
+            event["unread_count"] = count
+        else:
+            event["delta"] = delta
+        await self._publish([event])
+
+    async def _publish(self, events: List[Dict[str, Any]]):
+        try:
+            await self.broker.publish(events)
+            self.counters["published"] += len(events)
+        except Exception as e:
+            logger.error(f"[STREAM] Failed to publish {len(events)} events: {str(e)}")
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        for subscriber in list(self.subscribers.get(event.get("tenant_id"), ())):
+            if subscriber.wants(event):
+                if subscriber.offer(event):
+                    self.counters["delivered"] += 1
+                else:
+                    self.counters["dropped"] += 1
+
+    # ---------- subscribing ----------
+
+    def subscribe(self, tenant_id: str, user_id: str, role: str) -> Subscriber:
+        subscriber = Subscriber(tenant_id, user_id, role)
+        self.subscribers.setdefault(tenant_id, set()).add(subscriber)
+        self.counters["connections_total"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        tenant_subscribers = self.subscribers.get(subscriber.tenant_id)
+        if tenant_subscribers is not None:
+            tenant_subscribers.discard(subscriber)
+            if not tenant_subscribers:
+                self.subscribers.pop(subscriber.tenant_id, None)
+
+    async def _replay(self, subscriber: Subscriber, last_event_id: str) -> List[Dict[str, Any]]:
+        """Notifications the client missed since the last id it saw"""
+        last = await self.db.notifications.find_one(
+            {"id": last_event_id, "tenant_id": subscriber.tenant_id}, {"_id": 0, "created_at": 1}
+        )
+        if not last or not last.get("created_at"):
+            return []
+        query: Dict[str, Any] = {
+            "tenant_id": subscriber.tenant_id,
+            "is_active": True,
+            "created_at": {"$gt": last["created_at"]}
+        }
+        visibility = audience_filter(subscriber.user_id, subscriber.role)
+        if visibility:
+            query.update(visibility)
+        docs = await self.db.notifications.find(query, {"_id": 0, "is_read_by": 0}) \
+            .sort("created_at", 1).limit(STREAM_REPLAY_LIMIT).to_list(STREAM_REPLAY_LIMIT)
+        return docs
+
+    async def events(self, request, tenant_id: str, user_id: str, role: str,
+                     last_event_id: Optional[str] = None,
+                     greeting: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None):
+        """SSE body: replay after last_event_id, optional greeting, then live events with heartbeats"""
+        # Subscribe before replaying so nothing published meanwhile falls into a gap
+        subscriber = self.subscribe(tenant_id, user_id, role)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+
+            replayed: Set[str] = set()
+            if last_event_id:
+                missed = await self._replay(subscriber, last_event_id)
+                if len(missed) >= STREAM_REPLAY_LIMIT:
+                    yield format_sse("resync", {"reason": "too_many_missed"})
+                else:
+                    for notification in missed:
+                        replayed.add(notification["id"])
+                        yield format_sse("notification", notification, notification["id"])
+
+            if greeting is not None:
+                # The greeting's absolute counts already include everything replayed or queued
+                # so far: send those events first and let `ready` overwrite what they added
+                ready = await greeting()
+                for _ in range(subscriber.queue.qsize()):
+                    frame = self._frame(subscriber.queue.get_nowait(), replayed)
+                    if frame:
+                        yield frame
+                yield format_sse("ready", ready)
+
+            while True:
+                if await request.is_disconnected():
+                    break
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    yield format_sse("resync", {"reason": "slow_consumer"})
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+
+                frame = self._frame(event, replayed)
+                if frame:
+                    yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _frame(self, event: Dict[str, Any], replayed: Set[str]) -> Optional[str]:
+        if event["type"] == "notification":
+            notification = event["notification"]
+            if notification.get("id") in replayed:
+                return None
+            return format_sse("notification", notification, notification.get("id"))
+        return format_sse("unread", {k: event[k] for k in ("delta", "unread_count") if k in event})
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker.name,
+            "connected": sum(len(s) for s in self.subscribers.values()),
+            "tenants": len(self.subscribers),
+            "heartbeat_seconds": STREAM_HEARTBEAT_SECONDS,
+            **self.counters,
+        }
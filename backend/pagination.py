@@ -0,0 +1,164 @@
+"""
+Keyset Pagination & NDJSON Streaming for School ERP list endpoints
+Opaque cursors encode the sort key of the last row returned, so each page is an
+indexed range read instead of a skip/limit or an unbounded to_list()
+"""
+
+import base64
+import json
+import logging
+from datetime import datetime, date
+from typing import List, Optional, Dict, Any, Callable, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH_SIZE = 500
+
+SortSpec = List[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps fallback for values Mongo/pydantic hand back"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(doc: Dict[str, Any], sort: SortSpec) -> str:
+    values = [_encode_value(doc.get(field)) for field, _ in sort]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return [_decode_value(v) for v in values]
+
+
+def keyset_filter(sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """
+    Build the "rows strictly after this sort key" condition for a compound sort:
+    (a > x) OR (a == x AND b > y) OR ...
+    Nulls (and missing fields) sort lowest in MongoDB, but $gt/$lt never match them:
+    ascending, "after null" means "not null"; descending, nulls follow every value.
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        prefix = {sort[j][0]: values[j] for j in range(i)}
+        value = values[i]
+        if value is None:
+            if direction < 0:
+                # Nothing sorts below null in a descending scan
+                continue
+            branches.append({**prefix, field: {"$ne": None}})
+        elif direction > 0:
+            branches.append({**prefix, field: {"$gt": value}})
+        else:
+            branches.append({**prefix, field: {"$lt": value}})
+            branches.append({**prefix, field: None})
+    if not branches:
+        # Cursor points at the very last possible key
+        return {"_id": {"$exists": False}}
+    return {"$or": branches}
+
+
+def _with_cursor(query: Dict[str, Any], sort: SortSpec, after: Optional[str]) -> Dict[str, Any]:
+    if not after:
+        return query
+    return {"$and": [query, keyset_filter(sort, decode_cursor(after, sort))]}
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    sort: SortSpec,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    transform: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Return one page as {"items", "next_cursor", "has_more"}. Reads limit+1 rows to
+    detect whether another page exists without a separate count query.
+    """
+    page_size = clamp_limit(limit)
+    docs = await collection.find(_with_cursor(query, sort, after)).sort(sort).limit(page_size + 1).to_list(page_size + 1)
+
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    next_cursor = encode_cursor(docs[-1], sort) if has_more and docs else None
+
+    items = []
+    for doc in docs:
+        if transform is None:
+            items.append(doc)
+            continue
+        try:
+            item = transform(doc)
+        except Exception as e:
+            logger.warning(f"Skipping invalid record {doc.get('id')}: {e}")
+            continue
+        if item is not None:
+            items.append(item)
+
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def ndjson_response(
+    collection,
+    query: Dict[str, Any],
+    sort: SortSpec,
+    after: Optional[str] = None,
+    transform: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    filename: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Stream every matching row as newline-delimited JSON straight off the Motor
+    cursor, so memory stays bounded by the driver batch size.
+    """
+    async def generate():
+        cursor = collection.find(_with_cursor(query, sort, after)).sort(sort).batch_size(NDJSON_BATCH_SIZE)
+        async for doc in cursor:
+            try:
+                item = transform(doc) if transform else doc
+            except Exception as e:
+                logger.warning(f"Skipping invalid record {doc.get('id')}: {e}")
+                continue
+            if item is None:
+                continue
+            if isinstance(item, dict):
+                item.pop("_id", None)
+            yield (json.dumps(item, default=json_default) + "\n").encode("utf-8")
+
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return StreamingResponse(generate(), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,212 @@
+"""
+Fee Reminder Dispatcher for School ERP
+Groups pending fees per student in one aggregation, then fans reminders out through
+a bounded pool of workers with a token-bucket rate limit per channel (email / SMS).
+Reminder logs are buffered and written with insert_many.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+REMINDER_LOG_BATCH_SIZE = 200
+PROGRESS_REPORT_EVERY = 50
+
+
+class RateLimiter:
+    """Async token bucket: `rate` acquisitions per second with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def build_reminder_message(student_name: str, fee_types: List[str], total_pending: float) -> str:
+    return f"""
+Dear {student_name},
+
+This is a reminder that you have pending fee payments:
+
+Fee Types: {', '.join(fee_types)}
+Total Amount: ₹{total_pending:,.2f}
+
+Please make the payment at your earliest convenience to avoid any inconvenience.
+
+Thank you,
+School Administration
+    """.strip()
+
+
+class ReminderDispatcher:
+    def __init__(
+        self,
+        db,
+        send_email: Callable[..., Awaitable[Any]],
+        send_sms: Callable[..., Awaitable[Any]],
+        concurrency: Optional[int] = None,
+        email_rate: Optional[float] = None,
+        sms_rate: Optional[float] = None,
+    ):
+        self.db = db
+        self.send_email = send_email
+        self.send_sms = send_sms
+        self.concurrency = concurrency or int(os.environ.get("REMINDER_CONCURRENCY", "20"))
+        self.limiters = {
+            "email": RateLimiter(email_rate if email_rate is not None else float(os.environ.get("REMINDER_EMAIL_RATE", "50"))),
+            "sms": RateLimiter(sms_rate if sms_rate is not None else float(os.environ.get("REMINDER_SMS_RATE", "50"))),
+        }
+
+    async def collect_defaulters(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """One aggregation: pending fees grouped per student, joined with active student contacts"""
+        pipeline = [
+            {"$match": {
+                "tenant_id": tenant_id,
+                "$or": [
+                    {"pending_amount": {"$gt": 0}},
+                    {"overdue_amount": {"$gt": 0}}
+                ]
+            }},
+            {"$group": {
+                "_id": "$student_id",
+                "total_pending": {"$sum": {"$add": [
+                    {"$ifNull": ["$pending_amount", 0]},
+                    {"$ifNull": ["$overdue_amount", 0]}
+                ]}},
+                "fee_types": {"$addToSet": "$fee_type"}
+            }},
+            {"$lookup": {
+                "from": "students",
+                "let": {"student_id": "$_id"},
+                "pipeline": [
+                    {"$match": {
+                        "tenant_id": tenant_id,
+                        "is_active": True,
+                        "$expr": {"$eq": ["$id", "$$student_id"]}
+                    }},
+                    {"$project": {"_id": 0, "id": 1, "name": 1, "admission_no": 1, "email": 1, "phone": 1}}
+                ],
+                "as": "student"
+            }},
+            {"$unwind": "$student"},
+        ]
+        return await self.db.student_fees.aggregate(pipeline, allowDiskUse=True).to_list(None)
+
+    async def _remind(self, tenant_id: str, sent_by: str, group: Dict[str, Any]) -> Dict[str, Any]:
+        student = group["student"]
+        total_pending = group["total_pending"]
+        fee_types = sorted(t for t in group["fee_types"] if t)
+
+        email_success = False
+        sms_success = False
+
+        if student.get("email"):
+            try:
+                await self.limiters["email"].acquire()
+                await self.send_email(student["email"], student["name"], total_pending, fee_types)
+                email_success = True
+            except Exception as e:
+                logger.warning(f"Failed to send email to {student['email']}: {str(e)}")
+
+        if student.get("phone"):
+            try:
+                await self.limiters["sms"].acquire()
+                await self.send_sms(student["phone"], student["name"], total_pending)
+                sms_success = True
+            except Exception as e:
+                logger.warning(f"Failed to send SMS to {student['phone']}: {str(e)}")
+
+        return {
+            "id": str(uuid.uuid4()),
+            "tenant_id": tenant_id,
+            "student_id": student["id"],
+            "student_name": student["name"],
+            "admission_no": student.get("admission_no"),
+            "email": student.get("email"),
+            "phone": student.get("phone"),
+            "total_amount": total_pending,
+            "fee_types": fee_types,
+            "email_sent": email_success,
+            "sms_sent": sms_success,
+            "sent_by": sent_by,
+            "sent_at": datetime.utcnow(),
+            "message": build_reminder_message(student["name"], fee_types, total_pending)
+        }
+
+    async def dispatch(
+        self,
+        tenant_id: str,
+        sent_by: str,
+        on_progress: Optional[Callable[[int, int], Awaitable[Any]]] = None,
+    ) -> Dict[str, Any]:
+        groups = await self.collect_defaulters(tenant_id)
+        total = len(groups)
+        if on_progress:
+            await on_progress(0, total)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for group in groups:
+            queue.put_nowait(group)
+
+        stats = {"total_students": total, "sent_count": 0, "failed_count": 0}
+        log_buffer: List[Dict[str, Any]] = []
+        processed = 0
+        flush_lock = asyncio.Lock()
+
+        async def flush_logs(force: bool = False):
+            nonlocal log_buffer
+            async with flush_lock:
+                if log_buffer and (force or len(log_buffer) >= REMINDER_LOG_BATCH_SIZE):
+                    batch, log_buffer = log_buffer, []
+                    await self.db.reminder_logs.insert_many(batch, ordered=False)
+
+        async def worker():
+            nonlocal processed
+            while True:
+                try:
+                    group = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    log = await self._remind(tenant_id, sent_by, group)
+                    log_buffer.append(log)
+                    if log["email_sent"] or log["sms_sent"]:
+                        stats["sent_count"] += 1
+                    else:
+                        stats["failed_count"] += 1
+                except Exception as e:
+                    logger.error(f"Failed to send reminder to student {group.get('_id')}: {str(e)}")
+                    stats["failed_count"] += 1
+                processed += 1
+                await flush_logs()
+                if on_progress and processed % PROGRESS_REPORT_EVERY == 0:
+                    await on_progress(processed, total)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, total) or 1)))
+        await flush_logs(force=True)
+        if on_progress:
+            await on_progress(processed, total)
+
+        logger.info(f"Fee reminders sent: {stats['sent_count']} successful, {stats['failed_count']} failed")
+        return stats
@@ -0,0 +1,297 @@
+"""
+Report Artifact Cache for School ERP
+Rendered PDF/XLSX reports are kept on local disk under a content-addressed key: a hash
+of the tenant, report type, normalized filters, format and the data version of every
+collection the report is built from. Writers bump those versions in `data_versions`
+(report_cache.touch), so a changed collection simply produces new keys and the stale
+artifacts age out of the LRU size budget. Concurrent requests for the same key share a
+single render, and the key doubles as the ETag for If-None-Match revalidation.
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Union, Callable, Awaitable
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "erp_report_cache")
+REPORT_CACHE_MAX_MB = int(os.environ.get("REPORT_CACHE_MAX_MB", "512"))
+# Upper bound on an artifact's life, for data changed outside the API (imports, shell edits)
+REPORT_CACHE_MAX_AGE = int(os.environ.get("REPORT_CACHE_MAX_AGE", "86400"))
+
+MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+}
+
+Produced = Union[str, bytes]
+
+
+def normalize_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop unset filters and canonicalise values so equivalent requests share a key"""
+    normalized = {}
+    for name, value in (filters or {}).items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(v) for v in value)
+        normalized[name] = value
+    return normalized
+
+
+class CachedArtifact:
+    __slots__ = ("key", "tenant_id", "path", "filename", "size", "created_at")
+
+    def __init__(self, key: str, tenant_id: str, path: str, filename: str, size: int, created_at: float):
+        self.key = key
+        self.tenant_id = tenant_id
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.created_at = created_at
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.key[:32]}"'
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(os.path.splitext(self.filename)[1].lower(), "application/octet-stream")
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.replace("W/", "", 1) == self.etag for tag in tags)
+
+    def meta(self) -> Dict[str, Any]:
+        return {"key": self.key, "tenant_id": self.tenant_id, "filename": self.filename,
+                "size": self.size, "created_at": self.created_at}
+
+
+class ReportCache:
+    def __init__(self, db, directory: str = REPORT_CACHE_DIR,
+                 max_bytes: int = REPORT_CACHE_MAX_MB * 1024 * 1024, max_age: int = REPORT_CACHE_MAX_AGE):
+        self.db = db
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, CachedArtifact]" = OrderedDict()
+        self._bytes = 0
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0,
+                         "stored": 0, "evicted": 0, "expired": 0, "invalidations": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ---------- data versions ----------
+
+    async def versions(self, tenant_id: str, collections: List[str]) -> Dict[str, int]:
+        ids = [f"{tenant_id}|{name}" for name in collections]
+        found = {
+            doc["_id"]: doc.get("version", 0)
+            async for doc in self.db.data_versions.find({"_id": {"$in": ids}}, {"version": 1})
+        }
+        return {name: found.get(f"{tenant_id}|{name}", 0) for name in collections}
+
+    async def touch(self, tenant_id: Optional[str], *collections: str):
+        """Call after writing to a collection reports are built from"""
+        if not tenant_id or not collections:
+            return
+        now = datetime.utcnow()
+        try:
+            await self.db.data_versions.bulk_write([
+                UpdateOne(
+                    {"_id": f"{tenant_id}|{name}"},
+                    {"$inc": {"version": 1},
+                     "$set": {"tenant_id": tenant_id, "collection": name, "changed_at": now}},
+                    upsert=True
+                ) for name in collections
+            ], ordered=False)
+            self.counters["invalidations"] += len(collections)
+        except Exception as e:
+            logger.error(f"[REPORT CACHE] Failed to bump data version of {collections}: {str(e)}")
+
+    async def key(self, tenant_id: str, report_type: str, filters: Dict[str, Any],
+                  fmt: str, collections: List[str]) -> str:
+        fingerprint = json.dumps({
+            "tenant_id": tenant_id,
+            "report": report_type,
+            "filters": normalize_filters(filters),
+            "format": fmt.lower(),
+            "versions": await self.versions(tenant_id, collections),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    # ---------- artifacts ----------
+
+    def lookup(self, key: str) -> Optional[CachedArtifact]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created_at > self.max_age or not os.path.exists(entry.path):
+            self.counters["expired"] += 1
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        try:
+            os.utime(entry.path)  # keeps LRU order across restarts
+        except OSError:
+            pass
+        return entry
+
+    async def get_or_render(self, key: str, tenant_id: str, filename: str,
+                            render: Callable[[], Awaitable[Produced]]) -> CachedArtifact:
+        """Cached artifact for key; on a miss one caller renders and the rest wait for it"""
+        while True:
+            entry = self.lookup(key)
+            if entry is not None:
+                return entry
+            pending = self._rendering.get(key)
+            if pending is None:
+                break
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request rendering it went away; take over
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._rendering[key] = future
+        self.counters["misses"] += 1
+        try:
+            entry = self.store(key, tenant_id, filename, await render())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            self._rendering.pop(key, None)
+
+    def _paths(self, key: str, filename: str) -> tuple:
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(self.directory, f"{key}{extension}"), os.path.join(self.directory, f"{key}.json")
+
+    def store(self, key: str, tenant_id: str, filename: str, produced: Produced) -> CachedArtifact:
+        path, meta_path = self._paths(key, filename)
+        if isinstance(produced, bytes):
+            with open(path, "wb") as f:
+                f.write(produced)
+        else:
+            shutil.move(produced, path)
+        entry = CachedArtifact(key, tenant_id, path, filename, os.path.getsize(path), time.time())
+        with open(meta_path, "w") as f:
+            json.dump(entry.meta(), f)
+
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self.counters["stored"] += 1
+        self._evict()
+        return entry
+
+    def _evict(self):
+        # Never evict the newest entry, even when it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.counters["evicted"] += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for path in self._paths(key, entry.filename):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self):
+        """Rebuild the index from disk, least recently used first"""
+        now = time.time()
+        loaded = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                path, _ = self._paths(meta["key"], meta["filename"])
+                entry = CachedArtifact(meta["key"], meta["tenant_id"], path, meta["filename"],
+                                       os.path.getsize(path), meta["created_at"])
+                loaded.append((os.path.getmtime(path), entry))
+            except (OSError, ValueError, KeyError):
+                try:
+                    os.remove(meta_path)
+                except OSError:
+                    pass
+        for _, entry in sorted(loaded, key=lambda item: item[0]):
+            self._entries[entry.key] = entry
+            self._bytes += entry.size
+            if now - entry.created_at > self.max_age:
+                self._drop(entry.key)
+
+        # Artifacts whose metadata was never written (crash mid-store)
+        indexed = {entry.path for entry in self._entries.values()}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if not name.endswith(".json") and path not in indexed and now - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+        self._evict()
+
+    def purge(self, tenant_id: Optional[str] = None) -> int:
+        keys = [key for key, entry in self._entries.items() if tenant_id is None or entry.tenant_id == tenant_id]
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "directory": self.directory,
+            "entries": len(self._entries),
+            "size_mb": round(self._bytes / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "max_age_seconds": self.max_age,
+            "rendering": len(self._rendering),
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            **self.counters,
+        }
+
+
+report_cache = None
+
+def get_report_cache(db) -> ReportCache:
+    global report_cache
+    if report_cache is None:
+        report_cache = ReportCache(db)
+    return report_cache
@@ -0,0 +1,1603 @@
+"""
+Report Rendering Engine for School ERP
+reportlab / openpyxl rendering is CPU-bound and blocking, so report builders hand a
+plain `report_data` dict plus branding to a process pool instead of building the
+document on the event loop. Workers are spawned fresh (no inherited Mongo/event-loop
+state), capped in address space, recycled after a number of jobs, and a job that
+overruns its timeout gets its pool torn down and replaced.
+The shared PDF / Excel template helpers live here so they run inside the worker.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.environ.get("REPORT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_TIMEOUT_SECONDS = float(os.environ.get("REPORT_RENDER_TIMEOUT", "120"))
+RENDER_MEMORY_LIMIT_MB = int(os.environ.get("REPORT_RENDER_MEMORY_MB", "1024"))
+RENDER_MAX_TASKS_PER_CHILD = int(os.environ.get("REPORT_RENDER_MAX_TASKS_PER_CHILD", "50"))
+
+
+class ReportRenderError(Exception):
+    pass
+
+# ==================== PROFESSIONAL REPORT TEMPLATE SYSTEM ====================
+
+def create_professional_pdf_template(school_name: str = "School ERP System", school_colors: dict = None):
+    """
+    Create professional PDF styling templates with school branding
+    
+    Args:
+        school_name: Name of the school for header/footer
+        school_colors: Dict with 'primary' and 'secondary' hex colors
+    
+    Returns:
+        Dictionary with styles and template configurations
+    """
+    from reportlab.lib import colors as rl_colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
+    # Default school colors (professional blue-green theme)
+    if not school_colors:
+        school_colors = {
+            'primary': '#1e3a8a',      # Deep blue
+            'secondary': '#059669',     # Emerald green
+            'accent': '#f59e0b',        # Amber
+            'light': '#f0f9ff',         # Light blue background
+            'text': '#1f2937'           # Dark gray text
+        }
+    
+    # Convert hex to ReportLab colors
+    def hex_to_rgb(hex_color):
+        hex_color = hex_color.lstrip('#')
+        return tuple(int(hex_color[i:i+2], 16)/255.0 for i in (0, 2, 4))
+    
+    primary_color = rl_colors.Color(*hex_to_rgb(school_colors['primary']))
+    secondary_color = rl_colors.Color(*hex_to_rgb(school_colors['secondary']))
+    accent_color = rl_colors.Color(*hex_to_rgb(school_colors['accent']))
+    light_bg = rl_colors.Color(*hex_to_rgb(school_colors['light']))
+    
+    # Get base styles
+    styles = getSampleStyleSheet()
+    
+    # Custom professional styles
+    custom_styles = {
+        'SchoolTitle': ParagraphStyle(
+            'SchoolTitle',
+            parent=styles['Title'],
+            fontSize=22,
+            textColor=primary_color,
+            fontName='Helvetica-Bold',
+            alignment=1,  # Center
+            spaceAfter=10,
+            leading=26
+        ),
+        'ReportTitle': ParagraphStyle(
+            'ReportTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=secondary_color,
+            fontName='Helvetica-Bold',
+            alignment=1,
+            spaceAfter=20,
+            leading=20
+        ),
+        'SectionHeading': ParagraphStyle(
+            'SectionHeading',
+            parent=styles['Heading2'],
+            fontSize=12,
+            textColor=primary_color,
+            fontName='Helvetica-Bold',
+            spaceAfter=8,
+            spaceBefore=15,
+            leading=14
+        ),
+        'FilterText': ParagraphStyle(
+            'FilterText',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=rl_colors.Color(0.3, 0.3, 0.3),
+            fontName='Helvetica',
+            spaceAfter=12
+        ),
+        'FooterText': ParagraphStyle(
+            'FooterText',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=rl_colors.Color(0.4, 0.4, 0.4),
+            fontName='Helvetica',
+            alignment=1
+        ),
+        'MetricLabel': ParagraphStyle(
+            'MetricLabel',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=rl_colors.Color(0.2, 0.2, 0.2),
+            fontName='Helvetica-Bold'
+        ),
+        'MetricValue': ParagraphStyle(
+            'MetricValue',
+            parent=styles['Normal'],
+            fontSize=14,
+            textColor=primary_color,
+            fontName='Helvetica-Bold'
+        )
+    }
+    
+    # Table styles templates
+    table_styles = {
+        'header': [
+            ('BACKGROUND', (0, 0), (-1, 0), primary_color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 1, rl_colors.Color(0.8, 0.8, 0.8))
+        ],
+        'alternate_rows': [
+            ('BACKGROUND', (0, 1), (-1, -1), rl_colors.white),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [rl_colors.white, light_bg])
+        ],
+        'summary_box': [
+            ('BACKGROUND', (0, 0), (-1, 0), secondary_color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+            ('BACKGROUND', (0, 1), (-1, -1), light_bg),
+            ('GRID', (0, 0), (-1, -1), 1, rl_colors.Color(0.7, 0.7, 0.7))
+        ]
+    }
+    
+    return {
+        'styles': custom_styles,
+        'base_styles': styles,
+        'table_styles': table_styles,
+        'colors': {
+            'primary': primary_color,
+            'secondary': secondary_color,
+            'accent': accent_color,
+            'light_bg': light_bg
+        },
+        'school_name': school_name
+    }
+
+
+def add_pdf_header_footer(canvas, doc, school_name, report_title, generated_by, page_num_text=True, school_address=None, school_contact=None, logo_path=None):
+    """
+    Add professional header and footer to PDF pages with school branding, logo, and contact info
+    
+    Args:
+        canvas: ReportLab canvas object
+        doc: Document object
+        school_name: School name for header
+        report_title: Report title for header
+        generated_by: User who generated the report
+        page_num_text: Whether to show "Page X of Y"
+        school_address: School address (optional)
+        school_contact: School contact info (optional)
+        logo_path: Path to school logo image (optional)
+    """
+    from reportlab.lib import colors
+    import os
+    
+    canvas.saveState()
+    
+    # Header with school branding - increased height for logo and info
+    canvas.setFillColor(colors.Color(0.11, 0.23, 0.54))  # Deep blue
+    canvas.rect(0, doc.pagesize[1] - 90, doc.pagesize[0], 90, fill=True, stroke=False)
+    
+    # School logo (top-left corner) if provided
+    logo_x = 45
+    logo_y = doc.pagesize[1] - 80
+    logo_width = 60
+    logo_height = 60
+    
+    if logo_path and os.path.exists(logo_path):
+        try:
+            canvas.drawImage(logo_path, logo_x, logo_y, width=logo_width, height=logo_height, preserveAspectRatio=True, mask='auto')
+        except:
+            # If logo fails to load, show placeholder
+            canvas.setStrokeColor(colors.whitesmoke)
+            canvas.setLineWidth(2)
+            canvas.rect(logo_x, logo_y, logo_width, logo_height, stroke=True, fill=False)
+            canvas.setFont('Helvetica', 8)
+            canvas.setFillColor(colors.whitesmoke)
+            canvas.drawCentredString(logo_x + logo_width/2, logo_y + logo_height/2 - 3, "LOGO")
+    else:
+        # Placeholder for logo
+        canvas.setStrokeColor(colors.whitesmoke)
+        canvas.setLineWidth(2)
+        canvas.rect(logo_x, logo_y, logo_width, logo_height, stroke=True, fill=False)
+        canvas.setFont('Helvetica', 8)
+        canvas.setFillColor(colors.whitesmoke)
+        canvas.drawCentredString(logo_x + logo_width/2, logo_y + logo_height/2 - 3, "LOGO")
+    
+    # School information beside the logo
+    info_x = logo_x + logo_width + 15
+    
+    # School name
+    canvas.setFillColor(colors.whitesmoke)
+    canvas.setFont('Helvetica-Bold', 16)
+    canvas.drawString(info_x, doc.pagesize[1] - 35, school_name)
+    
+    # School address
+    if school_address:
+        canvas.setFont('Helvetica', 9)
+        canvas.drawString(info_x, doc.pagesize[1] - 52, school_address)
+    
+    # School contact info
+    if school_contact:
+        canvas.setFont('Helvetica', 9)
+        canvas.drawString(info_x, doc.pagesize[1] - 67, school_contact)
+    
+    # Report title below the header (on white background)
+    canvas.setFillColor(colors.Color(0.11, 0.23, 0.54))  # Deep blue text
+    canvas.setFont('Helvetica-Bold', 12)
+    canvas.drawCentredString(doc.pagesize[0]/2, doc.pagesize[1] - 105, report_title)
+    
+    # Footer line
+    canvas.setStrokeColor(colors.Color(0.02, 0.59, 0.41))  # Emerald green
+    canvas.setLineWidth(2)
+    canvas.line(40, 35, doc.pagesize[0] - 40, 35)
+    
+    # Footer text
+    canvas.setFillColor(colors.Color(0.4, 0.4, 0.4))
+    canvas.setFont('Helvetica', 7)
+    
+    # Generated by (left)
+    canvas.drawString(40, 20, f"Generated by: {generated_by}")
+    
+    # Generated date/time (center)
+    from datetime import datetime
+    canvas.drawCentredString(
+        doc.pagesize[0]/2, 
+        20, 
+        f"Generated: {datetime.now().strftime('%d-%b-%Y %I:%M %p')}"
+    )
+    
+    # Page number (right)
+    if page_num_text:
+        canvas.drawRightString(
+            doc.pagesize[0] - 40,
+            20,
+            f"Page {doc.page} of {doc._pageNumber if hasattr(doc, '_pageNumber') else doc.page}"
+        )
+    
+    canvas.restoreState()
+
+
+def create_filter_display(filters_dict, template):
+    """
+    Create formatted filter display paragraph for reports
+    
+    Args:
+        filters_dict: Dictionary of applied filters
+        template: Template configuration from create_professional_pdf_template
+    
+    Returns:
+        Paragraph object with formatted filters
+    """
+    from reportlab.platypus import Paragraph
+    
+    if not filters_dict or not any(filters_dict.values()):
+        return None
+    
+    filter_text = "<b>Applied Filters:</b> "
+    filter_parts = []
+    
+    for key, value in filters_dict.items():
+        if value and str(value).lower() not in ['all', 'all_classes', 'all_genders', 'all_statuses', 'all_departments']:
+            formatted_key = key.replace('_', ' ').title()
+            filter_parts.append(f"{formatted_key}: <b>{value}</b>")
+    
+    if filter_parts:
+        filter_text += " | ".join(filter_parts)
+        return Paragraph(filter_text, template['styles']['FilterText'])
+    
+    return None
+
+
+def create_summary_box(summary_data, template, col_widths=None):
+    """
+    Create professional summary box with key metrics
+    
+    Args:
+        summary_data: Dictionary of summary statistics
+        template: Template configuration
+        col_widths: Column widths for table
+    
+    Returns:
+        Table object with styled summary
+    """
+    from reportlab.platypus import Table, TableStyle
+    from reportlab.lib.units import inch
+    
+    if not summary_data:
+        return None
+    
+    # Prepare data for 2-column layout
+    data = []
+    items = list(summary_data.items())
+    
+    # Group into pairs for better visual layout
+    for i in range(0, len(items), 2):
+        row = []
+        for j in range(2):
+            if i + j < len(items):
+                key, value = items[i + j]
+                formatted_key = key.replace('_', ' ').title()
+                row.extend([formatted_key, str(value)])
+            else:
+                row.extend(['', ''])
+        data.append(row)
+    
+    # Default column widths if not provided
+    if not col_widths:
+        col_widths = [2*inch, 1.5*inch, 2*inch, 1.5*inch]
+    
+    summary_table = Table(data, colWidths=col_widths)
+    
+    # Apply professional styling
+    style_list = list(template['table_styles']['summary_box'])
+    summary_table.setStyle(TableStyle(style_list))
+    
+    return summary_table
+
+
+def create_data_table(headers, data_rows, template, col_widths=None, repeat_header=True):
+    """
+    Create professional data table with alternating row colors
+    
+    Args:
+        headers: List of column headers
+        data_rows: List of data rows
+        template: Template configuration
+        col_widths: Column widths
+        repeat_header: Whether to repeat header on new pages
+    
+    Returns:
+        Table object with professional styling
+    """
+    from reportlab.platypus import Table, TableStyle
+    from reportlab.lib.units import inch
+    
+    # Combine headers and data
+    table_data = [headers] + data_rows
+    
+    # Auto-calculate column widths if not provided
+    if not col_widths:
+        available_width = 6.5 * inch  # A4 width minus margins
+        col_widths = [available_width / len(headers)] * len(headers)
+    
+    data_table = Table(table_data, colWidths=col_widths, repeatRows=1 if repeat_header else 0)
+    
+    # Apply professional styling
+    style_list = (
+        list(template['table_styles']['header']) +
+        list(template['table_styles']['alternate_rows'])
+    )
+    
+    data_table.setStyle(TableStyle(style_list))
+    
+    return data_table
+
+
+def create_professional_excel_header(worksheet, school_name, report_title, filters_dict=None):
+    """
+    Create professional Excel report header with school branding
+    
+    Args:
+        worksheet: openpyxl worksheet object
+        school_name: School name for header
+        report_title: Report title
+        filters_dict: Optional filters to display
+    
+    Returns:
+        Current row number after header
+    """
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    # School colors
+    primary_color = "1e3a8a"      # Deep blue
+    secondary_color = "059669"     # Emerald green
+    light_bg = "f0f9ff"            # Light blue background
+    
+    row = 1
+    
+    # School name header (merged across columns)
+    worksheet.merge_cells(f'A{row}:F{row}')
+    school_cell = worksheet[f'A{row}']
+    school_cell.value = school_name
+    school_cell.font = Font(name='Calibri', size=18, bold=True, color="FFFFFF")
+    school_cell.fill = PatternFill(start_color=primary_color, end_color=primary_color, fill_type="solid")
+    school_cell.alignment = Alignment(horizontal='center', vertical='center')
+    worksheet.row_dimensions[row].height = 30
+    row += 1
+    
+    # Report title
+    worksheet.merge_cells(f'A{row}:F{row}')
+    title_cell = worksheet[f'A{row}']
+    title_cell.value = report_title
+    title_cell.font = Font(name='Calibri', size=14, bold=True, color="FFFFFF")
+    title_cell.fill = PatternFill(start_color=secondary_color, end_color=secondary_color, fill_type="solid")
+    title_cell.alignment = Alignment(horizontal='center', vertical='center')
+    worksheet.row_dimensions[row].height = 25
+    row += 1
+    
+    # Generated date/time
+    from datetime import datetime
+    worksheet.merge_cells(f'A{row}:F{row}')
+    date_cell = worksheet[f'A{row}']
+    date_cell.value = f"Generated: {datetime.now().strftime('%d-%b-%Y %I:%M %p')}"
+    date_cell.font = Font(name='Calibri', size=9, italic=True)
+    date_cell.alignment = Alignment(horizontal='center')
+    row += 1
+    
+    # Filters display (if provided)
+    if filters_dict:
+        filter_parts = []
+        for key, value in filters_dict.items():
+            if value and str(value).lower() not in ['all', 'all_classes', 'all_genders', 'all_statuses']:
+                formatted_key = key.replace('_', ' ').title()
+                filter_parts.append(f"{formatted_key}: {value}")
+        
+        if filter_parts:
+            worksheet.merge_cells(f'A{row}:F{row}')
+            filter_cell = worksheet[f'A{row}']
+            filter_cell.value = "Applied Filters: " + " | ".join(filter_parts)
+            filter_cell.font = Font(name='Calibri', size=9, bold=True)
+            filter_cell.fill = PatternFill(start_color=light_bg, end_color=light_bg, fill_type="solid")
+            filter_cell.alignment = Alignment(horizontal='left')
+            row += 1
+    
+    # Empty row for spacing
+    row += 1
+    
+    return row
+
+
+def format_excel_summary_box(worksheet, start_row, summary_data, primary_color="1e3a8a", secondary_color="059669"):
+    """
+    Format Excel summary box with professional styling
+    
+    Args:
+        worksheet: openpyxl worksheet object
+        start_row: Starting row number
+        summary_data: Dictionary of summary statistics
+        primary_color: Hex color for headers
+        secondary_color: Hex color for accents
+    
+    Returns:
+        Current row number after summary
+    """
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    row = start_row
+    
+    # Summary title
+    worksheet.merge_cells(f'A{row}:B{row}')
+    title_cell = worksheet[f'A{row}']
+    title_cell.value = "SUMMARY STATISTICS"
+    title_cell.font = Font(name='Calibri', size=12, bold=True, color="FFFFFF")
+    title_cell.fill = PatternFill(start_color=secondary_color, end_color=secondary_color, fill_type="solid")
+    title_cell.alignment = Alignment(horizontal='center', vertical='center')
+    worksheet.row_dimensions[row].height = 25
+    row += 1
+    
+    # Summary data in 2-column layout
+    items = list(summary_data.items())
+    for i in range(0, len(items), 2):
+        for j in range(2):
+            if i + j < len(items):
+                key, value = items[i + j]
+                formatted_key = key.replace('_', ' ').title()
+                
+                # Key column
+                col_offset = j * 2
+                key_cell = worksheet.cell(row=row, column=1 + col_offset)
+                key_cell.value = formatted_key
+                key_cell.font = Font(name='Calibri', size=10, bold=True)
+                key_cell.alignment = Alignment(horizontal='left')
+                
+                # Value column
+                value_cell = worksheet.cell(row=row, column=2 + col_offset)
+                value_cell.value = str(value)
+                value_cell.font = Font(name='Calibri', size=10, color=primary_color)
+                value_cell.alignment = Alignment(horizontal='right')
+        
+        row += 1
+    
+    # Empty row for spacing
+    row += 1
+    
+    return row
+
+
+def format_excel_data_table(worksheet, start_row, headers, data_rows, primary_color="1e3a8a"):
+    """
+    Format Excel data table with professional styling and alternating rows
+    
+    Args:
+        worksheet: openpyxl worksheet object
+        start_row: Starting row number
+        headers: List of column headers
+        data_rows: List of data rows
+        primary_color: Hex color for header background
+    
+    Returns:
+        Current row number after table
+    """
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    
+    row = start_row
+    light_bg = "f0f9ff"  # Light blue for alternating rows
+    
+    # Header row
+    for col_idx, header in enumerate(headers, start=1):
+        cell = worksheet.cell(row=row, column=col_idx)
+        cell.value = header
+        cell.font = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color=primary_color, end_color=primary_color, fill_type="solid")
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        
+        # Add border
+        thin_border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        cell.border = thin_border
+    
+    worksheet.row_dimensions[row].height = 20
+    row += 1
+    
+    # Data rows with alternating colors
+    for data_row in data_rows:
+        is_even = (row - start_row) % 2 == 0
+        
+        for col_idx, value in enumerate(data_row, start=1):
+            cell = worksheet.cell(row=row, column=col_idx)
+            cell.value = value
+            cell.font = Font(name='Calibri', size=10)
+            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            
+            # Alternating row colors
+            if is_even:
+                cell.fill = PatternFill(start_color=light_bg, end_color=light_bg, fill_type="solid")
+            
+            # Add border
+            thin_border = Border(
+                left=Side(style='thin'),
+                right=Side(style='thin'),
+                top=Side(style='thin'),
+                bottom=Side(style='thin')
+            )
+            cell.border = thin_border
+        
+        row += 1
+    
+    return row
+
+# ==================== END OF PROFESSIONAL REPORT TEMPLATE SYSTEM ====================
+
+# ==================== RENDERERS (run inside the worker process) ====================
+
+def render_academic_excel(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate professional Excel report for academic data with school branding"""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    
+    # Create workbook
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
+    
+    # School name and colors
+    school_name = "School ERP System"  # Can be fetched from current_user.school_name if available
+    primary_color = "1e3a8a"
+    secondary_color = "059669"
+    
+    # Professional header with school branding
+    row = create_professional_excel_header(
+        worksheet, 
+        school_name, 
+        report_data["title"], 
+        report_data.get("filters", {})
+    )
+    
+    # Professional summary box
+    if report_data.get("summary"):
+        row = format_excel_summary_box(worksheet, row, report_data["summary"], primary_color, secondary_color)
+        row += 1
+    
+    # Professional student data table
+    if report_data.get("students"):
+        # Determine headers and data based on report type
+        if report_type == "consolidated_marksheet":
+            headers = ["Name", "Class", "Roll No", "Math", "Science", "English", "Social", "Total", "Percentage", "Grade"]
+            data_rows = []
+            for student in report_data["students"][:200]:  # Show more with better formatting
+                perf = student.get("academic_performance", {})
+                data_rows.append([
+                    student.get("name", ""),
+                    student.get("class_name", ""),
+                    student.get("roll_no", ""),
+                    perf.get("mathematics", {}).get("marks", "-"),
+                    perf.get("science", {}).get("marks", "-"),
+                    perf.get("english", {}).get("marks", "-"),
+                    perf.get("social_studies", {}).get("marks", "-"),
+                    perf.get("total_marks", "-"),
+                    f"{perf.get('percentage', 0):.2f}%",
+                    perf.get("overall_grade", "-")
+                ])
+        else:
+            headers = ["Name", "Class", "Section", "Roll No", "Contact", "Status"]
+            data_rows = []
+            for student in report_data["students"][:200]:
+                data_rows.append([
+                    student.get("name", ""),
+                    student.get("class_name", ""),
+                    student.get("section_name", "-"),
+                    student.get("roll_no", ""),
+                    student.get("contact_number", "-"),
+                    student.get("status", "Active")
+                ])
+        
+        # Format professional table
+        row = format_excel_data_table(worksheet, row, headers, data_rows, primary_color)
+    
+    # Auto-adjust column widths (safe for merged cells)
+    for col_idx in range(1, worksheet.max_column + 1):
+        max_length = 0
+        column_letter = get_column_letter(col_idx)
+        for row_idx in range(1, worksheet.max_row + 1):
+            cell = worksheet.cell(row=row_idx, column=col_idx)
+            try:
+                if cell.value and len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 2, 50)
+        worksheet.column_dimensions[column_letter].width = adjusted_width
+    
+    # Save workbook
+    workbook.save(file_path)
+    return file_path
+
+
+def render_academic_pdf(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate professional PDF report for academic data with school branding"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.units import inch
+    
+    school_name = branding["school_name"]
+    school_address = branding["school_address"]
+    school_contact = branding["school_contact"]
+    logo_url = branding["logo_url"]
+    
+    template = create_professional_pdf_template(school_name)
+    
+    # Create PDF document with professional margins
+    doc = SimpleDocTemplate(
+        file_path, 
+        pagesize=A4, 
+        rightMargin=50, 
+        leftMargin=50, 
+        topMargin=115,  # Space for header with logo and school info
+        bottomMargin=50  # Space for footer
+    )
+    
+    # Build story with professional elements
+    story = []
+    
+    # Report title
+    story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
+    story.append(Spacer(1, 10))
+    
+    # Dynamic filters display
+    filters = report_data.get("filters", {})
+    if filters:
+        filter_para = create_filter_display(filters, template)
+        if filter_para:
+            story.append(filter_para)
+            story.append(Spacer(1, 15))
+    
+    # Professional summary box
+    if report_data.get("summary"):
+        story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
+        summary_table = create_summary_box(report_data["summary"], template)
+        if summary_table:
+            story.append(summary_table)
+            story.append(Spacer(1, 20))
+    
+    # Students data section with professional table
+    if report_data.get("students"):
+        story.append(Paragraph("STUDENT DATA", template['styles']['SectionHeading']))
+        story.append(Spacer(1, 8))
+        
+        if report_type == "consolidated_marksheet":
+            # Academic performance table
+            headers = ["Student", "Class", "Adm. No", "Math", "Science", "English", "Percentage", "Grade"]
+            data_rows = []
+            
+            for student in report_data["students"][:50]:  # Show more students with better formatting
+                perf = student.get("academic_performance", {})
+                data_rows.append([
+                    student.get("name", "")[:20],  # Truncate long names
+                    student.get("class_name", ""),
+                    student.get("admission_no", ""),
+                    str(perf.get("mathematics", {}).get("marks", "-")),
+                    str(perf.get("science", {}).get("marks", "-")),
+                    str(perf.get("english", {}).get("marks", "-")),
+                    f"{perf.get('percentage', 0):.1f}%",
+                    perf.get("overall_grade", "-")
+                ])
+            
+            col_widths = [1.3*inch, 0.6*inch, 0.7*inch, 0.5*inch, 0.5*inch, 0.5*inch, 0.7*inch, 0.5*inch]
+        else:
+            # Standard student list table
+            headers = ["Student Name", "Class", "Section", "Roll Number", "Status"]
+            data_rows = []
+            
+            for student in report_data["students"][:100]:  # Show more students
+                data_rows.append([
+                    student.get("name", "")[:25],
+                    student.get("class_name", ""),
+                    student.get("section_name", "-"),
+                    student.get("roll_no", ""),
+                    student.get("status", "Active")
+                ])
+            
+            col_widths = [2.2*inch, 0.9*inch, 0.9*inch, 1*inch, 1*inch]
+        
+        # Create professional data table
+        student_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+        story.append(student_table)
+    
+    # Build PDF with professional header/footer
+    def add_page_decorations(canvas, doc):
+        add_pdf_header_footer(
+            canvas, 
+            doc, 
+            school_name, 
+            report_data["title"], 
+            branding["generated_by"],
+            page_num_text=True,
+            school_address=school_address,
+            school_contact=school_contact,
+            logo_path=logo_url
+        )
+    
+    doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
+    return file_path
+
+
+def render_attendance_excel(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate Excel report for attendance data"""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Font, PatternFill
+    
+    # Create workbook
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
+    
+    # Header styling
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="059669", end_color="059669", fill_type="solid")
+    
+    # Title
+    worksheet.cell(row=1, column=1, value=report_data["title"]).font = Font(bold=True, size=16)
+    worksheet.cell(row=2, column=1, value=f"Generated: {report_data['generated_date']}")
+    
+    # Summary section
+    row = 4
+    worksheet.cell(row=row, column=1, value="SUMMARY STATISTICS").font = header_font
+    worksheet.cell(row=row, column=1).fill = header_fill
+    row += 1
+    
+    summary = report_data["summary"]
+    for key, value in summary.items():
+        worksheet.cell(row=row, column=1, value=key.replace("_", " ").title())
+        worksheet.cell(row=row, column=2, value=str(value))
+        row += 1
+    
+    # Report-specific sections
+    if report_type == "monthly_summary":
+        # Daily breakdown
+        if report_data.get("daily_breakdown"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="DAILY BREAKDOWN").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            daily_headers = ["Date", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
+            for col, header in enumerate(daily_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for daily_record in report_data["daily_breakdown"]:
+                worksheet.cell(row=row, column=1, value=daily_record["date"])
+                worksheet.cell(row=row, column=2, value=daily_record["present"])
+                worksheet.cell(row=row, column=3, value=daily_record["absent"])
+                worksheet.cell(row=row, column=4, value=daily_record["late"])
+                worksheet.cell(row=row, column=5, value=daily_record["outpass"])
+                worksheet.cell(row=row, column=6, value=daily_record["total"])
+                worksheet.cell(row=row, column=7, value=f"{daily_record['attendance_rate']}%")
+                row += 1
+        
+        # Employee breakdown
+        if report_data.get("employee_breakdown"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="EMPLOYEE BREAKDOWN").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            emp_headers = ["Employee ID", "Name", "Department", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
+            for col, header in enumerate(emp_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for emp_record in report_data["employee_breakdown"]:
+                worksheet.cell(row=row, column=1, value=emp_record["employee_id"])
+                worksheet.cell(row=row, column=2, value=emp_record["staff_name"])
+                worksheet.cell(row=row, column=3, value=emp_record["department"])
+                worksheet.cell(row=row, column=4, value=emp_record["present"])
+                worksheet.cell(row=row, column=5, value=emp_record["absent"])
+                worksheet.cell(row=row, column=6, value=emp_record["late"])
+                worksheet.cell(row=row, column=7, value=emp_record["outpass"])
+                worksheet.cell(row=row, column=8, value=emp_record["total"])
+                worksheet.cell(row=row, column=9, value=f"{emp_record['attendance_rate']}%")
+                row += 1
+                
+    elif report_type == "staff_attendance":
+        # Staff details
+        if report_data.get("staff_details"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="STAFF ATTENDANCE DETAILS").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            staff_headers = ["Employee ID", "Name", "Department", "Present", "Absent", "Late", "Outpass", "Total Days", "Attendance Rate", "Punctuality Rate"]
+            for col, header in enumerate(staff_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for staff_record in report_data["staff_details"]:
+                worksheet.cell(row=row, column=1, value=staff_record["employee_id"])
+                worksheet.cell(row=row, column=2, value=staff_record["staff_name"])
+                worksheet.cell(row=row, column=3, value=staff_record["department"])
+                worksheet.cell(row=row, column=4, value=staff_record["present"])
+                worksheet.cell(row=row, column=5, value=staff_record["absent"])
+                worksheet.cell(row=row, column=6, value=staff_record["late"])
+                worksheet.cell(row=row, column=7, value=staff_record["outpass"])
+                worksheet.cell(row=row, column=8, value=staff_record["total_days"])
+                worksheet.cell(row=row, column=9, value=f"{staff_record['attendance_rate']}%")
+                worksheet.cell(row=row, column=10, value=f"{staff_record['punctuality_rate']}%")
+                row += 1
+        
+        # Department summary
+        if report_data.get("department_summary"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="DEPARTMENT SUMMARY").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            dept_headers = ["Department", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
+            for col, header in enumerate(dept_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for dept_record in report_data["department_summary"]:
+                worksheet.cell(row=row, column=1, value=dept_record["department"])
+                worksheet.cell(row=row, column=2, value=dept_record["present"])
+                worksheet.cell(row=row, column=3, value=dept_record["absent"])
+                worksheet.cell(row=row, column=4, value=dept_record["late"])
+                worksheet.cell(row=row, column=5, value=dept_record["outpass"])
+                worksheet.cell(row=row, column=6, value=dept_record["total"])
+                worksheet.cell(row=row, column=7, value=f"{dept_record['attendance_rate']}%")
+                row += 1
+    
+    elif report_type == "student_attendance":
+        # Student details
+        if report_data.get("student_details"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="STUDENT ATTENDANCE DETAILS").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            student_headers = ["Student ID", "Student Name", "Class", "Section", "Status"]
+            for col, header in enumerate(student_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for student_record in report_data["student_details"]:
+                worksheet.cell(row=row, column=1, value=student_record["student_id"])
+                worksheet.cell(row=row, column=2, value=student_record["student_name"])
+                worksheet.cell(row=row, column=3, value=student_record.get("class_name", ""))
+                worksheet.cell(row=row, column=4, value=student_record.get("section_name", ""))
+                worksheet.cell(row=row, column=5, value=student_record["status"].title())
+                row += 1
+        
+        # Class summary
+        if report_data.get("class_summary"):
+            row += 2
+            worksheet.cell(row=row, column=1, value="CLASS-WISE SUMMARY").font = header_font
+            worksheet.cell(row=row, column=1).fill = header_fill
+            row += 1
+            
+            # Headers
+            class_headers = ["Class - Section", "Present", "Absent", "Total", "Attendance Rate"]
+            for col, header in enumerate(class_headers, 1):
+                cell = worksheet.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+            row += 1
+            
+            # Data
+            for class_record in report_data["class_summary"]:
+                worksheet.cell(row=row, column=1, value=class_record["class_section"])
+                worksheet.cell(row=row, column=2, value=class_record["present"])
+                worksheet.cell(row=row, column=3, value=class_record["absent"])
+                worksheet.cell(row=row, column=4, value=class_record["total"])
+                worksheet.cell(row=row, column=5, value=f"{class_record['attendance_rate']}%")
+                row += 1
+    
+    # Auto-adjust column widths (safe for merged cells)
+    for col_idx in range(1, worksheet.max_column + 1):
+        max_length = 0
+        column_letter = get_column_letter(col_idx)
+        for row_idx in range(1, worksheet.max_row + 1):
+            cell = worksheet.cell(row=row_idx, column=col_idx)
+            try:
+                if cell.value and len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 2, 50)
+        worksheet.column_dimensions[column_letter].width = adjusted_width
+    
+    # Save workbook
+    workbook.save(file_path)
+    return file_path
+
+
+def render_attendance_pdf(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate professional PDF report for attendance data with school branding"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.units import inch
+    
+    school_name = branding["school_name"]
+    school_address = branding["school_address"]
+    school_contact = branding["school_contact"]
+    logo_url = branding["logo_url"]
+    
+    template = create_professional_pdf_template(school_name)
+    
+    # Create PDF document with professional margins
+    doc = SimpleDocTemplate(
+        file_path, 
+        pagesize=A4, 
+        rightMargin=50, 
+        leftMargin=50, 
+        topMargin=115,
+        bottomMargin=50
+    )
+    
+    # Build story with professional elements
+    story = []
+    
+    # Report title
+    story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
+    story.append(Spacer(1, 10))
+    
+    # Dynamic filters display
+    filters = report_data.get("filters", {})
+    if filters:
+        filter_para = create_filter_display(filters, template)
+        if filter_para:
+            story.append(filter_para)
+            story.append(Spacer(1, 15))
+    
+    # Professional summary box
+    if report_data.get("summary"):
+        story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
+        summary_table = create_summary_box(report_data["summary"], template)
+        if summary_table:
+            story.append(summary_table)
+            story.append(Spacer(1, 20))
+    
+    # Report-specific sections with professional tables
+    if report_type == "monthly_summary":
+        # Daily breakdown
+        if report_data.get("daily_breakdown"):
+            story.append(Paragraph("DAILY BREAKDOWN", template['styles']['SectionHeading']))
+            headers = ["Date", "Present", "Absent", "Late", "Outpass", "Total", "Rate %"]
+            data_rows = []
+            
+            for daily_record in report_data["daily_breakdown"]:
+                data_rows.append([
+                    daily_record["date"],
+                    str(daily_record["present"]),
+                    str(daily_record["absent"]),
+                    str(daily_record["late"]),
+                    str(daily_record["outpass"]),
+                    str(daily_record["total"]),
+                    f"{daily_record['attendance_rate']}%"
+                ])
+            
+            col_widths = [1.2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch]
+            daily_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(daily_table)
+            story.append(Spacer(1, 20))
+        
+        # Employee breakdown
+        if report_data.get("employee_breakdown"):
+            story.append(Paragraph("EMPLOYEE SUMMARY", template['styles']['SectionHeading']))
+            headers = ["Employee", "Department", "Present", "Absent", "Rate %"]
+            data_rows = []
+            
+            for emp_record in report_data["employee_breakdown"][:50]:  # Show more
+                data_rows.append([
+                    emp_record["staff_name"][:20],
+                    emp_record["department"][:15],
+                    str(emp_record["present"]),
+                    str(emp_record["absent"]),
+                    f"{emp_record['attendance_rate']}%"
+                ])
+            
+            col_widths = [2*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch]
+            emp_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(emp_table)
+            
+    elif report_type == "staff_attendance":
+        # Staff details
+        if report_data.get("staff_details"):
+            story.append(Paragraph("STAFF ATTENDANCE SUMMARY", template['styles']['SectionHeading']))
+            headers = ["Employee", "Department", "Present", "Absent", "Rate %"]
+            data_rows = []
+            
+            for staff_record in report_data["staff_details"][:50]:
+                # Safe handling for None values
+                staff_name = staff_record.get("staff_name") or staff_record.get("employee_id", "Unknown")
+                department = staff_record.get("department") or "N/A"
+                
+                data_rows.append([
+                    str(staff_name)[:20],
+                    str(department)[:15],
+                    str(staff_record.get("present", 0)),
+                    str(staff_record.get("absent", 0)),
+                    f"{staff_record.get('attendance_rate', 0)}%"
+                ])
+            
+            col_widths = [2*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch]
+            staff_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(staff_table)
+            story.append(Spacer(1, 20))
+        
+        # Department summary
+        if report_data.get("department_summary"):
+            story.append(Paragraph("DEPARTMENT SUMMARY", template['styles']['SectionHeading']))
+            headers = ["Department", "Present", "Absent", "Total", "Rate %"]
+            data_rows = []
+            
+            for dept_record in report_data["department_summary"]:
+                data_rows.append([
+                    str(dept_record.get("department", "N/A")),
+                    str(dept_record.get("present", 0)),
+                    str(dept_record.get("absent", 0)),
+                    str(dept_record.get("total", 0)),
+                    f"{dept_record.get('attendance_rate', 0)}%"
+                ])
+            
+            col_widths = [2*inch, 1*inch, 1*inch, 1*inch, 1*inch]
+            dept_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(dept_table)
+    
+    elif report_type == "student_attendance":
+        # Student details
+        if report_data.get("student_details"):
+            story.append(Paragraph("STUDENT ATTENDANCE DETAILS", template['styles']['SectionHeading']))
+            headers = ["Student ID", "Student Name", "Class", "Section", "Status"]
+            data_rows = []
+            
+            for student_record in report_data["student_details"]:
+                data_rows.append([
+                    str(student_record["student_id"])[:15],
+                    student_record["student_name"][:25],
+                    student_record.get("class_name", "")[:15],
+                    student_record.get("section_name", "")[:10],
+                    student_record["status"].title()
+                ])
+            
+            col_widths = [1.2*inch, 2*inch, 1.2*inch, 0.8*inch, 1*inch]
+            student_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(student_table)
+            story.append(Spacer(1, 20))
+        
+        # Class summary
+        if report_data.get("class_summary"):
+            story.append(Paragraph("CLASS-WISE SUMMARY", template['styles']['SectionHeading']))
+            headers = ["Class - Section", "Present", "Absent", "Total", "Rate %"]
+            data_rows = []
+            
+            for class_record in report_data["class_summary"]:
+                data_rows.append([
+                    class_record["class_section"],
+                    str(class_record["present"]),
+                    str(class_record["absent"]),
+                    str(class_record["total"]),
+                    f"{class_record['attendance_rate']}%"
+                ])
+            
+            col_widths = [2*inch, 1*inch, 1*inch, 1*inch, 1.2*inch]
+            class_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+            story.append(class_table)
+    
+    # Build PDF with professional header/footer
+    def add_page_decorations(canvas, doc):
+        add_pdf_header_footer(
+            canvas, 
+            doc, 
+            school_name, 
+            report_data["title"], 
+            branding["generated_by"],
+            page_num_text=True,
+            school_address=school_address,
+            school_contact=school_contact,
+            logo_path=logo_url
+        )
+    
+    doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
+    return file_path
+
+
+def render_transport_excel(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate Excel report for transport data (vehicle, route efficiency, transport fees)"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+    
+    # Create workbook
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
+    
+    # Header styling (Orange theme for transport)
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="FF8C00", end_color="FF8C00", fill_type="solid")
+    
+    # Title
+    worksheet.cell(row=1, column=1, value=report_data["title"]).font = Font(bold=True, size=16)
+    worksheet.cell(row=2, column=1, value=f"Generated: {report_data['generated_date']}")
+    
+    # Summary section
+    row = 4
+    worksheet.cell(row=row, column=1, value="SUMMARY STATISTICS").font = header_font
+    worksheet.cell(row=row, column=1).fill = header_fill
+    row += 1
+    
+    summary = report_data["summary"]
+    for key, value in summary.items():
+        worksheet.cell(row=row, column=1, value=key.replace("_", " ").title())
+        worksheet.cell(row=row, column=2, value=str(value))
+        row += 1
+    
+    # Report-specific data sections
+    if report_type == "vehicle" and report_data.get("vehicles"):
+        row += 2
+        worksheet.cell(row=row, column=1, value="VEHICLE DETAILS").font = header_font
+        worksheet.cell(row=row, column=1).fill = header_fill
+        row += 1
+        
+        # Headers for vehicle data
+        vehicle_headers = ["Vehicle Number", "Type", "Capacity", "Driver", "Route", "Utilization %", "Last Maintenance", "Next Maintenance", "Fuel Efficiency", "Status"]
+        for col, header in enumerate(vehicle_headers, 1):
+            cell = worksheet.cell(row=row, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+        row += 1
+        
+        # Vehicle data
+        for vehicle in report_data["vehicles"]:
+            worksheet.cell(row=row, column=1, value=vehicle.get("vehicle_number", ""))
+            worksheet.cell(row=row, column=2, value=vehicle.get("vehicle_type", ""))
+            worksheet.cell(row=row, column=3, value=vehicle.get("capacity", ""))
+            worksheet.cell(row=row, column=4, value=vehicle.get("driver_name", ""))
+            worksheet.cell(row=row, column=5, value=vehicle.get("route_assigned", ""))
+            worksheet.cell(row=row, column=6, value=vehicle.get("utilization_rate", ""))
+            worksheet.cell(row=row, column=7, value=vehicle.get("last_maintenance", ""))
+            worksheet.cell(row=row, column=8, value=vehicle.get("next_maintenance", ""))
+            worksheet.cell(row=row, column=9, value=vehicle.get("fuel_efficiency", ""))
+            worksheet.cell(row=row, column=10, value=vehicle.get("status", ""))
+            row += 1
+            
+    elif report_type == "route_efficiency" and report_data.get("routes"):
+        row += 2
+        worksheet.cell(row=row, column=1, value="ROUTE PERFORMANCE").font = header_font
+        worksheet.cell(row=row, column=1).fill = header_fill
+        row += 1
+        
+        # Headers for route data
+        route_headers = ["Route Name", "Distance (km)", "Time (min)", "Students", "Pickup Points", "Fuel Cost/Day", "Efficiency", "On-Time %", "Vehicle", "Monthly Cost"]
+        for col, header in enumerate(route_headers, 1):
+            cell = worksheet.cell(row=row, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+        row += 1
+        
+        # Route data
+        for route in report_data["routes"]:
+            worksheet.cell(row=row, column=1, value=route.get("route_name", ""))
+            worksheet.cell(row=row, column=2, value=route.get("distance_km", ""))
+            worksheet.cell(row=row, column=3, value=route.get("average_time_minutes", ""))
+            worksheet.cell(row=row, column=4, value=route.get("students_served", ""))
+            worksheet.cell(row=row, column=5, value=route.get("pickup_points", ""))
+            worksheet.cell(row=row, column=6, value=route.get("fuel_cost_per_day", ""))
+            worksheet.cell(row=row, column=7, value=route.get("efficiency_rating", ""))
+            worksheet.cell(row=row, column=8, value=route.get("on_time_percentage", ""))
+            worksheet.cell(row=row, column=9, value=route.get("vehicle_assigned", ""))
+            worksheet.cell(row=row, column=10, value=route.get("monthly_cost", ""))
+            row += 1
+            
+    elif report_type == "transport_fees" and report_data.get("fee_records"):
+        row += 2
+        worksheet.cell(row=row, column=1, value="FEE COLLECTION DETAILS").font = header_font
+        worksheet.cell(row=row, column=1).fill = header_fill
+        row += 1
+        
+        # Headers for fee data
+        fee_headers = ["Student ID", "Student Name", "Class", "Route", "Month", "Fee Amount", "Paid Amount", "Pending", "Payment Date", "Payment Method", "Status"]
+        for col, header in enumerate(fee_headers, 1):
+            cell = worksheet.cell(row=row, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+        row += 1
+        
+        # Fee data (limit to first 100 records for Excel performance)
+        for fee_record in report_data["fee_records"][:100]:
+            worksheet.cell(row=row, column=1, value=fee_record.get("student_id", ""))
+            worksheet.cell(row=row, column=2, value=fee_record.get("student_name", ""))
+            worksheet.cell(row=row, column=3, value=fee_record.get("class", ""))
+            worksheet.cell(row=row, column=4, value=fee_record.get("route", ""))
+            worksheet.cell(row=row, column=5, value=fee_record.get("month", ""))
+            worksheet.cell(row=row, column=6, value=fee_record.get("fee_amount", ""))
+            worksheet.cell(row=row, column=7, value=fee_record.get("paid_amount", ""))
+            worksheet.cell(row=row, column=8, value=fee_record.get("pending_amount", ""))
+            worksheet.cell(row=row, column=9, value=fee_record.get("payment_date", ""))
+            worksheet.cell(row=row, column=10, value=fee_record.get("payment_method", ""))
+            worksheet.cell(row=row, column=11, value=fee_record.get("status", ""))
+            row += 1
+    
+    # Auto-adjust column widths (safe for merged cells)
+    for col_idx in range(1, worksheet.max_column + 1):
+        max_length = 0
+        column_letter = get_column_letter(col_idx)
+        for row_idx in range(1, worksheet.max_row + 1):
+            cell = worksheet.cell(row=row_idx, column=col_idx)
+            try:
+                if cell.value and len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 2, 50)
+        worksheet.column_dimensions[column_letter].width = adjusted_width
+    
+    # Save workbook
+    workbook.save(file_path)
+    return file_path
+
+
+def render_transport_pdf(report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Generate professional PDF report for transport data with school branding"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.units import inch
+    
+    school_name = branding["school_name"]
+    school_address = branding["school_address"]
+    school_contact = branding["school_contact"]
+    logo_url = branding["logo_url"]
+    
+    # Get professional template
+    template = create_professional_pdf_template(school_name)
+    
+    # Create PDF document with professional margins
+    doc = SimpleDocTemplate(
+        file_path, 
+        pagesize=A4, 
+        rightMargin=50, 
+        leftMargin=50, 
+        topMargin=115,
+        bottomMargin=50
+    )
+    
+    # Build story with professional elements
+    story = []
+    
+    # Report title
+    story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
+    story.append(Spacer(1, 10))
+    
+    # Dynamic filters display
+    filters = report_data.get("filters", {})
+    if filters:
+        filter_para = create_filter_display(filters, template)
+        if filter_para:
+            story.append(filter_para)
+            story.append(Spacer(1, 15))
+    
+    # Professional summary box
+    if report_data.get("summary"):
+        story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
+        summary_table = create_summary_box(report_data["summary"], template)
+        if summary_table:
+            story.append(summary_table)
+            story.append(Spacer(1, 20))
+    
+    # Vehicles section with professional table
+    if report_data.get("vehicles"):
+        story.append(Paragraph("ACTIVE VEHICLES", template['styles']['SectionHeading']))
+        headers = ["Registration", "Type", "Capacity", "Driver", "Status"]
+        data_rows = []
+        
+        for vehicle in report_data["vehicles"][:50]:  # Show more vehicles
+            data_rows.append([
+                vehicle.get("registration", ""),
+                vehicle.get("type", ""),
+                str(vehicle.get("capacity", 0)),
+                vehicle.get("driver_name", "")[:20],
+                vehicle.get("status", "")
+            ])
+        
+        col_widths = [1.3*inch, 1*inch, 0.9*inch, 1.8*inch, 1*inch]
+        vehicle_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+        story.append(vehicle_table)
+        story.append(Spacer(1, 20))
+    
+    # Routes section with professional table
+    if report_data.get("routes"):
+        story.append(Paragraph("ACTIVE ROUTES", template['styles']['SectionHeading']))
+        headers = ["Route Name", "Start Point", "End Point", "Status"]
+        data_rows = []
+        
+        for route in report_data["routes"][:50]:  # Show more routes
+            data_rows.append([
+                route.get("route_name", "")[:25],
+                route.get("start_point", "")[:20],
+                route.get("end_point", "")[:20],
+                route.get("status", "")
+            ])
+        
+        col_widths = [1.8*inch, 1.6*inch, 1.6*inch, 1*inch]
+        route_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
+        story.append(route_table)
+    
+    # Build PDF with professional header/footer
+    def add_page_decorations(canvas, doc):
+        add_pdf_header_footer(
+            canvas, 
+            doc, 
+            school_name, 
+            report_data["title"], 
+            branding["generated_by"],
+            page_num_text=True,
+            school_address=school_address,
+            school_contact=school_contact,
+            logo_path=logo_url
+        )
+    
+    doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
+    return file_path
+
+
+# ==================== WORKER POOL ====================
+
+RENDERERS = {
+    "academic_excel": render_academic_excel,
+    "academic_pdf": render_academic_pdf,
+    "attendance_excel": render_attendance_excel,
+    "attendance_pdf": render_attendance_pdf,
+    "transport_excel": render_transport_excel,
+    "transport_pdf": render_transport_pdf,
+}
+
+
+def _init_worker(memory_limit_mb: int):
+    """Runs once in every freshly spawned worker"""
+    if memory_limit_mb > 0:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:  # Not available on every platform
+            logger.warning(f"Could not apply report worker memory limit: {e}")
+
+
+def render_job(renderer: str, report_type: str, report_data: dict, file_path: str, branding: Dict[str, Any]) -> str:
+    """Process-pool entry point: everything it receives is pickled from the API process"""
+    try:
+        return RENDERERS[renderer](report_type, report_data, file_path, branding)
+    except MemoryError:
+        raise ReportRenderError(f"{renderer} exceeded the {RENDER_MEMORY_LIMIT_MB} MB worker memory limit")
+
+
+class ReportRenderer:
+    def __init__(self, workers: int = RENDER_WORKERS, timeout: float = RENDER_TIMEOUT_SECONDS,
+                 memory_limit_mb: int = RENDER_MEMORY_LIMIT_MB, max_tasks_per_child: int = RENDER_MAX_TASKS_PER_CHILD):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Unfinished jobs per pool, and retired pools still draining them
+        self._pending: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._retired: Dict[ProcessPoolExecutor, asyncio.Task] = {}
+        self.in_flight = 0
+        self.counters = {"rendered": 0, "failed": 0, "timeouts": 0, "pool_restarts": 0}
+        self.render_time_total = 0.0
+        self.render_time_max = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            kwargs: Dict[str, Any] = {
+                "max_workers": self.workers,
+                # Spawned workers import only this module - nothing of the API process leaks in
+                "mp_context": multiprocessing.get_context("spawn"),
+                "initializer": _init_worker,
+                "initargs": (self.memory_limit_mb,),
+            }
+            if self.max_tasks_per_child > 0:
+                kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+            try:
+                self._executor = ProcessPoolExecutor(**kwargs)
+            except TypeError:  # max_tasks_per_child needs Python 3.11+
+                kwargs.pop("max_tasks_per_child", None)
+                self._executor = ProcessPoolExecutor(**kwargs)
+            self._pending[self._executor] = set()
+        return self._executor
+
+    def _submit(self, *args) -> Tuple[ProcessPoolExecutor, Future]:
+        executor = self._pool()
+        future = executor.submit(render_job, *args)
+        pending = self._pending[executor]
+        pending.add(future)
+        future.add_done_callback(pending.discard)
+        return executor, future
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """
+        Stop sending jobs to a pool with a stuck or crashed worker. New jobs get a fresh
+        pool; the old one finishes its other jobs before its processes are terminated,
+        so one runaway report doesn't fail everyone else's. Only the pool the failed job
+        ran on is touched, never whatever pool happens to be current.
+        """
+        if self._executor is executor:
+            self._executor = None
+        if executor in self._retired:
+            return
+        self.counters["pool_restarts"] += 1
+        self._retired[executor] = asyncio.get_running_loop().create_task(self._drain(executor))
+
+    async def _drain(self, executor: ProcessPoolExecutor):
+        try:
+            others = [f for f in self._pending.get(executor, ()) if not f.done()]
+            if others:
+                # Each of those jobs has its own timeout; this only bounds the wait
+                await asyncio.to_thread(wait_futures, others, self.timeout)
+        finally:
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                try:
+                    process.terminate()
+                except Exception:
+                    pass
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._pending.pop(executor, None)
+            self._retired.pop(executor, None)
+
+    async def render(self, renderer: str, report_type: str, report_data: dict, file_path: str,
+                     branding: Optional[Dict[str, Any]] = None) -> str:
+        if renderer not in RENDERERS:
+            raise ReportRenderError(f"Unknown renderer: {renderer}")
+        args = (renderer, report_type, report_data, file_path, branding or {})
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            if self.workers <= 0:
+                # Pool disabled: still keep the blocking build off the event loop
+                result = await asyncio.wait_for(asyncio.to_thread(render_job, *args), timeout=self.timeout)
+            else:
+                executor, future = self._submit(*args)
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self._pending.get(executor, set()).discard(future)
+                    self._retire(executor)
+                    raise
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed by the memory cap); later jobs get a fresh pool
+                    self._retire(executor)
+                    raise ReportRenderError(f"{renderer} worker crashed")
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            self.counters["failed"] += 1
+            raise ReportRenderError(f"{renderer} did not finish within {self.timeout:.0f}s")
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        elapsed = time.perf_counter() - started
+        self.counters["rendered"] += 1
+        self.render_time_total += elapsed
+        self.render_time_max = max(self.render_time_max, elapsed)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        rendered = self.counters["rendered"]
+        return {
+            "mode": "process_pool" if self.workers > 0 else "thread",
+            "workers": self.workers,
+            "pool_started": self._executor is not None,
+            "pools_draining": len(self._retired),
+            "timeout_seconds": self.timeout,
+            "memory_limit_mb": self.memory_limit_mb,
+            "in_flight": self.in_flight,
+            "render_avg_ms": round(self.render_time_total / rendered * 1000, 2) if rendered else 0.0,
+            "render_max_ms": round(self.render_time_max * 1000, 2),
+            **self.counters,
+        }
+
+    def close(self):
+        for task in list(self._retired.values()):
+            task.cancel()
+        for executor in list(self._pending):
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+        self._executor = None
+
+
+report_renderer = None
+
+def get_report_renderer():
+    global report_renderer
+    if report_renderer is None:
+        report_renderer = ReportRenderer()
+    return report_renderer
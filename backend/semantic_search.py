@@ -0,0 +1,635 @@
+"""
+Semantic Q&A Retrieval for GiNi
+When keyword search finds no Q&A knowledge-base entry for a question, GiNi tries this
+tier before calling GPT: paraphrases of a stored question ("why do plants need
+sunlight" vs "explain photosynthesis in plants") often share concepts but not exact terms.
+
+Embeddings are computed locally with no network or model download: stemmed words,
+word bigrams and character 4-grams are feature-hashed, weighted with TF-IDF and
+projected onto an LSA basis (randomized truncated SVD) fitted per (tenant, subject), so
+a large subject cannot crowd a small one out of the basis. Each shard keeps unit-length
+float32 vectors in a memory-mapped file, and a query is one matrix-vector product per
+shard with a cosine threshold. Words the subject has never seen carry no direction in
+the basis, so "structure of the human brain" would land on "structure of the human eye":
+a question with too many such words is not matched at all.
+
+The CMS search index forwards every Q&A write here: new and edited questions are folded
+into their shard's basis and written in place, and a shard is refitted once it has grown
+well past what it was fitted on. `data_versions` ("tenant|semantic_qa") keeps
+workers in step: a worker whose copy is behind rebuilds it.
+"""
+
+import os
+import re
+import json
+import uuid
+import zlib
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReturnDocument
+
+from cms_search import tokenize
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_INDEX_DIR = os.environ.get("SEMANTIC_INDEX_DIR") or os.path.join(tempfile.gettempdir(), "erp_semantic_qa")
+SEMANTIC_DIMENSIONS = int(os.environ.get("SEMANTIC_DIMENSIONS", "128"))
+# Cosine similarity a stored question needs to be served as the answer
+SEMANTIC_MIN_SCORE = float(os.environ.get("SEMANTIC_MIN_SCORE", "0.8"))
+# Share of the query's weight that must fall inside the tenant's basis; below this the
+# question is mostly about things the corpus never mentions and any match is noise
+SEMANTIC_MIN_COVERAGE = float(os.environ.get("SEMANTIC_MIN_COVERAGE", "0.4"))
+# Share of the query's words the shard's questions may never have used
+SEMANTIC_MAX_UNKNOWN = float(os.environ.get("SEMANTIC_MAX_UNKNOWN", "0.25"))
+# Refit the basis once the corpus is this many times larger than when it was fitted
+SEMANTIC_REFIT_GROWTH = float(os.environ.get("SEMANTIC_REFIT_GROWTH", "1.5"))
+SEMANTIC_SAVE_DELAY = float(os.environ.get("SEMANTIC_SAVE_DELAY", "5"))
+# Superseded index generations are removed once nothing has written to them for this long
+GENERATION_RETENTION_SECONDS = 3600
+
+HASH_BITS = 13
+HASH_SIZE = 1 << HASH_BITS
+OVERSAMPLE = 10
+SHARD_MIN_CAPACITY = 64
+
+QA_FIELDS = {"question": 1.0, "chapter_topic": 0.5, "keywords": 0.5}
+QA_PROJECTION = {"id": 1, "question": 1, "chapter_topic": 1, "keywords": 1,
+                 "subject": 1, "class_standard": 1, "school_id": 1, "is_active": 1}
+
+SparseRow = Tuple[np.ndarray, np.ndarray]
+
+
+# ---------- vectorizer ----------
+
+def _hash(feature: str) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h & (HASH_SIZE - 1), (1.0 if h & 0x80000000 else -1.0)
+
+
+def qa_text(doc: Dict[str, Any]) -> List[Tuple[str, float]]:
+    parts = []
+    for field, weight in QA_FIELDS.items():
+        value = doc.get(field)
+        if isinstance(value, (list, tuple)):
+            value = " ".join(str(v) for v in value if v is not None)
+        if value:
+            parts.append((str(value), weight))
+    return parts
+
+
+def features(parts: List[Tuple[str, float]]) -> SparseRow:
+    """Signed hashed features with sublinear term frequency; indices are unique"""
+    counts: Dict[int, float] = {}
+
+    def add(feature: str, weight: float):
+        index, sign = _hash(feature)
+        counts[index] = counts.get(index, 0.0) + sign * weight
+
+    for text, weight in parts:
+        tokens = tokenize(text)
+        for position, token in enumerate(tokens):
+            add(f"w:{token}", weight)
+            if position:
+                add(f"b:{tokens[position - 1]} {token}", 0.5 * weight)
+            padded = f"^{token}$"
+            grams = [padded[i:i + 4] for i in range(max(len(padded) - 3, 1))]
+            for gram in grams:
+                add(f"c:{gram}", 0.5 * weight / len(grams))
+
+    indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    values = np.sign(values) * np.log1p(np.abs(values))
+    keep = values != 0
+    return indices[keep], values[keep]
+
+
+class LsaModel:
+    """TF-IDF weights and a truncated SVD basis fitted to one tenant's questions"""
+
+    def __init__(self, idf: np.ndarray, components: np.ndarray, fitted_docs: int):
+        self.idf = idf
+        self.components = components  # (dimensions, HASH_SIZE), orthonormal rows
+        self.fitted_docs = fitted_docs
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, rows: List[SparseRow], dimensions: int = SEMANTIC_DIMENSIONS, seed: int = 7) -> "LsaModel":
+        n = len(rows)
+        df = np.zeros(HASH_SIZE, dtype=np.float32)
+        for indices, _ in rows:
+            df[indices] += 1
+        idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        weighted = [(indices, _unit(values * idf[indices])) for indices, values in rows]
+        weighted = [(indices, values) for indices, values in weighted if values is not None]
+
+        rank = min(dimensions + OVERSAMPLE, len(weighted))
+        if rank == 0:
+            return cls(idf, np.zeros((0, HASH_SIZE), dtype=np.float32), n)
+
+        # Randomized range finder with one power iteration, on the sparse rows directly
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((HASH_SIZE, rank)).astype(np.float32)
+        sample = _times(weighted, omega)
+        sample = _times(weighted, _transpose_times(weighted, sample))
+        basis, _ = np.linalg.qr(sample)
+        projected = _transpose_times(weighted, basis)  # (HASH_SIZE, rank) = X^T Q
+        left, _, _ = np.linalg.svd(projected, full_matrices=False)
+        components = np.ascontiguousarray(left[:, :dimensions].T, dtype=np.float32)
+        return cls(idf, components, n)
+
+    def unknown_share(self, tokens: List[str]) -> float:
+        """Share of the tokens whose word feature had no document frequency at fit time"""
+        if not tokens:
+            return 1.0
+        unseen = np.log(1 + self.fitted_docs) + 1
+        unknown = sum(1 for token in tokens if self.idf[_hash(f"w:{token}")[0]] >= unseen - 1e-4)
+        return unknown / len(tokens)
+
+    def embed(self, row: SparseRow) -> Tuple[Optional[np.ndarray], float]:
+        """Unit vector in the basis plus the share of the input's weight the basis captures"""
+        indices, values = row
+        weighted = _unit(values * self.idf[indices]) if len(indices) else None
+        if weighted is None or not self.dimensions:
+            return None, 0.0
+        vector = self.components[:, indices] @ weighted
+        coverage = float(np.linalg.norm(vector))
+        if coverage == 0:
+            return None, 0.0
+        return (vector / coverage).astype(np.float32), coverage
+
+
+def _unit(values: np.ndarray) -> Optional[np.ndarray]:
+    norm = float(np.linalg.norm(values))
+    return (values / norm).astype(np.float32) if norm else None
+
+
+def _times(rows: List[SparseRow], dense: np.ndarray) -> np.ndarray:
+    """X @ dense for sparse X given as rows"""
+    out = np.empty((len(rows), dense.shape[1]), dtype=np.float32)
+    for i, (indices, values) in enumerate(rows):
+        out[i] = values @ dense[indices]
+    return out
+
+
+def _transpose_times(rows: List[SparseRow], dense: np.ndarray) -> np.ndarray:
+    """X^T @ dense for sparse X given as rows (indices within a row are unique)"""
+    out = np.zeros((HASH_SIZE, dense.shape[1]), dtype=np.float32)
+    for i, (indices, values) in enumerate(rows):
+        out[indices] += values[:, None] * dense[i]
+    return out
+
+
+# ---------- storage ----------
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", value)[:40] + "-" + format(zlib.crc32(value.encode("utf-8")), "08x")
+
+
+class Shard:
+    """One (tenant, subject): its own LSA basis and a growable memory-mapped float32 matrix"""
+
+    def __init__(self, directory: str, subject: str, model: LsaModel, generation: Optional[str] = None):
+        self.subject = subject
+        self.model = model
+        self.generation = generation or uuid.uuid4().hex[:8]
+        base = os.path.join(directory, f"{_slug(subject or '_')}-{self.generation}")
+        self.path = f"{base}.f32"
+        self.model_path = f"{base}.npz"
+        self.refs: List[Optional[str]] = []
+        self.classes: List[Optional[str]] = []
+        self.schools: List[Optional[str]] = []
+        self.positions: Dict[str, int] = {}
+        self.matrix: Optional[np.memmap] = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def needs_refit(self, added: int) -> bool:
+        # Small shards are refitted on every change (it takes milliseconds); large ones
+        # fold new questions into their basis until they outgrow it
+        fitted = self.model.fitted_docs
+        return fitted < SEMANTIC_DIMENSIONS or len(self) + added > fitted * SEMANTIC_REFIT_GROWTH
+
+    def embed(self, doc: Dict[str, Any]) -> Optional[np.ndarray]:
+        return self.model.embed(features(qa_text(doc)))[0]
+
+    def _map(self, capacity: int):
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.model.dimensions))
+
+    def _grow(self, needed: int):
+        capacity = max(SHARD_MIN_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        tmp_path = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        grown = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(capacity, self.model.dimensions))
+        if self.matrix is not None:
+            grown[:len(self.refs)] = self.matrix[:len(self.refs)]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.path)
+        self._map(capacity)
+
+    def put(self, doc: Dict[str, Any], vector: Optional[np.ndarray]):
+        ref = doc["id"]
+        if vector is None:
+            self.drop(ref)
+            return
+        position = self.positions.get(ref)
+        if position is None:
+            position = len(self.refs)
+            self._grow(position + 1)
+            self.refs.append(ref)
+            self.classes.append(doc.get("class_standard"))
+            self.schools.append(doc.get("school_id"))
+            self.positions[ref] = position
+        else:
+            self.classes[position] = doc.get("class_standard")
+            self.schools[position] = doc.get("school_id")
+        self.matrix[position] = vector
+
+    def drop(self, ref: str):
+        position = self.positions.pop(ref, None)
+        if position is not None:
+            self.refs[position] = None
+            self.matrix[position] = 0  # zero rows never clear the threshold
+
+    def search(self, row: SparseRow, tokens: List[str], k: int, min_score: float,
+               class_standard: Optional[str], school_id: Optional[str]) -> List[Tuple[str, float]]:
+        count = len(self.refs)
+        if not count or self.model.unknown_share(tokens) > SEMANTIC_MAX_UNKNOWN:
+            return []
+        vector, coverage = self.model.embed(row)
+        if vector is None or coverage < SEMANTIC_MIN_COVERAGE:
+            return []
+        scores = np.asarray(self.matrix[:count] @ vector)
+        candidates = np.flatnonzero(scores >= min_score)
+        hits = []
+        for position in candidates[np.argsort(-scores[candidates])]:
+            ref = self.refs[position]
+            if ref is None:
+                continue
+            if class_standard and self.classes[position] != class_standard:
+                continue
+            if school_id and self.schools[position] != school_id:
+                continue
+            hits.append((ref, float(scores[position])))
+            if len(hits) >= k:
+                break
+        return hits
+
+    def save_model(self):
+        with open(self.model_path, "wb") as f:
+            np.savez(f, idf=self.model.idf, components=self.model.components)
+
+    def flush(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+
+    def remove_files(self):
+        # Unlinking is safe while another worker still has the file mapped
+        for path in (self.path, self.model_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def meta(self) -> Dict[str, Any]:
+        return {"subject": self.subject, "generation": self.generation, "fitted_docs": self.model.fitted_docs,
+                "refs": self.refs, "classes": self.classes, "schools": self.schools, "capacity": self.capacity}
+
+    @classmethod
+    def fit(cls, directory: str, subject: str, docs: List[Dict[str, Any]]) -> "Shard":
+        rows = [features(qa_text(doc)) for doc in docs]
+        shard = cls(directory, subject, LsaModel.fit(rows))
+        for doc, row in zip(docs, rows):
+            shard.put(doc, shard.model.embed(row)[0])
+        shard.save_model()
+        shard.flush()
+        return shard
+
+    @classmethod
+    def load(cls, directory: str, meta: Dict[str, Any]) -> "Shard":
+        shard = cls(directory, meta["subject"], None, meta["generation"])
+        with np.load(shard.model_path) as arrays:
+            shard.model = LsaModel(arrays["idf"], arrays["components"], meta["fitted_docs"])
+        shard.refs, shard.classes, shard.schools = meta["refs"], meta["classes"], meta["schools"]
+        shard.positions = {ref: position for position, ref in enumerate(shard.refs) if ref is not None}
+        if meta["capacity"]:
+            shard._map(meta["capacity"])
+        return shard
+
+
+class TenantVectors:
+    def __init__(self, tenant_id: str, directory: str, version: int):
+        self.tenant_id = tenant_id
+        self.directory = directory
+        self.version = version
+        self.shards: Dict[str, Shard] = {}
+        self.subject_of: Dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.subject_of)
+
+    def set_shard(self, shard: Shard):
+        previous = self.shards.get(shard.subject)
+        if previous is not None:
+            for ref in previous.positions:
+                self.subject_of.pop(ref, None)
+            previous.remove_files()
+        self.shards[shard.subject] = shard
+        for ref in shard.positions:
+            self.subject_of[ref] = shard.subject
+
+    def put(self, shard: Shard, doc: Dict[str, Any], vector: Optional[np.ndarray]):
+        shard.put(doc, vector)
+        if doc["id"] in shard.positions:
+            self.subject_of[doc["id"]] = shard.subject
+
+    def drop(self, ref: str):
+        subject = self.subject_of.pop(ref, None)
+        if subject is not None:
+            self.shards[subject].drop(ref)
+
+    def search(self, question: str, k: int, min_score: float, subject: Optional[str] = None,
+               class_standard: Optional[str] = None, school_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        row = features([(question, 1.0)])
+        tokens = sorted(set(tokenize(question)))
+        if subject is not None:
+            shards = [self.shards[subject]] if subject in self.shards else []
+        else:
+            shards = list(self.shards.values())
+        hits = []
+        for shard in shards:
+            hits.extend(shard.search(row, tokens, k, min_score, class_standard, school_id))
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
+
+    def save(self):
+        for shard in self.shards.values():
+            shard.flush()
+        meta = {"tenant_id": self.tenant_id, "version": self.version,
+                "shards": [shard.meta() for shard in self.shards.values()]}
+        tmp_path = os.path.join(self.directory, f"meta.json.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory: str) -> "TenantVectors":
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        vectors = cls(meta["tenant_id"], directory, meta["version"])
+        for shard_meta in meta["shards"]:
+            vectors.set_shard(Shard.load(directory, shard_meta))
+        return vectors
+
+
+# ---------- service ----------
+
+class SemanticSearch:
+    def __init__(self, db, directory: str = SEMANTIC_INDEX_DIR):
+        self.db = db
+        self.directory = directory
+        self._tenants: Dict[str, TenantVectors] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._save_tasks: Dict[str, asyncio.Task] = {}
+        self.counters = {"queries": 0, "hits": 0, "misses": 0, "builds": 0, "loads": 0,
+                         "updates": 0, "refits": 0, "stale": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------- versions ----------
+
+    def _version_id(self, tenant_id: str) -> str:
+        return f"{tenant_id}|semantic_qa"
+
+    async def _current_version(self, tenant_id: str) -> int:
+        doc = await self.db.data_versions.find_one({"_id": self._version_id(tenant_id)}, {"version": 1})
+        return doc.get("version", 0) if doc else 0
+
+    async def _bump_version(self, tenant_id: str) -> int:
+        doc = await self.db.data_versions.find_one_and_update(
+            {"_id": self._version_id(tenant_id)},
+            {"$inc": {"version": 1},
+             "$set": {"tenant_id": tenant_id, "collection": "semantic_qa", "changed_at": datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+    async def invalidate(self, tenant_id: str):
+        """Force a rebuild on the next query"""
+        await self._bump_version(tenant_id)
+
+    # ---------- building ----------
+
+    def _tenant_root(self, tenant_id: str) -> str:
+        return os.path.join(self.directory, _slug(tenant_id))
+
+    def _read(self, tenant_id: str) -> Optional[TenantVectors]:
+        root = self._tenant_root(tenant_id)
+        try:
+            with open(os.path.join(root, "current")) as f:
+                generation = f.read().strip()
+            return TenantVectors.load(os.path.join(root, generation))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[SEMANTIC] Discarding unreadable vectors for tenant {tenant_id}: {str(e)}")
+            return None
+
+    def _build_files(self, tenant_id: str, version: int, docs: List[Dict[str, Any]]) -> TenantVectors:
+        root = self._tenant_root(tenant_id)
+        generation = f"v{version}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(root, generation)
+        os.makedirs(directory, exist_ok=True)
+
+        by_subject: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in docs:
+            by_subject.setdefault(doc.get("subject") or "", []).append(doc)
+        vectors = TenantVectors(tenant_id, directory, version)
+        for subject, subject_docs in by_subject.items():
+            vectors.set_shard(Shard.fit(directory, subject, subject_docs))
+        vectors.save()
+
+        # Point readers at the new generation, then drop generations no worker has written to lately
+        pointer = os.path.join(root, f"current.{uuid.uuid4().hex[:8]}.tmp")
+        with open(pointer, "w") as f:
+            f.write(generation)
+        os.replace(pointer, os.path.join(root, "current"))
+        cutoff = time.time() - GENERATION_RETENTION_SECONDS
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if name != generation and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+        return vectors
+
+    def _active_qa(self, tenant_id: str, subject: Optional[str] = None):
+        query: Dict[str, Any] = {"tenant_id": tenant_id, "is_active": True}
+        if subject is not None:
+            # Shards group missing and empty subjects together
+            query["subject"] = subject if subject else {"$in": [None, ""]}
+        return self.db.qa_knowledge_base.find(query, QA_PROJECTION).batch_size(1000)
+
+    async def _build(self, tenant_id: str, version: int) -> TenantVectors:
+        docs = [doc async for doc in self._active_qa(tenant_id)]
+        vectors = await asyncio.to_thread(self._build_files, tenant_id, version, docs)
+        self.counters["builds"] += 1
+        logger.info(f"[SEMANTIC] Built {len(vectors)} Q&A vectors in {len(vectors.shards)} subject shards "
+                    f"for tenant {tenant_id}")
+        return vectors
+
+    async def vectors_for(self, tenant_id: str) -> TenantVectors:
+        version = await self._current_version(tenant_id)
+        vectors = self._tenants.get(tenant_id)
+        if vectors is not None and vectors.version == version:
+            return vectors
+
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            vectors = self._tenants.get(tenant_id)
+            if vectors is not None and vectors.version >= version:
+                return vectors
+            vectors = await asyncio.to_thread(self._read, tenant_id)
+            if vectors is not None and vectors.version == version:
+                self.counters["loads"] += 1
+            else:
+                if vectors is not None:
+                    self.counters["stale"] += 1
+                vectors = await self._build(tenant_id, version)
+            self._tenants[tenant_id] = vectors
+            return vectors
+
+    # ---------- incremental updates ----------
+
+    async def on_cms_change(self, tenant_id: str, kind: str, docs: Dict[str, Dict[str, Any]], refs: Tuple[str, ...]):
+        """CMS search index listener: fold changed Q&A entries into the tenant's subject shards"""
+        if kind != "qa":
+            return
+        version = await self._bump_version(tenant_id)
+        vectors = self._tenants.get(tenant_id)
+        if vectors is None:
+            return
+        if vectors.version != version - 1:
+            self.counters["stale"] += 1
+            return
+
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            for ref in refs:
+                vectors.drop(ref)
+            by_subject: Dict[str, List[Dict[str, Any]]] = {}
+            for doc in docs.values():
+                if doc.get("is_active", True):
+                    by_subject.setdefault(doc.get("subject") or "", []).append(doc)
+
+            for subject, changed in by_subject.items():
+                shard = vectors.shards.get(subject)
+                if shard is None or shard.needs_refit(len(changed)):
+                    subject_docs = [doc async for doc in self._active_qa(tenant_id, subject)]
+                    shard = await asyncio.to_thread(Shard.fit, vectors.directory, subject, subject_docs)
+                    vectors.set_shard(shard)
+                    self.counters["refits"] += 1
+                else:
+                    embedded = await asyncio.to_thread(lambda: [shard.embed(doc) for doc in changed])
+                    for doc, vector in zip(changed, embedded):
+                        vectors.put(shard, doc, vector)
+            vectors.version = version
+            self.counters["updates"] += len(refs)
+        self._schedule_save(tenant_id)
+
+    def _schedule_save(self, tenant_id: str):
+        task = self._save_tasks.get(tenant_id)
+        if task is None or task.done():
+            self._save_tasks[tenant_id] = asyncio.create_task(self._save_later(tenant_id))
+
+    async def _save_later(self, tenant_id: str):
+        await asyncio.sleep(SEMANTIC_SAVE_DELAY)
+        await self._save(tenant_id)
+
+    async def _save(self, tenant_id: str):
+        vectors = self._tenants.get(tenant_id)
+        if vectors is None:
+            return
+        try:
+            await asyncio.to_thread(vectors.save)
+        except Exception as e:
+            logger.error(f"[SEMANTIC] Failed to persist vectors for tenant {tenant_id}: {str(e)}")
+
+    async def flush(self):
+        """Write pending shard metadata now (shutdown)"""
+        pending = [tenant_id for tenant_id, task in self._save_tasks.items() if not task.done()]
+        for tenant_id in pending:
+            self._save_tasks.pop(tenant_id).cancel()
+            await self._save(tenant_id)
+
+    # ---------- querying ----------
+
+    async def search(self, tenant_id: str, question: str, k: int = 3, min_score: float = SEMANTIC_MIN_SCORE,
+                     subject: Optional[str] = None, class_standard: Optional[str] = None,
+                     school_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        if not question or not question.strip():
+            return []
+        vectors = await self.vectors_for(tenant_id)
+        hits = vectors.search(question, k, min_score, subject, class_standard, school_id)
+        self.counters["queries"] += 1
+        self.counters["hits" if hits else "misses"] += 1
+        return hits
+
+    async def documents(self, tenant_id: str, question: str, k: int = 3, **filters) -> List[Dict[str, Any]]:
+        """Matching Q&A entries in similarity order, each with its `similarity`"""
+        hits = await self.search(tenant_id, question, k, **filters)
+        if not hits:
+            return []
+        found = {
+            doc["id"]: doc async for doc in self.db.qa_knowledge_base.find(
+                {"tenant_id": tenant_id, "is_active": True, "id": {"$in": [ref for ref, _ in hits]}}
+            )
+        }
+        ranked = []
+        for ref, score in hits:
+            doc = found.get(ref)
+            if doc is not None:
+                doc["similarity"] = round(score, 4)
+                ranked.append(doc)
+        return ranked
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "directory": self.directory,
+            "tenants_loaded": len(self._tenants),
+            "vectors": sum(len(vectors) for vectors in self._tenants.values()),
+            "shards": sum(len(vectors.shards) for vectors in self._tenants.values()),
+            "dimensions": SEMANTIC_DIMENSIONS,
+            "min_score": SEMANTIC_MIN_SCORE,
+            "max_unknown": SEMANTIC_MAX_UNKNOWN,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            **self.counters,
+        }
+
+
+semantic_search = None
+
+def get_semantic_search(db) -> SemanticSearch:
+    global semantic_search
+    if semantic_search is None:
+        semantic_search = SemanticSearch(db)
+    return semantic_search
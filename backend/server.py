@@ -1,17 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, File, UploadFile, BackgroundTasks, Header
 from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel, Field, EmailStr, field_validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union, Literal
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from pathlib import Path
 
 import os
+import json
 import logging
 import uuid
 import asyncio
@@ -28,13 +31,32 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 import tempfile
 import requests
-from twilio.rest import Client
 import io
 import pandas as pd
 import csv
 import cloudinary
 import cloudinary.uploader
 from notification_service import get_notification_service, NotificationEventType
+from notification_receipts import audience_filter
+from db_indexes import get_index_manager
+from pagination import fetch_page, ndjson_response
+from export_streaming import cursor_rows, csv_response, xlsx_response, write_xlsx
+from ttl_cache import TTLCache
+from biometric_db import (
+    get_biometric_pool, UPDATE_DEVICE_SEEN_SQL, LATEST_DEVICE_PUNCH_SQL
+)
+from attendance_state import get_attendance_state_tracker, ShiftThresholds
+from biometric_live import get_live_attendance_hub, RECENT_PUNCHES_SQL
+from report_rendering import (
+    get_report_renderer, create_professional_pdf_template, add_pdf_header_footer,
+    create_filter_display, create_summary_box, create_data_table
+)
+from report_cache import get_report_cache
+from cms_search import get_cms_search_index, ANSWER_MIN_MATCH
+from semantic_search import get_semantic_search
+from answer_cache import get_answer_cache
+from reminder_dispatcher import ReminderDispatcher
+from message_transport import get_message_transports
 
 
 ROOT_DIR = Path(__file__).parent
@@ -51,6 +73,17 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 notification_svc = get_notification_service(db)
+index_manager = get_index_manager(db)
+biometric_pool = get_biometric_pool()
+attendance_state = get_attendance_state_tracker()
+live_attendance = get_live_attendance_hub(db)
+report_renderer = get_report_renderer()
+report_cache = get_report_cache(db)
+cms_search = get_cms_search_index(db)
+semantic_search = get_semantic_search(db)
+cms_search.add_listener(semantic_search.on_cms_change)
+answer_cache = get_answer_cache(db)
+message_transports = get_message_transports()
 
 # ==================== MongoDB Serialization Utility ====================
 def sanitize_mongo_data(data: Any) -> Any:
@@ -180,28 +213,56 @@ def extract_tenant_from_host(host: str) -> Optional[str]:
     
     return None
 
+# Host -> (tenant_id, school_id). Resolution depends only on the Host header and the
+# tenant's active school, so it is safe to share across requests for a short TTL.
+host_resolution_cache = TTLCache(
+    maxsize=int(os.environ.get('HOST_RESOLUTION_CACHE_SIZE', '1000')),
+    ttl=float(os.environ.get('HOST_RESOLUTION_CACHE_TTL_SECONDS', '300')),
+    name="host_resolution"
+)
+
+# Requests that never read tenant context - static assets and liveness probes
+TENANT_RESOLUTION_SKIP_PREFIXES = ("/health", "/uploads/", "/static/", "/favicon.ico")
+
+def invalidate_host_resolution(tenant_id: Optional[str] = None):
+    """Drop cached host resolutions for a tenant, or all of them when the tenant is unknown"""
+    if tenant_id is None:
+        host_resolution_cache.clear()
+    else:
+        host_resolution_cache.invalidate_where(lambda _, value: value[0] == tenant_id)
+
 async def tenant_resolver_middleware(request: Request, call_next):
     """Middleware to resolve tenant and school context - SECURE VERSION"""
+    if request.url.path.startswith(TENANT_RESOLUTION_SKIP_PREFIXES):
+        return await call_next(request)
+    
     # Extract tenant ONLY from trusted sources (subdomain/host, never from headers)
     host = request.headers.get('host', '')
-    tenant_from_host = extract_tenant_from_host(host)
     
-    # SECURITY: Only use host-based tenant resolution, never headers
-    # This prevents tenant spoofing attacks via X-Tenant-Id header manipulation
-    resolved_tenant = tenant_from_host or DEFAULT_TENANT_ID
-    resolved_school_id = DEFAULT_SCHOOL_ID
-    
-    # Try to resolve school for this tenant
-    try:
-        if resolved_tenant:
-            school = await db.schools.find_one({
-                "tenant_id": resolved_tenant, 
-                "is_active": True
-            })
-            if school:
-                resolved_school_id = school["id"]
-    except Exception as e:
-        logging.error(f"Error resolving school context: {e}")
+    cached = host_resolution_cache.get(host)
+    if cached is not None:
+        resolved_tenant, resolved_school_id = cached
+    else:
+        tenant_from_host = extract_tenant_from_host(host)
+        
+        # SECURITY: Only use host-based tenant resolution, never headers
+        # This prevents tenant spoofing attacks via X-Tenant-Id header manipulation
+        resolved_tenant = tenant_from_host or DEFAULT_TENANT_ID
+        resolved_school_id = DEFAULT_SCHOOL_ID
+        
+        # Try to resolve school for this tenant
+        try:
+            if resolved_tenant:
+                school = await db.schools.find_one({
+                    "tenant_id": resolved_tenant, 
+                    "is_active": True
+                }, {"id": 1})
+                if school:
+                    resolved_school_id = school["id"]
+            host_resolution_cache.set(host, (resolved_tenant, resolved_school_id))
+        except Exception as e:
+            # Don't cache failures - the next request retries the lookup
+            logging.error(f"Error resolving school context: {e}")
     
     # Store ONLY in request.state (no global mutation)
     request.state.tenant_id = resolved_tenant
@@ -263,6 +324,21 @@ class AuditLog(BaseModel):
     ip_address: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BackgroundJob(BaseModel):
+    """Progress record for long-running batch operations (billing, reminders, ...)"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tenant_id: str
+    job_type: str  # "billing_cycle_generation", ...
+    status: str = "running"  # running, completed, failed
+    total: int = 0
+    processed: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
 class Tenant(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -391,6 +467,11 @@ class Student(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class StudentPage(BaseModel):
+    items: List[Student]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 class StudentCreate(BaseModel):
     admission_no: str
     roll_no: str
@@ -500,6 +581,11 @@ class Staff(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class StaffPage(BaseModel):
+    items: List[Staff]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 class StaffCreate(BaseModel):
     employee_id: Optional[str] = None  # Auto-generated if not provided
     name: str
@@ -1404,28 +1490,59 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# Authenticated principals are cached per worker for a short revalidation window so
+# the signed token's claims can be trusted without a users lookup on every request.
+# Admin changes to a user invalidate the entry immediately on the worker that made them;
+# other workers pick the change up when the TTL expires.
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', '5000')),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60')),
+    name="principals"
+)
+tenant_cache = TTLCache(
+    maxsize=int(os.environ.get('TENANT_CACHE_SIZE', '500')),
+    ttl=float(os.environ.get('TENANT_CACHE_TTL_SECONDS', '300')),
+    name="tenants"
+)
+
+def invalidate_principal(user_id: str, tenant_id: Optional[str] = None):
+    """Evict a cached principal after the user's record changes"""
+    if tenant_id is not None:
+        principal_cache.invalidate((user_id, tenant_id))
+    else:
+        principal_cache.invalidate_where(lambda key, _: key[0] == user_id)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
         user_id: str = payload.get("sub")
         tenant_id: str = payload.get("tenant_id")
         school_id: str = payload.get("school_id")  # Added school_id support
-        
-        logging.info(f"DEBUG JWT Token - user_id: {user_id}, tenant_id: {tenant_id}")
+        token_role: Optional[str] = payload.get("role")
         
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
-        user = await db.users.find_one({"id": user_id, "tenant_id": tenant_id})
-        logging.info(f"DEBUG MongoDB Query - Looking for user with id='{user_id}', found: {user is not None}")
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+        cache_key = (user_id, tenant_id)
+        cached_user: Optional[User] = principal_cache.get(cache_key)
+        
+        # A token minted after a role change must not be served the old role
+        if cached_user is not None and token_role and cached_user.role != token_role:
+            principal_cache.invalidate(cache_key)
+            cached_user = None
         
-        logging.info(f"DEBUG get_current_user: Fetched from DB - username='{user.get('username')}', role='{user.get('role')}'")
+        if cached_user is None:
+            user = await db.users.find_one({"id": user_id, "tenant_id": tenant_id}, {"password_hash": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            cached_user = User(**user)
+            principal_cache.set(cache_key, cached_user)
         
-        # Add school_id to user object if available
-        user_obj = User(**user)
-        logging.info(f"DEBUG get_current_user: After User() creation - username='{user_obj.username}', role='{user_obj.role}'")
+        if not cached_user.is_active:
+            raise HTTPException(status_code=401, detail="User account is inactive")
+        
+        # Add school_id to user object if available (copy so the cached principal stays pristine)
+        user_obj = cached_user.copy()
         if school_id:
             user_obj.school_id = school_id
             
@@ -1434,10 +1551,63 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
 async def get_current_tenant(user: User = Depends(get_current_user)):
-    tenant = await db.tenants.find_one({"id": user.tenant_id})
-    if not tenant:
-        raise HTTPException(status_code=404, detail="Tenant not found")
-    return Tenant(**tenant)
+    tenant_obj = tenant_cache.get(user.tenant_id)
+    if tenant_obj is None:
+        tenant = await db.tenants.find_one({"id": user.tenant_id})
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+        tenant_obj = Tenant(**tenant)
+        tenant_cache.set(user.tenant_id, tenant_obj)
+    return tenant_obj
+
+# ==================== BACKGROUND JOBS ====================
+
+async def create_job(tenant_id: str, job_type: str, created_by: Optional[str] = None, total: int = 0) -> BackgroundJob:
+    job = BackgroundJob(tenant_id=tenant_id, job_type=job_type, created_by=created_by, total=total)
+    await db.background_jobs.insert_one(job.dict())
+    return job
+
+async def update_job_progress(job_id: str, processed: int, total: Optional[int] = None):
+    update = {"processed": processed, "updated_at": datetime.utcnow()}
+    if total is not None:
+        update["total"] = total
+    await db.background_jobs.update_one({"id": job_id}, {"$set": update})
+
+async def finish_job(job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+    now = datetime.utcnow()
+    await db.background_jobs.update_one(
+        {"id": job_id},
+        {"$set": {
+            "status": "failed" if error else "completed",
+            "result": result,
+            "error": error,
+            "updated_at": now,
+            "finished_at": now
+        }}
+    )
+
+# The event loop only keeps weak references to tasks; hold background jobs here until
+# they finish so one can't be garbage-collected mid-run, and log the ones that crash
+background_tasks = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_coro().__qualname__} failed: {task.exception()!r}")
+
+@api_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+    """Get progress of a background job started by a batch endpoint"""
+    job = await db.background_jobs.find_one({"id": job_id, "tenant_id": current_user.tenant_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return sanitize_mongo_data(job)
 
 # ==================== BOOTSTRAP/SEED DATA ====================
 
@@ -1966,6 +2136,7 @@ async def update_user(
         {"id": user_id, "tenant_id": current_user.tenant_id},
         {"$set": update_data}
     )
+    invalidate_principal(user_id, current_user.tenant_id)
     
     # Log admin action
     await log_admin_action(
@@ -2015,6 +2186,7 @@ async def change_user_status(
         {"id": user_id, "tenant_id": current_user.tenant_id},
         {"$set": {"is_active": is_active, "updated_at": datetime.utcnow()}}
     )
+    invalidate_principal(user_id, current_user.tenant_id)
     
     # Log admin action
     action = "user_activated" if is_active else "user_suspended"
@@ -2065,6 +2237,7 @@ async def delete_user(
         "id": user_id,
         "tenant_id": current_user.tenant_id
     })
+    invalidate_principal(user_id, current_user.tenant_id)
     
     # Log admin action
     await log_admin_action(
@@ -2118,6 +2291,7 @@ async def reset_user_password(
         {"id": user_id, "tenant_id": current_user.tenant_id},
         {"$set": {"password_hash": hashed_password, "updated_at": datetime.utcnow()}}
     )
+    invalidate_principal(user_id, current_user.tenant_id)
     
     # Log admin action
     await log_admin_action(
@@ -2176,9 +2350,11 @@ async def system_reset(
         # Delete student data (not users)
         await db.students.delete_many({"tenant_id": current_user.tenant_id})
         await db.attendance.delete_many({"tenant_id": current_user.tenant_id})
+        await report_cache.touch(current_user.tenant_id, "students", "attendance")
         await db.fees.delete_many({"tenant_id": current_user.tenant_id})
         await db.student_fees.delete_many({"tenant_id": current_user.tenant_id})
         await db.fee_payments.delete_many({"tenant_id": current_user.tenant_id})
+        await db.fee_totals.delete_many({"tenant_id": current_user.tenant_id})  # rebuilt on next read
         await db.student_route_assignments.delete_many({"tenant_id": current_user.tenant_id})
         
         # Log admin action
@@ -2241,6 +2417,7 @@ async def create_tenant(tenant_data: TenantCreate, current_user: User = Depends(
         "updated_at": datetime.utcnow()
     }
     await db.schools.insert_one(school)
+    invalidate_host_resolution(tenant.id)
     
     # Auto-create an institution record
     institution = {
@@ -2292,6 +2469,8 @@ async def update_tenant_modules(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    tenant_cache.invalidate(tenant_id)
+    invalidate_host_resolution(tenant_id)
     
     return {"message": "Tenant modules updated successfully", "allowed_modules": module_data.allowed_modules}
 
@@ -2385,6 +2564,7 @@ async def get_institution(current_user: User = Depends(get_current_user)):
     )
     
     await db.institutions.insert_one(default_institution.dict())
+    await report_cache.touch(current_user.tenant_id, "institutions")
     return default_institution
 
 @api_router.put("/institution", response_model=Institution)
@@ -2412,6 +2592,7 @@ async def update_institution(
         
         new_institution = Institution(**institution_dict)
         await db.institutions.insert_one(new_institution.dict())
+        await report_cache.touch(current_user.tenant_id, "institutions")
         return new_institution
     
     # Update existing institution
@@ -2426,6 +2607,7 @@ async def update_institution(
         },
         {"$set": update_data}
     )
+    await report_cache.touch(current_user.tenant_id, "institutions")
     
     updated_institution = await db.institutions.find_one({
         "tenant_id": current_user.tenant_id,
@@ -2477,18 +2659,26 @@ async def upload_institution_logo(
         {"tenant_id": current_user.tenant_id, "is_active": True},
         {"$set": {"logo_url": logo_url, "updated_at": datetime.utcnow()}}
     )
+    await report_cache.touch(current_user.tenant_id, "institutions")
     
     return {"message": "Logo uploaded successfully", "logo_url": logo_url}
 
 # ==================== STUDENT MANAGEMENT ====================
 
-@api_router.get("/students", response_model=List[Student])
+@api_router.get("/students", response_model=Union[List[Student], StudentPage])
 async def get_students(
     class_id: Optional[str] = None,
     section_id: Optional[str] = None,
     search: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
+    """
+    List students. Pass `limit`/`after` for keyset pagination (response includes
+    `next_cursor`), or `format=ndjson` to stream every matching row.
+    """
     query = {"tenant_id": current_user.tenant_id, "is_active": True}
     
     if class_id:
@@ -2502,6 +2692,12 @@ async def get_students(
             {"roll_no": {"$regex": search, "$options": "i"}}
         ]
     
+    sort = [("id", 1)]
+    if format == "ndjson":
+        return ndjson_response(db.students, query, sort, after, transform=lambda s: Student(**s).dict())
+    if after or limit:
+        return await fetch_page(db.students, query, sort, after, limit, transform=lambda s: Student(**s))
+    
     students = await db.students.find(query).to_list(1000)
     return [Student(**student) for student in students]
 
@@ -2580,6 +2776,7 @@ async def create_student(student_data: StudentCreate, current_user: User = Depen
     
     try:
         await db.students.insert_one(student.dict())
+        await report_cache.touch(current_user.tenant_id, "students")
     except Exception as e:
         # Rollback user creation if student creation fails
         await db.users.delete_one({"id": user_id})
@@ -2698,6 +2895,7 @@ async def update_student(
         {"id": student_id, "tenant_id": current_user.tenant_id},
         {"$set": update_data}
     )
+    await report_cache.touch(current_user.tenant_id, "students")
     
     updated_student = await db.students.find_one({
         "id": student_id,
@@ -2727,6 +2925,7 @@ async def delete_student(
         {"id": student_id, "tenant_id": current_user.tenant_id},
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
+    await report_cache.touch(current_user.tenant_id, "students")
     
     return {"message": "Student deleted successfully", "id": student_id}
 
@@ -3081,6 +3280,7 @@ async def import_students(
                     "suggestion": "Please check the data format and try again"
                 })
         
+        await report_cache.touch(current_user.tenant_id, "students")
         return {
             "imported_count": imported_count,
             "total_rows": len(df),
@@ -3177,6 +3377,11 @@ async def download_staff_import_sample():
         logging.error(f"Failed to download staff sample template: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to download staff sample template: {str(e)}")
 
+STUDENT_EXPORT_HEADERS = [
+    "Admission No", "Roll No", "Name", "Father's Name", "Mother's Name", "Date of Birth", "Gender",
+    "Class", "Section", "Phone", "Email", "Address", "Guardian Name", "Guardian Phone"
+]
+
 @api_router.get("/students/export")
 async def export_students(
     format: str = "csv",
@@ -3193,100 +3398,51 @@ async def export_students(
         if section_id:
             query["section_id"] = section_id
         
-        # Fetch students
-        students = await db.students.find(query).to_list(1000)
-        
-        if not students:
+        if not await db.students.find_one(query, {"_id": 1}):
             raise HTTPException(status_code=404, detail="No students found")
         
-        # Fetch classes and sections for display names
-        classes = await db.classes.find({"tenant_id": current_user.tenant_id}).to_list(1000)
-        sections = await db.sections.find({"tenant_id": current_user.tenant_id}).to_list(1000)
-        
-        class_map = {c["id"]: f"{c['name']} ({c['standard']})" for c in classes}
-        section_map = {s["id"]: s["name"] for s in sections}
+        # Class/section display names, resolved once for the whole export
+        class_map = {
+            c["id"]: f"{c['name']} ({c.get('standard', '')})"
+            async for c in db.classes.find({"tenant_id": current_user.tenant_id}, {"_id": 0, "id": 1, "name": 1, "standard": 1})
+        }
+        section_map = {
+            sec["id"]: sec["name"]
+            async for sec in db.sections.find({"tenant_id": current_user.tenant_id}, {"_id": 0, "id": 1, "name": 1})
+        }
         
-        # Prepare data
-        export_data = []
-        for student in students:
-            export_data.append({
-                "Admission No": student.get("admission_no", ""),
-                "Roll No": student.get("roll_no", ""),
-                "Name": student.get("name", ""),
-                "Father's Name": student.get("father_name", ""),
-                "Mother's Name": student.get("mother_name", ""),
-                "Date of Birth": student.get("date_of_birth", ""),
-                "Gender": student.get("gender", ""),
-                "Class": class_map.get(student.get("class_id"), ""),
-                "Section": section_map.get(student.get("section_id"), ""),
-                "Phone": student.get("phone", ""),
-                "Email": student.get("email", ""),
-                "Address": student.get("address", ""),
-                "Guardian Name": student.get("guardian_name", ""),
-                "Guardian Phone": student.get("guardian_phone", "")
-            })
+        def student_row(student):
+            return [
+                student.get("admission_no", ""),
+                student.get("roll_no", ""),
+                student.get("name", ""),
+                student.get("father_name", ""),
+                student.get("mother_name", ""),
+                student.get("date_of_birth", ""),
+                student.get("gender", ""),
+                class_map.get(student.get("class_id"), ""),
+                section_map.get(student.get("section_id"), ""),
+                student.get("phone", ""),
+                student.get("email", ""),
+                student.get("address", ""),
+                student.get("guardian_name", ""),
+                student.get("guardian_phone", "")
+            ]
         
         if format == "csv":
-            # Create CSV
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=export_data[0].keys())
-            writer.writeheader()
-            writer.writerows(export_data)
-            
-            # Return as downloadable file
-            return StreamingResponse(
-                iter([output.getvalue()]),
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename=students_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
+            return csv_response(
+                cursor_rows(db.students.find(query, {"_id": 0}), student_row),
+                STUDENT_EXPORT_HEADERS,
+                f"students_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             )
         
         elif format == "excel":
-            # Create Excel file
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Students"
-            
-            # Header style
-            header_fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            
-            # Write headers
-            headers = list(export_data[0].keys())
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Write data
-            for row_num, student in enumerate(export_data, 2):
-                for col_num, value in enumerate(student.values(), 1):
-                    ws.cell(row=row_num, column=col_num, value=value)
-            
-            # Adjust column widths (safe for merged cells)
-            from openpyxl.utils import get_column_letter
-            for col_idx in range(1, ws.max_column + 1):
-                max_length = 0
-                column_letter = get_column_letter(col_idx)
-                for row_idx in range(1, ws.max_row + 1):
-                    cell = ws.cell(row=row_idx, column=col_idx)
-                    try:
-                        if cell.value and len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Save to bytes
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            return StreamingResponse(
-                output,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename=students_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"}
+            return await xlsx_response(
+                cursor_rows(db.students.find(query, {"_id": 0}), student_row),
+                STUDENT_EXPORT_HEADERS,
+                f"students_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                "Students",
+                widths=[15, 10, 25, 25, 25, 14, 10, 20, 10, 15, 30, 40, 25, 16]
             )
         
         elif format == "pdf":
@@ -3355,9 +3511,13 @@ async def export_students(
                 elements.append(Spacer(1, 15))
             
             # Summary statistics
-            total_students = len(students)
-            total_male = len([s for s in students if s.get("gender") == "Male"])
-            total_female = len([s for s in students if s.get("gender") == "Female"])
+            gender_counts = {
+                row["_id"]: row["count"]
+                async for row in db.students.aggregate([{"$match": query}, {"$group": {"_id": "$gender", "count": {"$sum": 1}}}])
+            }
+            total_students = sum(gender_counts.values())
+            total_male = gender_counts.get("Male", 0)
+            total_female = gender_counts.get("Female", 0)
             
             summary_data = {
                 "Total Students": str(total_students),
@@ -3376,7 +3536,8 @@ async def export_students(
             headers = ["Admission No", "Name", "Class", "Section", "Guardian", "Phone"]
             data_rows = []
             
-            for student in students[:100]:  # Limit for PDF performance
+            students = await db.students.find(query, {"_id": 0}).limit(100).to_list(100)  # Limit for PDF performance
+            for student in students:
                 data_rows.append([
                     student.get("admission_no", "")[:15],
                     student.get("name", "")[:25],
@@ -3660,9 +3821,20 @@ async def remove_tag_from_staff(
 
 # ==================== STAFF MANAGEMENT ====================
 
-@api_router.get("/staff", response_model=List[Staff])
-async def get_staff(current_user: User = Depends(get_current_user)):
+@api_router.get("/staff", response_model=Union[List[Staff], StaffPage])
+async def get_staff(
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     query = {"tenant_id": current_user.tenant_id, "is_active": True}
+    sort = [("id", 1)]
+    if format == "ndjson":
+        return ndjson_response(db.staff, query, sort, after, transform=lambda m: Staff(**m).dict())
+    if after or limit:
+        return await fetch_page(db.staff, query, sort, after, limit, transform=lambda m: Staff(**m))
+    
     staff = await db.staff.find(query).to_list(1000)
     return [Staff(**member) for member in staff]
 
@@ -3714,6 +3886,8 @@ async def create_staff(staff_data: StaffCreate, current_user: User = Depends(get
                 "updated_at": datetime.utcnow()
             }
             await db.schools.insert_one(school)
+            await report_cache.touch(current_user.tenant_id, "schools")
+            invalidate_host_resolution(current_user.tenant_id)
             logging.info(f"Created school from institution for tenant {current_user.tenant_id}")
         else:
             # No school or institution - create a default
@@ -3730,6 +3904,8 @@ async def create_staff(staff_data: StaffCreate, current_user: User = Depends(get
                 "updated_at": datetime.utcnow()
             }
             await db.schools.insert_one(school)
+            await report_cache.touch(current_user.tenant_id, "schools")
+            invalidate_host_resolution(current_user.tenant_id)
             logging.info(f"Auto-created default school for tenant {current_user.tenant_id}")
     
     school_id = school["id"]
@@ -3848,91 +4024,58 @@ async def delete_staff(
     logging.info(f"Staff deleted: {existing_staff.get('name', 'Unknown')} (ID: {staff_id})")
     return {"message": "Staff member deleted successfully", "staff_id": staff_id}
 
+STAFF_EXPORT_HEADERS = [
+    "Employee ID", "Name", "Email", "Phone", "Designation", "Department", "Qualification",
+    "Experience (Years)", "Date of Joining", "Salary", "Address"
+]
+
 @api_router.get("/staff/export")
 async def export_staff(
     format: str = "excel",
     department: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Export staff data to Excel or PDF format"""
+    """Export staff data to CSV, Excel or PDF format"""
     try:
         # Build query
         query = {"tenant_id": current_user.tenant_id, "is_active": True}
         if department and department != "all_departments":
             query["department"] = department
         
-        # Fetch staff
-        staff_list = await db.staff.find(query).to_list(1000)
-        
-        if not staff_list:
+        if not await db.staff.find_one(query, {"_id": 1}):
             raise HTTPException(status_code=404, detail="No staff found")
         
-        # Prepare data
-        export_data = []
-        for staff in staff_list:
-            export_data.append({
-                "Employee ID": staff.get("employee_id", ""),
-                "Name": staff.get("name", ""),
-                "Email": staff.get("email", ""),
-                "Phone": staff.get("phone", ""),
-                "Designation": staff.get("designation", ""),
-                "Department": staff.get("department", ""),
-                "Qualification": staff.get("qualification", ""),
-                "Experience (Years)": str(staff.get("experience_years", 0)),
-                "Date of Joining": staff.get("date_of_joining", ""),
-                "Salary": str(staff.get("salary", 0)),
-                "Address": staff.get("address", "")
-            })
+        def staff_row(staff):
+            return [
+                staff.get("employee_id", ""),
+                staff.get("name", ""),
+                staff.get("email", ""),
+                staff.get("phone", ""),
+                staff.get("designation", ""),
+                staff.get("department", ""),
+                staff.get("qualification", ""),
+                str(staff.get("experience_years", 0)),
+                staff.get("date_of_joining", ""),
+                str(staff.get("salary", 0)),
+                staff.get("address", "")
+            ]
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        if format.lower() == "excel":
-            # Create Excel file
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Staff Directory"
-            
-            # Header style
-            header_fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            
-            # Write headers
-            headers = list(export_data[0].keys())
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Write data
-            for row_num, staff in enumerate(export_data, 2):
-                for col_num, value in enumerate(staff.values(), 1):
-                    ws.cell(row=row_num, column=col_num, value=value)
-            
-            # Adjust column widths (safe for merged cells)
-            from openpyxl.utils import get_column_letter
-            for col_idx in range(1, ws.max_column + 1):
-                max_length = 0
-                column_letter = get_column_letter(col_idx)
-                for row_idx in range(1, ws.max_row + 1):
-                    cell = ws.cell(row=row_idx, column=col_idx)
-                    try:
-                        if cell.value and len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Save to bytes
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            return StreamingResponse(
-                output,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename=staff_directory_{timestamp}.xlsx"}
+        if format.lower() == "csv":
+            return csv_response(
+                cursor_rows(db.staff.find(query, {"_id": 0}), staff_row),
+                STAFF_EXPORT_HEADERS,
+                f"staff_directory_{timestamp}.csv"
+            )
+        
+        elif format.lower() == "excel":
+            return await xlsx_response(
+                cursor_rows(db.staff.find(query, {"_id": 0}), staff_row),
+                STAFF_EXPORT_HEADERS,
+                f"staff_directory_{timestamp}.xlsx",
+                "Staff Directory",
+                widths=[14, 25, 30, 15, 20, 18, 20, 18, 16, 12, 40]
             )
         
         elif format.lower() == "pdf":
@@ -3991,8 +4134,8 @@ async def export_staff(
                 elements.append(Spacer(1, 15))
             
             # Summary statistics
-            total_staff = len(staff_list)
-            departments_count = len(set(s.get("department", "") for s in staff_list if s.get("department")))
+            total_staff = await db.staff.count_documents(query)
+            departments_count = len([d for d in await db.staff.distinct("department", query) if d])
             
             summary_data = {
                 "Total Staff": str(total_staff),
@@ -4010,7 +4153,8 @@ async def export_staff(
             headers = ["Employee ID", "Name", "Designation", "Department", "Phone", "Email"]
             data_rows = []
             
-            for staff in staff_list[:100]:  # Limit for PDF performance
+            staff_list = await db.staff.find(query, {"_id": 0}).limit(100).to_list(100)  # Limit for PDF performance
+            for staff in staff_list:
                 data_rows.append([
                     staff.get("employee_id", "")[:12],
                     staff.get("name", "")[:25],
@@ -4048,7 +4192,7 @@ async def export_staff(
             )
         
         else:
-            raise HTTPException(status_code=400, detail="Invalid format. Choose 'excel' or 'pdf'")
+            raise HTTPException(status_code=400, detail="Invalid format. Choose 'csv', 'excel' or 'pdf'")
             
     except HTTPException:
         raise
@@ -4632,6 +4776,7 @@ class BulkAttendanceRequest(BaseModel):
     date: str
     type: str
     records: List[AttendanceRecord]
+    notification_mode: Literal["individual", "digest", "none"] = "individual"  # digest: one summary per class + one per parent
 
 @api_router.get("/attendance")
 async def get_attendance(
@@ -4700,6 +4845,68 @@ async def get_attendance(
         logging.error(f"[ATTENDANCE-GET] Error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve attendance records")
 
+async def notify_bulk_absences(request_data: BulkAttendanceRequest, current_user: User):
+    """Queue absence notifications for a saved attendance sheet with a single student lookup"""
+    tenant_id = current_user.tenant_id
+    school_id = getattr(current_user, 'school_id', None)
+    absent_students = [r for r in request_data.records if r.status == "absent" and r.type == "student" and r.person_id]
+    absent_staff = [r for r in request_data.records if r.status == "absent" and r.type == "staff"]
+    
+    contacts = {}
+    if absent_students:
+        cursor = db.students.find(
+            {"tenant_id": tenant_id, "id": {"$in": list({r.person_id for r in absent_students})}},
+            {"_id": 0, "id": 1, "parent_email": 1, "guardian_email": 1, "parent_user_id": 1}
+        )
+        async for student in cursor:
+            contacts[student["id"]] = student
+    
+    absentees = []
+    for record in absent_students:
+        student = contacts.get(record.person_id)
+        if not student:
+            continue
+        absentees.append({
+            "name": record.person_name,
+            "parent_email": student.get("parent_email") or student.get("guardian_email"),
+            "parent_user_id": student.get("parent_user_id"),
+            "class_id": record.class_id,
+            "section_id": record.section_id,
+            "group_name": " - ".join(part for part in (record.class_name, record.section_name) if part) or "Class",
+        })
+    
+    if request_data.notification_mode == "digest":
+        by_class = {}
+        for absentee in absentees:
+            by_class.setdefault((absentee["class_id"], absentee["section_id"]), []).append(absentee)
+        for (class_id, section_id), group in by_class.items():
+            await notification_svc.notify_attendance_digest(
+                tenant_id=tenant_id,
+                school_id=school_id,
+                date=request_data.date,
+                group_name=group[0]["group_name"],
+                absentees=group,
+                target_class=class_id,
+                target_section=section_id
+            )
+        if absent_staff:
+            await notification_svc.notify_attendance_digest(
+                tenant_id=tenant_id,
+                school_id=school_id,
+                date=request_data.date,
+                group_name="Staff",
+                absentees=[{"name": r.staff_name} for r in absent_staff],
+                notify_parents=False
+            )
+        return
+    
+    if absentees:
+        await notification_svc.notify_students_absent(tenant_id, school_id, request_data.date, absentees)
+    if absent_staff:
+        await notification_svc.notify_staff_absent_batch(
+            tenant_id, school_id, [r.staff_name for r in absent_staff], request_data.date
+        )
+
 @api_router.post("/attendance/bulk")
 async def save_bulk_attendance(
     request_data: BulkAttendanceRequest,
@@ -4767,28 +4974,13 @@ async def save_bulk_attendance(
             result = await db.attendance.insert_many(attendance_records)
             logging.info(f"[ATTENDANCE-POST] Inserted {len(result.inserted_ids)} new records")
         
-        for record in request_data.records:
-            if record.status == "absent":
-                if record.type == "student":
-                    student = await db.students.find_one({"id": record.person_id, "tenant_id": current_user.tenant_id})
-                    if student:
-                        parent_email = student.get("parent_email") or student.get("guardian_email")
-                        asyncio.create_task(notification_svc.notify_student_absent(
-                            tenant_id=current_user.tenant_id,
-                            school_id=getattr(current_user, 'school_id', None),
-                            student_name=record.person_name,
-                            student_id=record.person_id,
-                            date=request_data.date,
-                            parent_email=parent_email
-                        ))
-                elif record.type == "staff" and hasattr(record, 'staff_name'):
-                    asyncio.create_task(notification_svc.notify_staff_late(
-                        tenant_id=current_user.tenant_id,
-                        school_id=getattr(current_user, 'school_id', None),
-                        staff_name=record.staff_name,
-                        date=request_data.date,
-                        time="N/A"
-                    ))
+        await report_cache.touch(current_user.tenant_id, "attendance")
+        if request_data.notification_mode != "none":
+            try:
+                await notify_bulk_absences(request_data, current_user)
+            except Exception as e:
+                # The sheet is already saved; a notification failure must not fail the request
+                logging.error(f"[ATTENDANCE-POST] Absence notifications failed: {str(e)}")
         
         entity_type = "students" if request_data.type == "student" else "staff members"
         logging.info(f"[ATTENDANCE-POST] Success - saved {len(attendance_records)} {entity_type} for {request_data.date}")
@@ -4873,10 +5065,7 @@ async def update_device_status(
         import asyncpg
         import os
         
-        database_url = os.environ.get('DATABASE_URL')
-        conn = await asyncpg.connect(database_url)
-        
-        try:
+        async with biometric_pool.acquire() as conn:
             # Update device registry
             await conn.execute(
                 """UPDATE device_registry SET
@@ -4893,8 +5082,6 @@ async def update_device_status(
             
             return {"status": "success", "message": "Device status updated"}
             
-        finally:
-            await conn.close()
             
     except Exception as e:
         logger.error(f"Device status update failed: {e}")
@@ -4902,6 +5089,7 @@ async def update_device_status(
 
 @api_router.get("/reports/attendance/monthly-summary")
 async def generate_monthly_attendance_report(
+    request: Request,
     format: str = "pdf",
     month: str = None,
     year: str = None,
@@ -4917,6 +5105,11 @@ async def generate_monthly_attendance_report(
         current_date = datetime.now()
         report_month = int(month) if month else current_date.month
         report_year = int(year) if year else current_date.year
+
+        report_key, cached = await cached_report(request, current_user, "attendance/monthly-summary", format,
+                                                 {"month": report_month, "year": report_year}, ["institutions"])
+        if cached:
+            return cached
         
         # Generate sample attendance data (In production, this would query actual attendance records)
         # Calculate month boundaries
@@ -5024,22 +5217,12 @@ async def generate_monthly_attendance_report(
             }
         elif format.lower() == "excel":
             filename = f"monthly_attendance_{report_year}_{report_month:02d}"
-            file_path = await generate_attendance_excel_report("monthly_summary", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_attendance_excel_report("monthly_summary", report_data, current_user, filename))
         else:  # PDF
             filename = f"monthly_attendance_{report_year}_{report_month:02d}"
-            file_path = await generate_attendance_pdf_report("monthly_summary", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_attendance_pdf_report("monthly_summary", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Monthly attendance report generation failed: {e}")
@@ -5127,6 +5310,7 @@ async def create_sample_attendance_data(
         if attendance_records:
             await db.attendance.insert_many(attendance_records)
         
+        await report_cache.touch(current_user.tenant_id, "attendance")
         logging.info(f"Sample attendance data created: {len(attendance_records)} records for {current_user.full_name}")
         return {
             "message": f"Successfully created {len(attendance_records)} sample attendance records",
@@ -5297,6 +5481,7 @@ async def seed_all_modules_data(
                 })
                 results["vehicles"] += 1
         
+        await report_cache.touch(tenant_id, "classes", "students", "vehicles")
         existing_events = await db.calendar_events.count_documents({"tenant_id": tenant_id})
         if existing_events == 0:
             events = [
@@ -5516,6 +5701,7 @@ async def seed_all_modules_data(
 
 @api_router.get("/reports/attendance/staff-attendance")
 async def generate_staff_attendance_report(
+    request: Request,
     format: str = "pdf",
     start_date: str = None,
     end_date: str = None,
@@ -5552,6 +5738,14 @@ async def generate_staff_attendance_report(
             start_date_str = start_date_obj.strftime("%Y-%m-%d")
             end_date_str = end_date_obj.strftime("%Y-%m-%d")
         
+        report_key, cached = await cached_report(
+            request, current_user, "attendance/staff-attendance", format,
+            {"start_date": start_date_str, "end_date": end_date_str, "department": department},
+            ["attendance", "institutions"]
+        )
+        if cached:
+            return cached
+
         # Check if this is a single-day report (start_date = end_date)
         is_single_day = start_date_str == end_date_str
         
@@ -5628,12 +5822,12 @@ async def generate_staff_attendance_report(
                 return {"message": "No staff attendance data found for this period", "data": empty_report_data, "format": "json"}
             elif format.lower() == "excel":
                 filename = f"staff_attendance_{start_date}_{end_date}".replace("-", "_")
-                file_path = await generate_attendance_excel_report("staff_attendance", empty_report_data, current_user, filename)
-                return FileResponse(path=file_path, filename=f"{filename}.xlsx", media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", background=BackgroundTask(cleanup_temp_file, file_path))
+                return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                                  lambda: generate_attendance_excel_report("staff_attendance", empty_report_data, current_user, filename))
             else:  # PDF
                 filename = f"staff_attendance_{start_date}_{end_date}".replace("-", "_")
-                file_path = await generate_attendance_pdf_report("staff_attendance", empty_report_data, current_user, filename)
-                return FileResponse(path=file_path, filename=f"{filename}.pdf", media_type="application/pdf", background=BackgroundTask(cleanup_temp_file, file_path))
+                return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                                  lambda: generate_attendance_pdf_report("staff_attendance", empty_report_data, current_user, filename))
         
         # Aggregate staff statistics with improved validation
         staff_stats = {}
@@ -5748,22 +5942,12 @@ async def generate_staff_attendance_report(
             }
         elif format.lower() == "excel":
             filename = f"staff_attendance_{start_date}_{end_date}".replace("-", "_")
-            file_path = await generate_attendance_excel_report("staff_attendance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_attendance_excel_report("staff_attendance", report_data, current_user, filename))
         else:  # PDF
             filename = f"staff_attendance_{start_date}_{end_date}".replace("-", "_")
-            file_path = await generate_attendance_pdf_report("staff_attendance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_attendance_pdf_report("staff_attendance", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Staff attendance report generation failed: {e}")
@@ -5771,6 +5955,7 @@ async def generate_staff_attendance_report(
 
 @api_router.get("/reports/attendance/student-attendance")
 async def generate_student_attendance_report(
+    request: Request,
     format: str = "pdf",
     date: str = None,
     class_id: str = "all",
@@ -5793,6 +5978,14 @@ async def generate_student_attendance_report(
         except ValueError:
             date_obj = datetime.now()
             date_str = date_obj.strftime("%Y-%m-%d")
+
+        report_key, cached = await cached_report(
+            request, current_user, "attendance/student-attendance", format,
+            {"date": date_str, "class_id": class_id, "section_id": section_id},
+            ["attendance", "students", "institutions"]
+        )
+        if cached:
+            return cached
         
         # Query student attendance records
         filter_criteria = {
@@ -5843,12 +6036,12 @@ async def generate_student_attendance_report(
                 return {"message": "No student attendance data found for this date", "data": empty_report_data, "format": "json"}
             elif format.lower() == "excel":
                 filename = f"student_attendance_{date_str}".replace("-", "_")
-                file_path = await generate_attendance_excel_report("student_attendance", empty_report_data, current_user, filename)
-                return FileResponse(path=file_path, filename=f"{filename}.xlsx", media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", background=BackgroundTask(cleanup_temp_file, file_path))
+                return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                                  lambda: generate_attendance_excel_report("student_attendance", empty_report_data, current_user, filename))
             else:
                 filename = f"student_attendance_{date_str}".replace("-", "_")
-                file_path = await generate_attendance_pdf_report("student_attendance", empty_report_data, current_user, filename)
-                return FileResponse(path=file_path, filename=f"{filename}.pdf", media_type="application/pdf", background=BackgroundTask(cleanup_temp_file, file_path))
+                return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                                  lambda: generate_attendance_pdf_report("student_attendance", empty_report_data, current_user, filename))
         
         # Aggregate student statistics
         student_stats = {}
@@ -5929,22 +6122,12 @@ async def generate_student_attendance_report(
             }
         elif format.lower() == "excel":
             filename = f"student_attendance_{date_str}".replace("-", "_")
-            file_path = await generate_attendance_excel_report("student_attendance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_attendance_excel_report("student_attendance", report_data, current_user, filename))
         else:
             filename = f"student_attendance_{date_str}".replace("-", "_")
-            file_path = await generate_attendance_pdf_report("student_attendance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_attendance_pdf_report("student_attendance", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Student attendance report generation failed: {e}")
@@ -6652,6 +6835,7 @@ async def create_class(class_data: ClassCreate, current_user: User = Depends(get
     
     cls = Class(**class_dict)
     await db.classes.insert_one(cls.dict())
+    await report_cache.touch(current_user.tenant_id, "classes")
     return cls
 
 @api_router.get("/sections", response_model=List[Section])
@@ -6787,6 +6971,7 @@ async def update_class(class_id: str, class_data: ClassUpdate, current_user: Use
             {"id": class_id, "tenant_id": current_user.tenant_id},
             {"$set": update_data}
         )
+        await report_cache.touch(current_user.tenant_id, "classes")
         
         # Fetch and return updated class
         updated_class = await db.classes.find_one({
@@ -6816,6 +7001,7 @@ async def delete_class(class_id: str, current_user: User = Depends(get_current_u
         {"id": class_id, "tenant_id": current_user.tenant_id},
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
+    await report_cache.touch(current_user.tenant_id, "classes")
     
     logging.info(f"Class deleted: {existing_class.get('name', 'Unknown')} (ID: {class_id}) by {current_user.full_name}")
     return {"message": "Class deleted successfully", "class_id": class_id}
@@ -7053,12 +7239,12 @@ async def update_timetable(timetable_id: str, timetable_data: TimetableUpdate, c
         
         logging.info(f"Timetable updated (ID: {timetable_id}) by {current_user.full_name}")
         
-        asyncio.create_task(notification_svc.notify_timetable_update(
+        await notification_svc.notify_timetable_update(
             tenant_id=current_user.tenant_id,
             school_id=getattr(current_user, 'school_id', None),
             class_name=existing_timetable.get("class_name", "Unknown"),
             section=existing_timetable.get("section_name", "")
-        ))
+        )
         
         return Timetable(**updated_timetable)
     
@@ -8075,14 +8261,14 @@ async def create_calendar_event(
     
     await db.calendar_events.insert_one(event.dict())
     
-    asyncio.create_task(notification_svc.notify_calendar_event(
+    await notification_svc.notify_calendar_event(
         tenant_id=current_user.tenant_id,
         school_id=school_id,
         event_type=event_data.event_type,
         event_title=event_data.title,
         event_date=event_data.start_date,
         description=event_data.description or ""
-    ))
+    )
     
     logging.info(f"Calendar event created: {event.title} by {current_user.full_name}")
     return {"message": "Event created successfully", "event_id": event.id}
@@ -8220,34 +8406,25 @@ async def get_notifications(
     target_role: Optional[str] = None,
     target_class: Optional[str] = None,
     unread_only: bool = False,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get notifications based on user role and filters"""
+    """
+    Get notifications based on user role and filters.
+    Supports keyset pagination via `limit`/`after` and `format=ndjson` streaming.
+    """
     query = {
         "tenant_id": current_user.tenant_id,
         "is_active": True
     }
     
-    # Filter based on user role - students only see notifications targeted to them
-    if current_user.role == "student":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "student"},
-            {"target_user_ids": current_user.id}
-        ]
-    elif current_user.role == "teacher":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "teacher"},
-            {"target_user_ids": current_user.id}
-        ]
-    elif current_user.role == "parent":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "parent"},
-            {"target_user_ids": current_user.id}
-        ]
-    # Admin and super_admin see all notifications
+    # Students, teachers and parents only see notifications targeted to them;
+    # admin and super_admin see all notifications
+    visibility = audience_filter(current_user.id, current_user.role)
+    if visibility:
+        query.update(visibility)
     
     if notification_type:
         query["notification_type"] = notification_type
@@ -8258,53 +8435,80 @@ async def get_notifications(
     if target_class:
         query["target_class"] = target_class
     
+    read_view = await notification_svc.read_state.read_view(current_user.tenant_id, current_user.id)
     if unread_only:
-        query["is_read_by"] = {"$nin": [current_user.id]}
+        query.update(read_view.unread_query())
     
-    notifications = await db.notifications.find(query).sort("created_at", -1).to_list(100)
-    
-    # Add is_read flag for current user and convert ObjectId to string
-    result = []
-    for notif in notifications:
-        notif["is_read"] = current_user.id in notif.get("is_read_by", [])
+    def with_read_flag(notif):
+        # Add is_read flag for current user and convert ObjectId to string
+        notif["is_read"] = read_view.is_read(notif)
         if "_id" in notif:
             notif["_id"] = str(notif["_id"])
-        result.append(notif)
+        return notif
     
-    return result
+    sort = [("created_at", -1), ("id", -1)]
+    if format == "ndjson":
+        return ndjson_response(db.notifications, query, sort, after, transform=with_read_flag)
+    if after or limit:
+        return await fetch_page(db.notifications, query, sort, after, limit, transform=with_read_flag)
+    
+    notifications = await db.notifications.find(query).sort(sort).to_list(100)
+    return [with_read_flag(notif) for notif in notifications]
 
 @api_router.get("/notifications/unread-count")
 async def get_unread_count(current_user: User = Depends(get_current_user)):
-    """Get count of unread notifications for current user"""
-    query = {
-        "tenant_id": current_user.tenant_id,
-        "is_active": True,
-        "is_read_by": {"$nin": [current_user.id]}
-    }
-    
-    # Apply role-based filtering
-    if current_user.role == "student":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "student"},
-            {"target_user_ids": current_user.id}
-        ]
-    elif current_user.role == "teacher":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "teacher"},
-            {"target_user_ids": current_user.id}
-        ]
-    elif current_user.role == "parent":
-        query["$or"] = [
-            {"target_role": "all"},
-            {"target_role": "parent"},
-            {"target_user_ids": current_user.id}
-        ]
-    
-    count = await db.notifications.count_documents(query)
+    """Get count of unread notifications for current user (served from the per-user counter)"""
+    count = await notification_svc.read_state.unread_count(current_user.tenant_id, current_user.id, current_user.role)
     return {"unread_count": count}
 
+async def get_stream_user(request: Request, token: Optional[str] = None) -> User:
+    """EventSource cannot send headers, so streams also accept the JWT as ?token="""
+    credentials = token
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        credentials = authorization[7:]
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=credentials))
+
+@api_router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    current_user: User = Depends(get_stream_user)
+):
+    """
+    Server-Sent Events feed replacing unread-count / list polling.
+    Events: `notification` (id = notification id; each one is a +1 to the unread count),
+    `ready` (absolute unread_count, sent after any replayed notifications), `unread`
+    (delta or absolute unread_count for this user) and `resync` (refetch the list).
+    Reconnects resume after Last-Event-ID.
+    """
+    resume_from = request.headers.get("Last-Event-ID") or last_event_id
+
+    async def greeting():
+        # Counted once subscribed and replayed, so it covers every event sent before it
+        unread = await notification_svc.read_state.unread_count(
+            current_user.tenant_id, current_user.id, current_user.role
+        )
+        return {"unread_count": unread}
+
+    return StreamingResponse(
+        notification_svc.stream.events(
+            request, current_user.tenant_id, current_user.id, current_user.role,
+            last_event_id=resume_from, greeting=greeting
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/notifications/stream/metrics")
+async def get_notification_stream_metrics(current_user: User = Depends(get_current_user)):
+    """Connected SSE clients and fan-out counters for this worker"""
+    if current_user.role not in ["admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return notification_svc.stream.metrics()
+
 @api_router.get("/notifications/{notification_id}")
 async def get_notification(notification_id: str, current_user: User = Depends(get_current_user)):
     """Get a specific notification"""
@@ -8317,7 +8521,8 @@ async def get_notification(notification_id: str, current_user: User = Depends(ge
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
-    notification["is_read"] = current_user.id in notification.get("is_read_by", [])
+    read_view = await notification_svc.read_state.read_view(current_user.tenant_id, current_user.id)
+    notification["is_read"] = read_view.is_read(notification)
     return notification
 
 @api_router.post("/notifications")
@@ -8343,6 +8548,7 @@ async def create_notification(
     
     notification = Notification(**notification_dict)
     await db.notifications.insert_one(notification.dict())
+    await notification_svc.notifications_created([notification.dict()])
     
     logging.info(f"Notification created: {notification.title} by {current_user.full_name}")
     return {"message": "Notification created successfully", "notification_id": notification.id}
@@ -8377,6 +8583,8 @@ async def update_notification(
             {"id": notification_id, "tenant_id": current_user.tenant_id},
             {"$set": update_data}
         )
+        if "target_role" in update_data:
+            await notification_svc.read_state.record_changed([existing, {**existing, **update_data}])
     
     logging.info(f"Notification updated: {notification_id} by {current_user.full_name}")
     return {"message": "Notification updated successfully"}
@@ -8404,6 +8612,7 @@ async def delete_notification(notification_id: str, current_user: User = Depends
         {"id": notification_id, "tenant_id": current_user.tenant_id},
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
+    await notification_svc.read_state.record_changed([existing])
     
     logging.info(f"Notification deleted: {existing.get('title')} by {current_user.full_name}")
     return {"message": "Notification deleted successfully"}
@@ -8411,26 +8620,41 @@ async def delete_notification(notification_id: str, current_user: User = Depends
 @api_router.post("/notifications/{notification_id}/mark-read")
 async def mark_notification_read(notification_id: str, current_user: User = Depends(get_current_user)):
     """Mark a notification as read"""
-    result = await db.notifications.update_one(
-        {"id": notification_id, "tenant_id": current_user.tenant_id, "is_active": True},
-        {"$addToSet": {"is_read_by": current_user.id}}
+    marked = await notification_svc.read_state.mark_read(
+        current_user.tenant_id, current_user.id, current_user.role, notification_id
     )
     
-    if result.matched_count == 0:
+    if marked is None:
         raise HTTPException(status_code=404, detail="Notification not found")
     
+    if marked:
+        await notification_svc.stream.publish_unread(current_user.tenant_id, current_user.id, delta=-1)
     return {"message": "Notification marked as read"}
 
 @api_router.post("/notifications/mark-all-read")
 async def mark_all_notifications_read(current_user: User = Depends(get_current_user)):
     """Mark all notifications as read for current user"""
-    await db.notifications.update_many(
-        {"tenant_id": current_user.tenant_id, "is_active": True},
-        {"$addToSet": {"is_read_by": current_user.id}}
-    )
+    await notification_svc.read_state.mark_all_read(current_user.tenant_id, current_user.id, current_user.role)
+    await notification_svc.stream.publish_unread(current_user.tenant_id, current_user.id, count=0)
     
     return {"message": "All notifications marked as read"}
 
+@api_router.get("/notifications/outbox/metrics")
+async def get_notification_outbox_metrics(current_user: User = Depends(get_current_user)):
+    """Queue depth and delivery counters for the notification outbox worker"""
+    if current_user.role not in ["admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    tenant_id = None if current_user.role == "super_admin" else current_user.tenant_id
+    return await notification_svc.outbox.metrics(tenant_id)
+
+@api_router.post("/notifications/outbox/requeue-dead")
+async def requeue_dead_notifications(current_user: User = Depends(get_current_user)):
+    """Send dead-lettered notifications back through the outbox"""
+    if current_user.role not in ["admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    requeued = await notification_svc.outbox.requeue_dead_letters(current_user.tenant_id)
+    return {"message": f"Requeued {requeued} notifications", "requeued": requeued}
+
 @api_router.get("/notification-templates")
 async def get_notification_templates(current_user: User = Depends(get_current_user)):
     """Get notification templates"""
@@ -8937,6 +9161,7 @@ async def create_vehicle(vehicle_data: VehicleCreate, current_user: User = Depen
     
     vehicle = Vehicle(**vehicle_dict)
     await db.vehicles.insert_one(vehicle.dict())
+    await report_cache.touch(current_user.tenant_id, "vehicles")
     
     logging.info(f"Vehicle created: {vehicle.name} (ID: {vehicle.id}) by {current_user.full_name}")
     return vehicle
@@ -8999,6 +9224,7 @@ async def update_vehicle(
         {"id": vehicle_id, "tenant_id": current_user.tenant_id},
         {"$set": update_data}
     )
+    await report_cache.touch(current_user.tenant_id, "vehicles")
     
     # Fetch and return updated vehicle
     updated_vehicle = await db.vehicles.find_one({
@@ -9029,6 +9255,7 @@ async def delete_vehicle(vehicle_id: str, current_user: User = Depends(get_curre
         {"id": vehicle_id, "tenant_id": current_user.tenant_id},
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
+    await report_cache.touch(current_user.tenant_id, "vehicles")
     
     logging.info(f"Vehicle deleted: {vehicle['name']} (ID: {vehicle_id}) by {current_user.full_name}")
     return {"message": "Vehicle deleted successfully"}
@@ -9079,6 +9306,7 @@ async def create_route(route_data: RouteCreate, current_user: User = Depends(get
     
     route = Route(**route_dict)
     await db.routes.insert_one(route.dict())
+    await report_cache.touch(current_user.tenant_id, "routes")
     
     logging.info(f"Route created: {route.route_name} (ID: {route.id}) by {current_user.full_name}")
     return route
@@ -9118,6 +9346,7 @@ async def update_route(route_id: str, route_data: RouteCreate, current_user: Use
         {"id": route_id, "tenant_id": current_user.tenant_id},
         {"$set": update_data}
     )
+    await report_cache.touch(current_user.tenant_id, "routes")
     
     # Fetch and return the updated route
     updated_route = await db.routes.find_one({
@@ -9467,6 +9696,7 @@ async def generate_student_information_report(
 
 @api_router.get("/reports/vehicle")
 async def generate_vehicle_report(
+    request: Request,
     format: str = "pdf",
     current_user: User = Depends(get_current_user)
 ):
@@ -9474,6 +9704,11 @@ async def generate_vehicle_report(
     try:
         from datetime import datetime, timedelta
         import random
+
+        report_key, cached = await cached_report(request, current_user, "transport/vehicle", format,
+                                                 {"day": datetime.now().strftime("%Y-%m-%d")}, ["schools"])
+        if cached:
+            return cached
         
         # Generate sample vehicle data (In production, this would query actual vehicle records)
         vehicles = []
@@ -9522,22 +9757,12 @@ async def generate_vehicle_report(
             }
         elif format.lower() == "excel":
             filename = f"vehicle_report_{datetime.now().strftime('%Y%m%d')}"
-            file_path = await generate_transport_excel_report("vehicle", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_transport_excel_report("vehicle", report_data, current_user, filename))
         else:  # PDF
             filename = f"vehicle_report_{datetime.now().strftime('%Y%m%d')}"
-            file_path = await generate_transport_pdf_report("vehicle", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_transport_pdf_report("vehicle", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Vehicle report generation failed: {e}")
@@ -10302,14 +10527,11 @@ async def receive_punch_data(
                 raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
         
         # Get database connection
-        database_url = os.environ.get('DATABASE_URL')
-        if not database_url:
+        if not biometric_pool.configured:
             raise HTTPException(status_code=500, detail="Database not configured")
         
-        # Connect to PostgreSQL
-        conn = await asyncpg.connect(database_url)
-        
-        try:
+        # Borrow a pooled PostgreSQL connection
+        async with biometric_pool.acquire() as conn:
             # Prepare punch record for insertion
             punch_record = {
                 "person_id": punch_data["person_id"],
@@ -10326,17 +10548,10 @@ async def receive_punch_data(
                 "source_payload": punch_data.get("source_payload", punch_data)
             }
             
-            # Insert punch record into database
-            insert_query = """
-                INSERT INTO attendance_punches (
-                    person_id, person_type, tenant_id, school_id, device_id, device_name,
-                    punch_time, punch_method, punch_type, verification_score, status, source_payload
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                RETURNING punch_id, processed_at
-            """
-            
+            # Insert punch record into database (statement text is shared so the
+            # pooled connection reuses its prepared statement)
             result = await conn.fetchrow(
-                insert_query,
+                biometric_pool.insert_punch_sql,
                 punch_record["person_id"], punch_record["person_type"], 
                 punch_record["tenant_id"], punch_record["school_id"],
                 punch_record["device_id"], punch_record["device_name"],
@@ -10344,29 +10559,33 @@ async def receive_punch_data(
                 punch_record["punch_type"], punch_record["verification_score"],
                 punch_record["status"], json.dumps(punch_record["source_payload"])
             )
+            if result is None:
+                # Already stored (a connector retry or catch-up re-read): acknowledge, don't count it again
+                return {"status": "success", "message": "Punch already recorded", "duplicate": True}
             
             # Update device last_seen
             await conn.execute(
-                """UPDATE device_registry SET 
-                   last_seen = NOW(), connection_status = 'online', 
-                   daily_punches = daily_punches + 1
-                   WHERE device_id = $1 AND tenant_id = $2""",
-                punch_data["device_id"], current_user.tenant_id
+                UPDATE_DEVICE_SEEN_SQL,
+                punch_data["device_id"], current_user.tenant_id, 1
             )
             
             logger.info(f"Punch recorded: {punch_data['person_id']} on {punch_data['device_id']} at {punch_data['punch_time']}")
-            
-            return {
-                "status": "success",
-                "message": "Punch data recorded successfully",
-                "punch_id": result["punch_id"],
-                "processed_at": result["processed_at"].isoformat(),
-                "attendance_status": await _determine_attendance_status(punch_record, conn)
-            }
-            
-        finally:
-            await conn.close()
-            
+        
+        attendance_status = await _determine_attendance_status(punch_record)
+        await live_attendance.publish(current_user.tenant_id, [{
+            **punch_record, "punch_id": result["punch_id"], "attendance_status": attendance_status
+        }])
+        
+        return {
+            "status": "success",
+            "message": "Punch data recorded successfully",
+            "punch_id": result["punch_id"],
+            "processed_at": result["processed_at"].isoformat(),
+            "attendance_status": attendance_status
+        }
+        
+    except HTTPException:
+        raise
     except asyncpg.PostgresError as e:
         logger.error(f"Database error in punch ingestion: {e}")
         raise HTTPException(status_code=500, detail="Database error processing punch")
@@ -10374,130 +10593,282 @@ async def receive_punch_data(
         logger.error(f"Punch ingestion failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to process punch data")
 
-async def _determine_attendance_status(punch_record: dict, conn):
-    """Determine attendance status based on punch time and history"""
+BULK_PUNCH_MAX_RECORDS = 1000
+
+def _parse_punch_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+def _punch_key(person_id: str, device_id: str, punch_time: datetime) -> tuple:
+    # timestamptz columns store naive datetimes as UTC
+    if punch_time.tzinfo is None:
+        punch_time = punch_time.replace(tzinfo=timezone.utc)
+    return (str(person_id), device_id, punch_time.astimezone(timezone.utc))
+
+@api_router.get("/biometric/devices/{device_id}/latest-punch")
+async def get_latest_device_punch(
+    device_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Newest stored punch time for a device; connectors seed their catch-up watermark from it"""
+    if not biometric_pool.configured:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    async with biometric_pool.acquire() as conn:
+        last_punch_time = await conn.fetchval(LATEST_DEVICE_PUNCH_SQL, current_user.tenant_id, device_id)
+    if last_punch_time is not None:
+        # Same shape the connector sends: naive UTC ISO time with a Z suffix
+        last_punch_time = last_punch_time.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+    return {"device_id": device_id, "last_punch_time": last_punch_time}
+
+@api_router.post("/biometric/punches/bulk")
+async def receive_punch_batch(
+    batch_data: Dict[str, Any],
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Receive a batch of punches from a ZKTeco connector in one request
+    Expected payload: {"punches": [<same shape as POST /biometric/punch>, ...]}
+    All rows are written with a single multi-row INSERT inside one transaction.
+    """
     try:
-        # Check if this is first punch of the day
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        import asyncpg
+        
+        punches = batch_data.get("punches")
+        if not isinstance(punches, list) or not punches:
+            raise HTTPException(status_code=400, detail="punches must be a non-empty list")
+        if len(punches) > BULK_PUNCH_MAX_RECORDS:
+            raise HTTPException(status_code=400, detail=f"At most {BULK_PUNCH_MAX_RECORDS} punches per request")
+        
+        columns = [[] for _ in range(12)]
+        for index, punch_data in enumerate(punches):
+            for field in ["person_id", "device_id", "punch_time"]:
+                if field not in punch_data:
+                    raise HTTPException(status_code=400, detail=f"Punch {index}: missing required field: {field}")
+            try:
+                punch_time = _parse_punch_time(punch_data["punch_time"])
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Punch {index}: invalid punch_time")
+            
+            row = (
+                str(punch_data["person_id"]),
+                punch_data.get("person_type", "student"),
+                current_user.tenant_id,
+                current_user.school_id,
+                punch_data["device_id"],
+                punch_data.get("device_name", "Unknown Device"),
+                punch_time,
+                punch_data.get("punch_method", "fingerprint"),
+                punch_data.get("punch_type", "IN"),
+                float(punch_data.get("verification_score", 0) or 0),
+                punch_data.get("status", "verified"),
+                json.dumps(punch_data.get("source_payload", punch_data), default=str)
+            )
+            for column, value in zip(columns, row):
+                column.append(value)
+        
+        if not biometric_pool.configured:
+            raise HTTPException(status_code=500, detail="Database not configured")
+        
+        async with biometric_pool.acquire() as conn:
+            async with conn.transaction():
+                results = await conn.fetch(biometric_pool.bulk_insert_punches_sql, *columns)
+                # Punches already stored come back as nothing; match the new rows to their requests
+                inserted = {
+                    _punch_key(r["person_id"], r["device_id"], r["punch_time"]): r for r in results
+                }
+                rows: Dict[int, Any] = {}
+                for index in range(len(punches)):
+                    record = inserted.pop(_punch_key(columns[0][index], columns[4][index], columns[6][index]), None)
+                    if record is not None:
+                        rows[index] = record
+                device_counts: Dict[str, int] = {}
+                for index in rows:
+                    device_counts[columns[4][index]] = device_counts.get(columns[4][index], 0) + 1
+                for device_id, count in device_counts.items():
+                    await conn.execute(UPDATE_DEVICE_SEEN_SQL, device_id, current_user.tenant_id, count)
+        
+        # Advance attendance state in punch-time order so the earliest punch counts as the arrival
+        statuses: List[Optional[Dict[str, str]]] = [None] * len(punches)
+        new_rows = sorted(rows, key=lambda i: columns[6][i])
+        for index in new_rows:
+            statuses[index] = await attendance_state.observe(
+                current_user.tenant_id, columns[0][index], columns[6][index], columns[8][index]
+            )
         
-        existing_punches = await conn.fetch(
-            """SELECT punch_type, punch_time FROM attendance_punches 
-               WHERE person_id = $1 AND tenant_id = $2 AND punch_time >= $3 
-               ORDER BY punch_time ASC""",
-            punch_record["person_id"], punch_record["tenant_id"], today_start
+        await live_attendance.publish(current_user.tenant_id, [
+            {
+                "punch_id": rows[i]["punch_id"],
+                "person_id": columns[0][i],
+                "person_type": columns[1][i],
+                "device_id": columns[4][i],
+                "device_name": columns[5][i],
+                "punch_time": columns[6][i],
+                "punch_method": columns[7][i],
+                "punch_type": columns[8][i],
+                "verification_score": columns[9][i],
+                "attendance_status": statuses[i]
+            }
+            for i in new_rows
+        ])
+        
+        logger.info(
+            f"Bulk punch batch recorded: {len(rows)} new punches from {len(device_counts)} device(s), "
+            f"{len(punches) - len(rows)} already stored"
         )
         
-        # Determine status based on punch sequence
-        if not existing_punches:
-            # First punch of the day
-            punch_time = datetime.fromisoformat(punch_record["punch_time"].replace('Z', '+00:00'))
-            if punch_time.hour <= 9:  # Before 9 AM
-                return {"status": "present", "type": "on_time"}
-            elif punch_time.hour <= 10:  # Before 10 AM  
-                return {"status": "present", "type": "late"}
-            else:
-                return {"status": "present", "type": "very_late"}
-        else:
-            # Subsequent punch
-            last_punch = existing_punches[-1]
-            if punch_record["punch_type"] == "OUT":
-                return {"status": "checked_out", "type": "normal"}
-            else:
-                return {"status": "checked_in", "type": "return"}
-                
+        return {
+            "status": "success",
+            "message": "Punch batch recorded successfully",
+            "inserted": len(rows),
+            "duplicates": len(punches) - len(rows),
+            "punch_ids": [rows[i]["punch_id"] if i in rows else None for i in range(len(punches))],
+            "attendance_statuses": statuses
+        }
+        
+    except HTTPException:
+        raise
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error in bulk punch ingestion: {e}")
+        raise HTTPException(status_code=500, detail="Database error processing punch batch")
+    except Exception as e:
+        logger.error(f"Bulk punch ingestion failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process punch batch")
+
+async def _determine_attendance_status(punch_record: dict):
+    """Determine attendance status from the in-memory per-day punch state"""
+    try:
+        return await attendance_state.observe(
+            punch_record["tenant_id"],
+            punch_record["person_id"],
+            _parse_punch_time(punch_record["punch_time"]),
+            punch_record["punch_type"]
+        )
     except Exception as e:
         logger.error(f"Error determining attendance status: {e}")
         return {"status": "unknown", "type": "error"}
 
+@api_router.get("/biometric/shift-thresholds")
+async def get_shift_thresholds(current_user: User = Depends(get_current_user)):
+    """Shift thresholds used to classify a person's first punch of the day"""
+    return {
+        **attendance_state.thresholds_for(current_user.tenant_id).to_dict(),
+        "is_default": current_user.tenant_id not in attendance_state.tenant_thresholds
+    }
+
+@api_router.put("/biometric/shift-thresholds")
+async def update_shift_thresholds(
+    thresholds: Dict[str, str],
+    current_user: User = Depends(get_current_user)
+):
+    """Set per-tenant shift thresholds, e.g. {"on_time_until": "09:15", "late_until": "10:00"}"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    try:
+        shift = ShiftThresholds(thresholds["on_time_until"], thresholds["late_until"])
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid shift thresholds: {e}")
+    
+    await db.biometric_settings.update_one(
+        {"tenant_id": current_user.tenant_id},
+        {"$set": {**shift.to_dict(), "tenant_id": current_user.tenant_id,
+                  "updated_by": current_user.id, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    attendance_state.set_thresholds(current_user.tenant_id, shift)
+    return {"message": "Shift thresholds updated", **shift.to_dict()}
+
+async def load_shift_thresholds():
+    """Load per-tenant shift threshold overrides into the attendance state tracker"""
+    async for settings in db.biometric_settings.find({}, {"_id": 0}):
+        try:
+            attendance_state.set_thresholds(
+                settings["tenant_id"],
+                ShiftThresholds(settings["on_time_until"], settings["late_until"])
+            )
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Ignoring invalid shift thresholds for tenant {settings.get('tenant_id')}: {e}")
+
+@api_router.get("/admin/message-transports/metrics")
+async def get_message_transport_metrics(current_user: User = Depends(get_current_user)):
+    """Latency / error metrics for the outbound email and SMS providers"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return message_transports.metrics()
+
+@api_router.get("/biometric/pool-metrics")
+async def get_biometric_pool_metrics(current_user: User = Depends(get_current_user)):
+    """Connection pool metrics for the biometric PostgreSQL database"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {
+        **biometric_pool.metrics(),
+        "attendance_state": await attendance_state.stats(),
+        "live_feed": live_attendance.metrics()
+    }
+
+@api_router.post("/biometric/migrations/punch-dedupe-index")
+async def migrate_punch_dedupe_index(current_user: User = Depends(get_current_user)):
+    """Remove duplicate punches and build the unique punch index - super_admin only"""
+    if current_user.role != "super_admin":
+        raise HTTPException(status_code=403, detail="Only super admin can run biometric migrations")
+    if not biometric_pool.configured:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    try:
+        return await biometric_pool.migrate_punch_dedupe_index()
+    except Exception as e:
+        logging.error(f"Punch dedupe migration failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Punch dedupe migration failed: {str(e)}")
+
 @api_router.get("/biometric/live-attendance")
 async def get_live_attendance(
     current_user: User = Depends(get_current_user)
 ):
     """Get real-time attendance data from punch records"""
     try:
-        import asyncpg
-        import os
-        from datetime import datetime, date
+        from datetime import date
         
-        database_url = os.environ.get('DATABASE_URL')
-        conn = await asyncpg.connect(database_url)
-        
-        try:
+        async with biometric_pool.acquire() as conn:
             # Get today's attendance
             today = date.today()
             
             # Fetch today's punches from PostgreSQL
-            punches = await conn.fetch(
-                """SELECT person_id, person_type, device_id, device_name, 
-                          punch_time, punch_method, punch_type, verification_score, status
-                   FROM attendance_punches 
-                   WHERE tenant_id = $1 AND DATE(punch_time) = $2
-                   ORDER BY punch_time DESC
-                   LIMIT 100""",
-                current_user.tenant_id, today
-            )
-            
-            # Get staff data from MongoDB for name mapping
-            staff_dict = {}
-            try:
-                staff_members = await db.staff.find({"tenant_id": current_user.tenant_id, "is_active": True}).to_list(1000)
-                for staff in staff_members:
-                    staff_dict[staff.get("employee_id", "")] = {
-                        "name": staff.get("name", "Unknown Staff"),
-                        "designation": staff.get("designation", "Staff"),
-                        "department": staff.get("department", "Unknown")
-                    }
-            except Exception as e:
-                logger.warning(f"Could not fetch staff data from MongoDB: {e}")
-            
-            # Process attendance records into the format expected by frontend
-            attendance_records = []
-            for punch in punches:
-                person_id = punch["person_id"]
-                person_name = "Unknown"
-                
-                # Get person name based on type
-                if punch["person_type"] == "staff" and person_id in staff_dict:
-                    person_name = staff_dict[person_id]["name"]
-                elif punch["person_type"] == "student":
-                    person_name = f"Student {person_id}"  # Fallback for students
-                else:
-                    person_name = person_id
-                
-                # Format punch time
-                punch_time_str = punch["punch_time"].strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Create attendance record in expected format
-                attendance_records.append({
-                    "person_name": person_name,  # Frontend expects person_name
-                    "staff_name": person_name,   # Keep for backward compatibility
-                    "time": punch["punch_time"].strftime("%H:%M:%S"),  # Just time for display
-                    "punch_time": punch_time_str,  # Full datetime for sorting
-                    "punch_type": punch["punch_type"],  # IN/OUT - Frontend expects this
-                    "device_name": punch["device_name"] or f"Device {punch['device_id']}",  # Frontend expects device_name
-                    "verification_score": punch["verification_score"] or 0,  # Frontend expects this field name
-                    "status": punch["punch_type"],  # Keep for backward compatibility
-                    "method": punch["punch_method"],
-                    "person_type": punch["person_type"],
-                    "person_id": person_id
-                })
-            
-            return {
-                "message": "Daily attendance retrieved successfully",
-                "attendance": {
-                    "latest_punches": attendance_records,
-                    "total_count": len(attendance_records),
-                    "date": today.strftime("%Y-%m-%d")
-                }
+            punches = await conn.fetch(RECENT_PUNCHES_SQL, current_user.tenant_id, today, 100)
+        
+        # Names come from the cached staff/student directory instead of a per-poll Mongo scan
+        attendance_records = await live_attendance.format_punches(
+            current_user.tenant_id, [dict(punch) for punch in punches]
+        )
+        
+        return {
+            "message": "Daily attendance retrieved successfully",
+            "attendance": {
+                "latest_punches": attendance_records,
+                "total_count": len(attendance_records),
+                "date": today.strftime("%Y-%m-%d")
             }
-            
-        finally:
-            await conn.close()
+        }
             
     except Exception as e:
         logger.error(f"Live attendance retrieval failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve live attendance")
 
+@api_router.get("/biometric/live-attendance/stream")
+async def stream_live_attendance(
+    request: Request,
+    backfill: int = 50,
+    current_user: User = Depends(get_stream_user)
+):
+    """
+    Server-Sent Events feed of punches accepted for this tenant: one `backfill` event
+    with today's latest punches (up to `backfill`), then a `punch` event per punch
+    """
+    return StreamingResponse(
+        live_attendance.events(request, biometric_pool, current_user.tenant_id, backfill=backfill),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/biometric/generate-sample-data")
 async def generate_sample_data(
     current_user: User = Depends(get_current_user)
@@ -10509,8 +10880,7 @@ async def generate_sample_data(
         import random
         from datetime import datetime, date, timedelta
         
-        database_url = os.environ.get('DATABASE_URL')
-        conn = await asyncpg.connect(database_url)
+        conn = await biometric_pool.checkout()
         
         try:
             # First, get existing staff from MongoDB
@@ -10760,6 +11130,8 @@ async def generate_sample_data(
                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15)""",
                 punch_records
             )
+            await attendance_state.warm(conn, current_user.tenant_id)
+            live_attendance.reset(current_user.tenant_id)
             
             return {
                 "message": "Sample punch data generated successfully! 🎉",
@@ -10776,7 +11148,7 @@ async def generate_sample_data(
             logger.error(f"Error generating sample data: {e}")
             return {"message": "Error generating sample data", "error": str(e)}
         finally:
-            await conn.close()
+            await biometric_pool.release(conn)
             
     except Exception as e:
         logger.error(f"Database connection error: {e}")
@@ -10784,6 +11156,7 @@ async def generate_sample_data(
 
 @api_router.get("/reports/academic/consolidated-marksheet")
 async def generate_consolidated_marksheet(
+    request: Request,
     format: str = "pdf",
     year: str = "2024-25",
     class_filter: str = "all_classes",
@@ -10791,6 +11164,11 @@ async def generate_consolidated_marksheet(
 ):
     """Generate consolidated marksheet report"""
     try:
+        report_key, cached = await cached_report(request, current_user, "academic/consolidated-marksheet", format,
+                                                 {"year": year, "class_filter": class_filter}, ["students", "classes", "institutions"])
+        if cached:
+            return cached
+
         # Build query filters
         query = {"tenant_id": current_user.tenant_id, "is_active": True}
         
@@ -11028,22 +11406,12 @@ async def generate_consolidated_marksheet(
             }
         elif format.lower() == "excel":
             filename = f"consolidated_marksheet_{year.replace('-', '_')}"
-            file_path = await generate_academic_excel_report("consolidated_marksheet", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_academic_excel_report("consolidated_marksheet", report_data, current_user, filename))
         else:  # PDF
             filename = f"consolidated_marksheet_{year.replace('-', '_')}"
-            file_path = await generate_academic_pdf_report("consolidated_marksheet", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_academic_pdf_report("consolidated_marksheet", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Consolidated marksheet generation failed: {e}")
@@ -11051,6 +11419,7 @@ async def generate_consolidated_marksheet(
 
 @api_router.get("/reports/academic/subject-wise-analysis")
 async def generate_subject_wise_analysis(
+    request: Request,
     format: str = "excel",
     year: str = "2024-25",
     subject_filter: str = "all_subjects",
@@ -11058,6 +11427,11 @@ async def generate_subject_wise_analysis(
 ):
     """Generate subject-wise performance analysis report"""
     try:
+        report_key, cached = await cached_report(request, current_user, "academic/subject-wise-analysis", format,
+                                                 {"year": year, "subject_filter": subject_filter}, ["students", "classes", "institutions"])
+        if cached:
+            return cached
+
         # Fetch students data
         students = await db.students.find({"tenant_id": current_user.tenant_id, "is_active": True}).to_list(1000)
         
@@ -11113,22 +11487,12 @@ async def generate_subject_wise_analysis(
             }
         elif format.lower() == "excel":
             filename = f"subject_wise_analysis_{year.replace('-', '_')}"
-            file_path = await generate_academic_excel_report("subject_wise_analysis", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_academic_excel_report("subject_wise_analysis", report_data, current_user, filename))
         else:  # PDF
             filename = f"subject_wise_analysis_{year.replace('-', '_')}"
-            file_path = await generate_academic_pdf_report("subject_wise_analysis", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_academic_pdf_report("subject_wise_analysis", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Subject-wise analysis generation failed: {e}")
@@ -11136,6 +11500,7 @@ async def generate_subject_wise_analysis(
 
 @api_router.get("/reports/academic/class-performance")
 async def generate_class_performance(
+    request: Request,
     format: str = "pdf",
     year: str = "2024-25",
     class_filter: str = "all_classes",
@@ -11143,6 +11508,11 @@ async def generate_class_performance(
 ):
     """Generate class performance summary report"""
     try:
+        report_key, cached = await cached_report(request, current_user, "academic/class-performance", format,
+                                                 {"year": year, "class_filter": class_filter}, ["students", "classes", "institutions"])
+        if cached:
+            return cached
+
         # Fetch students data grouped by class
         all_students = await db.students.find({"tenant_id": current_user.tenant_id, "is_active": True}).to_list(1000)
         
@@ -11208,22 +11578,12 @@ async def generate_class_performance(
             }
         elif format.lower() == "excel":
             filename = f"class_performance_{year.replace('-', '_')}"
-            file_path = await generate_academic_excel_report("class_performance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_academic_excel_report("class_performance", report_data, current_user, filename))
         else:  # PDF
             filename = f"class_performance_{year.replace('-', '_')}"
-            file_path = await generate_academic_pdf_report("class_performance", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_academic_pdf_report("class_performance", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Class performance report generation failed: {e}")
@@ -11253,6 +11613,7 @@ async def get_transport_assigned_students_count(current_user: User = Depends(get
 
 @api_router.get("/reports/transport/daily")
 async def generate_daily_transport_report(
+    request: Request,
     date: str = None,  # Format: YYYY-MM-DD, defaults to today
     format: str = "pdf",  # "json", "pdf", "excel"
     current_user: User = Depends(get_current_user)
@@ -11264,6 +11625,11 @@ async def generate_daily_transport_report(
             report_date = datetime.strptime(date, "%Y-%m-%d").date()
         else:
             report_date = datetime.now().date()
+
+        report_key, cached = await cached_report(request, current_user, "transport/daily", format,
+                                                 {"date": report_date.isoformat()}, ["vehicles", "routes", "students", "schools"])
+        if cached:
+            return cached
         
         # Fetch vehicles and routes data
         vehicles_cursor = await db.vehicles.find({"tenant_id": current_user.tenant_id}).to_list(1000)
@@ -11322,23 +11688,13 @@ async def generate_daily_transport_report(
         elif format.lower() == "excel":
             # Generate Excel file
             filename = f"daily_transport_report_{report_date.strftime('%Y%m%d')}"
-            file_path = await generate_transport_excel_report("daily", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_transport_excel_report("daily", report_data, current_user, filename))
         else:  # PDF
             # Generate PDF file
             filename = f"daily_transport_report_{report_date.strftime('%Y%m%d')}"
-            file_path = await generate_transport_pdf_report("daily", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_transport_pdf_report("daily", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Daily transport report generation failed: {e}")
@@ -11346,6 +11702,7 @@ async def generate_daily_transport_report(
 
 @api_router.get("/reports/transport/monthly")
 async def generate_monthly_transport_report(
+    request: Request,
     month: str = None,  # Format: YYYY-MM, defaults to current month
     format: str = "pdf",  # "json", "pdf", "excel"
     current_user: User = Depends(get_current_user)
@@ -11364,6 +11721,11 @@ async def generate_monthly_transport_report(
             month_end = month_start.replace(year=month_start.year + 1, month=1)
         else:
             month_end = month_start.replace(month=month_start.month + 1)
+
+        report_key, cached = await cached_report(request, current_user, "transport/monthly", format,
+                                                 {"month": month_start.strftime("%Y-%m")}, ["vehicles", "routes", "students", "schools"])
+        if cached:
+            return cached
         
         # Fetch vehicles and routes data
         vehicles_cursor = await db.vehicles.find({"tenant_id": current_user.tenant_id}).to_list(1000)
@@ -11435,23 +11797,13 @@ async def generate_monthly_transport_report(
         elif format.lower() == "excel":
             # Generate Excel file
             filename = f"monthly_transport_report_{report_month.strftime('%Y%m')}"
-            file_path = await generate_transport_excel_report("monthly", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_transport_excel_report("monthly", report_data, current_user, filename))
         else:  # PDF
             # Generate PDF file
             filename = f"monthly_transport_report_{report_month.strftime('%Y%m')}"
-            file_path = await generate_transport_pdf_report("monthly", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_transport_pdf_report("monthly", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Monthly transport report generation failed: {e}")
@@ -11459,6 +11811,7 @@ async def generate_monthly_transport_report(
 
 @api_router.get("/reports/transport/generate")
 async def generate_custom_transport_report(
+    request: Request,
     start_date: str = None,  # Format: YYYY-MM-DD
     end_date: str = None,    # Format: YYYY-MM-DD
     vehicle_id: str = None,  # Optional vehicle filter
@@ -11477,6 +11830,14 @@ async def generate_custom_transport_report(
         # Parse dates
         start_dt = datetime.strptime(start_date, "%Y-%m-%d")
         end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+
+        report_key, cached = await cached_report(
+            request, current_user, "transport/generate", format,
+            {"start_date": start_date, "end_date": end_date, "vehicle_id": vehicle_id, "route_id": route_id},
+            ["vehicles", "routes", "students", "schools"]
+        )
+        if cached:
+            return cached
         
         # Build query filters
         vehicle_query = {"tenant_id": current_user.tenant_id}
@@ -11561,686 +11922,33 @@ async def generate_custom_transport_report(
         elif format.lower() == "excel":
             # Generate Excel file
             filename = f"custom_transport_report_{start_date}_to_{end_date}".replace("-", "")
-            file_path = await generate_transport_excel_report("custom", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.xlsx",
+                                              lambda: generate_transport_excel_report("custom", report_data, current_user, filename))
         else:  # PDF
             # Generate PDF file
             filename = f"custom_transport_report_{start_date}_to_{end_date}".replace("-", "")
-            file_path = await generate_transport_pdf_report("custom", report_data, current_user, filename)
-            return FileResponse(
-                path=file_path,
-                filename=f"{filename}.pdf",
-                media_type="application/pdf",
-                background=BackgroundTask(cleanup_temp_file, file_path)
-            )
+            return await render_cached_report(request, report_key, current_user, f"{filename}.pdf",
+                                              lambda: generate_transport_pdf_report("custom", report_data, current_user, filename))
             
     except Exception as e:
         logger.error(f"Custom transport report generation failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate custom transport report")
 
-# ==================== PROFESSIONAL REPORT TEMPLATE SYSTEM ====================
-
-def create_professional_pdf_template(school_name: str = "School ERP System", school_colors: dict = None):
-    """
-    Create professional PDF styling templates with school branding
-    
-    Args:
-        school_name: Name of the school for header/footer
-        school_colors: Dict with 'primary' and 'secondary' hex colors
-    
-    Returns:
-        Dictionary with styles and template configurations
-    """
-    from reportlab.lib import colors as rl_colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    
-    # Default school colors (professional blue-green theme)
-    if not school_colors:
-        school_colors = {
-            'primary': '#1e3a8a',      # Deep blue
-            'secondary': '#059669',     # Emerald green
-            'accent': '#f59e0b',        # Amber
-            'light': '#f0f9ff',         # Light blue background
-            'text': '#1f2937'           # Dark gray text
-        }
-    
-    # Convert hex to ReportLab colors
-    def hex_to_rgb(hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16)/255.0 for i in (0, 2, 4))
-    
-    primary_color = rl_colors.Color(*hex_to_rgb(school_colors['primary']))
-    secondary_color = rl_colors.Color(*hex_to_rgb(school_colors['secondary']))
-    accent_color = rl_colors.Color(*hex_to_rgb(school_colors['accent']))
-    light_bg = rl_colors.Color(*hex_to_rgb(school_colors['light']))
-    
-    # Get base styles
-    styles = getSampleStyleSheet()
-    
-    # Custom professional styles
-    custom_styles = {
-        'SchoolTitle': ParagraphStyle(
-            'SchoolTitle',
-            parent=styles['Title'],
-            fontSize=22,
-            textColor=primary_color,
-            fontName='Helvetica-Bold',
-            alignment=1,  # Center
-            spaceAfter=10,
-            leading=26
-        ),
-        'ReportTitle': ParagraphStyle(
-            'ReportTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=secondary_color,
-            fontName='Helvetica-Bold',
-            alignment=1,
-            spaceAfter=20,
-            leading=20
-        ),
-        'SectionHeading': ParagraphStyle(
-            'SectionHeading',
-            parent=styles['Heading2'],
-            fontSize=12,
-            textColor=primary_color,
-            fontName='Helvetica-Bold',
-            spaceAfter=8,
-            spaceBefore=15,
-            leading=14
-        ),
-        'FilterText': ParagraphStyle(
-            'FilterText',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=rl_colors.Color(0.3, 0.3, 0.3),
-            fontName='Helvetica',
-            spaceAfter=12
-        ),
-        'FooterText': ParagraphStyle(
-            'FooterText',
-            parent=styles['Normal'],
-            fontSize=8,
-            textColor=rl_colors.Color(0.4, 0.4, 0.4),
-            fontName='Helvetica',
-            alignment=1
-        ),
-        'MetricLabel': ParagraphStyle(
-            'MetricLabel',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=rl_colors.Color(0.2, 0.2, 0.2),
-            fontName='Helvetica-Bold'
-        ),
-        'MetricValue': ParagraphStyle(
-            'MetricValue',
-            parent=styles['Normal'],
-            fontSize=14,
-            textColor=primary_color,
-            fontName='Helvetica-Bold'
-        )
-    }
-    
-    # Table styles templates
-    table_styles = {
-        'header': [
-            ('BACKGROUND', (0, 0), (-1, 0), primary_color),
-            ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, rl_colors.Color(0.8, 0.8, 0.8))
-        ],
-        'alternate_rows': [
-            ('BACKGROUND', (0, 1), (-1, -1), rl_colors.white),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [rl_colors.white, light_bg])
-        ],
-        'summary_box': [
-            ('BACKGROUND', (0, 0), (-1, 0), secondary_color),
-            ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), light_bg),
-            ('GRID', (0, 0), (-1, -1), 1, rl_colors.Color(0.7, 0.7, 0.7))
-        ]
-    }
-    
-    return {
-        'styles': custom_styles,
-        'base_styles': styles,
-        'table_styles': table_styles,
-        'colors': {
-            'primary': primary_color,
-            'secondary': secondary_color,
-            'accent': accent_color,
-            'light_bg': light_bg
-        },
-        'school_name': school_name
-    }
-
+# ==================== REPORT RENDERING ====================
+# PDF/Excel templates and renderers live in report_rendering.py and run in the render
+# process pool; these builders only gather branding and hand the job off.
 
-def add_pdf_header_footer(canvas, doc, school_name, report_title, generated_by, page_num_text=True, school_address=None, school_contact=None, logo_path=None):
-    """
-    Add professional header and footer to PDF pages with school branding, logo, and contact info
-    
-    Args:
-        canvas: ReportLab canvas object
-        doc: Document object
-        school_name: School name for header
-        report_title: Report title for header
-        generated_by: User who generated the report
-        page_num_text: Whether to show "Page X of Y"
-        school_address: School address (optional)
-        school_contact: School contact info (optional)
-        logo_path: Path to school logo image (optional)
-    """
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from reportlab.pdfgen import canvas as pdf_canvas
-    import os
-    
-    canvas.saveState()
-    
-    # Header with school branding - increased height for logo and info
-    canvas.setFillColor(colors.Color(0.11, 0.23, 0.54))  # Deep blue
-    canvas.rect(0, doc.pagesize[1] - 90, doc.pagesize[0], 90, fill=True, stroke=False)
-    
-    # School logo (top-left corner) if provided
-    logo_x = 45
-    logo_y = doc.pagesize[1] - 80
-    logo_width = 60
-    logo_height = 60
-    
-    if logo_path and os.path.exists(logo_path):
-        try:
-            canvas.drawImage(logo_path, logo_x, logo_y, width=logo_width, height=logo_height, preserveAspectRatio=True, mask='auto')
-        except:
-            # If logo fails to load, show placeholder
-            canvas.setStrokeColor(colors.whitesmoke)
-            canvas.setLineWidth(2)
-            canvas.rect(logo_x, logo_y, logo_width, logo_height, stroke=True, fill=False)
-            canvas.setFont('Helvetica', 8)
-            canvas.setFillColor(colors.whitesmoke)
-            canvas.drawCentredString(logo_x + logo_width/2, logo_y + logo_height/2 - 3, "LOGO")
-    else:
-        # Placeholder for logo
-        canvas.setStrokeColor(colors.whitesmoke)
-        canvas.setLineWidth(2)
-        canvas.rect(logo_x, logo_y, logo_width, logo_height, stroke=True, fill=False)
-        canvas.setFont('Helvetica', 8)
-        canvas.setFillColor(colors.whitesmoke)
-        canvas.drawCentredString(logo_x + logo_width/2, logo_y + logo_height/2 - 3, "LOGO")
-    
-    # School information beside the logo
-    info_x = logo_x + logo_width + 15
-    
-    # School name
-    canvas.setFillColor(colors.whitesmoke)
-    canvas.setFont('Helvetica-Bold', 16)
-    canvas.drawString(info_x, doc.pagesize[1] - 35, school_name)
-    
-    # School address
-    if school_address:
-        canvas.setFont('Helvetica', 9)
-        canvas.drawString(info_x, doc.pagesize[1] - 52, school_address)
-    
-    # School contact info
-    if school_contact:
-        canvas.setFont('Helvetica', 9)
-        canvas.drawString(info_x, doc.pagesize[1] - 67, school_contact)
-    
-    # Report title below the header (on white background)
-    canvas.setFillColor(colors.Color(0.11, 0.23, 0.54))  # Deep blue text
-    canvas.setFont('Helvetica-Bold', 12)
-    canvas.drawCentredString(doc.pagesize[0]/2, doc.pagesize[1] - 105, report_title)
-    
-    # Footer line
-    canvas.setStrokeColor(colors.Color(0.02, 0.59, 0.41))  # Emerald green
-    canvas.setLineWidth(2)
-    canvas.line(40, 35, doc.pagesize[0] - 40, 35)
-    
-    # Footer text
-    canvas.setFillColor(colors.Color(0.4, 0.4, 0.4))
-    canvas.setFont('Helvetica', 7)
-    
-    # Generated by (left)
-    canvas.drawString(40, 20, f"Generated by: {generated_by}")
-    
-    # Generated date/time (center)
-    from datetime import datetime
-    canvas.drawCentredString(
-        doc.pagesize[0]/2, 
-        20, 
-        f"Generated: {datetime.now().strftime('%d-%b-%Y %I:%M %p')}"
-    )
-    
-    # Page number (right)
-    if page_num_text:
-        canvas.drawRightString(
-            doc.pagesize[0] - 40,
-            20,
-            f"Page {doc.page} of {doc._pageNumber if hasattr(doc, '_pageNumber') else doc.page}"
-        )
-    
-    canvas.restoreState()
+def _report_file_path(filename: str, extension: str) -> str:
+    # Unique per render: finished files are moved into the report cache
+    return os.path.join(tempfile.gettempdir(), f"{filename}_{uuid.uuid4().hex[:8]}.{extension}")
 
-
-def create_filter_display(filters_dict, template):
-    """
-    Create formatted filter display paragraph for reports
-    
-    Args:
-        filters_dict: Dictionary of applied filters
-        template: Template configuration from create_professional_pdf_template
-    
-    Returns:
-        Paragraph object with formatted filters
-    """
-    from reportlab.platypus import Paragraph
-    
-    if not filters_dict or not any(filters_dict.values()):
-        return None
-    
-    filter_text = "<b>Applied Filters:</b> "
-    filter_parts = []
-    
-    for key, value in filters_dict.items():
-        if value and str(value).lower() not in ['all', 'all_classes', 'all_genders', 'all_statuses', 'all_departments']:
-            formatted_key = key.replace('_', ' ').title()
-            filter_parts.append(f"{formatted_key}: <b>{value}</b>")
-    
-    if filter_parts:
-        filter_text += " | ".join(filter_parts)
-        return Paragraph(filter_text, template['styles']['FilterText'])
-    
-    return None
-
-
-def create_summary_box(summary_data, template, col_widths=None):
-    """
-    Create professional summary box with key metrics
-    
-    Args:
-        summary_data: Dictionary of summary statistics
-        template: Template configuration
-        col_widths: Column widths for table
-    
-    Returns:
-        Table object with styled summary
-    """
-    from reportlab.platypus import Table, TableStyle
-    from reportlab.lib.units import inch
-    
-    if not summary_data:
-        return None
-    
-    # Prepare data for 2-column layout
-    data = []
-    items = list(summary_data.items())
-    
-    # Group into pairs for better visual layout
-    for i in range(0, len(items), 2):
-        row = []
-        for j in range(2):
-            if i + j < len(items):
-                key, value = items[i + j]
-                formatted_key = key.replace('_', ' ').title()
-                row.extend([formatted_key, str(value)])
-            else:
-                row.extend(['', ''])
-        data.append(row)
-    
-    # Default column widths if not provided
-    if not col_widths:
-        col_widths = [2*inch, 1.5*inch, 2*inch, 1.5*inch]
-    
-    summary_table = Table(data, colWidths=col_widths)
-    
-    # Apply professional styling
-    style_list = list(template['table_styles']['summary_box'])
-    summary_table.setStyle(TableStyle(style_list))
-    
-    return summary_table
-
-
-def create_data_table(headers, data_rows, template, col_widths=None, repeat_header=True):
-    """
-    Create professional data table with alternating row colors
-    
-    Args:
-        headers: List of column headers
-        data_rows: List of data rows
-        template: Template configuration
-        col_widths: Column widths
-        repeat_header: Whether to repeat header on new pages
-    
-    Returns:
-        Table object with professional styling
-    """
-    from reportlab.platypus import Table, TableStyle
-    from reportlab.lib.units import inch
-    
-    # Combine headers and data
-    table_data = [headers] + data_rows
-    
-    # Auto-calculate column widths if not provided
-    if not col_widths:
-        available_width = 6.5 * inch  # A4 width minus margins
-        col_widths = [available_width / len(headers)] * len(headers)
-    
-    data_table = Table(table_data, colWidths=col_widths, repeatRows=1 if repeat_header else 0)
-    
-    # Apply professional styling
-    style_list = (
-        list(template['table_styles']['header']) +
-        list(template['table_styles']['alternate_rows'])
-    )
-    
-    data_table.setStyle(TableStyle(style_list))
-    
-    return data_table
-
-
-def create_professional_excel_header(worksheet, school_name, report_title, filters_dict=None):
-    """
-    Create professional Excel report header with school branding
-    
-    Args:
-        worksheet: openpyxl worksheet object
-        school_name: School name for header
-        report_title: Report title
-        filters_dict: Optional filters to display
-    
-    Returns:
-        Current row number after header
-    """
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    
-    # School colors
-    primary_color = "1e3a8a"      # Deep blue
-    secondary_color = "059669"     # Emerald green
-    light_bg = "f0f9ff"            # Light blue background
-    
-    row = 1
-    
-    # School name header (merged across columns)
-    worksheet.merge_cells(f'A{row}:F{row}')
-    school_cell = worksheet[f'A{row}']
-    school_cell.value = school_name
-    school_cell.font = Font(name='Calibri', size=18, bold=True, color="FFFFFF")
-    school_cell.fill = PatternFill(start_color=primary_color, end_color=primary_color, fill_type="solid")
-    school_cell.alignment = Alignment(horizontal='center', vertical='center')
-    worksheet.row_dimensions[row].height = 30
-    row += 1
-    
-    # Report title
-    worksheet.merge_cells(f'A{row}:F{row}')
-    title_cell = worksheet[f'A{row}']
-    title_cell.value = report_title
-    title_cell.font = Font(name='Calibri', size=14, bold=True, color="FFFFFF")
-    title_cell.fill = PatternFill(start_color=secondary_color, end_color=secondary_color, fill_type="solid")
-    title_cell.alignment = Alignment(horizontal='center', vertical='center')
-    worksheet.row_dimensions[row].height = 25
-    row += 1
-    
-    # Generated date/time
-    from datetime import datetime
-    worksheet.merge_cells(f'A{row}:F{row}')
-    date_cell = worksheet[f'A{row}']
-    date_cell.value = f"Generated: {datetime.now().strftime('%d-%b-%Y %I:%M %p')}"
-    date_cell.font = Font(name='Calibri', size=9, italic=True)
-    date_cell.alignment = Alignment(horizontal='center')
-    row += 1
-    
-    # Filters display (if provided)
-    if filters_dict:
-        filter_parts = []
-        for key, value in filters_dict.items():
-            if value and str(value).lower() not in ['all', 'all_classes', 'all_genders', 'all_statuses']:
-                formatted_key = key.replace('_', ' ').title()
-                filter_parts.append(f"{formatted_key}: {value}")
-        
-        if filter_parts:
-            worksheet.merge_cells(f'A{row}:F{row}')
-            filter_cell = worksheet[f'A{row}']
-            filter_cell.value = "Applied Filters: " + " | ".join(filter_parts)
-            filter_cell.font = Font(name='Calibri', size=9, bold=True)
-            filter_cell.fill = PatternFill(start_color=light_bg, end_color=light_bg, fill_type="solid")
-            filter_cell.alignment = Alignment(horizontal='left')
-            row += 1
-    
-    # Empty row for spacing
-    row += 1
-    
-    return row
-
-
-def format_excel_summary_box(worksheet, start_row, summary_data, primary_color="1e3a8a", secondary_color="059669"):
-    """
-    Format Excel summary box with professional styling
-    
-    Args:
-        worksheet: openpyxl worksheet object
-        start_row: Starting row number
-        summary_data: Dictionary of summary statistics
-        primary_color: Hex color for headers
-        secondary_color: Hex color for accents
-    
-    Returns:
-        Current row number after summary
-    """
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    
-    row = start_row
-    
-    # Summary title
-    worksheet.merge_cells(f'A{row}:B{row}')
-    title_cell = worksheet[f'A{row}']
-    title_cell.value = "SUMMARY STATISTICS"
-    title_cell.font = Font(name='Calibri', size=12, bold=True, color="FFFFFF")
-    title_cell.fill = PatternFill(start_color=secondary_color, end_color=secondary_color, fill_type="solid")
-    title_cell.alignment = Alignment(horizontal='center', vertical='center')
-    worksheet.row_dimensions[row].height = 25
-    row += 1
-    
-    # Summary data in 2-column layout
-    items = list(summary_data.items())
-    for i in range(0, len(items), 2):
-        for j in range(2):
-            if i + j < len(items):
-                key, value = items[i + j]
-                formatted_key = key.replace('_', ' ').title()
-                
-                # Key column
-                col_offset = j * 2
-                key_cell = worksheet.cell(row=row, column=1 + col_offset)
-                key_cell.value = formatted_key
-                key_cell.font = Font(name='Calibri', size=10, bold=True)
-                key_cell.alignment = Alignment(horizontal='left')
-                
-                # Value column
-                value_cell = worksheet.cell(row=row, column=2 + col_offset)
-                value_cell.value = str(value)
-                value_cell.font = Font(name='Calibri', size=10, color=primary_color)
-                value_cell.alignment = Alignment(horizontal='right')
-        
-        row += 1
-    
-    # Empty row for spacing
-    row += 1
-    
-    return row
-
-
-def format_excel_data_table(worksheet, start_row, headers, data_rows, primary_color="1e3a8a"):
-    """
-    Format Excel data table with professional styling and alternating rows
-    
-    Args:
-        worksheet: openpyxl worksheet object
-        start_row: Starting row number
-        headers: List of column headers
-        data_rows: List of data rows
-        primary_color: Hex color for header background
-    
-    Returns:
-        Current row number after table
-    """
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    
-    row = start_row
-    light_bg = "f0f9ff"  # Light blue for alternating rows
-    
-    # Header row
-    for col_idx, header in enumerate(headers, start=1):
-        cell = worksheet.cell(row=row, column=col_idx)
-        cell.value = header
-        cell.font = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color=primary_color, end_color=primary_color, fill_type="solid")
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        # Add border
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        cell.border = thin_border
-    
-    worksheet.row_dimensions[row].height = 20
-    row += 1
-    
-    # Data rows with alternating colors
-    for data_row in data_rows:
-        is_even = (row - start_row) % 2 == 0
-        
-        for col_idx, value in enumerate(data_row, start=1):
-            cell = worksheet.cell(row=row, column=col_idx)
-            cell.value = value
-            cell.font = Font(name='Calibri', size=10)
-            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            
-            # Alternating row colors
-            if is_even:
-                cell.fill = PatternFill(start_color=light_bg, end_color=light_bg, fill_type="solid")
-            
-            # Add border
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            cell.border = thin_border
-        
-        row += 1
-    
-    return row
-
-# ==================== END OF PROFESSIONAL REPORT TEMPLATE SYSTEM ====================
+def _report_generated_by(current_user: User) -> str:
+    return current_user.name if hasattr(current_user, 'name') else current_user.username
 
 async def generate_academic_excel_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
     """Generate professional Excel report for academic data with school branding"""
     try:
-        import tempfile
-        import os
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.xlsx")
-        
-        # Create workbook
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
-        
-        # School name and colors
-        school_name = "School ERP System"  # Can be fetched from current_user.school_name if available
-        primary_color = "1e3a8a"
-        secondary_color = "059669"
-        
-        # Professional header with school branding
-        row = create_professional_excel_header(
-            worksheet, 
-            school_name, 
-            report_data["title"], 
-            report_data.get("filters", {})
-        )
-        
-        # Professional summary box
-        if report_data.get("summary"):
-            row = format_excel_summary_box(worksheet, row, report_data["summary"], primary_color, secondary_color)
-            row += 1
-        
-        # Professional student data table
-        if report_data.get("students"):
-            # Determine headers and data based on report type
-            if report_type == "consolidated_marksheet":
-                headers = ["Name", "Class", "Roll No", "Math", "Science", "English", "Social", "Total", "Percentage", "Grade"]
-                data_rows = []
-                for student in report_data["students"][:200]:  # Show more with better formatting
-                    perf = student.get("academic_performance", {})
-                    data_rows.append([
-                        student.get("name", ""),
-                        student.get("class_name", ""),
-                        student.get("roll_no", ""),
-                        perf.get("mathematics", {}).get("marks", "-"),
-                        perf.get("science", {}).get("marks", "-"),
-                        perf.get("english", {}).get("marks", "-"),
-                        perf.get("social_studies", {}).get("marks", "-"),
-                        perf.get("total_marks", "-"),
-                        f"{perf.get('percentage', 0):.2f}%",
-                        perf.get("overall_grade", "-")
-                    ])
-            else:
-                headers = ["Name", "Class", "Section", "Roll No", "Contact", "Status"]
-                data_rows = []
-                for student in report_data["students"][:200]:
-                    data_rows.append([
-                        student.get("name", ""),
-                        student.get("class_name", ""),
-                        student.get("section_name", "-"),
-                        student.get("roll_no", ""),
-                        student.get("contact_number", "-"),
-                        student.get("status", "Active")
-                    ])
-            
-            # Format professional table
-            row = format_excel_data_table(worksheet, row, headers, data_rows, primary_color)
-        
-        # Auto-adjust column widths (safe for merged cells)
-        for col_idx in range(1, worksheet.max_column + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            for row_idx in range(1, worksheet.max_row + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save workbook
-        workbook.save(file_path)
-        return file_path
-        
+        return await report_renderer.render("academic_excel", report_type, report_data, _report_file_path(filename, "xlsx"))
     except Exception as e:
         logging.error(f"Failed to generate academic Excel report: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate Excel report")
@@ -12248,17 +11956,6 @@ async def generate_academic_excel_report(report_type: str, report_data: dict, cu
 async def generate_academic_pdf_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
     """Generate professional PDF report for academic data with school branding"""
     try:
-        import tempfile
-        import os
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.units import inch
-        from functools import partial
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.pdf")
-        
         # Fetch institution data dynamically
         institution = await db.institutions.find_one({
             "tenant_id": current_user.tenant_id,
@@ -12266,549 +11963,64 @@ async def generate_academic_pdf_report(report_type: str, report_data: dict, curr
             "is_active": True
         })
         
-        # Get school information
         if institution:
-            school_name = institution.get("school_name", "School ERP System")
-            school_address = institution.get("address", "")
             phone = institution.get("phone", "")
-            email = institution.get("email", "")
-            school_contact = f"Phone: {phone} | Email: {email}" if phone or email else ""
-            logo_url = institution.get("logo_url", None)
-        else:
-            # Fallback to defaults if no institution found
-            school_name = "School ERP System"
-            school_address = "123 Education Street, Academic City, State - 123456"
-            school_contact = "Phone: +91-1234567890 | Email: info@schoolerp.com"
-            logo_url = None
-        
-        template = create_professional_pdf_template(school_name)
-        
-        # Create PDF document with professional margins
-        doc = SimpleDocTemplate(
-            file_path, 
-            pagesize=A4, 
-            rightMargin=50, 
-            leftMargin=50, 
-            topMargin=115,  # Space for header with logo and school info
-            bottomMargin=50  # Space for footer
-        )
-        
-        # Build story with professional elements
-        story = []
-        
-        # Report title
-        story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
-        story.append(Spacer(1, 10))
-        
-        # Dynamic filters display
-        filters = report_data.get("filters", {})
-        if filters:
-            filter_para = create_filter_display(filters, template)
-            if filter_para:
-                story.append(filter_para)
-                story.append(Spacer(1, 15))
-        
-        # Professional summary box
-        if report_data.get("summary"):
-            story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
-            summary_table = create_summary_box(report_data["summary"], template)
-            if summary_table:
-                story.append(summary_table)
-                story.append(Spacer(1, 20))
-        
-        # Students data section with professional table
-        if report_data.get("students"):
-            story.append(Paragraph("STUDENT DATA", template['styles']['SectionHeading']))
-            story.append(Spacer(1, 8))
-            
-            if report_type == "consolidated_marksheet":
-                # Academic performance table
-                headers = ["Student", "Class", "Adm. No", "Math", "Science", "English", "Percentage", "Grade"]
-                data_rows = []
-                
-                for student in report_data["students"][:50]:  # Show more students with better formatting
-                    perf = student.get("academic_performance", {})
-                    data_rows.append([
-                        student.get("name", "")[:20],  # Truncate long names
-                        student.get("class_name", ""),
-                        student.get("admission_no", ""),
-                        str(perf.get("mathematics", {}).get("marks", "-")),
-                        str(perf.get("science", {}).get("marks", "-")),
-                        str(perf.get("english", {}).get("marks", "-")),
-                        f"{perf.get('percentage', 0):.1f}%",
-                        perf.get("overall_grade", "-")
-                    ])
-                
-                col_widths = [1.3*inch, 0.6*inch, 0.7*inch, 0.5*inch, 0.5*inch, 0.5*inch, 0.7*inch, 0.5*inch]
-            else:
-                # Standard student list table
-                headers = ["Student Name", "Class", "Section", "Roll Number", "Status"]
-                data_rows = []
-                
-                for student in report_data["students"][:100]:  # Show more students
-                    data_rows.append([
-                        student.get("name", "")[:25],
-                        student.get("class_name", ""),
-                        student.get("section_name", "-"),
-                        student.get("roll_no", ""),
-                        student.get("status", "Active")
-                    ])
-                
-                col_widths = [2.2*inch, 0.9*inch, 0.9*inch, 1*inch, 1*inch]
-            
-            # Create professional data table
-            student_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-            story.append(student_table)
-        
-        # Build PDF with professional header/footer
-        def add_page_decorations(canvas, doc):
-            add_pdf_header_footer(
-                canvas, 
-                doc, 
-                school_name, 
-                report_data["title"], 
-                current_user.name if hasattr(current_user, 'name') else current_user.username,
-                page_num_text=True,
-                school_address=school_address,
-                school_contact=school_contact,
-                logo_path=logo_url
-            )
-        
-        doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
-        return file_path
-        
-    except Exception as e:
-        logging.error(f"Failed to generate professional academic PDF report: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate PDF report")
-
-async def generate_attendance_excel_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
-    """Generate Excel report for attendance data"""
-    try:
-        import tempfile
-        import os
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.xlsx")
-        
-        # Create workbook
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
-        
-        # Header styling
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="059669", end_color="059669", fill_type="solid")
-        
-        # Title
-        worksheet.cell(row=1, column=1, value=report_data["title"]).font = Font(bold=True, size=16)
-        worksheet.cell(row=2, column=1, value=f"Generated: {report_data['generated_date']}")
-        
-        # Summary section
-        row = 4
-        worksheet.cell(row=row, column=1, value="SUMMARY STATISTICS").font = header_font
-        worksheet.cell(row=row, column=1).fill = header_fill
-        row += 1
-        
-        summary = report_data["summary"]
-        for key, value in summary.items():
-            worksheet.cell(row=row, column=1, value=key.replace("_", " ").title())
-            worksheet.cell(row=row, column=2, value=str(value))
-            row += 1
-        
-        # Report-specific sections
-        if report_type == "monthly_summary":
-            # Daily breakdown
-            if report_data.get("daily_breakdown"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="DAILY BREAKDOWN").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                daily_headers = ["Date", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
-                for col, header in enumerate(daily_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for daily_record in report_data["daily_breakdown"]:
-                    worksheet.cell(row=row, column=1, value=daily_record["date"])
-                    worksheet.cell(row=row, column=2, value=daily_record["present"])
-                    worksheet.cell(row=row, column=3, value=daily_record["absent"])
-                    worksheet.cell(row=row, column=4, value=daily_record["late"])
-                    worksheet.cell(row=row, column=5, value=daily_record["outpass"])
-                    worksheet.cell(row=row, column=6, value=daily_record["total"])
-                    worksheet.cell(row=row, column=7, value=f"{daily_record['attendance_rate']}%")
-                    row += 1
-            
-            # Employee breakdown
-            if report_data.get("employee_breakdown"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="EMPLOYEE BREAKDOWN").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                emp_headers = ["Employee ID", "Name", "Department", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
-                for col, header in enumerate(emp_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for emp_record in report_data["employee_breakdown"]:
-                    worksheet.cell(row=row, column=1, value=emp_record["employee_id"])
-                    worksheet.cell(row=row, column=2, value=emp_record["staff_name"])
-                    worksheet.cell(row=row, column=3, value=emp_record["department"])
-                    worksheet.cell(row=row, column=4, value=emp_record["present"])
-                    worksheet.cell(row=row, column=5, value=emp_record["absent"])
-                    worksheet.cell(row=row, column=6, value=emp_record["late"])
-                    worksheet.cell(row=row, column=7, value=emp_record["outpass"])
-                    worksheet.cell(row=row, column=8, value=emp_record["total"])
-                    worksheet.cell(row=row, column=9, value=f"{emp_record['attendance_rate']}%")
-                    row += 1
-                    
-        elif report_type == "staff_attendance":
-            # Staff details
-            if report_data.get("staff_details"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="STAFF ATTENDANCE DETAILS").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                staff_headers = ["Employee ID", "Name", "Department", "Present", "Absent", "Late", "Outpass", "Total Days", "Attendance Rate", "Punctuality Rate"]
-                for col, header in enumerate(staff_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for staff_record in report_data["staff_details"]:
-                    worksheet.cell(row=row, column=1, value=staff_record["employee_id"])
-                    worksheet.cell(row=row, column=2, value=staff_record["staff_name"])
-                    worksheet.cell(row=row, column=3, value=staff_record["department"])
-                    worksheet.cell(row=row, column=4, value=staff_record["present"])
-                    worksheet.cell(row=row, column=5, value=staff_record["absent"])
-                    worksheet.cell(row=row, column=6, value=staff_record["late"])
-                    worksheet.cell(row=row, column=7, value=staff_record["outpass"])
-                    worksheet.cell(row=row, column=8, value=staff_record["total_days"])
-                    worksheet.cell(row=row, column=9, value=f"{staff_record['attendance_rate']}%")
-                    worksheet.cell(row=row, column=10, value=f"{staff_record['punctuality_rate']}%")
-                    row += 1
-            
-            # Department summary
-            if report_data.get("department_summary"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="DEPARTMENT SUMMARY").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                dept_headers = ["Department", "Present", "Absent", "Late", "Outpass", "Total", "Attendance Rate"]
-                for col, header in enumerate(dept_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for dept_record in report_data["department_summary"]:
-                    worksheet.cell(row=row, column=1, value=dept_record["department"])
-                    worksheet.cell(row=row, column=2, value=dept_record["present"])
-                    worksheet.cell(row=row, column=3, value=dept_record["absent"])
-                    worksheet.cell(row=row, column=4, value=dept_record["late"])
-                    worksheet.cell(row=row, column=5, value=dept_record["outpass"])
-                    worksheet.cell(row=row, column=6, value=dept_record["total"])
-                    worksheet.cell(row=row, column=7, value=f"{dept_record['attendance_rate']}%")
-                    row += 1
-        
-        elif report_type == "student_attendance":
-            # Student details
-            if report_data.get("student_details"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="STUDENT ATTENDANCE DETAILS").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                student_headers = ["Student ID", "Student Name", "Class", "Section", "Status"]
-                for col, header in enumerate(student_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for student_record in report_data["student_details"]:
-                    worksheet.cell(row=row, column=1, value=student_record["student_id"])
-                    worksheet.cell(row=row, column=2, value=student_record["student_name"])
-                    worksheet.cell(row=row, column=3, value=student_record.get("class_name", ""))
-                    worksheet.cell(row=row, column=4, value=student_record.get("section_name", ""))
-                    worksheet.cell(row=row, column=5, value=student_record["status"].title())
-                    row += 1
-            
-            # Class summary
-            if report_data.get("class_summary"):
-                row += 2
-                worksheet.cell(row=row, column=1, value="CLASS-WISE SUMMARY").font = header_font
-                worksheet.cell(row=row, column=1).fill = header_fill
-                row += 1
-                
-                # Headers
-                class_headers = ["Class - Section", "Present", "Absent", "Total", "Attendance Rate"]
-                for col, header in enumerate(class_headers, 1):
-                    cell = worksheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-                
-                # Data
-                for class_record in report_data["class_summary"]:
-                    worksheet.cell(row=row, column=1, value=class_record["class_section"])
-                    worksheet.cell(row=row, column=2, value=class_record["present"])
-                    worksheet.cell(row=row, column=3, value=class_record["absent"])
-                    worksheet.cell(row=row, column=4, value=class_record["total"])
-                    worksheet.cell(row=row, column=5, value=f"{class_record['attendance_rate']}%")
-                    row += 1
-        
-        # Auto-adjust column widths (safe for merged cells)
-        for col_idx in range(1, worksheet.max_column + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            for row_idx in range(1, worksheet.max_row + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save workbook
-        workbook.save(file_path)
-        return file_path
-        
-    except Exception as e:
-        logging.error(f"Failed to generate attendance Excel report: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate Excel report")
-
-async def generate_attendance_pdf_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
-    """Generate professional PDF report for attendance data with school branding"""
-    try:
-        import tempfile
-        import os
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.units import inch
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.pdf")
-        
-        # Fetch school information for branding
-        school_data = await db.institutions.find_one({"tenant_id": current_user.tenant_id})
-        
-        if school_data:
-            school_name = school_data.get("name", "School ERP System")
-            school_address = school_data.get("address", "123 Education Street, Academic City, State - 123456")
-            school_phone = school_data.get("phone", "+91-1234567890")
-            school_email = school_data.get("email", "info@schoolerp.com")
-            school_contact = f"Phone: {school_phone} | Email: {school_email}"
-            logo_url = school_data.get("logo_url")
-        else:
-            school_name = "School ERP System"
-            school_address = "123 Education Street, Academic City, State - 123456"
-            school_contact = "Phone: +91-1234567890 | Email: info@schoolerp.com"
-            logo_url = None
-        
-        template = create_professional_pdf_template(school_name)
-        
-        # Create PDF document with professional margins
-        doc = SimpleDocTemplate(
-            file_path, 
-            pagesize=A4, 
-            rightMargin=50, 
-            leftMargin=50, 
-            topMargin=115,
-            bottomMargin=50
-        )
-        
-        # Build story with professional elements
-        story = []
-        
-        # Report title
-        story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
-        story.append(Spacer(1, 10))
-        
-        # Dynamic filters display
-        filters = report_data.get("filters", {})
-        if filters:
-            filter_para = create_filter_display(filters, template)
-            if filter_para:
-                story.append(filter_para)
-                story.append(Spacer(1, 15))
-        
-        # Professional summary box
-        if report_data.get("summary"):
-            story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
-            summary_table = create_summary_box(report_data["summary"], template)
-            if summary_table:
-                story.append(summary_table)
-                story.append(Spacer(1, 20))
-        
-        # Report-specific sections with professional tables
-        if report_type == "monthly_summary":
-            # Daily breakdown
-            if report_data.get("daily_breakdown"):
-                story.append(Paragraph("DAILY BREAKDOWN", template['styles']['SectionHeading']))
-                headers = ["Date", "Present", "Absent", "Late", "Outpass", "Total", "Rate %"]
-                data_rows = []
-                
-                for daily_record in report_data["daily_breakdown"]:
-                    data_rows.append([
-                        daily_record["date"],
-                        str(daily_record["present"]),
-                        str(daily_record["absent"]),
-                        str(daily_record["late"]),
-                        str(daily_record["outpass"]),
-                        str(daily_record["total"]),
-                        f"{daily_record['attendance_rate']}%"
-                    ])
-                
-                col_widths = [1.2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch]
-                daily_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(daily_table)
-                story.append(Spacer(1, 20))
-            
-            # Employee breakdown
-            if report_data.get("employee_breakdown"):
-                story.append(Paragraph("EMPLOYEE SUMMARY", template['styles']['SectionHeading']))
-                headers = ["Employee", "Department", "Present", "Absent", "Rate %"]
-                data_rows = []
-                
-                for emp_record in report_data["employee_breakdown"][:50]:  # Show more
-                    data_rows.append([
-                        emp_record["staff_name"][:20],
-                        emp_record["department"][:15],
-                        str(emp_record["present"]),
-                        str(emp_record["absent"]),
-                        f"{emp_record['attendance_rate']}%"
-                    ])
-                
-                col_widths = [2*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch]
-                emp_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(emp_table)
-                
-        elif report_type == "staff_attendance":
-            # Staff details
-            if report_data.get("staff_details"):
-                story.append(Paragraph("STAFF ATTENDANCE SUMMARY", template['styles']['SectionHeading']))
-                headers = ["Employee", "Department", "Present", "Absent", "Rate %"]
-                data_rows = []
-                
-                for staff_record in report_data["staff_details"][:50]:
-                    # Safe handling for None values
-                    staff_name = staff_record.get("staff_name") or staff_record.get("employee_id", "Unknown")
-                    department = staff_record.get("department") or "N/A"
-                    
-                    data_rows.append([
-                        str(staff_name)[:20],
-                        str(department)[:15],
-                        str(staff_record.get("present", 0)),
-                        str(staff_record.get("absent", 0)),
-                        f"{staff_record.get('attendance_rate', 0)}%"
-                    ])
-                
-                col_widths = [2*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch]
-                staff_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(staff_table)
-                story.append(Spacer(1, 20))
-            
-            # Department summary
-            if report_data.get("department_summary"):
-                story.append(Paragraph("DEPARTMENT SUMMARY", template['styles']['SectionHeading']))
-                headers = ["Department", "Present", "Absent", "Total", "Rate %"]
-                data_rows = []
-                
-                for dept_record in report_data["department_summary"]:
-                    data_rows.append([
-                        str(dept_record.get("department", "N/A")),
-                        str(dept_record.get("present", 0)),
-                        str(dept_record.get("absent", 0)),
-                        str(dept_record.get("total", 0)),
-                        f"{dept_record.get('attendance_rate', 0)}%"
-                    ])
-                
-                col_widths = [2*inch, 1*inch, 1*inch, 1*inch, 1*inch]
-                dept_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(dept_table)
-        
-        elif report_type == "student_attendance":
-            # Student details
-            if report_data.get("student_details"):
-                story.append(Paragraph("STUDENT ATTENDANCE DETAILS", template['styles']['SectionHeading']))
-                headers = ["Student ID", "Student Name", "Class", "Section", "Status"]
-                data_rows = []
-                
-                for student_record in report_data["student_details"]:
-                    data_rows.append([
-                        str(student_record["student_id"])[:15],
-                        student_record["student_name"][:25],
-                        student_record.get("class_name", "")[:15],
-                        student_record.get("section_name", "")[:10],
-                        student_record["status"].title()
-                    ])
-                
-                col_widths = [1.2*inch, 2*inch, 1.2*inch, 0.8*inch, 1*inch]
-                student_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(student_table)
-                story.append(Spacer(1, 20))
-            
-            # Class summary
-            if report_data.get("class_summary"):
-                story.append(Paragraph("CLASS-WISE SUMMARY", template['styles']['SectionHeading']))
-                headers = ["Class - Section", "Present", "Absent", "Total", "Rate %"]
-                data_rows = []
-                
-                for class_record in report_data["class_summary"]:
-                    data_rows.append([
-                        class_record["class_section"],
-                        str(class_record["present"]),
-                        str(class_record["absent"]),
-                        str(class_record["total"]),
-                        f"{class_record['attendance_rate']}%"
-                    ])
-                
-                col_widths = [2*inch, 1*inch, 1*inch, 1*inch, 1.2*inch]
-                class_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-                story.append(class_table)
+            email = institution.get("email", "")
+            branding = {
+                "school_name": institution.get("school_name", "School ERP System"),
+                "school_address": institution.get("address", ""),
+                "school_contact": f"Phone: {phone} | Email: {email}" if phone or email else "",
+                "logo_url": institution.get("logo_url", None)
+            }
+        else:
+            # Fallback to defaults if no institution found
+            branding = {
+                "school_name": "School ERP System",
+                "school_address": "123 Education Street, Academic City, State - 123456",
+                "school_contact": "Phone: +91-1234567890 | Email: info@schoolerp.com",
+                "logo_url": None
+            }
+        branding["generated_by"] = _report_generated_by(current_user)
         
-        # Build PDF with professional header/footer
-        def add_page_decorations(canvas, doc):
-            add_pdf_header_footer(
-                canvas, 
-                doc, 
-                school_name, 
-                report_data["title"], 
-                current_user.name if hasattr(current_user, 'name') else current_user.username,
-                page_num_text=True,
-                school_address=school_address,
-                school_contact=school_contact,
-                logo_path=logo_url
-            )
+        return await report_renderer.render("academic_pdf", report_type, report_data, _report_file_path(filename, "pdf"), branding)
         
-        doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
-        return file_path
+    except Exception as e:
+        logging.error(f"Failed to generate professional academic PDF report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate PDF report")
+
+async def generate_attendance_excel_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
+    """Generate Excel report for attendance data"""
+    try:
+        return await report_renderer.render("attendance_excel", report_type, report_data, _report_file_path(filename, "xlsx"))
+    except Exception as e:
+        logging.error(f"Failed to generate attendance Excel report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate Excel report")
+
+async def generate_attendance_pdf_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
+    """Generate professional PDF report for attendance data with school branding"""
+    try:
+        # Fetch school information for branding
+        school_data = await db.institutions.find_one({"tenant_id": current_user.tenant_id})
+        
+        if school_data:
+            school_phone = school_data.get("phone", "+91-1234567890")
+            school_email = school_data.get("email", "info@schoolerp.com")
+            branding = {
+                "school_name": school_data.get("name", "School ERP System"),
+                "school_address": school_data.get("address", "123 Education Street, Academic City, State - 123456"),
+                "school_contact": f"Phone: {school_phone} | Email: {school_email}",
+                "logo_url": school_data.get("logo_url")
+            }
+        else:
+            branding = {
+                "school_name": "School ERP System",
+                "school_address": "123 Education Street, Academic City, State - 123456",
+                "school_contact": "Phone: +91-1234567890 | Email: info@schoolerp.com",
+                "logo_url": None
+            }
+        branding["generated_by"] = _report_generated_by(current_user)
+        
+        return await report_renderer.render("attendance_pdf", report_type, report_data, _report_file_path(filename, "pdf"), branding)
         
     except Exception as e:
         import traceback
@@ -12817,108 +12029,9 @@ async def generate_attendance_pdf_report(report_type: str, report_data: dict, cu
         raise HTTPException(status_code=500, detail="Failed to generate PDF report")
 
 async def generate_transport_excel_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
-    """Generate Excel report for transport data"""
+    """Generate Excel report for transport data (vehicle, route efficiency, transport fees)"""
     try:
-        import tempfile
-        import os
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.xlsx")
-        
-        # Create workbook
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = f"{report_type.title()} Transport Report"
-        
-        # Header styling
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        
-        # Title
-        worksheet.cell(row=1, column=1, value=report_data["title"]).font = Font(bold=True, size=16)
-        worksheet.cell(row=2, column=1, value=f"Generated: {report_data['generated_date']}")
-        
-        # Summary section
-        row = 4
-        worksheet.cell(row=row, column=1, value="SUMMARY STATISTICS").font = header_font
-        worksheet.cell(row=row, column=1).fill = header_fill
-        row += 1
-        
-        summary = report_data["summary"]
-        for key, value in summary.items():
-            worksheet.cell(row=row, column=1, value=key.replace("_", " ").title())
-            worksheet.cell(row=row, column=2, value=value)
-            row += 1
-        
-        # Vehicles section
-        row += 2
-        worksheet.cell(row=row, column=1, value="VEHICLES").font = header_font
-        worksheet.cell(row=row, column=1).fill = header_fill
-        row += 1
-        
-        # Vehicle headers
-        vehicle_headers = ["Registration", "Type", "Capacity", "Driver", "Status"]
-        for col, header in enumerate(vehicle_headers, 1):
-            cell = worksheet.cell(row=row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-        row += 1
-        
-        # Vehicle data
-        for vehicle in report_data.get("vehicles", []):
-            worksheet.cell(row=row, column=1, value=vehicle.get("registration", ""))
-            worksheet.cell(row=row, column=2, value=vehicle.get("type", ""))
-            worksheet.cell(row=row, column=3, value=vehicle.get("capacity", 0))
-            worksheet.cell(row=row, column=4, value=vehicle.get("driver_name", ""))
-            worksheet.cell(row=row, column=5, value=vehicle.get("status", ""))
-            row += 1
-        
-        # Routes section
-        row += 2
-        worksheet.cell(row=row, column=1, value="ROUTES").font = header_font
-        worksheet.cell(row=row, column=1).fill = header_fill
-        row += 1
-        
-        # Route headers
-        route_headers = ["Route Name", "Start Point", "End Point", "Status", "Morning Start", "Evening Start"]
-        for col, header in enumerate(route_headers, 1):
-            cell = worksheet.cell(row=row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-        row += 1
-        
-        # Route data
-        for route in report_data.get("routes", []):
-            worksheet.cell(row=row, column=1, value=route.get("route_name", ""))
-            worksheet.cell(row=row, column=2, value=route.get("start_point", ""))
-            worksheet.cell(row=row, column=3, value=route.get("end_point", ""))
-            worksheet.cell(row=row, column=4, value=route.get("status", ""))
-            worksheet.cell(row=row, column=5, value=route.get("morning_start_time", ""))
-            worksheet.cell(row=row, column=6, value=route.get("evening_start_time", ""))
-            row += 1
-        
-        # Auto-adjust column widths (safe for merged cells)
-        for col_idx in range(1, worksheet.max_column + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            for row_idx in range(1, worksheet.max_row + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save workbook
-        workbook.save(file_path)
-        return file_path
-        
+        return await report_renderer.render("transport_excel", report_type, report_data, _report_file_path(filename, "xlsx"))
     except Exception as e:
         logging.error(f"Failed to generate transport Excel report: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate Excel report")
@@ -12926,16 +12039,6 @@ async def generate_transport_excel_report(report_type: str, report_data: dict, c
 async def generate_transport_pdf_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
     """Generate professional PDF report for transport data with school branding"""
     try:
-        import tempfile
-        import os
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.units import inch
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.pdf")
-        
         # Fetch school data for branding
         institution = await db.schools.find_one({
             "tenant_id": current_user.tenant_id,
@@ -12943,113 +12046,67 @@ async def generate_transport_pdf_report(report_type: str, report_data: dict, cur
         })
         
         if institution:
-            school_name = institution.get("school_name", "School ERP System")
-            school_address = institution.get("address", "")
             phone = institution.get("phone", "")
             email = institution.get("email", "")
-            school_contact = f"Phone: {phone} | Email: {email}" if phone or email else ""
-            logo_url = institution.get("logo_url", None)
+            branding = {
+                "school_name": institution.get("school_name", "School ERP System"),
+                "school_address": institution.get("address", ""),
+                "school_contact": f"Phone: {phone} | Email: {email}" if phone or email else "",
+                "logo_url": institution.get("logo_url", None)
+            }
         else:
-            school_name = "School ERP System"
-            school_address = "123 Education Street, Academic City, State - 123456"
-            school_contact = "Phone: +91-1234567890 | Email: info@schoolerp.com"
-            logo_url = None
-        
-        # Get professional template
-        template = create_professional_pdf_template(school_name)
-        
-        # Create PDF document with professional margins
-        doc = SimpleDocTemplate(
-            file_path, 
-            pagesize=A4, 
-            rightMargin=50, 
-            leftMargin=50, 
-            topMargin=115,
-            bottomMargin=50
-        )
-        
-        # Build story with professional elements
-        story = []
-        
-        # Report title
-        story.append(Paragraph(report_data["title"], template['styles']['ReportTitle']))
-        story.append(Spacer(1, 10))
-        
-        # Dynamic filters display
-        filters = report_data.get("filters", {})
-        if filters:
-            filter_para = create_filter_display(filters, template)
-            if filter_para:
-                story.append(filter_para)
-                story.append(Spacer(1, 15))
-        
-        # Professional summary box
-        if report_data.get("summary"):
-            story.append(Paragraph("SUMMARY STATISTICS", template['styles']['SectionHeading']))
-            summary_table = create_summary_box(report_data["summary"], template)
-            if summary_table:
-                story.append(summary_table)
-                story.append(Spacer(1, 20))
-        
-        # Vehicles section with professional table
-        if report_data.get("vehicles"):
-            story.append(Paragraph("ACTIVE VEHICLES", template['styles']['SectionHeading']))
-            headers = ["Registration", "Type", "Capacity", "Driver", "Status"]
-            data_rows = []
-            
-            for vehicle in report_data["vehicles"][:50]:  # Show more vehicles
-                data_rows.append([
-                    vehicle.get("registration", ""),
-                    vehicle.get("type", ""),
-                    str(vehicle.get("capacity", 0)),
-                    vehicle.get("driver_name", "")[:20],
-                    vehicle.get("status", "")
-                ])
-            
-            col_widths = [1.3*inch, 1*inch, 0.9*inch, 1.8*inch, 1*inch]
-            vehicle_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-            story.append(vehicle_table)
-            story.append(Spacer(1, 20))
-        
-        # Routes section with professional table
-        if report_data.get("routes"):
-            story.append(Paragraph("ACTIVE ROUTES", template['styles']['SectionHeading']))
-            headers = ["Route Name", "Start Point", "End Point", "Status"]
-            data_rows = []
-            
-            for route in report_data["routes"][:50]:  # Show more routes
-                data_rows.append([
-                    route.get("route_name", "")[:25],
-                    route.get("start_point", "")[:20],
-                    route.get("end_point", "")[:20],
-                    route.get("status", "")
-                ])
-            
-            col_widths = [1.8*inch, 1.6*inch, 1.6*inch, 1*inch]
-            route_table = create_data_table(headers, data_rows, template, col_widths, repeat_header=True)
-            story.append(route_table)
-        
-        # Build PDF with professional header/footer
-        def add_page_decorations(canvas, doc):
-            add_pdf_header_footer(
-                canvas, 
-                doc, 
-                school_name, 
-                report_data["title"], 
-                current_user.name if hasattr(current_user, 'name') else current_user.username,
-                page_num_text=True,
-                school_address=school_address,
-                school_contact=school_contact,
-                logo_path=logo_url
-            )
+            branding = {
+                "school_name": "School ERP System",
+                "school_address": "123 Education Street, Academic City, State - 123456",
+                "school_contact": "Phone: +91-1234567890 | Email: info@schoolerp.com",
+                "logo_url": None
+            }
+        branding["generated_by"] = _report_generated_by(current_user)
         
-        doc.build(story, onFirstPage=add_page_decorations, onLaterPages=add_page_decorations)
-        return file_path
+        return await report_renderer.render("transport_pdf", report_type, report_data, _report_file_path(filename, "pdf"), branding)
         
     except Exception as e:
         logging.error(f"Failed to generate transport PDF report: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate PDF report")
 
+def report_artifact_response(request: Request, artifact) -> Response:
+    headers = {"ETag": artifact.etag, "Cache-Control": "private, no-cache"}
+    if artifact.matches(request.headers.get("if-none-match")):
+        report_cache.counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=artifact.path, filename=artifact.filename, media_type=artifact.media_type, headers=headers)
+
+async def cached_report(request: Request, current_user: User, report_type: str, format: str,
+                        filters: dict, collections: List[str]):
+    """Cache key for a PDF/Excel report plus the cached response when the artifact is still current"""
+    if format.lower() == "json":
+        return None, None
+    if format.lower() != "excel":
+        # Anything but Excel renders a PDF, whose footer prints "Generated by: <user>"
+        filters = {**filters, "generated_by": _report_generated_by(current_user)}
+    key = await report_cache.key(current_user.tenant_id, report_type, filters, format, collections)
+    artifact = report_cache.lookup(key)
+    return key, (report_artifact_response(request, artifact) if artifact else None)
+
+async def render_cached_report(request: Request, report_key: str, current_user: User, download_name: str, render) -> Response:
+    """Render through the report cache; concurrent requests for the same key share one render"""
+    artifact = await report_cache.get_or_render(report_key, current_user.tenant_id, download_name, render)
+    return report_artifact_response(request, artifact)
+
+@api_router.get("/reports/render-metrics")
+async def get_report_render_metrics(current_user: User = Depends(get_current_user)):
+    """Process-pool and artifact-cache metrics for PDF/Excel reports"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {**report_renderer.metrics(), "cache": report_cache.metrics()}
+
+@api_router.delete("/reports/cache")
+async def purge_report_cache(current_user: User = Depends(get_current_user)):
+    """Drop this tenant's cached report files (e.g. after editing data outside the API)"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"purged": report_cache.purge(current_user.tenant_id)}
+
 # ==================== DASHBOARD STATS WITH FILTERS ====================
 
 @api_router.get("/dashboard/stats")
@@ -13526,6 +12583,7 @@ class BulkPaymentCreate(BaseModel):
     payment_mode: str
     transaction_id: Optional[str] = None
     remarks: Optional[str] = None
+    idempotency_key: Optional[str] = None  # Same role as the Idempotency-Key header
 
     @field_validator('student_ids')
     @classmethod
@@ -13605,6 +12663,9 @@ class FeeInvoice(BaseModel):
     parent_id: Optional[str] = None
     parent_name: Optional[str] = None
     
+    # Billing cycle run that generated this invoice (None for manual invoices)
+    billing_cycle_id: Optional[str] = None
+    
     # Tracking
     payments: List[Dict[str, Any]] = Field(default_factory=list)  # Payment history for this invoice
     is_active: bool = True
@@ -13698,6 +12759,11 @@ class Transaction(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
 
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 class TransactionCreate(BaseModel):
     transaction_type: str
     category: str
@@ -14921,6 +13987,230 @@ async def get_certificates_dashboard(current_user: User = Depends(get_current_us
         logging.error(f"Failed to get certificates dashboard: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve dashboard data")
 
+# ==================== FEE TOTALS READ MODEL ====================
+# One `fee_totals` document per tenant holding the same sums the fee dashboard used
+# to aggregate over every student_fees/payments row. Writers apply $inc deltas;
+# reconcile_fee_totals() rebuilds it from scratch (first read, on demand, after resets).
+
+def _fee_day_key(when: Optional[datetime] = None) -> str:
+    return (when or datetime.utcnow()).strftime("%Y-%m-%d")
+
+async def adjust_fee_totals(
+    tenant_id: str,
+    total_fees: float = 0,
+    collected: float = 0,
+    pending: float = 0,
+    overdue: float = 0,
+    pending_records: int = 0,
+    payments: int = 0,
+    payment_amount: float = 0,
+    payment_date: Optional[datetime] = None
+):
+    """Apply deltas to the tenant's fee totals. No-op until the document has been reconciled once."""
+    inc = {
+        field: value for field, value in {
+            "total_fees": total_fees,
+            "collected": collected,
+            "pending": pending,
+            "overdue": overdue,
+            "pending_records": pending_records,
+        }.items() if value
+    }
+    if payments or payment_amount:
+        day = _fee_day_key(payment_date)
+        inc[f"days.{day}.count"] = payments
+        inc[f"days.{day}.amount"] = payment_amount
+    if not inc:
+        return
+    try:
+        await db.fee_totals.update_one(
+            {"tenant_id": tenant_id},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        # The read model can always be rebuilt; never fail the write that triggered it
+        logging.error(f"Failed to adjust fee totals for tenant {tenant_id}: {str(e)}")
+
+async def reconcile_fee_totals(tenant_id: str) -> Dict[str, Any]:
+    """Rebuild a tenant's fee totals from student_fees and today's payments"""
+    fees_result = await db.student_fees.aggregate([
+        {"$match": {"tenant_id": tenant_id}},
+        {"$group": {
+            "_id": None,
+            "total_fees": {"$sum": "$amount"},
+            "collected": {"$sum": "$paid_amount"},
+            "pending": {"$sum": "$pending_amount"},
+            "overdue": {"$sum": "$overdue_amount"},
+            "pending_records": {"$sum": {"$cond": [{"$gt": ["$pending_amount", 0]}, 1, 0]}}
+        }}
+    ]).to_list(1)
+    fees = fees_result[0] if fees_result else {}
+    
+    today = datetime.utcnow().date()
+    payments_result = await db.payments.aggregate([
+        {"$match": {
+            "tenant_id": tenant_id,
+            "payment_date": {
+                "$gte": datetime.combine(today, datetime.min.time()),
+                "$lte": datetime.combine(today, datetime.max.time())
+            }
+        }},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}}
+    ]).to_list(1)
+    payments_today = payments_result[0] if payments_result else {}
+    
+    now = datetime.utcnow()
+    totals = {
+        "tenant_id": tenant_id,
+        "total_fees": fees.get("total_fees", 0),
+        "collected": fees.get("collected", 0),
+        "pending": fees.get("pending", 0),
+        "overdue": fees.get("overdue", 0),
+        "pending_records": fees.get("pending_records", 0),
+        "days": {
+            today.strftime("%Y-%m-%d"): {
+                "count": payments_today.get("count", 0),
+                "amount": payments_today.get("amount", 0)
+            }
+        },
+        "reconciled_at": now,
+        "updated_at": now
+    }
+    await db.fee_totals.replace_one({"tenant_id": tenant_id}, totals, upsert=True)
+    return totals
+
+async def get_fee_totals(tenant_id: str) -> Dict[str, Any]:
+    totals = await db.fee_totals.find_one({"tenant_id": tenant_id}, {"_id": 0})
+    if totals is None:
+        totals = await reconcile_fee_totals(tenant_id)
+    return totals
+
+def fee_totals_to_dashboard_stats(totals: Dict[str, Any]) -> Dict[str, Any]:
+    today = totals.get("days", {}).get(_fee_day_key(), {})
+    return {
+        "total_fees": totals.get("total_fees", 0),
+        "collected": totals.get("collected", 0),
+        "pending": totals.get("pending", 0),
+        "overdue": totals.get("overdue", 0),
+        "payments_today": today.get("count", 0),
+        "todays_collection": today.get("amount", 0)
+    }
+
+async def run_fee_totals_reconciliation(job_id: str, tenant_ids: List[str]):
+    try:
+        for processed, tenant_id in enumerate(tenant_ids, start=1):
+            await reconcile_fee_totals(tenant_id)
+            await update_job_progress(job_id, processed)
+        await finish_job(job_id, result={"tenants_reconciled": len(tenant_ids)})
+    except Exception as e:
+        logging.error(f"Fee totals reconciliation job {job_id} failed: {str(e)}")
+        await finish_job(job_id, error=str(e))
+
+@api_router.post("/fees/totals/reconcile")
+async def reconcile_fee_totals_endpoint(
+    all_tenants: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Rebuild the fee totals read model (current tenant, or every tenant for super admins)"""
+    if current_user.role not in ["super_admin", "admin", "accountant"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if all_tenants:
+        if current_user.role != "super_admin":
+            raise HTTPException(status_code=403, detail="Only super admins can reconcile all tenants")
+        tenant_ids = await db.tenants.distinct("id")
+    else:
+        tenant_ids = [current_user.tenant_id]
+    
+    job = await create_job(current_user.tenant_id, "fee_totals_reconciliation", current_user.id, total=len(tenant_ids))
+    start_background_task(run_fee_totals_reconciliation(job.id, tenant_ids))
+    return {"message": "Fee totals reconciliation started", "job_id": job.id, "tenants": len(tenant_ids)}
+
+# ==================== PAYMENT IDEMPOTENCY ====================
+# Clients send an Idempotency-Key; the first request claims it in payment_idempotency
+# (unique on tenant_id + key, TTL on expires_at) and stores its response, so retries
+# and double submits replay that response instead of recording a second payment.
+
+PAYMENT_IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('PAYMENT_IDEMPOTENCY_TTL_SECONDS', '86400'))
+PAYMENT_DUPLICATE_WINDOW_SECONDS = 60
+IDEMPOTENCY_STALE_CLAIM_SECONDS = 300
+
+def idempotency_fingerprint(scope: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps({"scope": scope, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+async def claim_idempotency_key(
+    tenant_id: str, key: str, scope: str, request_hash: str, ttl_seconds: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Claim a key for this request. Returns None when the caller now owns the key,
+    otherwise the record left by the earlier request with the same key.
+    """
+    now = datetime.utcnow()
+    claim = {
+        "tenant_id": tenant_id,
+        "key": key,
+        "scope": scope,
+        "request_hash": request_hash,
+        "status": "in_progress",
+        "response": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=ttl_seconds)
+    }
+    try:
+        await db.payment_idempotency.insert_one(dict(claim))
+        return None
+    except DuplicateKeyError:
+        pass
+    
+    # Take over records the TTL monitor hasn't purged yet, or claims abandoned by a crashed request
+    taken = await db.payment_idempotency.find_one_and_update(
+        {
+            "tenant_id": tenant_id,
+            "key": key,
+            "$or": [
+                {"expires_at": {"$lte": now}},
+                {"status": "in_progress", "created_at": {"$lte": now - timedelta(seconds=IDEMPOTENCY_STALE_CLAIM_SECONDS)}}
+            ]
+        },
+        {"$set": claim}
+    )
+    if taken is not None:
+        return None
+    
+    existing = await db.payment_idempotency.find_one({"tenant_id": tenant_id, "key": key}, {"_id": 0})
+    if existing is None:
+        raise HTTPException(status_code=409, detail="Idempotency key is being released, please retry")
+    if existing.get("request_hash") != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return existing
+
+def replay_idempotent_response(existing: Dict[str, Any]) -> Dict[str, Any]:
+    if existing.get("status") == "completed":
+        return existing["response"]
+    raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+async def complete_idempotency_key(tenant_id: str, key: str, response: Dict[str, Any]):
+    await db.payment_idempotency.update_one(
+        {"tenant_id": tenant_id, "key": key, "status": "in_progress"},
+        {"$set": {"status": "completed", "response": response, "completed_at": datetime.utcnow()}}
+    )
+
+async def release_idempotency_key(tenant_id: str, key: str):
+    """Drop an unfinished claim so the client can retry after a failure"""
+    await db.payment_idempotency.delete_one({"tenant_id": tenant_id, "key": key, "status": "in_progress"})
+
+async def abandon_idempotency_key(tenant_id: str, key: str, recorded: Optional[Dict[str, Any]]):
+    """
+    Settle a claim after a failed request. Once a payment has been written the key stays
+    claimed (completed with what was recorded) so a retry can't record it twice; failures
+    before any write release it.
+    """
+    if recorded is not None:
+        await complete_idempotency_key(tenant_id, key, recorded)
+    else:
+        await release_idempotency_key(tenant_id, key)
+
 # ==================== FEE MANAGEMENT ENDPOINTS ====================
 
 @api_router.post("/fees/configurations", response_model=FeeConfiguration)
@@ -15138,7 +14428,8 @@ async def generate_student_fees(
                 "message": "Student fees generated successfully",
                 "config_id": config_id,
                 "created": result["created"],
-                "updated": result["updated"]
+                "updated": result["updated"],
+                "unchanged": result["unchanged"]
             }
         else:
             # Generate for all active configurations
@@ -15149,6 +14440,7 @@ async def generate_student_fees(
             
             total_created = 0
             total_updated = 0
+            total_unchanged = 0
             
             for config_dict in configs:
                 result = await create_student_fees_from_config(
@@ -15157,13 +14449,15 @@ async def generate_student_fees(
                 )
                 total_created += result["created"]
                 total_updated += result["updated"]
+                total_unchanged += result["unchanged"]
             
-            logging.info(f"Bulk fee generation: {total_created} created, {total_updated} updated across {len(configs)} configs")
+            logging.info(f"Bulk fee generation: {total_created} created, {total_updated} updated, {total_unchanged} unchanged across {len(configs)} configs")
             return {
                 "message": "Student fees generated for all configurations",
                 "configurations_processed": len(configs),
                 "created": total_created,
-                "updated": total_updated
+                "updated": total_updated,
+                "unchanged": total_unchanged
             }
             
     except HTTPException:
@@ -15176,26 +14470,13 @@ async def generate_student_fees(
 async def get_fee_dashboard(current_user: User = Depends(get_current_user)):
     """Get fee dashboard statistics"""
     try:
-        # Use MongoDB aggregation for scalable stats calculation (handles unlimited records)
-        fees_pipeline = [
-            {"$match": {"tenant_id": current_user.tenant_id}},
-            {"$group": {
-                "_id": None,
-                "total_fees": {"$sum": "$amount"},
-                "collected": {"$sum": "$paid_amount"},
-                "pending": {"$sum": "$pending_amount"},
-                "overdue": {"$sum": "$overdue_amount"}
-            }}
-        ]
-        fees_result = await db.student_fees.aggregate(fees_pipeline).to_list(1)
-        
-        if fees_result:
-            total_fees = fees_result[0].get("total_fees", 0)
-            collected = fees_result[0].get("collected", 0)
-            pending = fees_result[0].get("pending", 0)
-            overdue = fees_result[0].get("overdue", 0)
-        else:
-            total_fees = collected = pending = overdue = 0
+        # Totals are read from the per-tenant fee_totals document instead of re-aggregating
+        totals = await get_fee_totals(current_user.tenant_id)
+        stats = fee_totals_to_dashboard_stats(totals)
+        total_fees = stats["total_fees"]
+        collected = stats["collected"]
+        pending = stats["pending"]
+        overdue = stats["overdue"]
         
         logging.info(f"DASHBOARD DEBUG: Calculated totals - Total={total_fees}, Collected={collected}, Pending={pending}, Overdue={overdue}")
         
@@ -15219,41 +14500,9 @@ async def get_fee_dashboard(current_user: User = Depends(get_current_user)):
                 logging.warning(f"Skipping invalid payment record: {str(e)}")
                 continue
         
-        # Calculate today's specific metrics using aggregation for scalability
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
-        
-        payments_pipeline = [
-            {"$match": {
-                "tenant_id": current_user.tenant_id,
-                "payment_date": {"$gte": today_start, "$lte": today_end}
-            }},
-            {"$group": {
-                "_id": None,
-                "count": {"$sum": 1},
-                "total_amount": {"$sum": "$amount"}
-            }}
-        ]
-        payments_result = await db.payments.aggregate(payments_pipeline).to_list(1)
-        
-        if payments_result:
-            payments_today = payments_result[0].get("count", 0)
-            todays_collection = payments_result[0].get("total_amount", 0)
-        else:
-            payments_today = 0
-            todays_collection = 0
-        
-        # Pending approvals using aggregation
-        pending_pipeline = [
-            {"$match": {
-                "tenant_id": current_user.tenant_id,
-                "pending_amount": {"$gt": 0}
-            }},
-            {"$count": "total"}
-        ]
-        pending_result = await db.student_fees.aggregate(pending_pipeline).to_list(1)
-        pending_approvals = pending_result[0].get("total", 0) if pending_result else 0
+        payments_today = stats["payments_today"]
+        todays_collection = stats["todays_collection"]
+        pending_approvals = totals.get("pending_records", 0)
         
         # Monthly target (calculated from fee configurations)
         fee_configs = await db.fee_configurations.find({
@@ -15333,12 +14582,36 @@ async def get_student_fees(
         logging.error(f"Failed to get student fees for {student_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve student fees")
 
+def transform_payment_record(payment: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a payment document into the format the fee screens expect"""
+    return {
+        "id": payment.get("id", ""),
+        "receipt_no": payment.get("receipt_no", ""),
+        "student_id": payment.get("student_id", ""),
+        "student_name": payment.get("student_name", ""),
+        "admission_no": payment.get("admission_no", "N/A"),
+        "fee_type": payment.get("fee_type", ""),
+        "amount": payment.get("amount", 0),
+        "payment_mode": payment.get("payment_mode", ""),
+        "payment_date": payment.get("payment_date", ""),
+        "transaction_id": payment.get("transaction_id", ""),
+        "remarks": payment.get("remarks", ""),
+        "created_by": payment.get("created_by", "System"),
+        "created_at": payment.get("created_at", "")
+    }
+
 @api_router.get("/fees/payments")
 async def get_payments(
     student_id: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get payment records, optionally filtered by student_id"""
+    """
+    Get payment records, optionally filtered by student_id.
+    Supports keyset pagination via `limit`/`after` and `format=ndjson` streaming.
+    """
     try:
         # Build query filter
         query_filter = {
@@ -15359,6 +14632,12 @@ async def get_payments(
             
             query_filter["student_id"] = student_id
         
+        sort = [("created_at", -1), ("id", -1)]
+        if format == "ndjson":
+            return ndjson_response(db.payments, query_filter, sort, after, transform=transform_payment_record)
+        if after or limit:
+            return await fetch_page(db.payments, query_filter, sort, after, limit, transform=transform_payment_record)
+        
         # Get payments with applied filter
         payments_raw = await db.payments.find(query_filter).sort("created_at", -1).to_list(1000)
         
@@ -15366,29 +14645,7 @@ async def get_payments(
         payments = []
         for payment in payments_raw:
             try:
-                # Ensure required fields exist with defaults if missing
-                if "admission_no" not in payment:
-                    payment["admission_no"] = "N/A"
-                if "created_by" not in payment:
-                    payment["created_by"] = "System"
-                
-                # Transform to frontend-expected format
-                transformed_payment = {
-                    "id": payment.get("id", ""),
-                    "receipt_no": payment.get("receipt_no", ""),
-                    "student_id": payment.get("student_id", ""),
-                    "student_name": payment.get("student_name", ""),
-                    "admission_no": payment.get("admission_no", "N/A"),
-                    "fee_type": payment.get("fee_type", ""),
-                    "amount": payment.get("amount", 0),
-                    "payment_mode": payment.get("payment_mode", ""),
-                    "payment_date": payment.get("payment_date", ""),
-                    "transaction_id": payment.get("transaction_id", ""),
-                    "remarks": payment.get("remarks", ""),
-                    "created_by": payment.get("created_by", "System"),
-                    "created_at": payment.get("created_at", "")
-                }
-                payments.append(transformed_payment)
+                payments.append(transform_payment_record(payment))
             except Exception as e:
                 logging.warning(f"Skipping invalid payment record: {str(e)}")
                 continue
@@ -15525,9 +14782,16 @@ async def get_student_fees(
 @api_router.post("/fees/payments", response_model=Payment)
 async def create_payment(
     payment_data: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user)
 ):
-    """Record a new payment"""
+    """
+    Record a new payment.
+    Send an Idempotency-Key header to make retries safe: a repeated key replays the
+    first response. Without one, an identical payment within 60 seconds is rejected.
+    """
+    claimed_key = None
+    recorded = None
     try:
         # Role-based access control - only admin/super_admin/teacher can process payments
         allowed_roles = ['super_admin', 'admin', 'teacher', 'accountant']
@@ -15547,21 +14811,30 @@ async def create_payment(
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
         
-        # Duplicate payment prevention - check for same payment in last 60 seconds
-        duplicate_window = datetime.utcnow() - timedelta(seconds=60)
-        existing_payment = await db.payments.find_one({
-            "student_id": payment_data.student_id,
-            "fee_type": payment_data.fee_type,
-            "amount": payment_data.amount,
-            "tenant_id": current_user.tenant_id,
-            "payment_date": {"$gte": duplicate_window}
-        })
+        # Duplicate payment prevention - one indexed claim on payment_idempotency
+        if idempotency_key:
+            request_hash = idempotency_fingerprint("payment", payment_data.dict())
+            key, ttl = idempotency_key, PAYMENT_IDEMPOTENCY_TTL_SECONDS
+        else:
+            # Keyless clients keep the old rule: the same student, fee type and amount twice
+            # within a minute is a duplicate, whatever the mode, transaction id or remarks
+            request_hash = idempotency_fingerprint("payment", {
+                "student_id": payment_data.student_id,
+                "fee_type": payment_data.fee_type,
+                "amount": payment_data.amount
+            })
+            key, ttl = f"auto:{request_hash}", PAYMENT_DUPLICATE_WINDOW_SECONDS
         
-        if existing_payment:
+        existing_claim = await claim_idempotency_key(current_user.tenant_id, key, "payment", request_hash, ttl)
+        if existing_claim is not None:
+            if idempotency_key:
+                return replay_idempotent_response(existing_claim)
+            receipt = (existing_claim.get("response") or {}).get("receipt_no")
             raise HTTPException(
                 status_code=409, 
-                detail=f"Duplicate payment detected. A similar payment was made within the last minute. Receipt: {existing_payment.get('receipt_no')}"
+                detail=f"Duplicate payment detected. A similar payment was made within the last minute. Receipt: {receipt}"
             )
+        claimed_key = key
         
         # Generate receipt number
         receipt_no = f"RCP{datetime.utcnow().strftime('%Y%m%d')}{uuid.uuid4().hex[:6].upper()}"
@@ -15586,6 +14859,7 @@ async def create_payment(
         # Save payment
         payment_dict = payment.dict()
         await db.payments.insert_one(payment_dict)
+        recorded = payment.dict()
         
         # Update student fees (ERP logic: overdue -> pending -> advance)
         await apply_payment_to_student_fees(payment, current_user)
@@ -15612,90 +14886,57 @@ async def create_payment(
                 "is_active": True
             }
             await db.transactions.insert_one(fee_transaction)
+            await report_cache.touch(current_user.tenant_id, "transactions")
             logging.info(f"Transaction auto-created: {transaction_receipt} for payment {receipt_no}")
         except Exception as tx_error:
             logging.error(f"Failed to auto-create transaction for payment {receipt_no}: {str(tx_error)}")
         
-        # Calculate updated dashboard statistics AFTER all updates complete using aggregation
-        # This handles unlimited records efficiently without loading all into memory
-        
-        # Aggregate student fees totals
-        fees_pipeline = [
-            {"$match": {"tenant_id": current_user.tenant_id}},
-            {"$group": {
-                "_id": None,
-                "total_fees": {"$sum": "$amount"},
-                "collected": {"$sum": "$paid_amount"},
-                "pending": {"$sum": "$pending_amount"},
-                "overdue": {"$sum": "$overdue_amount"}
-            }}
-        ]
-        fees_result = await db.student_fees.aggregate(fees_pipeline).to_list(1)
-        
-        if fees_result:
-            dashboard_stats = {
-                "total_fees": fees_result[0].get("total_fees", 0),
-                "collected": fees_result[0].get("collected", 0),
-                "pending": fees_result[0].get("pending", 0),
-                "overdue": fees_result[0].get("overdue", 0)
-            }
-        else:
-            dashboard_stats = {"total_fees": 0, "collected": 0, "pending": 0, "overdue": 0}
-        
-        # Calculate today's metrics using aggregation
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
-        
-        payments_pipeline = [
-            {"$match": {
-                "tenant_id": current_user.tenant_id,
-                "payment_date": {"$gte": today_start, "$lte": today_end}
-            }},
-            {"$group": {
-                "_id": None,
-                "count": {"$sum": 1},
-                "total_amount": {"$sum": "$amount"}
-            }}
-        ]
-        payments_result = await db.payments.aggregate(payments_pipeline).to_list(1)
-        
-        if payments_result:
-            dashboard_stats["payments_today"] = payments_result[0].get("count", 0)
-            dashboard_stats["todays_collection"] = payments_result[0].get("total_amount", 0)
-        else:
-            dashboard_stats["payments_today"] = 0
-            dashboard_stats["todays_collection"] = 0
+        # Dashboard figures come from the incrementally maintained fee_totals document
+        dashboard_stats = fee_totals_to_dashboard_stats(await get_fee_totals(current_user.tenant_id))
         
         logging.info(f"Payment created: {payment.id} for student {student['name']}")
         logging.info(f"Updated dashboard stats: {dashboard_stats}")
         
         parent_email = student.get("parent_email") or student.get("guardian_email")
-        asyncio.create_task(notification_svc.notify_payment_received(
+        await notification_svc.notify_payment_received(
             tenant_id=current_user.tenant_id,
             school_id=student["school_id"],
             student_name=student["name"],
             amount=f"{payment_data.amount:,.2f}",
             receipt_no=receipt_no,
             parent_email=parent_email
-        ))
+        )
         
         # Return payment with dashboard stats
         response = payment.dict()
         response["dashboard_stats"] = dashboard_stats
+        await complete_idempotency_key(current_user.tenant_id, claimed_key, response)
         return response
         
+    except HTTPException:
+        if claimed_key:
+            await abandon_idempotency_key(current_user.tenant_id, claimed_key, recorded)
+        raise
     except Exception as e:
         logging.error(f"Failed to create payment: {str(e)}")
+        if claimed_key:
+            await abandon_idempotency_key(current_user.tenant_id, claimed_key, recorded)
         raise HTTPException(status_code=500, detail="Failed to record payment")
 
 @api_router.post("/fees/bulk-payments")
 @api_router.post("/payments/bulk")  # Additional route for frontend compatibility
 async def create_bulk_payment(
     bulk_data: BulkPaymentCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user)
 ):
-    """Process bulk payments for multiple students"""
+    """
+    Process bulk payments for multiple students.
+    An Idempotency-Key header or `idempotency_key` field makes the batch safe to retry.
+    """
+    claimed_key = None
+    payments = []
+    total_amount = 0
     try:
         # Role-based access control - only admin/super_admin can process bulk payments
         allowed_roles = ['super_admin', 'admin', 'accountant']
@@ -15705,8 +14946,16 @@ async def create_bulk_payment(
                 detail=f"Unauthorized: Only {', '.join(allowed_roles)} can process bulk payments"
             )
         
-        payments = []
-        total_amount = 0
+        key = idempotency_key or bulk_data.idempotency_key
+        if key:
+            request_hash = idempotency_fingerprint("bulk_payment", bulk_data.dict(exclude={"idempotency_key"}))
+            existing_claim = await claim_idempotency_key(
+                current_user.tenant_id, key, "bulk_payment", request_hash, PAYMENT_IDEMPOTENCY_TTL_SECONDS
+            )
+            if existing_claim is not None:
+                return replay_idempotent_response(existing_claim)
+            claimed_key = key
+        
         skipped_students = []
         
         for student_id in bulk_data.student_ids:
@@ -15753,6 +15002,8 @@ async def create_bulk_payment(
             # Save payment
             payment_dict = payment.dict()
             await db.payments.insert_one(payment_dict)
+            payments.append(payment)
+            total_amount += payment_amount
             
             # Update student fees
             await apply_payment_to_student_fees(payment, current_user)
@@ -15781,73 +15032,46 @@ async def create_bulk_payment(
                 await db.transactions.insert_one(fee_transaction)
             except Exception as tx_error:
                 logging.error(f"Failed to auto-create transaction for bulk payment {receipt_no}: {str(tx_error)}")
-            
-            payments.append(payment)
-            total_amount += payment_amount
-        
-        # Calculate updated dashboard statistics AFTER all payments complete using aggregation
-        fees_pipeline = [
-            {"$match": {"tenant_id": current_user.tenant_id}},
-            {"$group": {
-                "_id": None,
-                "total_fees": {"$sum": "$amount"},
-                "collected": {"$sum": "$paid_amount"},
-                "pending": {"$sum": "$pending_amount"},
-                "overdue": {"$sum": "$overdue_amount"}
-            }}
-        ]
-        fees_result = await db.student_fees.aggregate(fees_pipeline).to_list(1)
-        
-        if fees_result:
-            dashboard_stats = {
-                "total_fees": fees_result[0].get("total_fees", 0),
-                "collected": fees_result[0].get("collected", 0),
-                "pending": fees_result[0].get("pending", 0),
-                "overdue": fees_result[0].get("overdue", 0)
-            }
-        else:
-            dashboard_stats = {"total_fees": 0, "collected": 0, "pending": 0, "overdue": 0}
-        
-        # Calculate today's metrics using aggregation
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
-        
-        payments_pipeline = [
-            {"$match": {
-                "tenant_id": current_user.tenant_id,
-                "payment_date": {"$gte": today_start, "$lte": today_end}
-            }},
-            {"$group": {
-                "_id": None,
-                "count": {"$sum": 1},
-                "total_amount": {"$sum": "$amount"}
-            }}
-        ]
-        payments_result = await db.payments.aggregate(payments_pipeline).to_list(1)
         
-        if payments_result:
-            dashboard_stats["payments_today"] = payments_result[0].get("count", 0)
-            dashboard_stats["todays_collection"] = payments_result[0].get("total_amount", 0)
-        else:
-            dashboard_stats["payments_today"] = 0
-            dashboard_stats["todays_collection"] = 0
+        await report_cache.touch(current_user.tenant_id, "transactions")
+        # Dashboard figures come from the incrementally maintained fee_totals document
+        dashboard_stats = fee_totals_to_dashboard_stats(await get_fee_totals(current_user.tenant_id))
         
         logging.info(f"Bulk payment processed: {len(payments)} payments, total: {total_amount}")
         logging.info(f"Updated dashboard stats: {dashboard_stats}")
         
-        return {
+        response = {
             "message": f"Bulk payment processed successfully",
             "payments_count": len(payments),
             "total_amount": total_amount,
             "receipts": [p.receipt_no for p in payments],
             "dashboard_stats": dashboard_stats
         }
+        if claimed_key:
+            await complete_idempotency_key(current_user.tenant_id, claimed_key, response)
+        return response
         
+    except HTTPException:
+        if claimed_key:
+            await abandon_idempotency_key(current_user.tenant_id, claimed_key, bulk_payment_recorded(payments, total_amount))
+        raise
     except Exception as e:
         logging.error(f"Failed to process bulk payment: {str(e)}")
+        if claimed_key:
+            await abandon_idempotency_key(current_user.tenant_id, claimed_key, bulk_payment_recorded(payments, total_amount))
         raise HTTPException(status_code=500, detail="Failed to process bulk payment")
 
+def bulk_payment_recorded(payments: List[Payment], total_amount: float) -> Optional[Dict[str, Any]]:
+    """Response replayed for a bulk request that failed after writing some payments"""
+    if not payments:
+        return None
+    return {
+        "message": "Bulk payment partially processed",
+        "payments_count": len(payments),
+        "total_amount": total_amount,
+        "receipts": [p.receipt_no for p in payments]
+    }
+
 @api_router.get("/reports/export")
 async def export_fee_report(
     format: str = "excel",  # "excel" or "pdf"
@@ -16143,117 +15367,36 @@ async def generate_pdf_report(report_type: str, current_user: User, filename: st
         logging.error(f"Failed to generate PDF report: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate PDF report")
 
+async def run_fee_reminder_job(job_id: str, tenant_id: str, sent_by: str):
+    try:
+        stats = await reminder_dispatcher.dispatch(
+            tenant_id,
+            sent_by,
+            on_progress=lambda processed, total: update_job_progress(job_id, processed, total)
+        )
+        await finish_job(job_id, result=stats)
+    except Exception as e:
+        logging.error(f"Fee reminder job {job_id} failed: {str(e)}")
+        await finish_job(job_id, error=str(e))
+
 @api_router.post("/reminders/send")
 async def send_fee_reminders(
     reminder_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
 ):
-    """Send fee reminders to students with pending payments"""
+    """
+    Send fee reminders to students with pending payments.
+    Reminders are dispatched in the background; poll /jobs/{job_id} for
+    total_students / sent_count / failed_count.
+    """
     try:
-        # Get pending student fees (overdue or pending amount > 0)
-        pending_fees = await db.student_fees.find({
-            "tenant_id": current_user.tenant_id,
-            "$or": [
-                {"pending_amount": {"$gt": 0}},
-                {"overdue_amount": {"$gt": 0}}
-            ]
-        }).to_list(1000)
-        
-        # Get unique students with pending fees
-        student_ids = list(set(fee["student_id"] for fee in pending_fees))
-        
-        # Get student contact details
-        students_data = await db.students.find({
-            "id": {"$in": student_ids},
-            "tenant_id": current_user.tenant_id,
-            "is_active": True
-        }).to_list(1000)
-        
-        sent_count = 0
-        failed_count = 0
-        reminder_logs = []
-        
-        for student in students_data:
-            try:
-                # Calculate total pending amount for this student
-                student_pending_fees = [fee for fee in pending_fees if fee["student_id"] == student["id"]]
-                total_pending = sum(fee.get("pending_amount", 0) + fee.get("overdue_amount", 0) 
-                                  for fee in student_pending_fees)
-                
-                # Prepare reminder message
-                fee_types = list(set(fee["fee_type"] for fee in student_pending_fees))
-                message = f"""
-Dear {student['name']},
-
-This is a reminder that you have pending fee payments:
-
-Fee Types: {', '.join(fee_types)}
-Total Amount: ₹{total_pending:,.2f}
-
-Please make the payment at your earliest convenience to avoid any inconvenience.
-
-Thank you,
-School Administration
-                """.strip()
-                
-                # Send email reminder
-                email_success = False
-                sms_success = False
-                
-                if student.get("email"):
-                    try:
-                        await send_email_reminder(student["email"], student["name"], total_pending, fee_types)
-                        email_success = True
-                    except Exception as e:
-                        logging.warning(f"Failed to send email to {student['email']}: {str(e)}")
-                
-                # Send SMS reminder
-                if student.get("phone"):
-                    try:
-                        await send_sms_reminder(student["phone"], student["name"], total_pending)
-                        sms_success = True
-                    except Exception as e:
-                        logging.warning(f"Failed to send SMS to {student['phone']}: {str(e)}")
-                
-                # Log reminder attempt
-                reminder_log = {
-                    "id": str(uuid.uuid4()),
-                    "tenant_id": current_user.tenant_id,
-                    "student_id": student["id"],
-                    "student_name": student["name"],
-                    "admission_no": student["admission_no"],
-                    "email": student.get("email"),
-                    "phone": student.get("phone"),
-                    "total_amount": total_pending,
-                    "fee_types": fee_types,
-                    "email_sent": email_success,
-                    "sms_sent": sms_success,
-                    "sent_by": current_user.id,
-                    "sent_at": datetime.utcnow(),
-                    "message": message
-                }
-                
-                # Save reminder log to database
-                await db.reminder_logs.insert_one(reminder_log)
-                reminder_logs.append(reminder_log)
-                
-                if email_success or sms_success:
-                    sent_count += 1
-                else:
-                    failed_count += 1
-                    
-            except Exception as e:
-                logging.error(f"Failed to send reminder to student {student['id']}: {str(e)}")
-                failed_count += 1
-        
-        logging.info(f"Fee reminders sent: {sent_count} successful, {failed_count} failed")
+        job = await create_job(current_user.tenant_id, "fee_reminders", current_user.id)
+        start_background_task(run_fee_reminder_job(job.id, current_user.tenant_id, current_user.id))
         
         return {
-            "message": f"Fee reminders processed successfully",
-            "total_students": len(students_data),
-            "sent_count": sent_count,
-            "failed_count": failed_count,
-            "reminder_logs": reminder_logs[:10]  # Return first 10 logs for confirmation
+            "message": "Fee reminders are being sent",
+            "job_id": job.id,
+            "status": job.status
         }
         
     except Exception as e:
@@ -16261,20 +15404,8 @@ School Administration
         raise HTTPException(status_code=500, detail="Failed to send fee reminders")
 
 async def send_email_reminder(email: str, student_name: str, amount: float, fee_types: list):
-    """Send email reminder using Replit Mail integration"""
+    """Send email reminder through the configured email transport (SMTP / Replit Mail)"""
     try:
-        # Get auth token for Replit Mail
-        x_replit_token = os.environ.get('REPL_IDENTITY')
-        if x_replit_token:
-            x_replit_token = "repl " + x_replit_token
-        else:
-            x_replit_token = os.environ.get('WEB_REPL_RENEWAL')
-            if x_replit_token:
-                x_replit_token = "depl " + x_replit_token
-        
-        if not x_replit_token:
-            raise Exception("No Replit authentication token found")
-        
         # Prepare email content
         subject = f"Fee Payment Reminder - {student_name}"
         
@@ -16316,8 +15447,7 @@ async def send_email_reminder(email: str, student_name: str, amount: float, fee_
         School Administration
         """
         
-        # Send email via Replit Mail API
-        response = await send_replit_email(x_replit_token, email, subject, html_content, text_content)
+        await message_transports.send_email([email], subject, text_content, html_content)
         logging.info(f"Email reminder sent to {email}")
         return True
         
@@ -16325,59 +15455,24 @@ async def send_email_reminder(email: str, student_name: str, amount: float, fee_
         logging.error(f"Failed to send email reminder: {str(e)}")
         raise
 
-async def send_replit_email(auth_token: str, to_email: str, subject: str, html_content: str, text_content: str):
-    """Send email using Replit Mail API"""
-    response = requests.post(
-        "https://connectors.replit.com/api/v2/mailer/send",
-        headers={
-            "Content-Type": "application/json",
-            "X_REPLIT_TOKEN": auth_token,
-        },
-        json={
-            "to": to_email,
-            "subject": subject,
-            "html": html_content,
-            "text": text_content,
-        }
-    )
-    
-    if not response.ok:
-        error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-        raise Exception(f"Email API error: {error_data}")
-    
-    return response.json()
-
 async def send_sms_reminder(phone: str, student_name: str, amount: float):
-    """Send SMS reminder using Twilio integration"""
+    """Send SMS reminder through the configured SMS transport (Twilio / HTTP gateway)"""
     try:
-        # Get Twilio credentials
-        account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-        twilio_phone = os.environ.get('TWILIO_PHONE_NUMBER')
-        
-        if not all([account_sid, auth_token, twilio_phone]):
-            raise Exception("Twilio credentials not configured")
-        
-        # Initialize Twilio client
-        client = Client(account_sid, auth_token)
-        
         # Prepare SMS message
         message_body = f"Fee Reminder: Dear {student_name}, you have pending fees of ₹{amount:,.0f}. Please pay at your earliest convenience. - School Admin"
         
-        # Send SMS
-        message = client.messages.create(
-            body=message_body,
-            from_=twilio_phone,
-            to=phone
-        )
+        # Runs on the transport's own thread pool, off the event loop
+        result = await message_transports.send_sms(phone, message_body)
         
-        logging.info(f"SMS reminder sent to {phone}, SID: {message.sid}")
+        logging.info(f"SMS reminder sent to {phone} via {result.get('provider')}")
         return True
         
     except Exception as e:
         logging.error(f"Failed to send SMS reminder: {str(e)}")
         raise
 
+reminder_dispatcher = ReminderDispatcher(db, send_email_reminder, send_sms_reminder)
+
 # ==================== ENTERPRISE FEE MANAGEMENT - INVOICE & BILLING APIs ====================
 
 @api_router.get("/fees/invoices")
@@ -16408,34 +15503,342 @@ async def get_fee_invoices(
         logging.error(f"Failed to get fee invoices: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get fee invoices")
 
-@api_router.get("/fees/billing-cycles")
-async def get_billing_cycles(
-    year: Optional[int] = None,
-    current_user: User = Depends(get_current_user)
-):
-    """Get all billing cycles with optional year filter"""
+@api_router.get("/fees/billing-cycles")
+async def get_billing_cycles(
+    year: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Get all billing cycles with optional year filter"""
+    try:
+        if current_user.role not in ['super_admin', 'admin', 'accountant']:
+            raise HTTPException(status_code=403, detail="Only admin/accountant can view billing cycles")
+        
+        query = {"tenant_id": current_user.tenant_id, "is_active": True}
+        if year:
+            query["billing_year"] = year
+        
+        cycles = await db.fee_billing_cycles.find(query).sort([("billing_year", -1), ("billing_month", -1)]).to_list(100)
+        return sanitize_mongo_data(cycles)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to get billing cycles: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get billing cycles")
+
+FEE_INVOICE_INSERT_CHUNK_SIZE = 500
+
+def build_fee_items_for_class(fee_configs: List[Dict[str, Any]], class_id: Optional[str], billing_month: int):
+    """Fee items billable this month for a class - (items, total)"""
+    fee_items = []
+    class_total = 0.0
+    
+    for config in fee_configs:
+        # Check if config applies to this student's class
+        if config.get("apply_to_classes") == "all" or config.get("apply_to_classes") == class_id:
+            # Check frequency - only include monthly fees or split yearly fees
+            frequency = config.get("frequency", "monthly")
+            fee_amount = config.get("amount", 0)
+            
+            if frequency == "monthly":
+                fee_items.append({
+                    "fee_type": config.get("fee_type"),
+                    "amount": fee_amount,
+                    "description": f"Monthly {config.get('fee_type')}"
+                })
+                class_total += fee_amount
+            elif frequency == "quarterly" and billing_month in [1, 4, 7, 10]:
+                fee_items.append({
+                    "fee_type": config.get("fee_type"),
+                    "amount": fee_amount,
+                    "description": f"Quarterly {config.get('fee_type')}"
+                })
+                class_total += fee_amount
+            elif frequency == "half-yearly" and billing_month in [1, 7]:
+                fee_items.append({
+                    "fee_type": config.get("fee_type"),
+                    "amount": fee_amount,
+                    "description": f"Half-Yearly {config.get('fee_type')}"
+                })
+                class_total += fee_amount
+            elif frequency == "yearly" and billing_month == 1:
+                fee_items.append({
+                    "fee_type": config.get("fee_type"),
+                    "amount": fee_amount,
+                    "description": f"Yearly {config.get('fee_type')}"
+                })
+                class_total += fee_amount
+    
+    return fee_items, class_total
+
+async def generate_billing_cycle_invoices(
+    job_id: str,
+    current_user: User,
+    billing_month: int,
+    billing_year: int,
+    existing_cycle: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Batch pipeline behind POST /fees/billing-cycles/generate: load configs, classes,
+    sections and the parent map once, derive fee items per class, then stream students
+    and insert invoices with insert_many in chunks, reporting progress on the job record.
+    """
+    import calendar
+    billing_period = f"{billing_year}-{str(billing_month).zfill(2)}"
+    
+    # Get month name
+    month_name = calendar.month_name[billing_month]
+    cycle_name = f"{month_name} {billing_year}"
+    
+    # Calculate dates
+    last_day = calendar.monthrange(billing_year, billing_month)[1]
+    start_date = f"{billing_year}-{str(billing_month).zfill(2)}-01"
+    end_date = f"{billing_year}-{str(billing_month).zfill(2)}-{last_day}"
+    
+    # Due date: 15th of next month
+    next_month = billing_month + 1 if billing_month < 12 else 1
+    next_year = billing_year if billing_month < 12 else billing_year + 1
+    due_date = f"{next_year}-{str(next_month).zfill(2)}-15"
+    
+    # Get all active fee configurations
+    fee_configs = await db.fee_configurations.find({
+        "tenant_id": current_user.tenant_id,
+        "is_active": True
+    }).to_list(100)
+    
+    # Get classes for class names
+    classes = await db.classes.find({"tenant_id": current_user.tenant_id}).to_list(100)
+    class_map = {c["id"]: c for c in classes}
+    
+    # Get sections
+    sections = await db.sections.find({"tenant_id": current_user.tenant_id}).to_list(100)
+    section_map = {s["id"]: s for s in sections}
+    
+    # Parent lookup: linked student id -> first parent user, in one query
+    parent_map: Dict[str, Dict[str, Any]] = {}
+    parents_cursor = db.users.find(
+        {
+            "tenant_id": current_user.tenant_id,
+            "role": "parent",
+            "linked_student_ids": {"$exists": True, "$ne": []}
+        },
+        {"_id": 0, "id": 1, "full_name": 1, "linked_student_ids": 1}
+    )
+    async for parent_user in parents_cursor:
+        for linked_id in parent_user.get("linked_student_ids") or []:
+            parent_map.setdefault(linked_id, parent_user)
+    
+    student_query = {
+        "tenant_id": current_user.tenant_id,
+        "is_active": True
+    }
+    total_students = await db.students.count_documents(student_query)
+    await update_job_progress(job_id, 0, total_students)
+    
+    # Fee items depend only on the class, so compute them once per class
+    class_fee_items: Dict[Optional[str], tuple] = {}
+    
+    invoices_created = 0
+    students_processed = 0
+    total_amount = 0.0
+    pending_invoices = []
+    
+    async def flush(batch):
+        if batch:
+            await db.fee_invoices.insert_many(batch, ordered=False)
+            await update_job_progress(job_id, students_processed)
+    
+    students_cursor = db.students.find(
+        student_query,
+        {"_id": 0, "id": 1, "name": 1, "admission_no": 1, "class_id": 1, "section_id": 1}
+    )
+    async for student in students_cursor:
+        students_processed += 1
+        class_id = student.get("class_id")
+        if class_id not in class_fee_items:
+            class_fee_items[class_id] = build_fee_items_for_class(fee_configs, class_id, billing_month)
+        fee_items, student_total = class_fee_items[class_id]
+        
+        if fee_items and student_total > 0:
+            # Get class and section names
+            class_info = class_map.get(class_id, {})
+            section_info = section_map.get(student.get("section_id"), {})
+            parent_user = parent_map.get(student.get("id"))
+            
+            invoice = FeeInvoice(
+                tenant_id=current_user.tenant_id,
+                school_id=current_user.school_id or "default",
+                student_id=student["id"],
+                student_name=student.get("name", ""),
+                admission_no=student.get("admission_no", ""),
+                class_id=class_id,
+                class_name=class_info.get("name", ""),
+                section_id=student.get("section_id"),
+                section_name=section_info.get("name", ""),
+                billing_month=billing_month,
+                billing_year=billing_year,
+                billing_period=billing_period,
+                fee_items=[dict(item) for item in fee_items],
+                total_amount=student_total,
+                pending_amount=student_total,
+                due_date=due_date,
+                status="pending",
+                parent_id=parent_user.get("id") if parent_user else None,
+                parent_name=parent_user.get("full_name") if parent_user else None,
+                billing_cycle_id=existing_cycle.get("id") if existing_cycle else None
+            )
+            
+            pending_invoices.append(invoice.dict())
+            invoices_created += 1
+            total_amount += student_total
+        
+        if len(pending_invoices) >= FEE_INVOICE_INSERT_CHUNK_SIZE:
+            await flush(pending_invoices)
+            pending_invoices = []
+    
+    await flush(pending_invoices)
+    
+    # Create or update billing cycle
+    cycle_doc = {
+        "id": existing_cycle.get("id") if existing_cycle else str(uuid.uuid4()),
+        "tenant_id": current_user.tenant_id,
+        "school_id": current_user.school_id or "default",
+        "billing_month": billing_month,
+        "billing_year": billing_year,
+        "billing_period": billing_period,
+        "cycle_name": cycle_name,
+        "start_date": start_date,
+        "end_date": end_date,
+        "due_date": due_date,
+        "status": "active",
+        "invoices_generated": True,
+        "total_invoices": invoices_created,
+        "total_amount": total_amount,
+        "collected_amount": 0.0,
+        "generated_at": datetime.utcnow(),
+        "generated_by": current_user.id,
+        "is_active": True,
+        "created_at": existing_cycle.get("created_at", datetime.utcnow()) if existing_cycle else datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    
+    if existing_cycle:
+        await db.fee_billing_cycles.update_one(
+            {"id": existing_cycle["id"]},
+            {"$set": cycle_doc}
+        )
+    else:
+        await db.fee_billing_cycles.insert_one(cycle_doc)
+    
+    logging.info(f"Generated {invoices_created} invoices for billing period {billing_period} ({students_processed} students scanned)")
+    
+    result = {
+        "message": f"Successfully generated {invoices_created} invoices for {cycle_name}",
+        "billing_period": billing_period,
+        "invoices_created": invoices_created,
+        "total_amount": total_amount,
+        "due_date": due_date
+    }
+    await finish_job(job_id, result=result)
+    return result
+
+BILLING_CYCLE_CLAIM_STALE_SECONDS = 3600
+
+async def claim_billing_cycle(current_user: User, billing_month: int, billing_year: int, billing_period: str):
+    """
+    Mark the period's cycle as generating (creating it if needed) in one atomic step.
+    Returns the claimed cycle, or None when another run holds the claim. Raises 400 when
+    invoices already exist, and 503 while the unique (tenant_id, billing_period) index that
+    stops a concurrent upsert from creating a second cycle is missing.
+    """
+    now = datetime.utcnow()
+    existing_cycle = await db.fee_billing_cycles.find_one({
+        "tenant_id": current_user.tenant_id,
+        "billing_period": billing_period,
+        "is_active": True
+    })
+    if existing_cycle and existing_cycle.get("invoices_generated"):
+        raise HTTPException(status_code=400, detail="Invoices already generated for this billing period")
+    
+    claim = {"$set": {"status": "generating", "generation_started_at": now, "updated_at": now}}
+    not_claimed = {
+        "invoices_generated": {"$ne": True},
+        "$or": [
+            {"status": {"$ne": "generating"}},
+            # A run that died without releasing its claim
+            {"generation_started_at": {"$lt": now - timedelta(seconds=BILLING_CYCLE_CLAIM_STALE_SECONDS)}}
+        ]
+    }
+    
+    if existing_cycle:
+        cycle = await db.fee_billing_cycles.find_one_and_update(
+            {"id": existing_cycle["id"], **not_claimed},
+            claim,
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        if not await index_manager.has_index("fee_billing_cycles", "fee_billing_cycles_tenant_period_unique"):
+            logging.error("fee_billing_cycles_tenant_period_unique is missing; refusing to create billing cycles")
+            raise HTTPException(status_code=503, detail="Billing cycle generation is unavailable until database indexes are built")
+        try:
+            cycle = await db.fee_billing_cycles.find_one_and_update(
+                {"tenant_id": current_user.tenant_id, "billing_period": billing_period, "is_active": True, **not_claimed},
+                {
+                    **claim,
+                    "$setOnInsert": {
+                        "id": str(uuid.uuid4()),
+                        "school_id": current_user.school_id or "default",
+                        "billing_month": billing_month,
+                        "billing_year": billing_year,
+                        "created_at": now
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None
+    
+    if cycle:
+        # Invoices left behind by a run that died before finishing
+        await db.fee_invoices.delete_many({
+            "tenant_id": current_user.tenant_id,
+            "billing_period": billing_period,
+            "billing_cycle_id": cycle["id"]
+        })
+    return cycle
+
+async def release_billing_cycle(cycle: Dict[str, Any]):
+    """Give the claim back after a failed run, dropping its partial invoices, so the period can be generated again"""
+    result = await db.fee_billing_cycles.update_one(
+        {"id": cycle["id"], "status": "generating", "generation_started_at": cycle.get("generation_started_at")},
+        {"$set": {"status": "draft", "updated_at": datetime.utcnow()}}
+    )
+    if result.modified_count:
+        await db.fee_invoices.delete_many({
+            "tenant_id": cycle["tenant_id"],
+            "billing_period": cycle["billing_period"],
+            "billing_cycle_id": cycle["id"]
+        })
+
+async def run_billing_cycle_job(job_id: str, current_user: User, billing_month: int, billing_year: int, existing_cycle):
     try:
-        if current_user.role not in ['super_admin', 'admin', 'accountant']:
-            raise HTTPException(status_code=403, detail="Only admin/accountant can view billing cycles")
-        
-        query = {"tenant_id": current_user.tenant_id, "is_active": True}
-        if year:
-            query["billing_year"] = year
-        
-        cycles = await db.fee_billing_cycles.find(query).sort([("billing_year", -1), ("billing_month", -1)]).to_list(100)
-        return sanitize_mongo_data(cycles)
-    except HTTPException:
-        raise
+        await generate_billing_cycle_invoices(job_id, current_user, billing_month, billing_year, existing_cycle)
     except Exception as e:
-        logging.error(f"Failed to get billing cycles: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to get billing cycles")
+        logging.error(f"Billing cycle job {job_id} failed: {str(e)}")
+        await release_billing_cycle(existing_cycle)
+        await finish_job(job_id, error=str(e))
 
 @api_router.post("/fees/billing-cycles/generate")
 async def generate_billing_cycle(
     cycle_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
 ):
-    """Generate invoices for a billing cycle"""
+    """Generate invoices for a billing cycle
+    
+    Pass "run_in_background": true to return a job id immediately and poll /jobs/{job_id}.
+    """
+    job = None
+    cycle = None
     try:
         if current_user.role not in ['super_admin', 'admin', 'accountant']:
             raise HTTPException(status_code=403, detail="Only admin/accountant can generate billing cycles")
@@ -16444,180 +15847,34 @@ async def generate_billing_cycle(
         billing_year = cycle_data.get("billing_year", datetime.utcnow().year)
         billing_period = f"{billing_year}-{str(billing_month).zfill(2)}"
         
-        # Check if cycle already exists
-        existing_cycle = await db.fee_billing_cycles.find_one({
-            "tenant_id": current_user.tenant_id,
-            "billing_period": billing_period,
-            "is_active": True
-        })
-        
-        if existing_cycle and existing_cycle.get("invoices_generated"):
-            raise HTTPException(status_code=400, detail="Invoices already generated for this billing period")
-        
-        # Get month name
-        import calendar
-        month_name = calendar.month_name[billing_month]
-        cycle_name = f"{month_name} {billing_year}"
-        
-        # Calculate dates
-        last_day = calendar.monthrange(billing_year, billing_month)[1]
-        start_date = f"{billing_year}-{str(billing_month).zfill(2)}-01"
-        end_date = f"{billing_year}-{str(billing_month).zfill(2)}-{last_day}"
-        
-        # Due date: 15th of next month
-        next_month = billing_month + 1 if billing_month < 12 else 1
-        next_year = billing_year if billing_month < 12 else billing_year + 1
-        due_date = f"{next_year}-{str(next_month).zfill(2)}-15"
-        
-        # Get all active fee configurations
-        fee_configs = await db.fee_configurations.find({
-            "tenant_id": current_user.tenant_id,
-            "is_active": True
-        }).to_list(100)
-        
-        # Get all active students
-        students = await db.students.find({
-            "tenant_id": current_user.tenant_id,
-            "is_active": True
-        }).to_list(5000)
-        
-        # Get classes for class names
-        classes = await db.classes.find({"tenant_id": current_user.tenant_id}).to_list(100)
-        class_map = {c["id"]: c for c in classes}
-        
-        # Get sections
-        sections = await db.sections.find({"tenant_id": current_user.tenant_id}).to_list(100)
-        section_map = {s["id"]: s for s in sections}
-        
-        # Generate invoices for each student
-        invoices_created = 0
-        total_amount = 0.0
-        
-        for student in students:
-            # Calculate fee items for this student
-            fee_items = []
-            student_total = 0.0
-            
-            for config in fee_configs:
-                # Check if config applies to this student's class
-                if config.get("apply_to_classes") == "all" or config.get("apply_to_classes") == student.get("class_id"):
-                    # Check frequency - only include monthly fees or split yearly fees
-                    frequency = config.get("frequency", "monthly")
-                    fee_amount = config.get("amount", 0)
-                    
-                    if frequency == "monthly":
-                        fee_items.append({
-                            "fee_type": config.get("fee_type"),
-                            "amount": fee_amount,
-                            "description": f"Monthly {config.get('fee_type')}"
-                        })
-                        student_total += fee_amount
-                    elif frequency == "quarterly" and billing_month in [1, 4, 7, 10]:
-                        fee_items.append({
-                            "fee_type": config.get("fee_type"),
-                            "amount": fee_amount,
-                            "description": f"Quarterly {config.get('fee_type')}"
-                        })
-                        student_total += fee_amount
-                    elif frequency == "half-yearly" and billing_month in [1, 7]:
-                        fee_items.append({
-                            "fee_type": config.get("fee_type"),
-                            "amount": fee_amount,
-                            "description": f"Half-Yearly {config.get('fee_type')}"
-                        })
-                        student_total += fee_amount
-                    elif frequency == "yearly" and billing_month == 1:
-                        fee_items.append({
-                            "fee_type": config.get("fee_type"),
-                            "amount": fee_amount,
-                            "description": f"Yearly {config.get('fee_type')}"
-                        })
-                        student_total += fee_amount
-            
-            if fee_items and student_total > 0:
-                # Get class and section names
-                class_info = class_map.get(student.get("class_id"), {})
-                section_info = section_map.get(student.get("section_id"), {})
-                
-                # Get parent info if available
-                parent_user = await db.users.find_one({
-                    "tenant_id": current_user.tenant_id,
-                    "linked_student_ids": student.get("id"),
-                    "role": "parent"
-                })
-                
-                invoice = FeeInvoice(
-                    tenant_id=current_user.tenant_id,
-                    school_id=current_user.school_id or "default",
-                    student_id=student["id"],
-                    student_name=student.get("name", ""),
-                    admission_no=student.get("admission_no", ""),
-                    class_id=student.get("class_id"),
-                    class_name=class_info.get("name", ""),
-                    section_id=student.get("section_id"),
-                    section_name=section_info.get("name", ""),
-                    billing_month=billing_month,
-                    billing_year=billing_year,
-                    billing_period=billing_period,
-                    fee_items=fee_items,
-                    total_amount=student_total,
-                    pending_amount=student_total,
-                    due_date=due_date,
-                    status="pending",
-                    parent_id=parent_user.get("id") if parent_user else None,
-                    parent_name=parent_user.get("full_name") if parent_user else None
-                )
-                
-                await db.fee_invoices.insert_one(invoice.dict())
-                invoices_created += 1
-                total_amount += student_total
-        
-        # Create or update billing cycle
-        cycle_doc = {
-            "id": existing_cycle.get("id") if existing_cycle else str(uuid.uuid4()),
-            "tenant_id": current_user.tenant_id,
-            "school_id": current_user.school_id or "default",
-            "billing_month": billing_month,
-            "billing_year": billing_year,
-            "billing_period": billing_period,
-            "cycle_name": cycle_name,
-            "start_date": start_date,
-            "end_date": end_date,
-            "due_date": due_date,
-            "status": "active",
-            "invoices_generated": True,
-            "total_invoices": invoices_created,
-            "total_amount": total_amount,
-            "collected_amount": 0.0,
-            "generated_at": datetime.utcnow(),
-            "generated_by": current_user.id,
-            "is_active": True,
-            "created_at": existing_cycle.get("created_at", datetime.utcnow()) if existing_cycle else datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
+        # Claim the cycle atomically so two clicks (or two admins) can't both generate it
+        cycle = await claim_billing_cycle(current_user, billing_month, billing_year, billing_period)
+        if cycle is None:
+            raise HTTPException(status_code=409, detail="Invoices for this billing period are already being generated")
+        existing_cycle = cycle
         
-        if existing_cycle:
-            await db.fee_billing_cycles.update_one(
-                {"id": existing_cycle["id"]},
-                {"$set": cycle_doc}
-            )
-        else:
-            await db.fee_billing_cycles.insert_one(cycle_doc)
+        job = await create_job(current_user.tenant_id, "billing_cycle_generation", created_by=current_user.id)
         
-        logging.info(f"Generated {invoices_created} invoices for billing period {billing_period}")
+        if cycle_data.get("run_in_background"):
+            start_background_task(run_billing_cycle_job(job.id, current_user, billing_month, billing_year, existing_cycle))
+            return {
+                "message": f"Invoice generation started for {billing_period}",
+                "billing_period": billing_period,
+                "job_id": job.id,
+                "status": "running"
+            }
         
-        return {
-            "message": f"Successfully generated {invoices_created} invoices for {cycle_name}",
-            "billing_period": billing_period,
-            "invoices_created": invoices_created,
-            "total_amount": total_amount,
-            "due_date": due_date
-        }
+        result = await generate_billing_cycle_invoices(job.id, current_user, billing_month, billing_year, existing_cycle)
+        return {**result, "job_id": job.id}
         
     except HTTPException:
         raise
     except Exception as e:
         logging.error(f"Failed to generate billing cycle: {str(e)}")
+        if cycle:
+            await release_billing_cycle(cycle)
+        if job:
+            await finish_job(job.id, error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to generate billing cycle: {str(e)}")
 
 @api_router.get("/fees/student-dashboard/{student_id}")
@@ -16965,6 +16222,9 @@ async def pay_invoice(
         )
         
         await db.payments.insert_one(payment.dict())
+        await adjust_fee_totals(
+            current_user.tenant_id, payments=1, payment_amount=payment.amount, payment_date=payment.payment_date
+        )
         
         # Update invoice
         new_paid = invoice.get("paid_amount", 0) + payment_data.amount
@@ -17016,58 +16276,76 @@ async def pay_invoice(
         raise HTTPException(status_code=500, detail="Failed to process payment")
 
 # Helper functions
+STUDENT_FEE_BULK_CHUNK_SIZE = 500
+
 async def create_student_fees_from_config(fee_config: FeeConfiguration, current_user: User):
     """Create student fee records based on fee configuration
     
     Creates student_fees records for all students matching the fee configuration's class criteria.
-    Checks for duplicates and only creates new records if they don't exist.
+    Existing (student_id, fee_config_id) rows are prefetched in one query, the diff is computed
+    in memory, and inserts/updates are applied with unordered bulk_write in chunks.
+    Returns a {"created", "updated", "unchanged"} report.
     """
     try:
         logging.info(f"=== CREATE STUDENT FEES START === Config ID: {fee_config.id}, apply_to_classes: {fee_config.apply_to_classes}")
         
         # Get students based on apply_to_classes
-        if fee_config.apply_to_classes == "all":
-            logging.info(f"Querying ALL students for tenant {current_user.tenant_id}")
-            students = await db.students.find({
-                "tenant_id": current_user.tenant_id,
-                "is_active": True
-            }).to_list(1000)
-        else:
+        student_query = {
+            "tenant_id": current_user.tenant_id,
+            "is_active": True
+        }
+        if fee_config.apply_to_classes != "all":
             # Specific class
-            logging.info(f"Querying students for tenant {current_user.tenant_id}, class_id: {fee_config.apply_to_classes}")
-            students = await db.students.find({
+            student_query["class_id"] = fee_config.apply_to_classes
+        
+        # Prefetch every existing active row for this configuration in one round trip
+        existing_by_student: Dict[str, Dict[str, Any]] = {}
+        existing_cursor = db.student_fees.find(
+            {
                 "tenant_id": current_user.tenant_id,
-                "class_id": fee_config.apply_to_classes,
+                "fee_config_id": fee_config.id,
                 "is_active": True
-            }).to_list(1000)
-        
-        logging.info(f"Found {len(students)} students matching criteria")
+            },
+            {"_id": 0, "id": 1, "student_id": 1, "fee_type": 1, "amount": 1,
+             "paid_amount": 1, "pending_amount": 1, "due_date": 1}
+        )
+        async for existing_fee in existing_cursor:
+            # Keep the first row per student, matching the previous find_one semantics
+            existing_by_student.setdefault(existing_fee["student_id"], existing_fee)
         
         created_count = 0
         updated_count = 0
-        
-        for student in students:
-            # Check if student_fee already exists for this student and fee config
-            existing_fee = await db.student_fees.find_one({
-                "tenant_id": current_user.tenant_id,
-                "student_id": student["id"],
-                "fee_config_id": fee_config.id,
-                "is_active": True
-            })
+        unchanged_count = 0
+        students_seen = 0
+        operations = []
+        totals_delta = {"total_fees": 0, "pending": 0, "pending_records": 0}
+        
+        async def flush(ops):
+            if ops:
+                await db.student_fees.bulk_write(ops, ordered=False)
+        
+        students_cursor = db.students.find(
+            student_query,
+            {"_id": 0, "id": 1, "name": 1, "admission_no": 1, "class_id": 1, "section_id": 1}
+        )
+        async for student in students_cursor:
+            students_seen += 1
+            existing_fee = existing_by_student.get(student["id"])
             
             if existing_fee:
-                # Update existing student_fee with new configuration values
-                # Calculate new pending_amount based on what's unpaid
-                old_amount = existing_fee.get("amount", 0)
-                paid_amount = existing_fee.get("paid_amount", 0)
-                old_pending = existing_fee.get("pending_amount", 0)
-                old_overdue = existing_fee.get("overdue_amount", 0)
-                
                 # New pending = new total amount - what's already paid
+                paid_amount = existing_fee.get("paid_amount", 0)
                 new_pending = max(0, fee_config.amount - paid_amount)
                 
+                if (existing_fee.get("fee_type") == fee_config.fee_type
+                        and existing_fee.get("amount") == fee_config.amount
+                        and existing_fee.get("pending_amount") == new_pending
+                        and existing_fee.get("due_date") == fee_config.due_date):
+                    unchanged_count += 1
+                    continue
+                
                 # Update the student_fee record with new config values
-                await db.student_fees.update_one(
+                operations.append(UpdateOne(
                     {"id": existing_fee["id"]},
                     {"$set": {
                         "fee_type": fee_config.fee_type,
@@ -17076,8 +16354,12 @@ async def create_student_fees_from_config(fee_config: FeeConfiguration, current_
                         "due_date": fee_config.due_date,
                         "updated_at": datetime.utcnow()
                     }}
-                )
+                ))
                 updated_count += 1
+                old_pending = existing_fee.get("pending_amount", 0)
+                totals_delta["total_fees"] += fee_config.amount - existing_fee.get("amount", 0)
+                totals_delta["pending"] += new_pending - old_pending
+                totals_delta["pending_records"] += int(new_pending > 0) - int(old_pending > 0)
             else:
                 # Create new student_fee record
                 student_fee = StudentFee(
@@ -17094,14 +16376,24 @@ async def create_student_fees_from_config(fee_config: FeeConfiguration, current_
                     pending_amount=fee_config.amount,
                     due_date=fee_config.due_date
                 )
-                
-                student_fee_dict = student_fee.dict()
-                logging.info(f"💾 Creating student_fee for {student['name']}: amount={student_fee_dict.get('amount')}, pending={student_fee_dict.get('pending_amount')}, dict_keys={list(student_fee_dict.keys())}")
-                await db.student_fees.insert_one(student_fee_dict)
+                operations.append(InsertOne(student_fee.dict()))
                 created_count += 1
+                totals_delta["total_fees"] += fee_config.amount
+                totals_delta["pending"] += fee_config.amount
+                totals_delta["pending_records"] += int(fee_config.amount > 0)
+            
+            if len(operations) >= STUDENT_FEE_BULK_CHUNK_SIZE:
+                await flush(operations)
+                operations = []
+        
+        await flush(operations)
+        await adjust_fee_totals(current_user.tenant_id, **totals_delta)
         
-        logging.info(f"Student fees generated for config {fee_config.id}: {created_count} created, {updated_count} updated")
-        return {"created": created_count, "updated": updated_count}
+        logging.info(
+            f"Student fees generated for config {fee_config.id} over {students_seen} students: "
+            f"{created_count} created, {updated_count} updated, {unchanged_count} unchanged"
+        )
+        return {"created": created_count, "updated": updated_count, "unchanged": unchanged_count}
             
     except Exception as e:
         logging.error(f"Failed to create student fees: {str(e)}")
@@ -17113,6 +16405,8 @@ async def create_student_fees_from_config(fee_config: FeeConfiguration, current_
 # ========================================
 async def apply_payment_to_student_fees(payment: Payment, current_user: User):
     """Apply payment to student fees using ERP logic (overdue -> pending -> advance)"""
+    # Deltas for the fee_totals read model, accumulated as each write lands
+    totals_delta = {"total_fees": 0, "collected": 0, "pending": 0, "overdue": 0, "pending_records": 0}
     try:
         logging.info(f"🔍 APPLY_PAYMENT: Looking for student_id={payment.student_id}, fee_type={payment.fee_type}, tenant={current_user.tenant_id}")
         
@@ -17158,6 +16452,8 @@ async def apply_payment_to_student_fees(payment: Payment, current_user: User):
                 )
                 
                 await db.student_fees.insert_one(student_fee.dict())
+                totals_delta["total_fees"] += payment.amount
+                totals_delta["collected"] += payment.amount
                 logging.info(f"Created on-the-fly student_fee for {payment.student_name} - {payment.fee_type}")
                 return  # Payment already recorded in the new student_fee
         
@@ -17188,6 +16484,8 @@ async def apply_payment_to_student_fees(payment: Payment, current_user: User):
                 current_overdue -= overdue_payment
                 current_paid += overdue_payment
                 remaining_amount -= overdue_payment
+                totals_delta["overdue"] -= overdue_payment
+                totals_delta["collected"] += overdue_payment
             
             # Then apply to pending
             if remaining_amount > 0 and current_pending > 0:
@@ -17205,6 +16503,10 @@ async def apply_payment_to_student_fees(payment: Payment, current_user: User):
                 current_pending -= pending_payment
                 current_paid += pending_payment
                 remaining_amount -= pending_payment
+                totals_delta["pending"] -= pending_payment
+                totals_delta["collected"] += pending_payment
+                if current_pending <= 0:
+                    totals_delta["pending_records"] -= 1
             
             # Calculate status using UPDATED amounts (not stale data)
             total_pending = current_pending + current_overdue
@@ -17224,20 +16526,45 @@ async def apply_payment_to_student_fees(payment: Payment, current_user: User):
             
     except Exception as e:
         logging.error(f"❌ Failed to apply payment to student fees: {str(e)}")
+    finally:
+        await adjust_fee_totals(
+            current_user.tenant_id,
+            payments=1,
+            payment_amount=payment.amount,
+            payment_date=payment.payment_date,
+            **totals_delta
+        )
 
 # ===== ACCOUNTS & TRANSACTIONS API ENDPOINTS =====
 
-@api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(current_user: User = Depends(get_current_user)):
-    """Get all transactions for the current tenant"""
+@api_router.get("/transactions", response_model=Union[List[Transaction], TransactionPage])
+async def get_transactions(
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get all transactions for the current tenant.
+    Supports keyset pagination via `limit`/`after` and `format=ndjson` streaming.
+    """
     try:
-        transactions = await db.transactions.find({
+        query = {
             "tenant_id": current_user.tenant_id,
             "is_active": True
-        }).sort([("transaction_date", -1)]).to_list(1000)
+        }
+        sort = [("transaction_date", -1), ("id", -1)]
+        if format == "ndjson":
+            return ndjson_response(db.transactions, query, sort, after, transform=lambda t: Transaction(**t).dict())
+        if after or limit:
+            return await fetch_page(db.transactions, query, sort, after, limit, transform=lambda t: Transaction(**t))
+        
+        transactions = await db.transactions.find(query).sort([("transaction_date", -1)]).to_list(1000)
         
         return [Transaction(**transaction) for transaction in transactions]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Failed to get transactions: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve transactions")
@@ -17290,6 +16617,7 @@ async def create_transaction(
         # Save to database
         transaction_dict = transaction.dict()
         await db.transactions.insert_one(transaction_dict)
+        await report_cache.touch(current_user.tenant_id, "transactions")
         
         logging.info(f"Transaction created: {transaction.id} by {current_user.full_name}")
         return transaction
@@ -17344,6 +16672,7 @@ async def update_transaction(
             {"id": transaction_id, "tenant_id": current_user.tenant_id},
             {"$set": update_data}
         )
+        await report_cache.touch(current_user.tenant_id, "transactions")
         
         # Fetch updated transaction
         updated_transaction = await db.transactions.find_one({
@@ -17380,6 +16709,7 @@ async def delete_transaction(
             {"id": transaction_id, "tenant_id": current_user.tenant_id},
             {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
         )
+        await report_cache.touch(current_user.tenant_id, "transactions")
         
         logging.info(f"Transaction deleted: {transaction_id} by {current_user.full_name}")
         return {"message": "Transaction deleted successfully"}
@@ -17455,68 +16785,64 @@ async def get_recent_transactions(
 
 @api_router.get("/accounts/export")
 async def export_accounts_report(
+    request: Request,
     format: str = "excel",  # "excel" or "pdf"
     current_user: User = Depends(get_current_user)
 ):
     """Export accounts report in Excel or PDF format"""
     try:
-        # Get transactions and dashboard data
-        transactions = await db.transactions.find({
-            "tenant_id": current_user.tenant_id,
-            "is_active": True
-        }).sort([("transaction_date", -1)]).to_list(1000)
+        # The PDF carries a "Prepared By" signature line, so it is cached per user
+        report_key, cached = await cached_report(
+            request, current_user, "accounts/export", format,
+            {"prepared_by": current_user.full_name if format == "pdf" else None},
+            ["transactions", "institutions"]
+        )
+        if cached:
+            return cached
+
+        query = {"tenant_id": current_user.tenant_id, "is_active": True}
         
-        # Calculate dashboard metrics
-        total_income = sum(t["amount"] for t in transactions if t["transaction_type"] == "Income")
-        total_expenses = sum(t["amount"] for t in transactions if t["transaction_type"] == "Expense")
+        # Calculate dashboard metrics over every active transaction
+        totals = {
+            row["_id"]: row["amount"]
+            async for row in db.transactions.aggregate([
+                {"$match": query},
+                {"$group": {"_id": "$transaction_type", "amount": {"$sum": "$amount"}}}
+            ])
+        }
+        total_income = totals.get("Income", 0)
+        total_expenses = totals.get("Expense", 0)
         net_balance = total_income - total_expenses
         
         if format == "excel":
-            # Create Excel export
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, Alignment
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Accounts Report"
-            
-            # Add headers
-            headers = ["Date", "Description", "Type", "Category", "Amount", "Payment Method", "Receipt No"]
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center")
+            def transaction_row(transaction):
+                return [
+                    safe_format_date(transaction["transaction_date"]),
+                    transaction["description"],
+                    transaction["transaction_type"],
+                    transaction["category"],
+                    transaction["amount"],
+                    transaction["payment_method"],
+                    transaction.get("receipt_no", "")
+                ]
             
-            # Add data
-            for row, transaction in enumerate(transactions, 2):
-                ws.cell(row=row, column=1, value=safe_format_date(transaction["transaction_date"]))
-                ws.cell(row=row, column=2, value=transaction["description"])
-                ws.cell(row=row, column=3, value=transaction["transaction_type"])
-                ws.cell(row=row, column=4, value=transaction["category"])
-                ws.cell(row=row, column=5, value=transaction["amount"])
-                ws.cell(row=row, column=6, value=transaction["payment_method"])
-                ws.cell(row=row, column=7, value=transaction.get("receipt_no", ""))
-            
-            # Add summary
-            summary_row = len(transactions) + 3
-            ws.cell(row=summary_row, column=1, value="SUMMARY").font = Font(bold=True)
-            ws.cell(row=summary_row+1, column=1, value="Total Income:")
-            ws.cell(row=summary_row+1, column=2, value=total_income)
-            ws.cell(row=summary_row+2, column=1, value="Total Expenses:")
-            ws.cell(row=summary_row+2, column=2, value=total_expenses)
-            ws.cell(row=summary_row+3, column=1, value="Net Balance:")
-            ws.cell(row=summary_row+3, column=2, value=net_balance)
-            
-            # Save to BytesIO
-            file_stream = io.BytesIO()
-            wb.save(file_stream)
-            file_stream.seek(0)
+            async def render():
+                file_path = _report_file_path("accounts_report", "xlsx")
+                await write_xlsx(
+                    file_path,
+                    cursor_rows(db.transactions.find(query, {"_id": 0}).sort([("transaction_date", -1)]), transaction_row),
+                    ["Date", "Description", "Type", "Category", "Amount", "Payment Method", "Receipt No"],
+                    "Accounts Report",
+                    header_fill=None,
+                    summary=[
+                        ["Total Income:", total_income],
+                        ["Total Expenses:", total_expenses],
+                        ["Net Balance:", net_balance]
+                    ]
+                )
+                return file_path
             
-            return StreamingResponse(
-                io.BytesIO(file_stream.read()),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": "attachment; filename=accounts_report.xlsx"}
-            )
+            return await render_cached_report(request, report_key, current_user, "accounts_report.xlsx", render)
         
         elif format == "pdf":
             # Create professional PDF export
@@ -17661,7 +16987,9 @@ async def export_accounts_report(
             # Transactions table with professional styling
             table_data = [["Date", "Description", "Type", "Amount"]]
             
-            for transaction in transactions[:40]:  # Limit to 40 for better page fit
+            transactions = await db.transactions.find(query, {"_id": 0}) \
+                .sort([("transaction_date", -1)]).limit(40).to_list(40)  # Limit to 40 for better page fit
+            for transaction in transactions:
                 amount_str = f"₹{transaction['amount']:,.2f}"
                 table_data.append([
                     safe_format_date(transaction["transaction_date"]),
@@ -17737,12 +17065,8 @@ async def export_accounts_report(
             # Build PDF
             doc.build(story)
             
-            buffer.seek(0)
-            return StreamingResponse(
-                io.BytesIO(buffer.read()),
-                media_type="application/pdf",
-                headers={"Content-Disposition": "attachment; filename=accounts_report.pdf"}
-            )
+            artifact = report_cache.store(report_key, current_user.tenant_id, "accounts_report.pdf", buffer.getvalue())
+            return report_artifact_response(request, artifact)
         
         else:
             raise HTTPException(status_code=400, detail="Invalid format. Use 'excel' or 'pdf'")
@@ -17993,155 +17317,10 @@ async def generate_administrative_pdf_report(report_type: str, report_data: dict
         return file_path
         
     except Exception as e:
-        logging.error(f"Failed to generate administrative PDF report: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate PDF report")
-
-# ==================== TRANSPORT REPORT HELPERS ====================
-
-async def generate_transport_excel_report(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
-    """Generate Excel report for transport data (vehicle, route efficiency, transport fees)"""
-    try:
-        import tempfile
-        import os
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        # Create temporary file
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, f"{filename}.xlsx")
-        
-        # Create workbook
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = f"{report_type.replace('_', ' ').title()} Report"
-        
-        # Header styling (Orange theme for transport)
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="FF8C00", end_color="FF8C00", fill_type="solid")
-        
-        # Title
-        worksheet.cell(row=1, column=1, value=report_data["title"]).font = Font(bold=True, size=16)
-        worksheet.cell(row=2, column=1, value=f"Generated: {report_data['generated_date']}")
-        
-        # Summary section
-        row = 4
-        worksheet.cell(row=row, column=1, value="SUMMARY STATISTICS").font = header_font
-        worksheet.cell(row=row, column=1).fill = header_fill
-        row += 1
-        
-        summary = report_data["summary"]
-        for key, value in summary.items():
-            worksheet.cell(row=row, column=1, value=key.replace("_", " ").title())
-            worksheet.cell(row=row, column=2, value=str(value))
-            row += 1
-        
-        # Report-specific data sections
-        if report_type == "vehicle" and report_data.get("vehicles"):
-            row += 2
-            worksheet.cell(row=row, column=1, value="VEHICLE DETAILS").font = header_font
-            worksheet.cell(row=row, column=1).fill = header_fill
-            row += 1
-            
-            # Headers for vehicle data
-            vehicle_headers = ["Vehicle Number", "Type", "Capacity", "Driver", "Route", "Utilization %", "Last Maintenance", "Next Maintenance", "Fuel Efficiency", "Status"]
-            for col, header in enumerate(vehicle_headers, 1):
-                cell = worksheet.cell(row=row, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            row += 1
-            
-            # Vehicle data
-            for vehicle in report_data["vehicles"]:
-                worksheet.cell(row=row, column=1, value=vehicle.get("vehicle_number", ""))
-                worksheet.cell(row=row, column=2, value=vehicle.get("vehicle_type", ""))
-                worksheet.cell(row=row, column=3, value=vehicle.get("capacity", ""))
-                worksheet.cell(row=row, column=4, value=vehicle.get("driver_name", ""))
-                worksheet.cell(row=row, column=5, value=vehicle.get("route_assigned", ""))
-                worksheet.cell(row=row, column=6, value=vehicle.get("utilization_rate", ""))
-                worksheet.cell(row=row, column=7, value=vehicle.get("last_maintenance", ""))
-                worksheet.cell(row=row, column=8, value=vehicle.get("next_maintenance", ""))
-                worksheet.cell(row=row, column=9, value=vehicle.get("fuel_efficiency", ""))
-                worksheet.cell(row=row, column=10, value=vehicle.get("status", ""))
-                row += 1
-                
-        elif report_type == "route_efficiency" and report_data.get("routes"):
-            row += 2
-            worksheet.cell(row=row, column=1, value="ROUTE PERFORMANCE").font = header_font
-            worksheet.cell(row=row, column=1).fill = header_fill
-            row += 1
-            
-            # Headers for route data
-            route_headers = ["Route Name", "Distance (km)", "Time (min)", "Students", "Pickup Points", "Fuel Cost/Day", "Efficiency", "On-Time %", "Vehicle", "Monthly Cost"]
-            for col, header in enumerate(route_headers, 1):
-                cell = worksheet.cell(row=row, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            row += 1
-            
-            # Route data
-            for route in report_data["routes"]:
-                worksheet.cell(row=row, column=1, value=route.get("route_name", ""))
-                worksheet.cell(row=row, column=2, value=route.get("distance_km", ""))
-                worksheet.cell(row=row, column=3, value=route.get("average_time_minutes", ""))
-                worksheet.cell(row=row, column=4, value=route.get("students_served", ""))
-                worksheet.cell(row=row, column=5, value=route.get("pickup_points", ""))
-                worksheet.cell(row=row, column=6, value=route.get("fuel_cost_per_day", ""))
-                worksheet.cell(row=row, column=7, value=route.get("efficiency_rating", ""))
-                worksheet.cell(row=row, column=8, value=route.get("on_time_percentage", ""))
-                worksheet.cell(row=row, column=9, value=route.get("vehicle_assigned", ""))
-                worksheet.cell(row=row, column=10, value=route.get("monthly_cost", ""))
-                row += 1
-                
-        elif report_type == "transport_fees" and report_data.get("fee_records"):
-            row += 2
-            worksheet.cell(row=row, column=1, value="FEE COLLECTION DETAILS").font = header_font
-            worksheet.cell(row=row, column=1).fill = header_fill
-            row += 1
-            
-            # Headers for fee data
-            fee_headers = ["Student ID", "Student Name", "Class", "Route", "Month", "Fee Amount", "Paid Amount", "Pending", "Payment Date", "Payment Method", "Status"]
-            for col, header in enumerate(fee_headers, 1):
-                cell = worksheet.cell(row=row, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            row += 1
-            
-            # Fee data (limit to first 100 records for Excel performance)
-            for fee_record in report_data["fee_records"][:100]:
-                worksheet.cell(row=row, column=1, value=fee_record.get("student_id", ""))
-                worksheet.cell(row=row, column=2, value=fee_record.get("student_name", ""))
-                worksheet.cell(row=row, column=3, value=fee_record.get("class", ""))
-                worksheet.cell(row=row, column=4, value=fee_record.get("route", ""))
-                worksheet.cell(row=row, column=5, value=fee_record.get("month", ""))
-                worksheet.cell(row=row, column=6, value=fee_record.get("fee_amount", ""))
-                worksheet.cell(row=row, column=7, value=fee_record.get("paid_amount", ""))
-                worksheet.cell(row=row, column=8, value=fee_record.get("pending_amount", ""))
-                worksheet.cell(row=row, column=9, value=fee_record.get("payment_date", ""))
-                worksheet.cell(row=row, column=10, value=fee_record.get("payment_method", ""))
-                worksheet.cell(row=row, column=11, value=fee_record.get("status", ""))
-                row += 1
-        
-        # Auto-adjust column widths (safe for merged cells)
-        for col_idx in range(1, worksheet.max_column + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            for row_idx in range(1, worksheet.max_row + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save workbook
-        workbook.save(file_path)
-        return file_path
-        
-    except Exception as e:
-        logging.error(f"Failed to generate transport Excel report: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate Excel report")
+        logging.error(f"Failed to generate administrative PDF report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate PDF report")
+
+# ==================== TRANSPORT REPORT HELPERS ====================
 
 async def generate_transport_pdf_report_v2(report_type: str, report_data: dict, current_user: User, filename: str) -> str:
     """Generate professional PDF report for transport data (vehicle, route efficiency, transport fees) - Extended version"""
@@ -18814,18 +17993,18 @@ async def update_admission_status(
         school_name = school.get("name", "School") if school else "School"
         
         if new_status == "Approved":
-            asyncio.create_task(notification_svc.notify_admission_approved(
+            await notification_svc.notify_admission_approved(
                 tenant_id=current_user.tenant_id,
                 school_id=getattr(current_user, 'school_id', None),
                 student_name=f"Application #{application_id}",
                 school_name=school_name
-            ))
+            )
         elif new_status == "Rejected":
-            asyncio.create_task(notification_svc.notify_admission_rejected(
+            await notification_svc.notify_admission_rejected(
                 tenant_id=current_user.tenant_id,
                 school_id=getattr(current_user, 'school_id', None),
                 student_name=f"Application #{application_id}"
-            ))
+            )
         
         return {
             "success": True,
@@ -19685,6 +18864,7 @@ async def create_academic_book(
         })
         
         await db.academic_books.insert_one(book_dict)
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_id)
         
         # Remove MongoDB's _id and convert datetime to ISO string for JSON response
         if "_id" in book_dict:
@@ -19791,6 +18971,8 @@ async def update_academic_book(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_id)
         
         return {"success": True, "message": "Book updated successfully"}
         
@@ -19818,6 +19000,8 @@ async def delete_academic_book(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_id)
         
         return {"success": True, "message": "Book deleted successfully"}
         
@@ -19947,6 +19131,7 @@ async def bulk_upload_qa_pairs(
         # Bulk insert into database
         if qa_pairs_to_insert:
             await db.qa_knowledge_base.insert_many(qa_pairs_to_insert)
+            await cms_search.refresh(current_user.tenant_id, "qa", *[qa["id"] for qa in qa_pairs_to_insert])
             logger.info(f"Bulk upload: {successful_count} Q&A knowledge base items added by {current_user.full_name}")
         
         return {
@@ -19973,39 +19158,24 @@ async def search_academic_content(
     class_standard: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Search academic content and Q&A pairs (for AI RAG)"""
+    """Search academic content and Q&A pairs (for AI RAG), ranked by the CMS BM25 index"""
     try:
         search_filter = {
-            "tenant_id": current_user.tenant_id,
             "school_id": current_user.school_id,
-            "is_active": True
+            "subject": subject,
+            "class_standard": class_standard
         }
-        
-        if subject:
-            search_filter["subject"] = subject
-        if class_standard:
-            search_filter["class_standard"] = class_standard
-        
+
         # Search in Q&A knowledge base first
-        qa_results = await db.qa_knowledge_base.find({
-            **search_filter,
-            "$or": [
-                {"question": {"$regex": query, "$options": "i"}},
-                {"keywords": {"$regex": query, "$options": "i"}},
-                {"tags": {"$regex": query, "$options": "i"}}
-            ]
-        }).limit(5).to_list(length=5)
-        
+        qa_results = await cms_search.documents(
+            current_user.tenant_id, "qa", query, 5, search_filter, with_score=True
+        )
+
         # Search in academic content
-        content_results = await db.academic_content.find({
-            **search_filter,
-            "$or": [
-                {"topic_title": {"$regex": query, "$options": "i"}},
-                {"content_text": {"$regex": query, "$options": "i"}},
-                {"keywords": {"$regex": query, "$options": "i"}}
-            ]
-        }).limit(3).to_list(length=3)
-        
+        content_results = await cms_search.documents(
+            current_user.tenant_id, "content", query, 3, search_filter, with_score=True
+        )
+
         for item in qa_results + content_results:
             if "_id" in item:
                 item["_id"] = str(item["_id"])
@@ -20022,6 +19192,22 @@ async def search_academic_content(
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@api_router.get("/cms/search-index/metrics")
+async def get_cms_search_metrics(current_user: User = Depends(get_current_user)):
+    """Size and hit counters of the in-process CMS keyword and semantic indexes"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {**cms_search.metrics(), "semantic": semantic_search.metrics()}
+
+@api_router.post("/cms/search-index/rebuild")
+async def rebuild_cms_search_index(current_user: User = Depends(get_current_user)):
+    """Rebuild this tenant's CMS search index on the next query (e.g. after editing content outside the API)"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    await cms_search.invalidate(current_user.tenant_id)
+    await semantic_search.invalidate(current_user.tenant_id)
+    return {"success": True, "message": "Search index will be rebuilt on the next query"}
+
 # ============================================================================
 # AI ASSISTANT MODULE - GPT-4o (Turbo) with OCR, Voice, and n8n Integration
 # ============================================================================
@@ -20086,47 +19272,28 @@ async def ai_chat(
         
         if question and question_type == "text":  # RAG only for text questions
             search_filter = {
-                "tenant_id": current_user.tenant_id,
                 "school_id": current_user.school_id,
-                "is_active": True
+                "subject": subject,
+                "class_standard": class_standard
             }
-            
-            if subject:
-                search_filter["subject"] = subject
-            if class_standard:
-                search_filter["class_standard"] = class_standard
-            
+
             # DEBUG: Log search parameters
             print(f"🔍 RAG SEARCH - Question: '{question}', Source Filter: {answer_source}")
             logger.info(f"🔍 RAG SEARCH - Question: '{question}', Source Filter: {answer_source}")
             
             # STEP 2: Search based on Answer Source selection
             qa_results = []
-            
-            # Build search query
-            text_search = {
-                "$or": [
-                    {"question": {"$regex": question, "$options": "i"}},
-                    {"keywords": {"$regex": question, "$options": "i"}},
-                    {"answer": {"$regex": question, "$options": "i"}}
-                ]
-            }
-            
+
             if answer_source == "Academic Book":
                 # Search ONLY in Academic Books and their chapters
                 print(f"📚 Searching ONLY in Academic Books...")
-                
+
                 # Search in book chapters for Academic Books
-                chapter_results = await db.book_chapters.find({
-                    **search_filter,
-                    "book_type": "academic",
-                    "$or": [
-                        {"chapter_name": {"$regex": question, "$options": "i"}},
-                        {"content": {"$regex": question, "$options": "i"}},
-                        {"keywords": {"$regex": question, "$options": "i"}}
-                    ]
-                }).limit(3).to_list(length=3)
-                
+                chapter_results = await cms_search.documents(
+                    current_user.tenant_id, "chapter", question, 3, {**search_filter, "book_type": "academic"},
+                    min_match=ANSWER_MIN_MATCH
+                )
+
                 for chapter in chapter_results:
                     # Get book name
                     book = await db.academic_books.find_one({"_id": chapter.get("book_id")})
@@ -20148,15 +19315,10 @@ async def ai_chat(
                 print(f"📖 Searching ONLY in Reference Books...")
                 
                 # Search in book chapters for Reference Books
-                chapter_results = await db.book_chapters.find({
-                    **search_filter,
-                    "book_type": "reference",
-                    "$or": [
-                        {"chapter_name": {"$regex": question, "$options": "i"}},
-                        {"content": {"$regex": question, "$options": "i"}},
-                        {"keywords": {"$regex": question, "$options": "i"}}
-                    ]
-                }).limit(3).to_list(length=3)
+                chapter_results = await cms_search.documents(
+                    current_user.tenant_id, "chapter", question, 3, {**search_filter, "book_type": "reference"},
+                    min_match=ANSWER_MIN_MATCH
+                )
                 
                 for chapter in chapter_results:
                     # Get book name
@@ -20179,19 +19341,26 @@ async def ai_chat(
                 print(f"🔍 Searching across ALL sources...")
                 
                 # Q&A Knowledge Base
-                qa_kb_results = await db.qa_knowledge_base.find({**search_filter, **text_search}).limit(2).to_list(length=2)
+                qa_kb_results = await cms_search.documents(
+                    current_user.tenant_id, "qa", question, 2, search_filter, min_match=ANSWER_MIN_MATCH
+                )
+                if not qa_kb_results:
+                    # Paraphrased questions: local embedding similarity, still no GPT call
+                    qa_kb_results = await semantic_search.documents(
+                        current_user.tenant_id, question, 2, subject=subject,
+                        class_standard=class_standard, school_id=current_user.school_id
+                    )
+                    if qa_kb_results:
+                        logger.info(f"🧭 SEMANTIC MATCH: '{question}' ~ '{qa_kb_results[0].get('question')}' "
+                                    f"({qa_kb_results[0]['similarity']})")
                 for qa in qa_kb_results:
                     qa["source_type"] = "Q&A Knowledge Base"
                     qa_results.append(qa)
-                
+
                 # Academic Books
-                academic_results = await db.academic_books.find({
-                    **search_filter,
-                    "$or": [
-                        {"book_name": {"$regex": question, "$options": "i"}},
-                        {"description": {"$regex": question, "$options": "i"}}
-                    ]
-                }).limit(1).to_list(length=1)
+                academic_results = await cms_search.documents(
+                    current_user.tenant_id, "academic_book", question, 1, search_filter, min_match=ANSWER_MIN_MATCH
+                )
                 
                 for book in academic_results:
                     qa_results.append({
@@ -20205,13 +19374,9 @@ async def ai_chat(
                     })
                 
                 # Reference Books
-                reference_results = await db.reference_books.find({
-                    **search_filter,
-                    "$or": [
-                        {"book_name": {"$regex": question, "$options": "i"}},
-                        {"description": {"$regex": question, "$options": "i"}}
-                    ]
-                }).limit(1).to_list(length=1)
+                reference_results = await cms_search.documents(
+                    current_user.tenant_id, "reference_book", question, 1, search_filter, min_match=ANSWER_MIN_MATCH
+                )
                 
                 for book in reference_results:
                     qa_results.append({
@@ -20292,9 +19457,14 @@ async def ai_chat(
                         "timestamp": datetime.now().isoformat()
                     }
         
-        # STEP 4: No CMS match - Fallback to GPT-4o (Turbo)
-        print(f"⚠️ CMS NOT FOUND - Sending to GPT-4o")
-        logger.info(f"⚠️ No CMS match - Using GPT-4o fallback")
+        # STEP 4: No CMS match - reuse an earlier GPT answer to the same question, else fall back to GPT-4o (Turbo)
+        cache_scope = {"class_standard": class_standard, "subject": subject, "answer_source": answer_source}
+        cached = await answer_cache.lookup(current_user.tenant_id, "chat", cache_scope, question)
+        if cached:
+            logger.info(f"✅ Answer cache {cached['match']} hit (similarity {cached['similarity']})")
+        else:
+            print(f"⚠️ CMS NOT FOUND - Sending to GPT-4o")
+            logger.info(f"⚠️ No CMS match - Using GPT-4o fallback")
         
         # Build GPT prompt with strict academic-only restriction
         system_prompt = """You are GiNi, a School Academic Assistant designed exclusively for educational purposes.
@@ -20326,18 +19496,30 @@ Remember: You are GiNi, a SCHOOL assistant. Stay strictly within academic bounda
         })
         
         # STEP 4: Get AI response from GPT
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=800
-        )
-        
-        ai_answer = response.choices[0].message.content
-        
-        # Check if GPT blocked the question due to academic-only restriction
-        restriction_message = "Sorry, I can only answer academic or syllabus-related questions"
-        is_restricted = restriction_message.lower() in ai_answer.lower()
+        if cached:
+            ai_answer = cached["answer"]
+            is_restricted = cached["is_restricted"]
+            model_used = "answer-cache"
+            tokens_used = 0
+        else:
+            response = await openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800
+            )
+            
+            ai_answer = response.choices[0].message.content
+            
+            # Check if GPT blocked the question due to academic-only restriction
+            restriction_message = "Sorry, I can only answer academic or syllabus-related questions"
+            is_restricted = restriction_message.lower() in ai_answer.lower()
+            model_used = "gpt-4o"
+            tokens_used = response.usage.total_tokens
+            await answer_cache.store(
+                current_user.tenant_id, "chat", cache_scope, question, ai_answer,
+                tokens_used=tokens_used, is_restricted=is_restricted
+            )
         
         # Determine source based on restriction
         response_source = "restricted" if is_restricted else "GPT"
@@ -20352,12 +19534,13 @@ Remember: You are GiNi, a SCHOOL assistant. Stay strictly within academic bounda
             "question": question,
             "question_type": question_type,
             "answer": ai_answer,
-            "model": "gpt-4o",
-            "tokens_used": response.usage.total_tokens,
+            "model": model_used,
+            "tokens_used": tokens_used,
             "source": response_source,
             "answer_source_filter": answer_source,
             "tags": response_tags,
             "cms_matches_count": 0,
+            "cache_match": cached["match"] if cached else None,
             "is_restricted": is_restricted,
             "restriction_reason": "Non-academic question blocked by AI model" if is_restricted else None,
             "created_at": datetime.now(timezone.utc)
@@ -20375,7 +19558,8 @@ Remember: You are GiNi, a SCHOOL assistant. Stay strictly within academic bounda
             "source": response_source,
             "tags": response_tags,  # Include tags (will be empty for GPT fallback)
             "cms_matches": 0,
-            "tokens_used": response.usage.total_tokens,
+            "tokens_used": tokens_used,
+            "cached": bool(cached),
             "is_restricted": is_restricted,
             "timestamp": datetime.now().isoformat()
         }
@@ -20823,6 +20007,29 @@ async def ai_get_stats(
         logger.error(f"AI stats error: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve AI statistics")
 
+@api_router.get("/ai-engine/answer-cache/metrics")
+async def get_answer_cache_metrics(current_user: User = Depends(get_current_user)):
+    """Hit/miss counters of the GPT answer cache and this tenant's cached entries per generator"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {
+        **answer_cache.metrics(),
+        "entries": await answer_cache.tenant_stats(current_user.tenant_id),
+    }
+
+@api_router.delete("/ai-engine/answer-cache")
+async def clear_answer_cache(
+    kind: Optional[str] = None,
+    subject: Optional[str] = None,
+    class_standard: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Drop cached GPT answers (optionally only one generator - chat/quiz/test/summary/notes - subject or class)"""
+    if current_user.role not in ["super_admin", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    deleted = await answer_cache.invalidate(current_user.tenant_id, kind=kind, subject=subject, class_standard=class_standard)
+    return {"success": True, "deleted": deleted}
+
 # ============================================================================
 # END AI ASSISTANT MODULE
 # ============================================================================
@@ -20860,82 +20067,21 @@ async def generate_quiz(
         print(f"===========================================")
         
         # STEP 1: Search CMS database for matching questions (RAG with keyword matching)
-        import re
-        
-        # Build base filter (tenant + active status)
-        base_filter = {
-            "tenant_id": current_user.tenant_id,
-            "school_id": current_user.school_id,
-            "is_active": True
-        }
-        
-        # Add subject and class (exact match)
-        if subject:
-            base_filter["subject"] = subject
-        if class_standard:
-            base_filter["class_standard"] = class_standard
-        
-        # Tier 1: Try exact topic/chapter match with optional difficulty
+        # Tier 1-2: Topic/chapter search ranked by the CMS BM25 index (title fields weigh more than answers)
         cms_questions = []
+        search_text = " ".join(part for part in (topic, chapter) if part)
+        if search_text:
+            cms_questions = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, num_questions * 3,
+                {
+                    "school_id": current_user.school_id,
+                    "subject": subject,
+                    "class_standard": class_standard,
+                    "difficulty_level": difficulty_level or None
+                }
+            )
         
-        tier1_filter = {**base_filter}
-        if difficulty_level:
-            tier1_filter["difficulty_level"] = difficulty_level
-        
-        # Extract keywords from topic and chapter for regex search
-        keywords = []
-        if topic:
-            keywords.extend([w.strip() for w in re.split(r'[,\s]+', topic) if len(w.strip()) > 2])
-        if chapter:
-            keywords.extend([w.strip() for w in re.split(r'[,\s]+', chapter) if len(w.strip()) > 2])
-        
-        # Tier 1: Exact topic/chapter match
-        if topic or chapter:
-            tier1_or_conditions = []
-            if topic:
-                tier1_or_conditions.append({"topic": {"$regex": re.escape(topic), "$options": "i"}})
-            if chapter:
-                tier1_or_conditions.append({"chapter": {"$regex": re.escape(chapter), "$options": "i"}})
-            
-            if tier1_or_conditions:
-                tier1_filter["$or"] = tier1_or_conditions
-                cursor = db.qa_pairs.find(tier1_filter).limit(num_questions * 2)
-                async for qa in cursor:
-                    cms_questions.append(qa)
-        
-        print(f"🔍 Tier 1 (Topic/Chapter match): Found {len(cms_questions)} questions")
-        
-        # Tier 2: Keyword search across question, answer, keywords, topic, chapter
-        if len(cms_questions) < num_questions and keywords:
-            tier2_filter = {**base_filter}
-            
-            # Apply difficulty filter to maintain user preference
-            if difficulty_level:
-                tier2_filter["difficulty_level"] = difficulty_level
-            
-            # Build regex patterns for each keyword (partial match)
-            keyword_patterns = [{"$regex": re.escape(kw), "$options": "i"} for kw in keywords]
-            
-            # Search across multiple fields
-            tier2_or_conditions = []
-            for pattern in keyword_patterns:
-                tier2_or_conditions.extend([
-                    {"question": pattern},
-                    {"answer": pattern},
-                    {"keywords": pattern},
-                    {"topic": pattern},
-                    {"chapter": pattern}
-                ])
-            
-            if tier2_or_conditions:
-                tier2_filter["$or"] = tier2_or_conditions
-                cursor = db.qa_pairs.find(tier2_filter).limit(num_questions * 3)
-                async for qa in cursor:
-                    # Avoid duplicates
-                    if not any(existing.get("_id") == qa.get("_id") for existing in cms_questions):
-                        cms_questions.append(qa)
-        
-        print(f"🔍 Tier 2 (Keyword match): Total {len(cms_questions)} questions")
+        print(f"🔍 Tier 1-2 (Ranked topic/chapter match): Found {len(cms_questions)} questions")
         
         # Tier 3: If still not enough, get any questions from subject + class with difficulty
         if len(cms_questions) < num_questions:
@@ -21001,17 +20147,25 @@ For each question, provide:
 Format as JSON array:
 [{{"question": "...", "answer": "...", "tag": "..."}}]"""
             
-            response = await openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a quiz generator for school students. Generate educational questions."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            
-            ai_response = response.choices[0].message.content
+            # Same chapter/topic at the same class, subject, level and size reuses the earlier GPT set
+            cache_scope = {"class_standard": class_standard, "subject": subject,
+                           "difficulty_level": difficulty_level, "num_questions": num_questions}
+            cache_question = f"{chapter or 'General'} {topic or 'General'}"
+            cached = await answer_cache.lookup(current_user.tenant_id, "quiz", cache_scope, cache_question, near=False)
+            if cached:
+                ai_response = cached["answer"]
+            else:
+                response = await openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are a quiz generator for school students. Generate educational questions."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=1500
+                )
+                
+                ai_response = response.choices[0].message.content
             
             # Parse AI response (simplified - should add better error handling)
             import json
@@ -21021,6 +20175,11 @@ Format as JSON array:
             json_match = re.search(r'\[.*\]', ai_response, re.DOTALL)
             if json_match:
                 ai_questions = json.loads(json_match.group())
+                if not cached:
+                    await answer_cache.store(
+                        current_user.tenant_id, "quiz", cache_scope, cache_question, ai_response,
+                        tokens_used=response.usage.total_tokens
+                    )
                 
                 for idx, q in enumerate(ai_questions[:num_questions], 1):
                     questions.append({
@@ -21449,80 +20608,21 @@ async def generate_test(
         # STEP 1: CMS-FIRST STRATEGY - Search qa_pairs database (3-Tier RAG)
         import re
         
-        # Build base filter (tenant + active status)
-        base_filter = {
-            "tenant_id": current_user.tenant_id,
-            "school_id": current_user.school_id,
-            "is_active": True
-        }
-        
-        # Add subject and class (exact match)
-        if subject:
-            base_filter["subject"] = subject
-        if class_standard:
-            base_filter["class_standard"] = class_standard
-        
-        # Tier 1: Try exact topic/chapter match with optional difficulty
+        # Tier 1-2: Topic/chapter search ranked by the CMS BM25 index (title fields weigh more than answers)
         cms_questions = []
+        search_text = " ".join(part for part in (topic, chapter) if part)
+        if search_text:
+            cms_questions = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, num_questions * 3,
+                {
+                    "school_id": current_user.school_id,
+                    "subject": subject,
+                    "class_standard": class_standard,
+                    "difficulty_level": difficulty_level or None
+                }
+            )
         
-        tier1_filter = {**base_filter}
-        if difficulty_level:
-            tier1_filter["difficulty_level"] = difficulty_level
-        
-        # Extract keywords from topic and chapter for regex search
-        keywords = []
-        if topic:
-            keywords.extend([w.strip() for w in re.split(r'[,\s]+', topic) if len(w.strip()) > 2])
-        if chapter:
-            keywords.extend([w.strip() for w in re.split(r'[,\s]+', chapter) if len(w.strip()) > 2])
-        
-        # Tier 1: Exact topic/chapter match
-        if topic or chapter:
-            tier1_or_conditions = []
-            if topic:
-                tier1_or_conditions.append({"topic": {"$regex": re.escape(topic), "$options": "i"}})
-            if chapter:
-                tier1_or_conditions.append({"chapter": {"$regex": re.escape(chapter), "$options": "i"}})
-            
-            if tier1_or_conditions:
-                tier1_filter["$or"] = tier1_or_conditions
-                cursor = db.qa_pairs.find(tier1_filter).limit(num_questions * 2)
-                async for qa in cursor:
-                    cms_questions.append(qa)
-        
-        print(f"🔍 TEST - Tier 1 (Topic/Chapter match): Found {len(cms_questions)} questions")
-        
-        # Tier 2: Keyword search across question, answer, keywords, topic, chapter
-        if len(cms_questions) < num_questions and keywords:
-            tier2_filter = {**base_filter}
-            
-            # Apply difficulty filter to maintain user preference
-            if difficulty_level:
-                tier2_filter["difficulty_level"] = difficulty_level
-            
-            # Build regex patterns for each keyword (partial match)
-            keyword_patterns = [{"$regex": re.escape(kw), "$options": "i"} for kw in keywords]
-            
-            # Search across multiple fields
-            tier2_or_conditions = []
-            for pattern in keyword_patterns:
-                tier2_or_conditions.extend([
-                    {"question": pattern},
-                    {"answer": pattern},
-                    {"keywords": pattern},
-                    {"topic": pattern},
-                    {"chapter": pattern}
-                ])
-            
-            if tier2_or_conditions:
-                tier2_filter["$or"] = tier2_or_conditions
-                cursor = db.qa_pairs.find(tier2_filter).limit(num_questions * 3)
-                async for qa in cursor:
-                    # Avoid duplicates
-                    if not any(existing.get("_id") == qa.get("_id") for existing in cms_questions):
-                        cms_questions.append(qa)
-        
-        print(f"🔍 TEST - Tier 2 (Keyword match): Total {len(cms_questions)} questions")
+        print(f"🔍 TEST - Tier 1-2 (Ranked topic/chapter match): Found {len(cms_questions)} questions")
         
         # Tier 3: If still not enough, get any questions from subject + class with difficulty
         if len(cms_questions) < num_questions:
@@ -21617,17 +20717,24 @@ Format as JSON array:
   "marks": 2
 }}]"""
             
-            response = await openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert exam question generator for schools. Create balanced, curriculum-aligned questions."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            
-            ai_response = response.choices[0].message.content
+            cache_scope = {"class_standard": class_standard, "subject": subject,
+                           "difficulty_level": difficulty_level, "num_questions": num_questions}
+            cache_question = f"{chapter or 'General'} {topic or 'General'}"
+            cached = await answer_cache.lookup(current_user.tenant_id, "test", cache_scope, cache_question, near=False)
+            if cached:
+                ai_response = cached["answer"]
+            else:
+                response = await openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are an expert exam question generator for schools. Create balanced, curriculum-aligned questions."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=2000
+                )
+                
+                ai_response = response.choices[0].message.content
             
             # Parse AI response
             import json
@@ -21637,6 +20744,11 @@ Format as JSON array:
                 raise HTTPException(status_code=500, detail="Failed to parse AI response")
             
             ai_questions = json.loads(json_match.group())
+            if not cached:
+                await answer_cache.store(
+                    current_user.tenant_id, "test", cache_scope, cache_question, ai_response,
+                    tokens_used=response.usage.total_tokens
+                )
             
             print(f"✅ AI generated {len(ai_questions)} questions, saving to CMS for future reuse...")
             
@@ -21683,7 +20795,9 @@ Format as JSON array:
                     "created_at": datetime.now(timezone.utc),
                     "updated_at": datetime.now(timezone.utc)
                 }
-                qa_pairs_to_save.append(qa_pair_doc)
+                # A cached set was already saved to the CMS when GPT first generated it
+                if not cached:
+                    qa_pairs_to_save.append(qa_pair_doc)
             
             generated_by = "ai"
         
@@ -21733,6 +20847,7 @@ Format as JSON array:
         # STEP 5: Save AI-generated questions to qa_pairs for future reuse
         if qa_pairs_to_save:
             await db.qa_pairs.insert_many(qa_pairs_to_save)
+            await cms_search.refresh(current_user.tenant_id, "qa_pair", *[qa["id"] for qa in qa_pairs_to_save])
             print(f"💾 Saved {len(qa_pairs_to_save)} AI-generated questions to CMS for future reuse")
         
         # Remove MongoDB _id field from questions before returning
@@ -22361,19 +21476,16 @@ async def generate_summary(
             "is_active": True
         }
         
-        # Build search criteria based on topic/chapter
-        search_criteria = []
-        if topic:
-            search_criteria.append({"question": {"$regex": re.escape(topic), "$options": "i"}})
-            search_criteria.append({"topic": {"$regex": re.escape(topic), "$options": "i"}})
-        if chapter:
-            search_criteria.append({"chapter": {"$regex": re.escape(chapter), "$options": "i"}})
-        
-        if search_criteria:
-            qa_filter["$or"] = search_criteria
-        
-        # Find matching Q&A pairs
-        qa_matches = await db.qa_pairs.find(qa_filter).limit(3).to_list(length=3)
+        # Find matching Q&A pairs, ranked by the CMS search index when a topic/chapter is given
+        search_text = " ".join(part for part in (topic, chapter) if part)
+        if search_text:
+            qa_matches = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, 3,
+                {"school_id": current_user.school_id, "subject": subject, "class_standard": class_standard},
+                min_match=ANSWER_MIN_MATCH
+            )
+        else:
+            qa_matches = await db.qa_pairs.find(qa_filter).limit(3).to_list(length=3)
         
         if qa_matches:
             print(f"✅ Found {len(qa_matches)} Q&A pairs in Knowledge Base - using CMS content!")
@@ -22454,12 +21566,13 @@ async def generate_summary(
             "subject": subject,
             "class_standard": class_standard
         }
-        if chapter:
-            qa_filter["chapter"] = {"$regex": re.escape(chapter), "$options": "i"}
-        if topic:
-            qa_filter["topic"] = {"$regex": re.escape(topic), "$options": "i"}
-        
-        qa_pairs = await db.qa_pairs.find(qa_filter).limit(5).to_list(length=5)
+        if search_text:
+            qa_pairs = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, 5,
+                {"school_id": current_user.school_id, "subject": subject, "class_standard": class_standard}
+            )
+        else:
+            qa_pairs = await db.qa_pairs.find(qa_filter).limit(5).to_list(length=5)
         if qa_pairs:
             cms_context += f"\nKey Concepts Covered: {len(qa_pairs)} Q&A pairs available in curriculum"
         
@@ -22480,17 +21593,27 @@ Create a well-structured summary with:
 Make it educational, clear, and appropriate for Class {class_standard} students.
 Use simple language and include definitions where necessary."""
         
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert educational content creator for schools. Generate clear, curriculum-aligned summaries."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
-        summary_content = response.choices[0].message.content
+        cache_scope = {"class_standard": class_standard, "subject": subject}
+        cache_question = f"{chapter or 'General Overview'} {topic or 'General'}"
+        cached = await answer_cache.lookup(current_user.tenant_id, "summary", cache_scope, cache_question, near=False)
+        if cached:
+            summary_content = cached["answer"]
+        else:
+            response = await openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are an expert educational content creator for schools. Generate clear, curriculum-aligned summaries."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=1500
+            )
+            
+            summary_content = response.choices[0].message.content
+            await answer_cache.store(
+                current_user.tenant_id, "summary", cache_scope, cache_question, summary_content,
+                tokens_used=response.usage.total_tokens
+            )
         
         # STEP 3: Save to CMS for future reuse
         summary_id = str(uuid.uuid4())
@@ -22521,6 +21644,7 @@ Use simple language and include definitions where necessary."""
             "summary_id": summary_id,
             "content": summary_content,
             "source": "ai_generated",
+            "cached": bool(cached),
             "class_standard": class_standard,
             "subject": subject,
             "chapter": chapter,
@@ -22682,19 +21806,16 @@ async def generate_notes(
             "is_active": True
         }
         
-        # Build search criteria based on topic/chapter
-        search_criteria = []
-        if topic:
-            search_criteria.append({"question": {"$regex": re.escape(topic), "$options": "i"}})
-            search_criteria.append({"topic": {"$regex": re.escape(topic), "$options": "i"}})
-        if chapter:
-            search_criteria.append({"chapter": {"$regex": re.escape(chapter), "$options": "i"}})
-        
-        if search_criteria:
-            qa_filter["$or"] = search_criteria
-        
-        # Find matching Q&A pairs
-        qa_matches = await db.qa_pairs.find(qa_filter).limit(5).to_list(length=5)
+        # Find matching Q&A pairs, ranked by the CMS search index when a topic/chapter is given
+        search_text = " ".join(part for part in (topic, chapter) if part)
+        if search_text:
+            qa_matches = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, 5,
+                {"school_id": current_user.school_id, "subject": subject, "class_standard": class_standard},
+                min_match=ANSWER_MIN_MATCH
+            )
+        else:
+            qa_matches = await db.qa_pairs.find(qa_filter).limit(5).to_list(length=5)
         
         if qa_matches:
             print(f"✅ Found {len(qa_matches)} Q&A pairs in Knowledge Base - using CMS content!")
@@ -22788,12 +21909,13 @@ async def generate_notes(
             "subject": subject,
             "class_standard": class_standard
         }
-        if chapter:
-            qa_filter["chapter"] = {"$regex": re.escape(chapter), "$options": "i"}
-        if topic:
-            qa_filter["topic"] = {"$regex": re.escape(topic), "$options": "i"}
-        
-        qa_pairs = await db.qa_pairs.find(qa_filter).limit(10).to_list(length=10)
+        if search_text:
+            qa_pairs = await cms_search.documents(
+                current_user.tenant_id, "qa_pair", search_text, 10,
+                {"school_id": current_user.school_id, "subject": subject, "class_standard": class_standard}
+            )
+        else:
+            qa_pairs = await db.qa_pairs.find(qa_filter).limit(10).to_list(length=10)
         if qa_pairs:
             cms_context += f"\nCurriculum Q&A Available: {len(qa_pairs)} pairs"
         
@@ -22818,17 +21940,27 @@ Create detailed study notes with:
 Make notes comprehensive, well-structured, and suitable for Class {class_standard} students.
 Use clear language, proper formatting, and include diagrams descriptions where helpful."""
         
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert teacher creating detailed study notes. Make notes comprehensive, well-organized, and student-friendly."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2500
-        )
-        
-        notes_content = response.choices[0].message.content
+        cache_scope = {"class_standard": class_standard, "subject": subject}
+        cache_question = f"{chapter or 'General Overview'} {topic or 'General'}"
+        cached = await answer_cache.lookup(current_user.tenant_id, "notes", cache_scope, cache_question, near=False)
+        if cached:
+            notes_content = cached["answer"]
+        else:
+            response = await openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are an expert teacher creating detailed study notes. Make notes comprehensive, well-organized, and student-friendly."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=2500
+            )
+            
+            notes_content = response.choices[0].message.content
+            await answer_cache.store(
+                current_user.tenant_id, "notes", cache_scope, cache_question, notes_content,
+                tokens_used=response.usage.total_tokens
+            )
         
         # STEP 3: Save to CMS for future reuse
         notes_id = str(uuid.uuid4())
@@ -22859,6 +21991,7 @@ Use clear language, proper formatting, and include diagrams descriptions where h
             "notes_id": notes_id,
             "content": notes_content,
             "source": "ai_generated",
+            "cached": bool(cached),
             "class_standard": class_standard,
             "subject": subject,
             "chapter": chapter,
@@ -23014,6 +22147,7 @@ async def create_academic_book(
         })
         
         await db.academic_books.insert_one(book_data)
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_data["id"])
         return sanitize_mongo_data(book_data)
     except Exception as e:
         logger.error(f"Error creating academic book: {e}")
@@ -23040,6 +22174,8 @@ async def update_academic_book(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Academic book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_id)
         
         return {"message": "Academic book updated successfully"}
     except HTTPException:
@@ -23065,6 +22201,8 @@ async def delete_academic_book(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Academic book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "academic_book", book_id)
         
         return {"message": "Academic book deleted successfully"}
     except HTTPException:
@@ -23139,6 +22277,7 @@ async def create_reference_book(
         })
         
         result = await db.reference_books.insert_one(book_data)
+        await cms_search.refresh(current_user.tenant_id, "reference_book", book_data["id"])
         return sanitize_mongo_data(book_data)
     except Exception as e:
         logger.error(f"Error creating reference book: {e}")
@@ -23165,6 +22304,8 @@ async def update_reference_book(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Reference book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "reference_book", book_id)
         
         return {"message": "Reference book updated successfully"}
     except HTTPException:
@@ -23190,6 +22331,8 @@ async def delete_reference_book(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Reference book not found")
+
+        await cms_search.refresh(current_user.tenant_id, "reference_book", book_id)
         
         return {"message": "Reference book deleted successfully"}
     except HTTPException:
@@ -23240,6 +22383,7 @@ async def create_book_chapter(
         })
         
         await db.book_chapters.insert_one(chapter_data)
+        await cms_search.refresh(current_user.tenant_id, "chapter", chapter_data["id"])
         return chapter_data
     except Exception as e:
         logger.error(f"Error creating book chapter: {e}")
@@ -23266,6 +22410,8 @@ async def update_book_chapter(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Chapter not found")
+
+        await cms_search.refresh(current_user.tenant_id, "chapter", chapter_id)
         
         return {"message": "Chapter updated successfully"}
     except HTTPException:
@@ -23291,6 +22437,8 @@ async def delete_book_chapter(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Chapter not found")
+
+        await cms_search.refresh(current_user.tenant_id, "chapter", chapter_id)
         
         return {"message": "Chapter deleted successfully"}
     except HTTPException:
@@ -23387,6 +22535,7 @@ async def create_qa_knowledge_base(
         })
         
         await db.qa_knowledge_base.insert_one(qa_data)
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_data["id"])
         qa_data.pop("_id", None)
         return qa_data
     except Exception as e:
@@ -23414,6 +22563,8 @@ async def update_qa_knowledge_base(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Q&A entry not found")
+
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_id)
         
         return {"message": "Q&A entry updated successfully"}
     except HTTPException:
@@ -23439,6 +22590,8 @@ async def delete_qa_knowledge_base(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Q&A entry not found")
+
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_id)
         
         return {"message": "Q&A entry deleted successfully"}
     except HTTPException:
@@ -23503,6 +22656,7 @@ async def create_previous_year_paper(
         })
         
         result = await db.previous_year_papers.insert_one(paper_data)
+        await cms_search.refresh(current_user.tenant_id, "paper", paper_data["id"])
         return sanitize_mongo_data(paper_data)
     except Exception as e:
         logger.error(f"Error creating previous year paper: {e}")
@@ -23529,6 +22683,8 @@ async def update_previous_year_paper(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Previous year paper not found")
+
+        await cms_search.refresh(current_user.tenant_id, "paper", paper_id)
         
         return {"message": "Previous year paper updated successfully"}
     except HTTPException:
@@ -23554,6 +22710,8 @@ async def delete_previous_year_paper(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Previous year paper not found")
+
+        await cms_search.refresh(current_user.tenant_id, "paper", paper_id)
         
         return {"message": "Previous year paper deleted successfully"}
     except HTTPException:
@@ -23602,6 +22760,7 @@ async def create_paper_question(
         })
         
         await db.paper_questions.insert_one(question_data)
+        await cms_search.refresh(current_user.tenant_id, "paper_question", question_data["id"])
         return question_data
     except Exception as e:
         logger.error(f"Error creating paper question: {e}")
@@ -23628,6 +22787,8 @@ async def update_paper_question(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Paper question not found")
+
+        await cms_search.refresh(current_user.tenant_id, "paper_question", question_id)
         
         return {"message": "Paper question updated successfully"}
     except HTTPException:
@@ -23653,6 +22814,8 @@ async def delete_paper_question(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Paper question not found")
+
+        await cms_search.refresh(current_user.tenant_id, "paper_question", question_id)
         
         return {"message": "Paper question deleted successfully"}
     except HTTPException:
@@ -23701,6 +22864,7 @@ async def create_qa_pair(
         })
         
         result = await db.qa_knowledge_base.insert_one(qa_dict)
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_dict["id"])
         return sanitize_mongo_data(qa_dict)
     except Exception as e:
         logger.error(f"Error creating Q&A pair: {e}")
@@ -23727,6 +22891,8 @@ async def update_qa_pair(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Q&A pair not found")
+
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_id)
         
         return {"message": "Q&A pair updated successfully"}
     except HTTPException:
@@ -23752,6 +22918,8 @@ async def delete_qa_pair(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Q&A pair not found")
+
+        await cms_search.refresh(current_user.tenant_id, "qa", qa_id)
         
         return {"message": "Q&A pair deleted successfully"}
     except HTTPException:
@@ -24009,9 +23177,15 @@ async def get_student_results(
     section_id: Optional[str] = None,
     student_id: Optional[str] = None,
     status: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get student results based on filters and user role"""
+    """
+    Get student results based on filters and user role.
+    Supports keyset pagination via `limit`/`after` and `format=ndjson` streaming.
+    """
     try:
         query = {
             "tenant_id": current_user.tenant_id,
@@ -24052,8 +23226,18 @@ async def get_student_results(
         if student_id and current_user.role not in ["student", "parent"]:
             query["student_id"] = student_id
         
+        sort = [("rank", 1), ("id", 1)]
+        if format == "ndjson":
+            return ndjson_response(db.student_results, query, sort, after)
+        if after or limit:
+            page = await fetch_page(db.student_results, query, sort, after, limit)
+            page["items"] = sanitize_mongo_data(page["items"])
+            return page
+        
         results = await db.student_results.find(query).sort("rank", 1).to_list(None)
         return sanitize_mongo_data(results)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching student results: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch student results")
@@ -25079,6 +24263,7 @@ async def create_school(
         }
         
         await db.schools.insert_one(school_doc)
+        invalidate_host_resolution()
         return sanitize_mongo_data(school_doc)
     except HTTPException:
         raise
@@ -25107,6 +24292,7 @@ async def update_school(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="School not found")
+        invalidate_host_resolution()
         
         updated_school = await db.schools.find_one({"id": school_id})
         return sanitize_mongo_data(updated_school)
@@ -25137,6 +24323,7 @@ async def delete_school(
             {"id": school_id},
             {"$set": {"is_active": False, "deleted_at": datetime.utcnow(), "deleted_by": current_user.id}}
         )
+        invalidate_host_resolution()
         return {"message": "School deleted successfully"}
     except HTTPException:
         raise
@@ -25148,6 +24335,26 @@ async def delete_school(
 # END SCHOOL LIST API ENDPOINTS
 # ============================================================================
 
+# ==================== DATABASE INDEX MANAGEMENT ====================
+
+@api_router.get("/admin/indexes/report")
+async def get_index_report(current_user: User = Depends(get_current_user)):
+    """Report declared indexes that are missing and existing indexes that are never used - super_admin only"""
+    if current_user.role != "super_admin":
+        raise HTTPException(status_code=403, detail="Only super admin can view index reports")
+    
+    report = await index_manager.report()
+    return sanitize_mongo_data(report)
+
+@api_router.post("/admin/indexes/ensure")
+async def rebuild_indexes(current_user: User = Depends(get_current_user)):
+    """Build any declared indexes that are missing - super_admin only"""
+    if current_user.role != "super_admin":
+        raise HTTPException(status_code=403, detail="Only super admin can build indexes")
+    
+    result = await index_manager.ensure_indexes()
+    return sanitize_mongo_data(result)
+
 # Include router and middleware
 app.include_router(api_router)
 
@@ -25247,9 +24454,35 @@ async def startup_db_client():
         await ensure_seed_data()
         logger.info("Seed data initialization completed")
         
+        # Build declared indexes in the background so startup isn't blocked on large collections
+        start_background_task(index_manager.ensure_indexes())
+        
+        # Deliver notifications queued in the outbox (including any left by a previous process)
+        notification_svc.outbox.start()
+        notification_svc.stream.start()
+        live_attendance.start()
+        
     except Exception as e:
         logger.error(f"Database startup error: {e}")
+    
+    try:
+        await load_shift_thresholds()
+        await biometric_pool.start()
+        if biometric_pool.pool is not None:
+            async with biometric_pool.acquire() as conn:
+                await attendance_state.warm(conn)
+    except Exception as e:
+        # Biometric routes retry pool creation lazily on first use
+        logger.error(f"Biometric database pool startup error: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await notification_svc.outbox.stop()
+    await notification_svc.stream.stop()
+    await live_attendance.stop()
+    report_renderer.close()
+    await cms_search.flush()
+    await semantic_search.flush()
+    await biometric_pool.close()
+    message_transports.close()
     client.close()
@@ -12,6 +12,7 @@ import time
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 import os
+import sqlite3
 from zk import ZK, const
 import threading
 import signal
@@ -24,10 +25,116 @@ logging.basicConfig(
 )
 logger = logging.getLogger('ZKTecoConnector')
 
+class PunchSpool:
+    """
+    Durable local spool for punches not yet acknowledged by the ERP.
+    Append-only SQLite table (WAL mode) plus a per-device high-water mark of the
+    newest punch already captured, so catch-up sync only pulls newer device records.
+    """
+    
+    def __init__(self, path: str = "zkteco_spool.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS spool (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   device_id TEXT NOT NULL,
+                   person_id TEXT NOT NULL,
+                   punch_time TEXT NOT NULL,
+                   payload TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   UNIQUE (device_id, person_id, punch_time)
+               )"""
+        )
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS watermarks (
+                   device_id TEXT PRIMARY KEY,
+                   last_punch_time TEXT NOT NULL
+               )"""
+        )
+    
+    def append(self, punches: List[Dict]) -> int:
+        """Persist punches; duplicates of an already-spooled punch are ignored"""
+        rows = [
+            (p["device_id"], str(p["person_id"]), p["punch_time"], json.dumps(p, default=str), time.time())
+            for p in punches
+        ]
+        with self.lock:
+            before = self.db.total_changes
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                """INSERT OR IGNORE INTO spool (device_id, person_id, punch_time, payload, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                rows
+            )
+            inserted = self.db.total_changes - before
+            for device_id, punch_time in self._newest_per_device(punches).items():
+                self._advance_watermark(device_id, punch_time)
+            self.db.execute("COMMIT")
+            return inserted
+    
+    def peek(self, device_id: str, limit: int) -> List[tuple]:
+        """Oldest un-acknowledged punches for a device as (row_id, payload)"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, payload FROM spool WHERE device_id = ? ORDER BY id LIMIT ?",
+                (device_id, limit)
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+    
+    def ack(self, row_ids: List[int]):
+        """Drop punches the ERP has accepted"""
+        if not row_ids:
+            return
+        with self.lock:
+            self.db.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in row_ids])
+    
+    def pending_count(self, device_id: Optional[str] = None) -> int:
+        with self.lock:
+            if device_id:
+                return self.db.execute("SELECT COUNT(*) FROM spool WHERE device_id = ?", (device_id,)).fetchone()[0]
+            return self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+    
+    def get_watermark(self, device_id: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT last_punch_time FROM watermarks WHERE device_id = ?", (device_id,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def seed_watermark(self, device_id: str, punch_time: str):
+        """Start a device's mark from the newest punch the ERP already has (first run of an existing install)"""
+        with self.lock:
+            self._advance_watermark(device_id, punch_time)
+    
+    def _advance_watermark(self, device_id: str, punch_time: str):
+        # Caller holds the lock; punch_time strings share one ISO format so they order lexically
+        self.db.execute(
+            """INSERT INTO watermarks (device_id, last_punch_time) VALUES (?, ?)
+               ON CONFLICT(device_id) DO UPDATE SET last_punch_time = excluded.last_punch_time
+               WHERE excluded.last_punch_time > watermarks.last_punch_time""",
+            (device_id, punch_time)
+        )
+    
+    @staticmethod
+    def _newest_per_device(punches: List[Dict]) -> Dict[str, str]:
+        newest: Dict[str, str] = {}
+        for p in punches:
+            if p["punch_time"] > newest.get(p["device_id"], ""):
+                newest[p["device_id"]] = p["punch_time"]
+        return newest
+    
+    def close(self):
+        with self.lock:
+            self.db.close()
+
 class ZKTecoDeviceConnector:
     """Manages connection to individual ZKTeco device"""
     
-    def __init__(self, device_config: Dict, erp_config: Dict):
+    def __init__(self, device_config: Dict, erp_config: Dict, spool: Optional[PunchSpool] = None):
         self.device_config = device_config
         self.erp_config = erp_config
         self.zk = ZK(
@@ -39,6 +146,21 @@ class ZKTecoDeviceConnector:
         self.running = False
         self.last_seen = None
         
+        # Punches are spooled to disk first, then uploaded in batches over one reused HTTP session
+        self.spool = spool or PunchSpool(erp_config.get('spool_path', 'zkteco_spool.db'))
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.batch_size = erp_config.get('batch_size', 50)
+        self.flush_interval = erp_config.get('flush_interval', 2.0)
+        self.unflushed = 0
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        
+        # Exponential backoff between failed uploads; spooled punches wait on disk meanwhile
+        self.retry_base_delay = erp_config.get('retry_base_delay', 1.0)
+        self.retry_max_delay = erp_config.get('retry_max_delay', 60.0)
+        self.retry_delay = 0.0
+        self.next_flush_at = 0.0
+        
     async def connect(self) -> bool:
         """Connect to ZKTeco device using async operations"""
         try:
@@ -105,6 +227,8 @@ class ZKTecoDeviceConnector:
                 
         self.running = True
         logger.info(f"Starting live capture for device {self.device_config['device_id']}")
+        self._start_flush_loop()
+        await self.catch_up()
         
         # Start live capture task on the event loop
         capture_task = asyncio.create_task(self._live_capture_worker())
@@ -120,6 +244,8 @@ class ZKTecoDeviceConnector:
                     
             self.running = True
             logger.info(f"Starting live capture for device {self.device_config['device_id']}")
+            self._start_flush_loop()
+            await self.catch_up()
             
             # Start the live capture worker directly
             await self._live_capture_worker()
@@ -179,45 +305,109 @@ class ZKTecoDeviceConnector:
             logger.error(f"Error getting live attendance batch: {e}")
             return []
     
+    def _start_flush_loop(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.unflushed = self.spool.pending_count(self.device_config['device_id'])
+            if self.unflushed:
+                logger.info(f"Replaying {self.unflushed} spooled punches for device {self.device_config['device_id']}")
+            self.flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        """Flush spooled punches every flush_interval seconds (respecting backoff)"""
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_punches()
+            except Exception as e:
+                logger.error(f"Punch flush error for device {self.device_config['device_id']}: {e}")
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """One keep-alive HTTP session per device instead of one per request"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                headers={
+                    'Authorization': f"Bearer {self.erp_config['auth_token']}",
+                    'Content-Type': 'application/json'
+                },
+                timeout=aiohttp.ClientTimeout(total=self.erp_config.get('request_timeout', 30))
+            )
+        return self.session
+    
+    async def _enqueue_punch(self, punch_data: Dict):
+        """Spool a punch durably; flush immediately once a full batch is waiting"""
+        await self._enqueue_punches([punch_data])
+    
+    async def _enqueue_punches(self, punches: List[Dict]):
+        if not punches:
+            return
+        self.unflushed += await asyncio.to_thread(self.spool.append, punches)
+        if self.unflushed >= self.batch_size:
+            await self.flush_punches()
+    
+    async def flush_punches(self, force: bool = False) -> bool:
+        """Upload spooled punches in batch_size chunks until the spool is drained or an upload fails"""
+        device_id = self.device_config['device_id']
+        if not force and time.monotonic() < self.next_flush_at:
+            return False
+        
+        async with self.flush_lock:
+            while True:
+                batch = await asyncio.to_thread(self.spool.peek, device_id, self.batch_size)
+                if not batch:
+                    self.unflushed = 0
+                    return True
+                
+                if not await self._send_batch_to_erp([payload for _, payload in batch]):
+                    # Leave the batch on disk and back off before the next attempt
+                    self.retry_delay = min(self.retry_max_delay, max(self.retry_base_delay, self.retry_delay * 2))
+                    self.next_flush_at = time.monotonic() + self.retry_delay
+                    logger.warning(f"Upload failed for {device_id}; {len(batch)}+ punches spooled, retrying in {self.retry_delay:.0f}s")
+                    return False
+                
+                await asyncio.to_thread(self.spool.ack, [row_id for row_id, _ in batch])
+                self.unflushed = max(0, self.unflushed - len(batch))
+                self.retry_delay = 0.0
+                self.next_flush_at = 0.0
+                self.last_seen = datetime.now()
+                logger.info(f"Sent batch of {len(batch)} punches from {device_id} to ERP")
+    
+    def _build_punch_data(self, attendance) -> Dict:
+        """Translate a pyzk attendance record into the ERP punch payload"""
+        punch_data = {
+            "person_id": str(attendance.user_id),
+            # Device default ("person_type" in its config), refined from the user_id pattern below
+            "person_type": self.device_config.get('person_type', 'student'),
+            "device_id": self.device_config['device_id'],
+            "device_name": self.device_config['device_name'],
+            "punch_time": attendance.timestamp.isoformat() + 'Z',
+            "punch_method": "fingerprint",  # Default for ZKTeco
+            "punch_type": self._determine_punch_type(attendance.punch),
+            "verification_score": 95.0,  # Default high score for successful punch
+            "status": "verified",
+            "source_payload": {
+                "raw_user_id": attendance.user_id,
+                "raw_timestamp": str(attendance.timestamp),
+                "raw_punch": attendance.punch,
+                "raw_status": getattr(attendance, 'status', None),
+                "device_info": self.device_config
+            }
+        }
+        
+        # Determine person type from user_id pattern
+        if str(attendance.user_id).startswith(('STF', 'STAFF', 'TCH')):
+            punch_data["person_type"] = "staff"
+        elif str(attendance.user_id).startswith(('STU', 'STUDENT')):
+            punch_data["person_type"] = "student"
+        
+        return punch_data
+    
     async def _process_attendance(self, attendance):
-        """Process attendance punch and send to ERP"""
+        """Process attendance punch and queue it for the next batch upload"""
         try:
-            # Prepare punch data
-            punch_data = {
-                "person_id": str(attendance.user_id),
-                "person_type": "student",  # Default, can be determined from user_id pattern
-                "device_id": self.device_config['device_id'],
-                "device_name": self.device_config['device_name'],
-                "punch_time": attendance.timestamp.isoformat() + 'Z',
-                "punch_method": "fingerprint",  # Default for ZKTeco
-                "punch_type": self._determine_punch_type(attendance.punch),
-                "verification_score": 95.0,  # Default high score for successful punch
-                "status": "verified",
-                "source_payload": {
-                    "raw_user_id": attendance.user_id,
-                    "raw_timestamp": str(attendance.timestamp),
-                    "raw_punch": attendance.punch,
-                    "raw_status": getattr(attendance, 'status', None),
-                    "device_info": self.device_config
-                }
-            }
-            
-            # Determine person type from user_id pattern
-            if str(attendance.user_id).startswith(('STF', 'STAFF', 'TCH')):
-                punch_data["person_type"] = "staff"
-            elif str(attendance.user_id).startswith(('STU', 'STUDENT')):
-                punch_data["person_type"] = "student"
-                
+            punch_data = self._build_punch_data(attendance)
             logger.info(f"Processing punch: {punch_data['person_id']} on {punch_data['device_id']} at {punch_data['punch_time']}")
             
-            # Send to ERP API
-            success = await self._send_to_erp(punch_data)
-            
-            if success:
-                logger.info(f"Punch sent to ERP successfully: {punch_data['person_id']}")
-                self.last_seen = datetime.now()
-            else:
-                logger.error(f"Failed to send punch to ERP: {punch_data['person_id']}")
+            await self._enqueue_punch(punch_data)
                 
         except Exception as e:
             logger.error(f"Error processing attendance: {e}")
@@ -236,37 +426,49 @@ class ZKTecoDeviceConnector:
         return punch_types.get(punch_code, "IN")
     
     async def _send_to_erp(self, punch_data: Dict) -> bool:
-        """Send punch data to ERP API"""
+        """Send a single punch to the ERP API"""
         try:
             url = f"{self.erp_config['base_url']}/biometric/punch"
-            headers = {
-                'Authorization': f"Bearer {self.erp_config['auth_token']}",
-                'Content-Type': 'application/json'
-            }
+            session = await self._get_session()
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=punch_data, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.debug(f"ERP response: {result}")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"ERP API error {response.status}: {error_text}")
-                        return False
+            async with session.post(url, json=punch_data) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    logger.debug(f"ERP response: {result}")
+                    return True
+                else:
+                    error_text = await response.text()
+                    logger.error(f"ERP API error {response.status}: {error_text}")
+                    return False
                         
         except Exception as e:
             logger.error(f"Error sending to ERP: {e}")
             return False
     
+    async def _send_batch_to_erp(self, punches: List[Dict]) -> bool:
+        """Send a batch of punches to the ERP bulk endpoint"""
+        try:
+            url = f"{self.erp_config['base_url']}/biometric/punches/bulk"
+            session = await self._get_session()
+            
+            async with session.post(url, json={"punches": punches}) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    logger.debug(f"ERP bulk response: {result.get('inserted')} inserted")
+                    return True
+                else:
+                    error_text = await response.text()
+                    logger.error(f"ERP bulk API error {response.status}: {error_text}")
+                    return False
+                        
+        except Exception as e:
+            logger.error(f"Error sending batch to ERP: {e}")
+            return False
+    
     async def _update_device_status(self, status: str, additional_data: Dict = None):
         """Update device status in ERP"""
         try:
             url = f"{self.erp_config['base_url']}/biometric/device-status"
-            headers = {
-                'Authorization': f"Bearer {self.erp_config['auth_token']}",
-                'Content-Type': 'application/json'
-            }
             
             status_data = {
                 "device_id": self.device_config['device_id'],
@@ -275,35 +477,39 @@ class ZKTecoDeviceConnector:
                 **(additional_data or {})
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.put(url, json=status_data, headers=headers) as response:
-                    if response.status == 200:
-                        logger.debug(f"Device status updated: {self.device_config['device_id']} - {status}")
-                    else:
-                        logger.warning(f"Failed to update device status: {response.status}")
+            session = await self._get_session()
+            async with session.put(url, json=status_data) as response:
+                if response.status == 200:
+                    logger.debug(f"Device status updated: {self.device_config['device_id']} - {status}")
+                else:
+                    logger.warning(f"Failed to update device status: {response.status}")
                         
         except Exception as e:
             logger.error(f"Error updating device status: {e}")
     
-    async def get_stored_attendance(self) -> List[Dict]:
-        """Get stored attendance records from device"""
+    def _blocking_get_attendance(self):
+        self.connection.disable_device()
+        try:
+            return self.connection.get_attendance()
+        finally:
+            self.connection.enable_device()
+    
+    async def get_stored_attendance(self, since: Optional[str] = None) -> List[Dict]:
+        """Get stored attendance records from device, optionally only those newer than `since`"""
         try:
             if not self.connection:
                 await self.connect()
                 
             if self.connection:
-                self.connection.disable_device()
-                records = self.connection.get_attendance()
-                self.connection.enable_device()
+                records = await asyncio.to_thread(self._blocking_get_attendance)
                 
                 attendance_data = []
                 for record in records:
-                    attendance_data.append({
-                        "person_id": str(record.user_id),
-                        "punch_time": record.timestamp.isoformat() + 'Z',
-                        "punch_type": self._determine_punch_type(record.punch),
-                        "device_id": self.device_config['device_id']
-                    })
+                    punch_time = record.timestamp.isoformat() + 'Z'
+                    if since and punch_time <= since:
+                        continue
+                    # Same payload as live capture, so person_type and method survive catch-up
+                    attendance_data.append(self._build_punch_data(record))
                 
                 return attendance_data
             return []
@@ -312,9 +518,49 @@ class ZKTecoDeviceConnector:
             logger.error(f"Error getting stored attendance: {e}")
             return []
     
+    async def catch_up(self) -> int:
+        """
+        Spool every device record newer than this device's high-water mark, then
+        flush. Run before live capture so the mark never skips offline-era punches.
+        """
+        device_id = self.device_config['device_id']
+        since = await asyncio.to_thread(self.spool.get_watermark, device_id)
+        if since is None:
+            since = await self._fetch_server_watermark()
+            if since:
+                await asyncio.to_thread(self.spool.seed_watermark, device_id, since)
+                logger.info(f"Seeded {device_id} watermark from the ERP's latest stored punch: {since}")
+        records = await self.get_stored_attendance(since=since)
+        if records:
+            await self._enqueue_punches(records)
+            logger.info(f"Catch-up for {device_id}: spooled {len(records)} records newer than {since or 'the beginning'}")
+        await self.flush_punches(force=True)
+        return len(records)
+    
+    async def _fetch_server_watermark(self) -> Optional[str]:
+        """Newest punch time the ERP holds for this device, or None (nothing stored / ERP unreachable)"""
+        try:
+            url = f"{self.erp_config['base_url']}/biometric/devices/{self.device_config['device_id']}/latest-punch"
+            session = await self._get_session()
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return (await response.json()).get("last_punch_time")
+                logger.warning(f"Could not read latest stored punch: {response.status}")
+        except Exception as e:
+            logger.warning(f"Could not read latest stored punch: {e}")
+        return None
+    
     async def disconnect(self):
         """Disconnect from device"""
         self.running = False
+        if self.flush_task:
+            self.flush_task.cancel()
+        try:
+            await self.flush_punches(force=True)
+        except Exception as e:
+            logger.error(f"Error flushing punches on disconnect: {e}")
+        if self.session and not self.session.closed:
+            await self.session.close()
         if self.connection:
             try:
                 self.connection.enable_device()
@@ -328,6 +574,7 @@ class ZKTecoService:
     
     def __init__(self, config_file: str = "zkteco_config.json"):
         self.config = self._load_config(config_file)
+        self.spool = PunchSpool(self.config['erp'].get('spool_path', 'zkteco_spool.db'))
         self.device_connectors: Dict[str, ZKTecoDeviceConnector] = {}
         self.capture_tasks: Dict[str, asyncio.Task] = {}
         self.running = False
@@ -375,7 +622,7 @@ class ZKTecoService:
         # Initialize device connectors and start capture tasks
         for device_config in self.config['devices']:
             device_id = device_config['device_id']
-            connector = ZKTecoDeviceConnector(device_config, self.config['erp'])
+            connector = ZKTecoDeviceConnector(device_config, self.config['erp'], spool=self.spool)
             self.device_connectors[device_id] = connector
             
             # Create and store capture task for each device (don't await)
@@ -395,7 +642,9 @@ class ZKTecoService:
                 for device_id, connector in self.device_connectors.items():
                     if not connector.connection:
                         logger.warning(f"Device {device_id} disconnected, attempting reconnection...")
-                        await connector.connect()
+                        if await connector.connect():
+                            # Pull whatever the device buffered while we were away
+                            await connector.catch_up()
                 
                 await asyncio.sleep(self.config.get('sync_interval', 30))
                 
@@ -411,20 +660,21 @@ class ZKTecoService:
         for connector in self.device_connectors.values():
             await connector.disconnect()
         
+        pending = self.spool.pending_count()
+        if pending:
+            logger.info(f"{pending} punches left in spool; they will be replayed on next start")
+        self.spool.close()
+        
         logger.info("ZKTeco Service stopped")
     
     async def sync_stored_data(self):
-        """Sync stored attendance data from all devices"""
+        """Sync stored attendance data newer than each device's high-water mark"""
         logger.info("Starting stored data sync...")
         
         for device_id, connector in self.device_connectors.items():
             try:
-                records = await connector.get_stored_attendance()
-                logger.info(f"Retrieved {len(records)} stored records from {device_id}")
-                
-                # Send each record to ERP
-                for record in records:
-                    await connector._send_to_erp(record)
+                count = await connector.catch_up()
+                logger.info(f"Retrieved {count} new stored records from {device_id}")
                     
             except Exception as e:
                 logger.error(f"Error syncing data from {device_id}: {e}")
@@ -95,6 +95,27 @@ const BiometricDevices = () => {
     fetchDevicesList();
   }, []);
 
+  // While the daily attendance view is open, new punches are pushed by the server
+  useEffect(() => {
+    if (!isDailyAttendanceModalOpen || typeof EventSource === 'undefined') return;
+    const token = localStorage.getItem('token');
+    if (!token) return;
+
+    const source = new EventSource(
+      `${API_BASE_URL}/biometric/live-attendance/stream?backfill=0&token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('punch', (event) => {
+      const punch = JSON.parse(event.data);
+      setDailyAttendanceData((prev) => {
+        if (!prev) return prev;
+        const latest = [punch, ...(prev.latest_punches || []).filter((p) => !punch.punch_id || p.punch_id !== punch.punch_id)].slice(0, 100);
+        return { ...prev, latest_punches: latest, total_count: latest.length };
+      });
+    });
+
+    return () => source.close();
+  }, [isDailyAttendanceModalOpen, API_BASE_URL]);
+
   const fetchBiometricData = async () => {
     setTotalDevices(8);
     setOnlineDevices(6);
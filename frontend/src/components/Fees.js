@@ -661,9 +661,9 @@ const Fees = () => {
       // Close modal
       setShowSendRemindersModal(false);
       
-      // Show success message
-      toast.success(`📧 Fee Reminders Sent Successfully!`, {
-        description: `${result.sent_count} reminders sent to students with pending fees. ${result.failed_count} failed.`,
+      // Reminders are dispatched in the background; progress is available at /jobs/{job_id}
+      toast.success(`📧 Fee Reminders Queued!`, {
+        description: 'Reminders are being sent to students with pending fees.',
         duration: 5000
       });
 
@@ -1492,15 +1492,14 @@ const Fees = () => {
       const response = await axios.post(`${API}/reminders/send`, {}, {
         headers: { Authorization: `Bearer ${token}` }
       });
-
-      const result = response.data;
+      console.log('✅ Reminders job started:', response.data.job_id);
       
       // Close modal first
       setShowSendRemindersModal(false);
       
-      // Show success message with actual results
-      toast.success(`📧 Reminders Sent Successfully!`, {
-        description: `${result.sent_count} reminders sent to students with pending fees. ${result.failed_count} failed.`,
+      // Reminders are dispatched in the background; progress is available at /jobs/{job_id}
+      toast.success(`📧 Reminders Queued!`, {
+        description: 'Reminders are being sent to students with pending fees.',
         duration: 5000
       });
 
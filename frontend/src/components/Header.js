@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import { useAuth } from "../App";
 import { useNavigate } from "react-router-dom";
 import i18n from "../i18n";
@@ -37,6 +37,7 @@ const Header = ({ onMenuClick }) => {
   const [notifications, setNotifications] = useState([]);
   const [unreadCount, setUnreadCount] = useState(0);
   const [, forceUpdate] = useState(0);
+  const streamConnected = useRef(false);
   const [attendanceSummary, setAttendanceSummary] = useState({
     present: 0,
     absent: 0,
@@ -65,7 +66,7 @@ const Header = ({ onMenuClick }) => {
       const data = response.data;
       const notificationsArray = Array.isArray(data)
         ? data
-        : data.notifications || [];
+        : data.items || data.notifications || [];
       setNotifications(notificationsArray.slice(0, 5));
     } catch (error) {
       console.error("Error fetching notifications:", error);
@@ -123,14 +124,61 @@ const Header = ({ onMenuClick }) => {
     fetchAttendanceSummary();
 
     const interval = setInterval(() => {
-      fetchNotifications();
-      fetchUnreadCount();
+      // Notifications arrive over the event stream; poll only while it is down
+      if (!streamConnected.current) {
+        fetchNotifications();
+        fetchUnreadCount();
+      }
       fetchAttendanceSummary();
     }, 30000);
 
     return () => clearInterval(interval);
   }, [fetchNotifications, fetchUnreadCount, fetchAttendanceSummary]);
 
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token || typeof EventSource === "undefined") return;
+
+    const source = new EventSource(
+      `${API_BASE_URL}/notifications/stream?token=${encodeURIComponent(token)}`,
+    );
+    source.onopen = () => {
+      streamConnected.current = true;
+    };
+    source.onerror = () => {
+      // EventSource reconnects by itself and resumes from the last event id
+      streamConnected.current = false;
+    };
+    // "ready" follows any replayed notifications, so its count replaces what they added
+    source.addEventListener("ready", (event) => {
+      setUnreadCount(JSON.parse(event.data).unread_count || 0);
+    });
+    source.addEventListener("notification", (event) => {
+      const notification = JSON.parse(event.data);
+      setNotifications((prev) =>
+        [notification, ...prev.filter((n) => n.id !== notification.id)].slice(0, 5),
+      );
+      setUnreadCount((count) => count + 1);
+    });
+    source.addEventListener("unread", (event) => {
+      const data = JSON.parse(event.data);
+      if (data.unread_count !== undefined) {
+        setUnreadCount(data.unread_count);
+      } else {
+        setUnreadCount((count) => Math.max(0, count + (data.delta || 0)));
+      }
+    });
+    source.addEventListener("resync", () => {
+      fetchNotifications();
+      fetchUnreadCount();
+    });
+
+    return () => {
+      streamConnected.current = false;
+      source.close();
+    };
+  }, [fetchNotifications, fetchUnreadCount]);
+
   const handleLogout = () => {
     logout();
   };
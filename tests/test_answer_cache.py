@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+from answer_cache import AnswerCache, normalize
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                return False
+            if "$in" in condition and not set(value or []) & set(condition["$in"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc.get(field, 0), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        return next((dict(doc) for doc in self.docs.values() if _matches(doc, query)), None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs.values() if _matches(doc, query)])
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            if not upsert:
+                return
+            doc = self.docs[query["_id"]] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+        doc.update(update.get("$set", {}))
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+SCOPE = {"class_standard": "8th", "subject": "History", "answer_source": "all"}
+
+
+def _cache():
+    return AnswerCache(SimpleNamespace(ai_answer_cache=FakeCollection()))
+
+
+def _lookup(cache, question, scope=SCOPE):
+    return asyncio.run(cache.lookup("t1", "chat", scope, question))
+
+
+def _store(cache, question, answer, **options):
+    asyncio.run(cache.store("t1", "chat", SCOPE, question, answer, tokens_used=100, **options))
+
+
+def test_question_words_and_negations_are_part_of_the_key():
+    keys = {" ".join(normalize(q)) for q in (
+        "Why did World War 2 start?", "When did World War 2 start?", "Where did World War 2 start?"
+    )}
+    assert len(keys) == 3
+    assert normalize("Why don't plants grow in the dark?") != normalize("Why do plants grow in the dark?")
+    assert normalize("Solve 2x + 3 = 7") != normalize("Solve 2x + 3 = 9")
+
+
+def test_punctuation_case_and_filler_words_share_a_key():
+    assert normalize("Explain the process of photosynthesis!") == normalize("process of PHOTOSYNTHESIS")
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = _cache()
+    _store(cache, "Explain the process of photosynthesis in green plants", "PHOTO")
+
+    exact = _lookup(cache, "explain process of photosynthesis in the green plants?")
+    assert exact["answer"] == "PHOTO" and exact["match"] == "exact"
+
+    near = _lookup(cache, "explain photosynthesis process in green plants")
+    assert near["answer"] == "PHOTO" and near["match"] == "near"
+
+
+def test_different_questions_about_the_same_thing_miss():
+    cache = _cache()
+    _store(cache, "Why did World War 2 start?", "WHY")
+    _store(cache, "Who invented the telephone?", "WHO")
+
+    assert _lookup(cache, "When did World War 2 start?") is None
+    assert _lookup(cache, "Where did World War 2 start?") is None
+    assert _lookup(cache, "When was the telephone invented?") is None
+    assert _lookup(cache, "Why did World War 1 start?") is None
+    assert _lookup(cache, "Why didn't World War 2 start earlier?") is None
+    assert cache.metrics()["misses"] == 5
+
+
+def test_scope_separates_entries():
+    cache = _cache()
+    _store(cache, "Why did World War 2 start?", "WHY")
+    assert _lookup(cache, "Why did World War 2 start?", {**SCOPE, "class_standard": "9th"}) is None
+    assert _lookup(cache, "Why did World War 2 start?", {**SCOPE, "subject": " history "})["answer"] == "WHY"
+
+
+def test_restricted_answers_are_only_served_on_exact_match():
+    cache = _cache()
+    _store(cache, "Who won the cricket world cup?", "Sorry, I can only answer academic questions", is_restricted=True)
+
+    assert _lookup(cache, "who won the cricket world cup")["is_restricted"] is True
+    assert _lookup(cache, "who won the cricket world cup final") is None
+
+
+def test_generator_keys_only_match_exactly():
+    cache = _cache()
+
+    def generated(kind, chapter, topic=None):
+        return asyncio.run(cache.lookup("t1", kind, SCOPE, f"{chapter} {topic or 'General'}", near=False))
+
+    for kind, chapter, topic in [("quiz", "Cell", None), ("notes", "Electric Current", None), ("test", "Force Pressure", None)]:
+        asyncio.run(cache.store("t1", kind, SCOPE, f"{chapter} {topic or 'General'}", kind.upper(), tokens_used=100))
+
+    assert generated("quiz", "Cell")["answer"] == "QUIZ"
+    assert generated("quiz", "Cell Division") is None
+    assert generated("notes", "Electric Current Circuits") is None
+    assert generated("test", "Force") is None
+
+    asyncio.run(cache.store("t1", "summary", SCOPE, "Explain the process of photosynthesis in green plants", "SUM"))
+    reworded = "explain photosynthesis process in green plants"
+    assert asyncio.run(cache.lookup("t1", "summary", SCOPE, reworded))["match"] == "near"
+    assert asyncio.run(cache.lookup("t1", "summary", SCOPE, reworded, near=False)) is None
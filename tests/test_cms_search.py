@@ -0,0 +1,58 @@
+import json
+import os
+
+from cms_search import CMSSearchIndex, TenantIndex
+
+
+def _index():
+    index = TenantIndex("t1", 4)
+    index.add("qa", {"id": "q1", "question": "What is photosynthesis in green plants?",
+                     "answer": "Plants make food from sunlight", "subject": "Biology", "class_standard": "8th"})
+    index.add("qa", {"id": "q2", "question": "Explain respiration in animals",
+                     "answer": "Animals release energy from food", "subject": "Biology", "class_standard": "9th"})
+    index.add("chapter", {"id": "c1", "chapter_title": "Chemical reactions",
+                          "content": "Photosynthesis is also a chemical reaction", "subject": "Chemistry"})
+    return index
+
+
+def test_search_ranks_title_matches_first():
+    hits = _index().search("photosynthesis", k=5)
+    assert [(kind, ref) for kind, ref, _ in hits] == [("qa", "q1"), ("chapter", "c1")]
+
+
+def test_search_filters_kinds_and_fields():
+    index = _index()
+    assert [ref for _, ref, _ in index.search("photosynthesis", 5, kinds=["chapter"])] == ["c1"]
+    assert [ref for _, ref, _ in index.search("food", 5, filters={"class_standard": "9th"})] == ["q2"]
+    assert index.search("food", 5, filters={"subject": "Physics"}) == []
+
+
+def test_min_match_requires_share_of_query_terms():
+    index = _index()
+    query = "photosynthesis sunlight chlorophyll stomata"
+    assert [ref for _, ref, _ in index.search(query, 5)] == ["q1", "c1"]
+    assert [ref for _, ref, _ in index.search(query, 5, min_match=0.5)] == ["q1"]
+    assert index.search(query, 5, min_match=0.75) == []
+
+
+def test_remove_drops_document_and_postings():
+    index = _index()
+    index.remove("chapter", "c1")
+    assert [ref for _, ref, _ in index.search("photosynthesis", 5)] == ["q1"]
+    assert "reaction" not in index.postings and len(index) == 2
+
+
+def test_state_round_trips_through_private_json_file(tmp_path):
+    directory = tmp_path / "cms"
+    store = CMSSearchIndex(db=None, directory=str(directory))
+    assert store.persist and oct(os.stat(directory).st_mode & 0o777) == "0o700"
+
+    index = _index()
+    store._write(index.to_state())
+    with open(store._path("t1")) as f:
+        assert json.load(f)["tenant_id"] == "t1"
+
+    loaded = store._read("t1")
+    assert loaded.version == 4 and loaded.total_length == index.total_length
+    assert loaded.search("respiration animals", 5) == index.search("respiration animals", 5)
+    assert store._read("t2") is None
@@ -0,0 +1,80 @@
+import asyncio
+import socket
+from email import message_from_bytes
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from message_transport import MessageTransports, SMTPEmailTransport, TransportError
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.greetings = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # Once per SMTP connection
+        self.greetings += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, message_from_bytes(envelope.content)))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        yield handler, port
+    finally:
+        controller.stop()
+
+
+def test_email_round_trip_reuses_one_session(smtp_server):
+    handler, port = smtp_server
+    transport = SMTPEmailTransport("127.0.0.1", port, sender="office@school.test", use_tls=False, timeout=5)
+    transports = MessageTransports(email=transport)
+
+    async def main():
+        for n in range(3):
+            await transports.send_email(["parent@home.test"], f"Fee reminder {n}", "Please pay", "<p>Please pay</p>")
+
+    try:
+        asyncio.run(main())
+    finally:
+        transports.close()
+
+    assert [message["Subject"] for _, message in handler.messages] == [f"Fee reminder {n}" for n in range(3)]
+    recipients, message = handler.messages[0]
+    assert recipients == ["parent@home.test"] and message["From"] == "office@school.test"
+    assert message.is_multipart() and message.get_payload()[1].get_content_type() == "text/html"
+    assert handler.greetings == 1
+    assert transports.metrics()["email"]["sent"] == 3
+
+
+def test_unreachable_server_is_a_transport_error():
+    transport = SMTPEmailTransport("127.0.0.1", _free_port(), use_tls=False, timeout=2)
+
+    async def main():
+        await transport.send(to=["parent@home.test"], subject="Hi", text="Hello")
+
+    try:
+        with pytest.raises(TransportError):
+            asyncio.run(main())
+    finally:
+        transport.close()
+    assert transport.metrics.failed == 1 and transport.metrics.in_flight == 0
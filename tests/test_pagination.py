@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, fetch_page, keyset_filter
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+        elif field == "$and":
+            if not all(_matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(field)
+            for op, operand in condition.items():
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (field in doc) != operand:
+                    return False
+                # Like MongoDB, range operators never match null or a missing field
+                if op in ("$gt", "$lt") and value is None:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+def _sort_key(doc, sort):
+    # Nulls sort lowest; flip per field for descending order
+    key = []
+    for field, direction in sort:
+        value = doc.get(field)
+        rank = (0, 0) if value is None else (1, value)
+        key.append(rank if direction > 0 else _Reversed(rank))
+    return key
+
+
+class _Reversed:
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, sort):
+        self.docs.sort(key=lambda doc: _sort_key(doc, sort))
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query):
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+
+def _docs():
+    base = datetime(2026, 1, 1)
+    docs = []
+    for i in range(23):
+        doc = {"id": f"r{i:02d}", "amount": i % 4}
+        if i % 5:
+            doc["paid_at"] = base + timedelta(days=i % 7)
+        elif i % 2:
+            doc["paid_at"] = None
+        docs.append(doc)
+    return docs
+
+
+def _walk(collection, sort, limit=4):
+    seen, after = [], None
+    while True:
+        page = asyncio.run(fetch_page(collection, {}, sort, after=after, limit=limit))
+        seen.extend(doc["id"] for doc in page["items"])
+        if not page["has_more"]:
+            return seen
+        after = page["next_cursor"]
+
+
+@pytest.mark.parametrize("sort", [
+    [("paid_at", -1), ("id", -1)],
+    [("paid_at", 1), ("id", 1)],
+    [("amount", -1), ("paid_at", -1), ("id", 1)],
+    [("amount", 1), ("paid_at", 1), ("id", -1)],
+])
+def test_pages_cover_every_row_once_in_order(sort):
+    docs = _docs()
+    expected = [doc["id"] for doc in sorted(docs, key=lambda doc: _sort_key(doc, sort))]
+    assert _walk(FakeCollection(docs), sort) == expected
+
+
+def test_descending_filter_keeps_nulls_after_values():
+    query = keyset_filter([("paid_at", -1), ("id", -1)], [datetime(2026, 1, 3), "r05"])
+    assert _matches({"id": "r01"}, query)
+    assert _matches({"id": "r02", "paid_at": None}, query)
+    assert not _matches({"id": "r03", "paid_at": datetime(2026, 1, 4)}, query)
+
+
+def test_cursor_round_trips_datetimes_and_nulls():
+    sort = [("paid_at", -1), ("amount", 1), ("id", 1)]
+    doc = {"paid_at": datetime(2026, 3, 1, 9, 30), "amount": None, "id": "r1"}
+    assert decode_cursor(encode_cursor(doc, sort), sort) == [datetime(2026, 3, 1, 9, 30), None, "r1"]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor({"id": "r1"}, [("id", 1)])])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, [("paid_at", -1), ("id", -1)])
+    assert exc.value.status_code == 400
@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+from report_cache import ReportCache, normalize_filters
+
+
+def _cache(tmp_path, max_bytes=250):
+    return ReportCache(db=None, directory=str(tmp_path / "reports"), max_bytes=max_bytes)
+
+
+def test_least_recently_used_artifacts_are_evicted(tmp_path):
+    cache = _cache(tmp_path)
+    first = cache.store("k1", "t1", "a.pdf", b"x" * 100)
+    cache.store("k2", "t1", "b.pdf", b"x" * 100)
+    assert cache.lookup("k1") is first  # k2 is now the least recently used
+
+    cache.store("k3", "t1", "c.xlsx", b"x" * 100)
+    assert cache.lookup("k2") is None
+    assert cache.lookup("k1") is not None and cache.lookup("k3") is not None
+    assert cache.counters["evicted"] == 1
+    assert sorted(os.listdir(cache.directory)) == ["k1.json", "k1.pdf", "k3.json", "k3.xlsx"]
+
+
+def test_newest_artifact_survives_even_over_budget(tmp_path):
+    cache = _cache(tmp_path, max_bytes=50)
+    cache.store("k1", "t1", "a.pdf", b"x" * 40)
+    cache.store("k2", "t1", "b.pdf", b"x" * 80)
+    assert list(cache._entries) == ["k2"]
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store("k1", "t1", "a.pdf", b"x" * 100)
+    cache.store("k2", "t2", "b.pdf", b"y" * 100)
+
+    reloaded = _cache(tmp_path)
+    assert reloaded.lookup("k2").filename == "b.pdf"
+    assert reloaded.purge("t1") == 1
+    assert reloaded.lookup("k1") is None
+
+
+def test_concurrent_misses_share_one_render(tmp_path):
+    cache = _cache(tmp_path)
+    renders = []
+
+    async def render():
+        renders.append(1)
+        await asyncio.sleep(0.01)
+        return b"%PDF-1.4"
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_render("k1", "t1", "r.pdf", render) for _ in range(5)])
+
+    artifacts = asyncio.run(main())
+    assert len(renders) == 1
+    assert {artifact.path for artifact in artifacts} == {artifacts[0].path}
+    assert cache.counters["coalesced"] == 4
+
+
+def test_etag_matches_if_none_match(tmp_path):
+    artifact = _cache(tmp_path).store("a" * 64, "t1", "r.pdf", b"%PDF")
+    assert artifact.matches(f'W/{artifact.etag}, "other"')
+    assert not artifact.matches('"other"')
+
+
+def test_equivalent_filters_normalize_alike():
+    assert normalize_filters({"class_id": " 7 ", "section": "", "subjects": ["b", "a"], "term": None}) == \
+        normalize_filters({"subjects": ("a", "b"), "class_id": "7"})
@@ -0,0 +1,92 @@
+import pytest
+
+from semantic_search import SEMANTIC_MIN_COVERAGE, SEMANTIC_MIN_SCORE, Shard, TenantVectors
+
+CORPUS = {
+    "photosynthesis": "What is photosynthesis in green plants?",
+    "respiration_animals": "Explain respiration in animals",
+    "respiration_plants": "Describe respiration in plants",
+    "heart": "What is the function of the heart in the human body?",
+    "roots": "How do plants absorb water through their roots?",
+    "flower": "What are the parts of a flower?",
+    "digestion": "Explain the process of digestion in humans",
+    "osmosis": "What is osmosis?",
+    "cell": "Define the cell as the basic unit of life",
+    "chlorophyll": "What is the role of chlorophyll in leaves?",
+    "eye": "Explain the structure of the human eye",
+    "kidney": "How does the kidney filter blood?",
+    "bacteria": "What causes diseases caused by bacteria?",
+    "pollination": "Describe pollination in flowering plants",
+    "transpiration": "What is transpiration in plants?",
+    "nitrogen": "Explain the nitrogen cycle",
+    "vertebrates": "What are vertebrate animals?",
+    "gills": "How do fish breathe underwater with gills?",
+    "food_chain": "What is the food chain in an ecosystem?",
+    "germination": "Explain the process of germination of seeds",
+}
+
+
+def _build(directory):
+    docs = [{"id": ref, "question": question, "subject": "Biology", "class_standard": "7th"}
+            for ref, question in CORPUS.items()]
+    tenant = TenantVectors("t1", directory, 1)
+    tenant.set_shard(Shard.fit(directory, "Biology", docs))
+    return tenant
+
+
+@pytest.fixture(scope="module")
+def vectors(tmp_path_factory):
+    return _build(str(tmp_path_factory.mktemp("semantic")))
+
+
+def test_thresholds_are_the_documented_defaults():
+    assert (SEMANTIC_MIN_SCORE, SEMANTIC_MIN_COVERAGE) == (0.8, 0.4)
+
+
+@pytest.mark.parametrize("question, ref", [
+    ("explain photosynthesis in plants", "photosynthesis"),
+    ("how does photosynthesis happen in green plants", "photosynthesis"),
+    ("what is the function of heart", "heart"),
+    ("how do roots absorb water", "roots"),
+    ("define osmosis", "osmosis"),
+    ("describe the parts of flowers", "flower"),
+    ("what is pollination", "pollination"),
+    ("explain germination", "germination"),
+])
+def test_paraphrases_hit_their_question(vectors, question, ref):
+    hits = vectors.search(question, 3, SEMANTIC_MIN_SCORE)
+    assert hits and hits[0][0] == ref
+
+
+@pytest.mark.parametrize("question, ref, other", [
+    ("respiration in plants", "respiration_plants", "respiration_animals"),
+    ("describe respiration in animals", "respiration_animals", "respiration_plants"),
+])
+def test_near_miss_questions_do_not_cross(vectors, question, ref, other):
+    hits = dict(vectors.search(question, 5, SEMANTIC_MIN_SCORE))
+    assert ref in hits and other not in hits
+
+
+@pytest.mark.parametrize("question", [
+    "who won the football world cup",
+    "what is the capital of france",
+    "explain newton's laws of motion",
+    "explain respiration in fish",
+    # Differ from a stored question only by a word the corpus never uses
+    "what is the structure of the human ear",
+    "explain the structure of the human brain",
+    "what are invertebrate animals",
+    "explain the carbon cycle",
+])
+def test_off_topic_and_unseen_concepts_miss(vectors, question):
+    assert vectors.search(question, 3, SEMANTIC_MIN_SCORE) == []
+
+
+def test_filters_subjects_and_drops_scope_hits(tmp_path):
+    vectors = _build(str(tmp_path))
+    assert vectors.search("define osmosis", 3, SEMANTIC_MIN_SCORE)
+    assert vectors.search("define osmosis", 3, SEMANTIC_MIN_SCORE, class_standard="8th") == []
+    assert vectors.search("define osmosis", 3, SEMANTIC_MIN_SCORE, subject="Physics") == []
+
+    vectors.drop("osmosis")
+    assert vectors.search("define osmosis", 3, SEMANTIC_MIN_SCORE) == []
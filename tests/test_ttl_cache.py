@@ -0,0 +1,69 @@
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    return TTLCache(**kwargs), clock
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=30)
+    cache.set("user:1", {"id": "1"})
+    clock.now += 29
+    assert cache.get("user:1") == {"id": "1"}
+    clock.now += 2
+    assert cache.get("user:1", "missing") == "missing"
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_per_entry_ttl_overrides_default(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=30)
+    cache.set("host:a", "t1", ttl=5)
+    cache.set("host:b", "t2")
+    clock.now += 10
+    assert cache.get("host:a") is None
+    assert cache.get("host:b") == "t2"
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    cache, _ = _cache(monkeypatch, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_invalidation(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    for key in [("t1", "u1"), ("t1", "u2"), ("t2", "u1")]:
+        cache.set(key, key[1])
+    cache.invalidate(("t2", "u1"))
+    assert cache.invalidate_where(lambda key, value: key[0] == "t1" and value == "u2") == 1
+    assert [key for key in cache._data] == [("t1", "u1")]
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stats_report_hit_rate(monkeypatch):
+    cache, _ = _cache(monkeypatch, maxsize=10, ttl=60, name="principals")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert stats["name"] == "principals" and stats["size"] == 1
+    assert stats["hit_rate"] == round(2 / 3, 4)